@@ -0,0 +1,292 @@
+"""評価 1 回あたりのメモリ使用量を `tracemalloc` で計測するベンチマーク。
+
+シナリオごとに、評価 1 回の間に増えたメモリのピーク（一時的な確保を含む）と、
+評価後も残ったメモリ・メモリブロック数を表示する。CPython は確保の累計回数を
+公開していないため、確保の件数は評価後に残ったブロック数（リークや
+キャッシュの肥大化の検出用）で表す。`--check` を指定すると
+`benchmarks/memory_budgets.json` の上限（既定の引数で計測した値）と比較し、
+超えたシナリオがあれば終了コード 1 を返す。
+
+実行例::
+
+    python benchmarks/memory_usage.py --rows 2000 --check
+    python benchmarks/memory_usage.py --update-budgets
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import statistics
+import sys
+import tempfile
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+from openpyxl import load_workbook
+
+from lab_aid import excel_cli
+from lab_aid.engine import evaluate
+from lab_aid.engine.runtime.inputs import parse_inputs_E
+
+BUDGETS_PATH = Path(__file__).with_name("memory_budgets.json")
+# `--update-budgets` で計測値に上乗せする余裕（Python のバージョン差を吸収する）。
+BUDGET_HEADROOM = 2.0
+# 残留メモリの上限の下限。計測用の一時オブジェクト程度の誤差は許容する。
+RETAINED_FLOOR = 64
+
+
+@dataclass(frozen=True, slots=True)
+class MemoryStats:
+    """1 シナリオの計測結果（いずれも評価 1 回あたり）。
+
+    Attributes:
+        evaluations: 計測した評価の件数。
+        peak: 評価中に増えたメモリのピークの中央値（バイト）。
+        peak_max: 評価中に増えたメモリのピークの最大値（バイト）。
+        retained: 評価後も残ったメモリ（バイト）。
+        blocks: 評価後も残ったメモリブロック数。
+    """
+
+    evaluations: int
+    peak: float
+    peak_max: float
+    retained: float
+    blocks: float
+
+    def to_dict(self) -> dict[str, float]:
+        """`--format json` 向けの辞書へ変換する。"""
+        return {
+            "evaluations": self.evaluations,
+            "peak_bytes": self.peak,
+            "peak_max_bytes": self.peak_max,
+            "retained_bytes": self.retained,
+            "retained_blocks": self.blocks,
+        }
+
+
+def measure(
+    func: Callable[[], object], evaluations: int, *, per_call: int = 1, warmup: int = 3
+) -> MemoryStats:
+    """`func` を繰り返し呼び出し、評価 1 回あたりのメモリ使用量を計測する。
+
+    構文解析キャッシュなどの初回だけの確保を除くため、先に `warmup` 回呼び出す。
+
+    Args:
+        func: 計測する処理。
+        evaluations: `func` の呼び出し回数。
+        per_call: `func` 1 回に含まれる評価の件数（ブック全体の処理など）。
+        warmup: 計測前の呼び出し回数。
+
+    Returns:
+        計測結果。
+    """
+    for _ in range(warmup):
+        func()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        peaks = [0] * evaluations
+        for index in range(evaluations):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            func()
+            peaks[index] = tracemalloc.get_traced_memory()[1] - before
+        gc.collect()
+        current = tracemalloc.get_traced_memory()[0]
+        blocks = sys.getallocatedblocks()
+        for _ in range(evaluations):
+            func()
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - current
+        retained_blocks = sys.getallocatedblocks() - blocks
+    finally:
+        tracemalloc.stop()
+    calls = evaluations * per_call
+    return MemoryStats(
+        calls,
+        statistics.median(peaks) / per_call,
+        max(peaks) / per_call,
+        max(0, retained) / calls,
+        max(0, retained_blocks) / calls,
+    )
+
+
+def _multi_measurement_inputs(items: int, values: int) -> str:
+    return "\n".join(
+        f"M{item}=" + ", ".join(f"{value * 0.25:.2f}" for value in range(values))
+        for item in range(items)
+    )
+
+
+def _workbook(directory: Path, rows: int) -> Path:
+    path = directory / "memory.xlsx"
+    with contextlib.redirect_stdout(io.StringIO()):
+        excel_cli.ensure_template(path)
+    wb = load_workbook(path)
+    ws = wb.active
+    for offset in range(rows):
+        ws.cell(row=3 + offset, column=1, value="E")
+        ws.cell(row=3 + offset, column=2, value="this = #A * 2 + #B")
+        ws.cell(row=3 + offset, column=3, value=f"A={offset % 97}.5\nB={offset % 13}")
+    wb.save(path)
+    return path
+
+
+def run_scenarios(
+    rows: int, items: int, values: int, evaluations: int
+) -> dict[str, MemoryStats]:
+    """全シナリオを計測する。
+
+    Args:
+        rows: `excel_cli` で処理するブックの行数。
+        items: `parse_inputs_E` に渡す複数値の試験項目の数。
+        values: 試験項目ごとの値の個数。
+        evaluations: 1 評価単位のシナリオの計測回数。
+
+    Returns:
+        シナリオ名をキーにした計測結果。
+    """
+    large = _multi_measurement_inputs(items, values)
+    scenarios = {
+        "evaluate_simple": measure(
+            lambda: evaluate("E", "this = #A * 2", "A=5"), evaluations
+        ),
+        "evaluate_loop": measure(
+            lambda: evaluate(
+                "E",
+                "s = 0\nfor i = 1 to 20\n  s = s + #A\nnext\nthis = roundjisb(s, 2, 1)",
+                "A=1.25",
+            ),
+            evaluations,
+        ),
+        "evaluate_round_R": measure(
+            lambda: evaluate("R", "this = roundjisb(this, 2, 1)", "1.205"), evaluations
+        ),
+        "parse_inputs_E_large": measure(
+            lambda: parse_inputs_E(large), max(3, evaluations // 100)
+        ),
+        "evaluate_aggregate_large": measure(
+            lambda: evaluate(
+                "E", "this = ave(#M0) + stdev(#M1)", large, strict_inputs=False
+            ),
+            max(3, evaluations // 100),
+        ),
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        path = _workbook(Path(tmp), rows)
+
+        def process() -> None:
+            with contextlib.redirect_stdout(io.StringIO()):
+                excel_cli.main([str(path), "--jobs", "1"])
+
+        scenarios["excel_cli_workbook"] = measure(process, 2, per_call=rows, warmup=1)
+    return scenarios
+
+
+def check_budgets(
+    results: dict[str, MemoryStats], budgets: dict[str, dict[str, float]]
+) -> list[str]:
+    """計測結果を上限と比較し、超えた項目の説明を返す。"""
+    failures = []
+    for name, stats in results.items():
+        budget = budgets.get(name)
+        if budget is None:
+            continue
+        for field, actual in (
+            ("peak_bytes", stats.peak),
+            ("retained_bytes", stats.retained),
+        ):
+            limit = budget.get(field)
+            if limit is not None and actual > limit:
+                failures.append(f"{name}.{field}: {actual:,.0f} > 上限 {limit:,.0f}")
+    return failures
+
+
+def _budgets_from(results: dict[str, MemoryStats]) -> dict[str, dict[str, float]]:
+    return {
+        name: {
+            "peak_bytes": round(stats.peak * BUDGET_HEADROOM),
+            "retained_bytes": round(
+                max(RETAINED_FLOOR, stats.retained * BUDGET_HEADROOM)
+            ),
+        }
+        for name, stats in results.items()
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    """ベンチマークを実行し、シナリオごとのメモリ使用量を表示する。
+
+    Args:
+        argv: コマンドライン引数リスト。``None`` の場合は `sys.argv` を使用。
+
+    Returns:
+        上限を超えたシナリオがあれば 1、なければ 0。
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000, help="ブックの行数")
+    parser.add_argument("--items", type=int, default=10, help="複数値の試験項目の数")
+    parser.add_argument(
+        "--values", type=int, default=1000, help="試験項目ごとの値の個数"
+    )
+    parser.add_argument(
+        "--evaluations", type=int, default=500, help="1 評価単位のシナリオの計測回数"
+    )
+    parser.add_argument(
+        "--check", action="store_true", help="上限を超えたら終了コード 1 を返す"
+    )
+    parser.add_argument(
+        "--budgets", type=Path, default=BUDGETS_PATH, help="上限を記録した JSON"
+    )
+    parser.add_argument(
+        "--update-budgets",
+        action="store_true",
+        help=f"計測値の {BUDGET_HEADROOM} 倍を新しい上限として書き出す",
+    )
+    parser.add_argument(
+        "--format", choices=("text", "json"), default="text", help="出力形式"
+    )
+    args = parser.parse_args(argv)
+
+    results = run_scenarios(args.rows, args.items, args.values, args.evaluations)
+    if args.format == "json":
+        payload = {name: stats.to_dict() for name, stats in results.items()}
+        print(json.dumps(payload, ensure_ascii=False, indent=2))
+    else:
+        print(f"Python {sys.version.split()[0]}  （いずれも評価 1 回あたり）")
+        header = "{:<26} {:>8} {:>12} {:>12} {:>10} {:>8}"
+        print(header.format("シナリオ", "件数", "ピーク", "最大", "残留", "ブロック"))
+        for name, stats in results.items():
+            print(
+                header.format(
+                    name,
+                    stats.evaluations,
+                    f"{stats.peak:,.0f} B",
+                    f"{stats.peak_max:,.0f} B",
+                    f"{stats.retained:,.1f} B",
+                    f"{stats.blocks:.2f}",
+                )
+            )
+    if args.update_budgets:
+        args.budgets.write_text(
+            json.dumps(_budgets_from(results), indent=2) + "\n", encoding="utf-8"
+        )
+        print(f"上限を更新しました: {args.budgets}")
+        return 0
+    if args.check:
+        budgets = json.loads(args.budgets.read_text(encoding="utf-8"))
+        failures = check_budgets(results, budgets)
+        for failure in failures:
+            print(f"[超過] {failure}")
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""`evaluate_many` のスレッド数に対するスループットを計測するベンチマーク。
+
+スレッド数に応じたスケーリングは GIL のないビルド（python3.13t/3.14t）で
+計測する。GIL が有効なビルドではスレッド数によらずほぼ一定になる。
+
+実行例::
+
+    python benchmarks/thread_scaling.py --rows 20000 --threads 1 4 8 16
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from time import perf_counter
+
+from lab_aid.engine import evaluate_many
+
+SCRIPTS = (
+    "a = #A * 2 + #B\nif a gt 10\n  this = roundjisb(a, 2, 1)\nelse\n  this = a\nend",
+    "s = 0\nfor i = 1 to 20\n  s = s + #A\nnext\nthis = s",
+    "this = strlen(#S) + str_comp(#S, 'abc')\nprint(this, this)",
+)
+
+
+def _requests(rows: int) -> list[tuple[str, str, str]]:
+    return [
+        (
+            "E",
+            SCRIPTS[row % len(SCRIPTS)],
+            f"A={row % 97}.5\nB={row % 13}\nS='abc{row % 5}'",
+        )
+        for row in range(rows)
+    ]
+
+
+def main(argv: list[str] | None = None) -> int:
+    """ベンチマークを実行し、スレッド数ごとの処理件数/秒を表示する。
+
+    Args:
+        argv: コマンドライン引数リスト。``None`` の場合は `sys.argv` を使用。
+
+    Returns:
+        終了コード（常に 0）。
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000, help="評価件数")
+    parser.add_argument(
+        "--threads", type=int, nargs="+", default=[1, 4, 8, 16], help="スレッド数"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="計測回数（最良値を採用）"
+    )
+    args = parser.parse_args(argv)
+
+    requests = _requests(args.rows)
+    expected = evaluate_many(requests, max_workers=1)
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"Python {sys.version.split()[0]}  GIL={'有効' if gil else '無効'}")
+    baseline: float | None = None
+    for threads in args.threads:
+        best = float("inf")
+        for _ in range(args.repeat):
+            started = perf_counter()
+            results = evaluate_many(requests, max_workers=threads)
+            best = min(best, perf_counter() - started)
+        if results != expected:
+            raise SystemExit(f"{threads} スレッドの結果が逐次評価と一致しません。")
+        rate = args.rows / best
+        baseline = baseline or rate
+        print(f"threads={threads:>2}  {rate:>10,.0f} 件/秒  x{rate / baseline:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
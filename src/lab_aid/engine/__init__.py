@@ -2,9 +2,59 @@
 
 from __future__ import annotations
 
-from .runtime import Engine, VarRef, evaluate
+from .runtime import (
+    BudgetExceededError,
+    CostEstimate,
+    Engine,
+    EvaluationLimits,
+    EvaluationResult,
+    ItemUsage,
+    LintDiagnostic,
+    MeasurementSeries,
+    Profiler,
+    ScriptDependencies,
+    VarRef,
+    WorkloadRecorder,
+    canonicalize_script,
+    capture,
+    evaluate,
+    evaluate_column_R,
+    evaluate_detailed,
+    evaluate_many,
+    evaluate_structured,
+    explain,
+    extract_dependencies,
+    lint_script,
+    open_measurements,
+    script_fingerprint,
+)
 
-__all__ = ["Engine", "VarRef", "evaluate"]
+__all__ = [
+    "BudgetExceededError",
+    "CostEstimate",
+    "Engine",
+    "EvaluationLimits",
+    "EvaluationResult",
+    "ItemUsage",
+    "LintDiagnostic",
+    "MeasurementSeries",
+    "Profiler",
+    "ScriptDependencies",
+    "VarRef",
+    "WorkloadRecorder",
+    "canonicalize_script",
+    "capture",
+    "evaluate",
+    "evaluate_column_R",
+    "evaluate_detailed",
+    "evaluate_many",
+    "evaluate_structured",
+    "explain",
+    "extract_dependencies",
+    "lint_script",
+    "open_measurements",
+    "script_fingerprint",
+]
 
 if __name__ == "__main__":
     cases = [
@@ -1,7 +1,47 @@
 """Lab-Aid エンジンの実行時ユーティリティをまとめたパッケージ。"""
 
-from .api import evaluate
+from .api import (
+    evaluate,
+    evaluate_column_R,
+    evaluate_detailed,
+    evaluate_many,
+    evaluate_structured,
+)
+from .canonical import canonicalize_script, script_fingerprint
+from .capture import WorkloadRecorder, capture
+from .cost import CostEstimate, explain
+from .dependencies import ItemUsage, ScriptDependencies, extract_dependencies
 from .engine_core import Engine
 from .inputs import VarRef
+from .limits import BudgetExceededError, EvaluationLimits
+from .lint import LintDiagnostic, lint_script
+from .profiler import Profiler
+from .result import EvaluationResult
+from .series import MeasurementSeries, open_measurements
 
-__all__ = ["Engine", "VarRef", "evaluate"]
+__all__ = [
+    "BudgetExceededError",
+    "CostEstimate",
+    "Engine",
+    "EvaluationLimits",
+    "EvaluationResult",
+    "ItemUsage",
+    "LintDiagnostic",
+    "MeasurementSeries",
+    "Profiler",
+    "ScriptDependencies",
+    "VarRef",
+    "WorkloadRecorder",
+    "canonicalize_script",
+    "capture",
+    "evaluate",
+    "evaluate_column_R",
+    "evaluate_detailed",
+    "evaluate_many",
+    "evaluate_structured",
+    "explain",
+    "extract_dependencies",
+    "lint_script",
+    "open_measurements",
+    "script_fingerprint",
+]
@@ -2,17 +2,55 @@
 
 from __future__ import annotations
 
-from .engine_core import Engine
+import ast
+import os
+from collections.abc import Callable, Iterable, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Any
+
+from .canonical import canonical_script
+from .capture import current_recorder
+from .constants import BUDGET_EXCEEDED_TEXT, ERROR_TEXT
+from .cost import estimate_cost, schedule_chunks
+from .engine_core import (
+    FUNCTION_DISPATCH,
+    CompiledProgram,
+    ConditionError,
+    Engine,
+    compile_script,
+)
+from .functions import PURE_FUNCTIONS, BuiltinNumericResult, format_roundjisb_output
 from .inputs import (
+    RE_ITEM_ANY,
+    LazyInputs,
     VarRef,
+    close_measurements,
     ensure_has_this_assignment_E,
     parse_input_R,
     parse_inputs_E,
     replace_rhs_this_for_R,
-    RE_ITEM_ANY,
+    structured_input_R,
+    structured_inputs_E,
 )
+from .limits import BudgetExceededError, EvaluationLimits
+from .metrics import EVALUATION_ERRORS, EVALUATION_SECONDS
+from .profiler import Profiler
+from .result import EvaluationResult, error_code_for
 from .text import strip_comment_quote_aware, to_text
 
+# `evaluate_many` が 1 スレッドへまとめて渡す評価件数。
+EVALUATE_MANY_CHUNK = 64
+# `evaluate_many` がワーカー 1 つあたりに作るチャンク数の目安。
+EVALUATE_MANY_SPLIT = 4
+
+# 1 評価あたりのメトリクス記録を 1 回のロック取得に抑えるため、ラベル解決済みの
+# 実体を保持しておく（評価件数は `lab_aid_evaluation_seconds_count` で得られる）。
+_EVALUATION_TIMERS = {
+    label: EVALUATION_SECONDS.labels(label) for label in ("E", "R", "other")
+}
+
 
 def assert_no_hash_usage(text: str, where: str) -> None:
     """禁止箇所に `#CODE` 形式の項目参照が含まれていないことを検証する。
@@ -61,101 +99,609 @@ def _contains_hash_reference(line: str) -> bool:
     return False
 
 
+@dataclass
+class _Progress:
+    """評価の進行状況。失敗時のエラー詳細の組み立てに用いる。"""
+
+    phase: str = "validate"
+    engine: Engine | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class _StructuredInputs:
+    """`evaluate_structured` に渡された、文字列化されていない入力。"""
+
+    value: Any
+
+
 def evaluate(
     calc_type: str,
     script: str,
     inputs: str,
+    *,
+    profiler: Profiler | None = None,
+    limits: EvaluationLimits | None = None,
+    strict_inputs: bool = True,
+    measurement_dir: str | os.PathLike[str] | None = None,
 ) -> tuple[str | None, str | None, str | None]:
     """Lab-Aid の推定計算（E）または丸め計算（R）を評価する。
 
     E タイプは試験項目の値を `this` へ代入するスクリプト、R タイプは丸め条件を
     評価するスクリプトを入力として受け取る。戻り値はいずれも Lab-Aid 互換の
     文字列表現を想定しており、例外発生時は仕様に従ったエラー文字列を返却する。
+    エラーの詳細が必要な場合は `evaluate_detailed` を利用する。
 
     Args:
         calc_type: "E" または "R" を示す計算種別。
         script: Lab-Aid 形式で記述された計算スクリプト。複数行を許可。
         inputs: E タイプでは `NAME=VALUE` 形式、R タイプでは単一値の入力文字列。
+        profiler: 指定した場合、入力解析・行・ビルトイン単位の実行時間を記録する。
+        limits: ステップ数・実行時間・文字列長・測定値数の予算。
+        strict_inputs: ``True``（既定）の場合、E タイプの入力を評価前にすべて
+            検証し、誤りのある行があればスクリプトが参照しなくても `"エラー"` を
+            返す。``False`` の場合はスクリプトが参照した項目（測定値）だけを参照時に
+            解析し、参照されない行の誤りは検出しない。
+        measurement_dir: E タイプの入力の `file('path')` で参照できる測定値
+            ファイルの基準ディレクトリ。``None``（既定）の場合は参照できない。
 
     Returns:
         E タイプの場合は `(raw_text, edited_text, reported_text)` のタプル。
         R タイプの場合は `(None, edited_text, reported_text)` のタプル。
         いずれもエラー発生時は仕様どおり `"エラー"` を含むタプルを返す。
+        `limits` の予算を超過した場合は `"エラー"` の代わりに `"上限超過"` を返す。
 
     Raises:
         なし。入力不備は Lab-Aid 互換のエラー文字列として呼び出し元へ返却される。
     """
 
+    return evaluate_detailed(
+        calc_type,
+        script,
+        inputs,
+        profiler=profiler,
+        limits=limits,
+        strict_inputs=strict_inputs,
+        measurement_dir=measurement_dir,
+    ).as_tuple()
+
+
+def evaluate_detailed(
+    calc_type: str,
+    script: str,
+    inputs: str,
+    *,
+    profiler: Profiler | None = None,
+    limits: EvaluationLimits | None = None,
+    strict_inputs: bool = True,
+    measurement_dir: str | os.PathLike[str] | None = None,
+) -> EvaluationResult:
+    """`evaluate` と同じ評価を行い、エラー詳細を含む構造化結果を返す。
+
+    Args:
+        calc_type: "E" または "R" を示す計算種別。
+        script: Lab-Aid 形式で記述された計算スクリプト。
+        inputs: E タイプでは `NAME=VALUE` 形式、R タイプでは単一値の入力文字列。
+        profiler: 指定した場合、入力解析・行・ビルトイン単位の実行時間を記録する。
+        limits: ステップ数・実行時間・文字列長・測定値数の予算。
+        strict_inputs: ``True``（既定）の場合、E タイプの入力を評価前にすべて検証する。
+            ``False`` の場合は参照された項目だけを参照時に解析する。
+        measurement_dir: `file('path')` で参照できる測定値ファイルの基準ディレクトリ。
+
+    Returns:
+        `EvaluationResult`。失敗時はエラーコード・例外クラス・行番号・式を保持する。
+    """
+    return _evaluate_detailed(
+        calc_type, script, inputs, profiler, limits, strict_inputs, measurement_dir
+    )
+
+
+def evaluate_structured(
+    calc_type: str,
+    script: str,
+    inputs: Mapping[Any, Any] | float | str,
+    *,
+    profiler: Profiler | None = None,
+    limits: EvaluationLimits | None = None,
+) -> EvaluationResult:
+    """`NAME=VALUE` 形式の文字列を介さずに、値のまま入力を渡して評価する。
+
+    E タイプの `inputs` は `CODE` または `(CODE, UNIT)` をキーとし、数値・文字列・
+    `VarRef`・測定値の列を値とするマップ（`structured_inputs_E`）。キーと値の型は
+    評価前に 1 回だけ検証し、リストの値はコピーせずにそのまま参照する。R タイプの
+    `inputs` は数値または文字列の値そのもの（`structured_input_R`）。
+
+    Args:
+        calc_type: "E" または "R" を示す計算種別。
+        script: Lab-Aid 形式で記述された計算スクリプト。
+        inputs: E タイプでは試験項目のマップ、R タイプでは入力値。
+        profiler: 指定した場合、入力検証・行・ビルトイン単位の実行時間を記録する。
+        limits: ステップ数・実行時間・文字列長・測定値数の予算。
+
+    Returns:
+        `evaluate_detailed` と同じ `EvaluationResult`。入力の型・項目名の誤りも
+        `phase="inputs"` のエラーとして返す。
+    """
+    return _evaluate_detailed(
+        calc_type, script, _StructuredInputs(inputs), profiler, limits, False, None
+    )
+
+
+def evaluate_column_R(
+    script: str,
+    values: Iterable[str],
+    *,
+    limits: EvaluationLimits | None = None,
+) -> tuple[list[str | None], list[str | None]]:
+    """1 つの R タイプスクリプトを入力値の列に適用する。
+
+    スクリプトの検証・`this` の置換・構文解析は 1 回だけ行い、同じ入力値は 1 回だけ
+    評価する。`this = roundjisb(this, 3, 0)` のように `this` と定数を引数とする
+    数値系ビルトイン 1 回の代入だけから成るスクリプトは、`Engine` を介さずに
+    ビルトインと表示形式の変換を直接適用する。
+
+    Args:
+        script: Lab-Aid 形式の R タイプ計算スクリプト。
+        values: R タイプの第 3 引数と同じ形式の入力文字列の列。
+        limits: 各値の評価に適用する実行予算。
+
+    Returns:
+        `(edited, reported)` の 2 つのリスト。各要素は同じ入力で
+        `evaluate("R", script, value)` を呼んだ結果の 2・3 番目と一致する。
+    """
+    started = perf_counter()
+    inputs = list(values)
+    if not inputs:
+        return [], []
+    rows: dict[str, tuple[str | None, str | None, str | None]] = {}
     try:
-        ctype = (calc_type or "").strip().upper()
-        if ctype not in ("E", "R"):
-            raise ValueError("calc_type は 'E' または 'R' を指定してください。")
-
-        if ctype == "E":
-            ensure_has_this_assignment_E(script)
-            items = parse_inputs_E(inputs)
-            engine = Engine(items=items, vars={"this": 0})
-            vars_after = engine.run_lines(script.splitlines())
-
-            if engine.this_assigned_count == 0:
-                raise ValueError("Eタイプでは this= が必須です。")
-
-            this_value = vars_after.get("this")
-            raw_text = (
-                engine.this_formatted
-                if engine.this_formatted is not None
-                else to_text(this_value)
+        canonical = canonical_script(script)
+        assert_no_hash_usage(canonical, "第2引数（計算式）")
+        program = compile_script(replace_rhs_this_for_R(canonical))
+    # 各値の結果は `evaluate("R", ...)` と一致させるため、`_evaluate_detailed` と
+    # 同じく任意の例外をエラー文字列へ変換する。
+    except Exception as exc:  # noqa: BLE001
+        failed = _column_failure(exc)
+        rows = dict.fromkeys(inputs, failed)
+    else:
+        kernel = _builtin_kernel(program) if limits is None else None
+        for value in inputs:
+            if value not in rows:
+                rows[value] = _evaluate_column_value(program, kernel, value, limits)
+
+    edited: list[str | None] = []
+    reported: list[str | None] = []
+    for value in inputs:
+        edited_text, reported_text, error_class = rows[value]
+        edited.append(edited_text)
+        reported.append(reported_text)
+        if error_class is not None:
+            EVALUATION_ERRORS.inc("R", error_class)
+    elapsed = perf_counter() - started
+    _EVALUATION_TIMERS["R"].observe(elapsed / len(inputs), len(inputs))
+    recorder = current_recorder()
+    if recorder is not None:
+        # 値ごとの所要時間は計測しないため、列全体の平均を記録する。
+        for value, edited_text, reported_text in zip(
+            inputs, edited, reported, strict=True
+        ):
+            recorder.record(
+                "R",
+                script,
+                value,
+                EvaluationResult(None, edited_text, reported_text),
+                elapsed / len(inputs),
+                limits,
             )
-            edited_text = engine.last_print
-            reported_text = engine.last_print2
-            return raw_text, edited_text, reported_text
+    return edited, reported
 
-        assert_no_hash_usage(script, "第2引数（計算式）")
-        assert_no_hash_usage(inputs, "第3引数（入力値）")
 
-        this_in_raw, literal = parse_input_R(inputs)
-        if isinstance(this_in_raw, VarRef):
-            this_initial = 0
-            placeholder_value = 0
+def _evaluate_column_value(
+    program: CompiledProgram,
+    kernel: Callable[[Any], str | None] | None,
+    value: str,
+    limits: EvaluationLimits | None,
+) -> tuple[str | None, str | None, str | None]:
+    """`evaluate_column_R` の 1 値分を評価し、`(edited, reported, 例外クラス名)` を返す。"""
+    try:
+        assert_no_hash_usage(value, "第3引数（入力値）")
+        this_in_raw, literal = parse_input_R(value)
+        if kernel is not None:
+            text = kernel(this_in_raw)
+            return text, text, None
+        edited, reported = _run_R(
+            program, this_in_raw, literal, None, limits, _Progress()
+        )
+        return edited, reported, None
+    except Exception as exc:  # noqa: BLE001 - evaluate_column_R と同じ理由
+        return _column_failure(exc)
+
+
+def _column_failure(exc: Exception) -> tuple[str, str, str]:
+    cause = _root_cause(exc)
+    text = (
+        BUDGET_EXCEEDED_TEXT if isinstance(cause, BudgetExceededError) else ERROR_TEXT
+    )
+    return text, text, type(cause).__name__
+
+
+def _builtin_kernel(program: CompiledProgram) -> Callable[[Any], str | None] | None:
+    """`this = 関数(this, 定数, ...)` だけのスクリプトを直接実行する関数を返す。
+
+    `PURE_FUNCTIONS` の呼び出しで、引数が `this`（`__THIS_IN__`）と数値定数のみの
+    場合に限る。それ以外は ``None`` を返し、`Engine` で評価する。
+    """
+    statements = [item for item in program.statements if item.kind != "skip"]
+    if len(statements) != 1 or statements[0].kind != "assign":
+        return None
+    statement = statements[0]
+    if statement.source.split("=", 1)[0].strip().lower() != "this":
+        return None
+    compiled = statement.compiled[0] if statement.compiled else None
+    node = compiled.node if compiled is not None else None
+    if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Name):
+        return None
+    name = node.func.id.lower()
+    if name not in PURE_FUNCTIONS:
+        return None
+    # ``None`` の位置に入力値を入れる。
+    template: list[int | float | None] = []
+    for arg in node.args:
+        if isinstance(arg, ast.Name) and arg.id == "__THIS_IN__":
+            template.append(None)
+        elif isinstance(arg, ast.Constant) and isinstance(arg.value, (int, float)):
+            if isinstance(arg.value, bool):
+                return None
+            template.append(arg.value)
         else:
-            this_initial = this_in_raw
-            placeholder_value = this_in_raw
+            return None
+    func = FUNCTION_DISPATCH[name]
+
+    def kernel(value: Any) -> str | None:
+        # `Engine.exec_assign` の `this` 代入と R タイプの出力処理を 1 値分で行う。
+        this_in = 0 if isinstance(value, VarRef) else value
+        result = func([this_in if slot is None else slot for slot in template])
+        if not isinstance(result, BuiltinNumericResult):
+            raise TypeError(f"{name}: 無効なビルトイン関数の戻り値です。")
+        formatted = format_roundjisb_output(result.value, result.format_hint)
+        return formatted if formatted is not None else to_text(result.value)
+
+    return kernel
+
 
-        runnable_script = replace_rhs_this_for_R(script)
-        engine = Engine(
-            items={},
-            vars={"this": this_initial, "__THIS_IN__": placeholder_value},
+def _root_cause(exc: Exception) -> Exception:
+    """IF 条件式のエラーは元の例外を、それ以外は `exc` 自体を返す。"""
+    cause = exc.__cause__ if isinstance(exc, ConditionError) else exc
+    return cause if isinstance(cause, Exception) else exc
+
+
+def _evaluate_detailed(
+    calc_type: str,
+    script: str,
+    inputs: str | _StructuredInputs,
+    profiler: Profiler | None,
+    limits: EvaluationLimits | None,
+    strict_inputs: bool,
+    measurement_dir: str | os.PathLike[str] | None,
+) -> EvaluationResult:
+    """`evaluate_detailed`・`evaluate_structured` の共通処理。"""
+    evaluation_started = perf_counter()
+    ctype = (calc_type or "").strip().upper()
+    label = ctype if ctype in ("E", "R") else "other"
+    progress = _Progress()
+    try:
+        raw, edited, reported = _evaluate(
+            ctype,
+            script,
+            inputs,
+            profiler,
+            limits,
+            strict_inputs,
+            measurement_dir,
+            progress,
         )
-        vars_after = engine.run_lines(runnable_script.splitlines())
-
-        edited_text = None
-        reported_text = None
-
-        if engine.last_print is not None:
-            edited_text = engine.last_print
-            reported_text = engine.last_print
-        elif engine.this_assigned_count > 0:
-            this_value = vars_after.get("this")
-            base_text = (
-                engine.this_formatted
-                if engine.this_formatted is not None
-                else to_text(this_value)
-            )
-            edited_text = base_text
-            reported_text = base_text
+        result = EvaluationResult(raw, edited, reported)
+    # 式の評価はゼロ除算・オーバーフロー等の任意の例外を送出し得るが、`evaluate` は
+    # 従来どおり例外を送出せず Lab-Aid 互換のエラー文字列を返す。
+    except Exception as exc:  # noqa: BLE001
+        cause = _root_cause(exc)
+        EVALUATION_ERRORS.inc(label, type(cause).__name__)
+        text = (
+            BUDGET_EXCEEDED_TEXT
+            if isinstance(cause, BudgetExceededError)
+            else ERROR_TEXT
+        )
+        raw, edited, reported = _failure(calc_type, text)
+        engine = progress.engine
+        result = EvaluationResult(
+            raw,
+            edited,
+            reported,
+            error_code=error_code_for(cause),
+            exception_class=type(cause).__name__,
+            message=str(cause),
+            phase=progress.phase,
+            line=engine.error_line if engine is not None else None,
+            source=engine.error_source if engine is not None else None,
+            expression=engine.error_expr if engine is not None else None,
+        )
+    finally:
+        elapsed = perf_counter() - evaluation_started
+        _EVALUATION_TIMERS[label].observe(elapsed)
+    recorder = current_recorder()
+    if recorder is not None and isinstance(inputs, str):
+        recorder.record(
+            calc_type,
+            script,
+            inputs,
+            result,
+            elapsed,
+            limits,
+            strict_inputs,
+            measurement_dir,
+        )
+    return result
+
+
+def evaluate_many(
+    requests: Iterable[tuple[str, str, str]],
+    *,
+    max_workers: int | None = None,
+    limits: EvaluationLimits | None = None,
+    strict_inputs: bool = True,
+    measurement_dir: str | os.PathLike[str] | None = None,
+) -> list[EvaluationResult]:
+    """複数の評価をスレッドプールで実行し、入力順の結果を返す。
+
+    正規形・`CompiledProgram` 等の構文解析結果は不変オブジェクトとしてロック付きの
+    キャッシュからスレッド間で共有し、変数や出力などの評価ごとの状態は評価ごとの
+    `Engine` に閉じる。このため GIL のないビルド（3.13t/3.14t）ではスレッド間で並列に
+    評価でき（スケーリングは `benchmarks/thread_scaling.py` で計測する）、どのビルドでも
+    結果は逐次評価と同一になる。
+
+    評価は `estimate_cost` の見積もりが大きい順に、合計コストがほぼ等しいチャンクへ
+    分けて投入する。空いたワーカーが次のチャンクを取り出すため、重い評価が終盤に
+    1 つのワーカーへ残らない。
+
+    Args:
+        requests: `(calc_type, script, inputs)` のイテラブル。
+        max_workers: スレッド数。``None`` は CPU 数。1 の場合は呼び出し元の
+            スレッドで順に評価する。
+        limits: 各評価に適用する実行予算。
+        strict_inputs: ``True``（既定）の場合、E タイプの入力を評価前にすべて検証する。
+            ``False`` の場合は参照された項目だけを参照時に解析する。
+        measurement_dir: `file('path')` で参照できる測定値ファイルの基準ディレクトリ。
+
+    Returns:
+        `requests` と同じ並びの `EvaluationResult` のリスト。
+    """
+    jobs = list(requests)
+
+    def run(job: tuple[str, str, str]) -> EvaluationResult:
+        calc_type, script, inputs = job
+        return evaluate_detailed(
+            calc_type,
+            script,
+            inputs,
+            limits=limits,
+            strict_inputs=strict_inputs,
+            measurement_dir=measurement_dir,
+        )
+
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(jobs)))
+    if workers == 1:
+        return [run(job) for job in jobs]
+
+    chunks = schedule_chunks(
+        [estimate_cost(*job) for job in jobs],
+        workers,
+        split=EVALUATE_MANY_SPLIT,
+        max_size=EVALUATE_MANY_CHUNK,
+    )
+    results: dict[int, EvaluationResult] = {}
+
+    def run_chunk(indices: list[int]) -> None:
+        for index in indices:
+            results[index] = run(jobs[index])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # 例外を呼び出し元へ伝えるため結果を取り出す。
+        list(pool.map(run_chunk, chunks))
+    return [results[index] for index in range(len(jobs))]
+
+
+def _evaluate(
+    ctype: str,
+    script: str,
+    inputs: str | _StructuredInputs,
+    profiler: Profiler | None,
+    limits: EvaluationLimits | None,
+    strict_inputs: bool,
+    measurement_dir: str | os.PathLike[str] | None,
+    progress: _Progress,
+) -> tuple[str | None, str | None, str | None]:
+    """例外を送出する形で評価本体を実行する。
+
+    Args:
+        ctype: 正規化済みの計算種別。
+        script: 計算スクリプト。
+        inputs: 入力文字列、または `evaluate_structured` に渡された値。
+        profiler: 計測先。
+        limits: 実行予算。
+        strict_inputs: E タイプの入力を評価前にすべて検証するか。
+        measurement_dir: 測定値ファイルの基準ディレクトリ。
+        progress: 進行状況の記録先。
+
+    Returns:
+        `(raw, edited, reported)` のタプル。
+
+    Raises:
+        Exception: 検証・入力解析・実行のいずれかで失敗した場合。
+    """
+    if ctype not in ("E", "R"):
+        raise ValueError("calc_type は 'E' または 'R' を指定してください。")
+    # 表記揺れのみ異なるスクリプトが同じ結果・同じ式キャッシュを共有するよう、
+    # 常に正規形を評価する（行番号は元のスクリプトと一致する）。
+    script = canonical_script(script)
+
+    if ctype == "E":
+        ensure_has_this_assignment_E(script)
+        progress.phase = "inputs"
+        started = perf_counter()
+        items: Mapping[Any, Any]
+        if isinstance(inputs, _StructuredInputs):
+            items = structured_inputs_E(inputs.value)
+        elif strict_inputs:
+            items = parse_inputs_E(inputs, measurement_dir=measurement_dir)
         else:
-            edited_text = literal
-            reported_text = literal
+            items = LazyInputs(inputs, measurement_dir=measurement_dir)
+        try:
+            return _run_E(script, items, profiler, limits, progress, started)
+        finally:
+            # 入力文字列から開いた測定値ファイルは評価ごとに閉じる（構造化入力の
+            # 列は呼び出し元が管理する）。
+            if isinstance(items, LazyInputs):
+                items.close()
+            elif not isinstance(inputs, _StructuredInputs):
+                close_measurements(items.values())
+
+    assert_no_hash_usage(script, "第2引数（計算式）")
+    if isinstance(inputs, _StructuredInputs):
+        progress.phase = "inputs"
+        started = perf_counter()
+        this_in_raw, literal = structured_input_R(inputs.value)
+    else:
+        assert_no_hash_usage(inputs, "第3引数（入力値）")
+        progress.phase = "inputs"
+        started = perf_counter()
+        this_in_raw, literal = parse_input_R(inputs)
+    if profiler is not None:
+        profiler.record_phase("inputs", perf_counter() - started)
+    program = compile_script(replace_rhs_this_for_R(script))
+    edited_text, reported_text = _run_R(
+        program, this_in_raw, literal, profiler, limits, progress
+    )
+    return None, edited_text, reported_text
+
+
+def _run_E(
+    script: str,
+    items: Mapping[Any, Any],
+    profiler: Profiler | None,
+    limits: EvaluationLimits | None,
+    progress: _Progress,
+    started: float,
+) -> tuple[str | None, str | None, str | None]:
+    """E タイプのスクリプトを実行し、`(raw, edited, reported)` を返す。"""
+    engine = Engine(items=items, vars={"this": 0}, profiler=profiler, limits=limits)
+    progress.engine = engine
+    if profiler is not None:
+        profiler.record_phase("inputs", perf_counter() - started)
+        started = perf_counter()
+    progress.phase = "run"
+    try:
+        vars_after = engine.run_program(compile_script(script))
+    finally:
+        if profiler is not None:
+            profiler.record_phase("run", perf_counter() - started)
+
+    progress.phase = "output"
+    if engine.this_assigned_count == 0:
+        raise ValueError("Eタイプでは this= が必須です。")
+
+    this_value = vars_after.get("this")
+    raw_text = (
+        engine.this_formatted
+        if engine.this_formatted is not None
+        else to_text(this_value)
+    )
+    edited_text = engine.last_print
+    reported_text = engine.last_print2
+    return raw_text, edited_text, reported_text
+
+
+def _run_R(
+    program: CompiledProgram,
+    this_in_raw: Any,
+    literal: str,
+    profiler: Profiler | None,
+    limits: EvaluationLimits | None,
+    progress: _Progress,
+) -> tuple[str | None, str | None]:
+    """R タイプの変換済みスクリプトを 1 つの入力値に対して実行する。
+
+    Args:
+        program: `replace_rhs_this_for_R` 適用後のスクリプトの `CompiledProgram`。
+        this_in_raw: 解析済みの入力値。
+        literal: 入力値のリテラル表記。
+        profiler: 計測先。
+        limits: 実行予算。
+        progress: 進行状況の記録先。
+
+    Returns:
+        `(edited, reported)` のタプル。
+    """
+    if isinstance(this_in_raw, VarRef):
+        this_initial = 0
+        placeholder_value = 0
+    else:
+        this_initial = this_in_raw
+        placeholder_value = this_in_raw
+
+    engine = Engine(
+        items={},
+        vars={"this": this_initial, "__THIS_IN__": placeholder_value},
+        profiler=profiler,
+        limits=limits,
+    )
+    progress.engine = engine
+    progress.phase = "run"
+    started = perf_counter()
+    try:
+        vars_after = engine.run_program(program)
+    finally:
+        if profiler is not None:
+            profiler.record_phase("run", perf_counter() - started)
+
+    progress.phase = "output"
+    edited_text = None
+    reported_text = None
+
+    if engine.last_print is not None:
+        edited_text = engine.last_print
+        reported_text = engine.last_print
+    elif engine.this_assigned_count > 0:
+        this_value = vars_after.get("this")
+        base_text = (
+            engine.this_formatted
+            if engine.this_formatted is not None
+            else to_text(this_value)
+        )
+        edited_text = base_text
+        reported_text = base_text
+    else:
+        edited_text = literal
+        reported_text = literal
+
+    if engine.last_print2 is not None:
+        reported_text = engine.last_print2
 
-        if engine.last_print2 is not None:
-            reported_text = engine.last_print2
+    return edited_text, reported_text
 
-        return None, edited_text, reported_text
 
-    except Exception:
-        if (calc_type or "").strip().upper() == "R":
-            return None, "エラー", "エラー"
-        return "エラー", None, None
+def _failure(calc_type: str, text: str) -> tuple[str | None, str | None, str | None]:
+    """計算種別に応じた失敗時の戻り値を組み立てる。"""
+    if (calc_type or "").strip().upper() == "R":
+        return None, text, text
+    return text, None, None
 
 
-__all__ = ["evaluate", "assert_no_hash_usage"]
+__all__ = [
+    "EVALUATE_MANY_CHUNK",
+    "EVALUATE_MANY_SPLIT",
+    "assert_no_hash_usage",
+    "evaluate",
+    "evaluate_column_R",
+    "evaluate_detailed",
+    "evaluate_many",
+    "evaluate_structured",
+]
@@ -0,0 +1,72 @@
+"""評価の前処理結果を保持するプロセス内キャッシュ。"""
+
+from __future__ import annotations
+
+import threading
+from collections.abc import Callable, Hashable
+
+from .metrics import CACHE_REQUESTS
+
+DEFAULT_CACHE_SIZE = 4096
+
+
+class BoundedCache[K: Hashable, V]:
+    """上限付きの LRU キャッシュ。
+
+    プロセス内で共有し、同じ式・スクリプトを繰り返し評価するバッチ処理で
+    構文解析等の前処理を省く。参照結果は `lab_aid_cache_requests_total{cache}`
+    に記録する。生成関数が例外を送出した場合は何もキャッシュしない。
+
+    Attributes:
+        name: メトリクスのラベルに用いるキャッシュ名。
+        maxsize: 保持する要素数の上限。
+    """
+
+    def __init__(self, name: str, maxsize: int = DEFAULT_CACHE_SIZE) -> None:
+        if maxsize <= 0:
+            raise ValueError("キャッシュの上限は 1 以上を指定してください。")
+        self.name = name
+        self.maxsize = maxsize
+        self._data: dict[K, V] = {}
+        self._lock = threading.Lock()
+        self._hits = CACHE_REQUESTS.labels(name, "hit")
+        self._misses = CACHE_REQUESTS.labels(name, "miss")
+
+    def get_or_create(self, key: K, factory: Callable[[K], V]) -> V:
+        """キーに対応する値を返し、未登録なら `factory(key)` で生成して登録する。
+
+        Args:
+            key: キャッシュキー。
+            factory: 値の生成関数。
+
+        Returns:
+            キャッシュ済みまたは新たに生成した値。
+        """
+        with self._lock:
+            if key in self._data:
+                # 末尾へ再挿入し、辞書の挿入順を LRU 順として扱う。
+                value = self._data[key] = self._data.pop(key)
+                hit = True
+            else:
+                hit = False
+        if hit:
+            self._hits.inc()
+            return value
+        self._misses.inc()
+        created = factory(key)
+        with self._lock:
+            self._data[key] = created
+            while len(self._data) > self.maxsize:
+                del self._data[next(iter(self._data))]
+        return created
+
+    def clear(self) -> None:
+        """キャッシュを空にする。"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+__all__ = ["DEFAULT_CACHE_SIZE", "BoundedCache"]
@@ -0,0 +1,276 @@
+"""計算スクリプトの正規形とフィンガープリント。"""
+
+from __future__ import annotations
+
+import ast
+import hashlib
+import re
+
+from .cache import BoundedCache
+from .engine_core import (
+    ELSE_RE,
+    END_RE,
+    FOR_RE,
+    FUNCTION_DISPATCH,
+    IDENTIFIER_RE,
+    IF_RE,
+    NEXT_RE,
+    OP_MAPPING,
+    PRINT2_RE,
+    PRINT_RE,
+    STATEMENT_FUNCTIONS,
+)
+from .inputs import RE_ITEM_ANY
+from .text import strip_comment_quote_aware
+
+_WORD_RE = re.compile(r"[A-Za-z0-9_]+")
+_CALL_NAMES = frozenset(FUNCTION_DISPATCH) | STATEMENT_FUNCTIONS
+
+
+def canonicalize_script(script: str) -> str:
+    """評価結果を変えない範囲で表記揺れを除いた正規形を返す。
+
+    各行を次のように書き換える。行数は保つため、エラーの行番号は元の
+    スクリプトと一致する（末尾の空行のみ除く）。
+
+    - 改行コードを LF に統一し、`;` 以降のコメントと REM 行を空行にする
+    - 引用符の外の連続する空白を 1 つにし、`(` の後・`)` `,` の前・関数名と `(`
+      の間の空白を除き、`,` の後は空白 1 つにそろえる（演算子の前後は変えない）
+    - 制御構文（IF/ELSE/END/FOR/NEXT/print/print2）のキーワード、`this`、
+      比較・論理演算子（`EQ`・`And` 等）、組み込み関数名を小文字にする
+    - 代入文は `左辺 = 右辺` の形にそろえる
+
+    `#CODE[UNIT]`・通常変数名・引用符内の文字列は変更しない。書き換えで
+    `Engine.run_lines` の行の解釈が変わる場合と、`"` を含む行（エンジンは
+    `"..."` を引用符として扱わないため、安全に書き換えられない）は、
+    コメント除去のみとする。
+
+    Args:
+        script: 計算スクリプト。
+
+    Returns:
+        正規形のスクリプト。
+    """
+    lines = [_canonical_line(raw) for raw in script.splitlines()]
+    while lines and not lines[-1]:
+        lines.pop()
+    return "\n".join(lines)
+
+
+def canonical_script(script: str) -> str:
+    """`canonicalize_script` の結果を `CANONICAL_CACHE` 経由で返す。"""
+    return CANONICAL_CACHE.get_or_create(script, canonicalize_script)
+
+
+def script_fingerprint(script: str) -> str:
+    """正規形に対する安定したフィンガープリントを返す。
+
+    フィンガープリントが等しいスクリプトは正規形が等しく、`evaluate` は正規形を
+    評価するため、同じ計算種別・入力に対して同じ結果（エラー詳細を含む）を返す。
+
+    Args:
+        script: 計算スクリプト。
+
+    Returns:
+        BLAKE2b（16 バイト）の 16 進表記。
+    """
+    canonical = canonical_script(script)
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _canonical_line(raw: str) -> str:
+    """1 行を正規化する。`run_lines` と同じ順序で行の種類を判定する。"""
+    line = strip_comment_quote_aware(raw)
+    if not line or line.lower().startswith("rem"):
+        return ""
+    if '"' in line:
+        return line
+    canonical = _rewrite_line(line)
+    if canonical != line and _line_kind(canonical) != _line_kind(line):
+        return line
+    return canonical
+
+
+def _rewrite_line(line: str) -> str:
+    match = PRINT_RE.match(line)
+    if match:
+        return f"print(this, {_canonical_expr(match.group(1).strip())})"
+    match = PRINT2_RE.match(line)
+    if match:
+        return f"print2(this, {_canonical_expr(match.group(1).strip())})"
+    match = IF_RE.match(line)
+    if match:
+        return f"if {_canonical_expr(match.group(1))}"
+    if ELSE_RE.match(line):
+        return "else"
+    if END_RE.match(line):
+        return "end"
+    match = FOR_RE.match(line)
+    if match:
+        var_name, from_expr, to_expr, step_expr = match.groups()
+        text = (
+            f"for {var_name} = {_canonical_expr(from_expr)} "
+            f"to {_canonical_expr(to_expr)}"
+        )
+        if step_expr is not None:
+            text += f" step {_canonical_expr(step_expr)}"
+        return text
+    match = NEXT_RE.match(line)
+    if match:
+        return f"next {match.group(1)}" if match.group(1) else "next"
+    if _is_statement_call(line):
+        # 関数ステートメントは行全体を構文解析して判定されるため、演算子語は
+        # 書き換えない（`AND` を `and` にすると解析結果が変わり得る）。
+        return _canonical_expr(line, operators=False)
+    lhs, sep, rhs = line.partition("=")
+    lhs = lhs.strip()
+    if sep and (IDENTIFIER_RE.fullmatch(lhs) or lhs.lower() == "this"):
+        lhs = "this" if lhs.lower() == "this" else lhs
+        return f"{lhs} = {_canonical_expr(rhs.strip())}"
+    return _canonical_expr(line, operators=False, names=False)
+
+
+def _line_kind(line: str) -> str:
+    """`run_lines` が行をどの構文として扱うかを返す。"""
+    for kind, pattern in (
+        ("print", PRINT_RE),
+        ("print2", PRINT2_RE),
+        ("if", IF_RE),
+        ("else", ELSE_RE),
+        ("end", END_RE),
+        ("for", FOR_RE),
+        ("next", NEXT_RE),
+    ):
+        if pattern.match(line):
+            return kind
+    return "statement" if _is_statement_call(line) else "assign"
+
+
+def _is_statement_call(line: str) -> bool:
+    """`Engine.exec_function_statement` が関数ステートメントとみなすか判定する。"""
+    lowered = line.lower()
+    if not any(name in lowered for name in STATEMENT_FUNCTIONS):
+        return False
+    try:
+        node = ast.parse(line, mode="eval").body
+    except SyntaxError:
+        return False
+    return (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id.lower() in STATEMENT_FUNCTIONS
+    )
+
+
+def _canonical_expr(expr: str, *, operators: bool = True, names: bool = True) -> str:
+    """式を 1 回の走査で正規化する。
+
+    Args:
+        expr: 式文字列。
+        operators: 比較・論理演算子の語を小文字にするか。
+        names: `this` と組み込み関数名を小文字にするか。
+
+    Returns:
+        正規化した式。
+    """
+    out: list[str] = []
+    pending_space = False
+    index = 0
+    length = len(expr)
+    while index < length:
+        char = expr[index]
+        if char.isspace():
+            pending_space = True
+            index += 1
+            continue
+        if char == "'":
+            end = index + 1
+            while end < length:
+                if expr[end] == "'":
+                    if end + 1 < length and expr[end + 1] == "'":
+                        end += 2
+                        continue
+                    end += 1
+                    break
+                end += 1
+            else:
+                end = length
+            token = expr[index:end]
+        elif char == "#" and (item := RE_ITEM_ANY.match(expr, index)):
+            token = item.group(0)
+            end = item.end()
+        elif word := _WORD_RE.match(expr, index):
+            token = word.group(0)
+            end = word.end()
+            if names or operators:
+                token = _canonical_word(expr, token, index, end, operators, names)
+        else:
+            token = char
+            end = index + 1
+        if out and _needs_space(out[-1], token, pending_space):
+            out.append(" ")
+        pending_space = False
+        out.append(token)
+        index = end
+    return "".join(out)
+
+
+def _needs_space(previous: str, token: str, pending_space: bool) -> bool:
+    """2 つの字句の間に空白を置くか判定する。"""
+    if previous == "(" or token in (")", ","):
+        return False
+    if previous == ",":
+        return True
+    # 関数名と `(` の間のみ詰める（`and (` 等の演算子語の後は残す）。
+    if (
+        token == "("
+        and _WORD_RE.fullmatch(previous) is not None
+        and previous.lower() not in OP_MAPPING
+    ):
+        return False
+    return pending_space
+
+
+def _canonical_word(
+    expr: str, word: str, start: int, end: int, operators: bool, names: bool
+) -> str:
+    """大小文字を区別しない語を小文字にする。
+
+    演算子語は `replace_word_ci_outside_quotes` と同じ ASCII の語境界で判定する。
+    `this` と関数名は Python の識別子の一部（`変数THIS` 等）でない場合に限る。
+    """
+    if word[0].isdigit():
+        return word
+    lowered = word.lower()
+    if operators and lowered in OP_MAPPING:
+        return lowered
+    if not names or lowered not in _CALL_NAMES and lowered != "this":
+        return word
+    if start > 0 and _is_identifier_char(expr[start - 1]):
+        return word
+    if end < len(expr) and _is_identifier_char(expr[end]):
+        return word
+    if lowered == "this":
+        return lowered
+    following = end
+    while following < len(expr) and expr[following].isspace():
+        following += 1
+    if following < len(expr) and expr[following] == "(":
+        return lowered
+    return word
+
+
+def _is_identifier_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+# 生のスクリプト文字列ごとの正規形。
+CANONICAL_CACHE: BoundedCache[str, str] = BoundedCache("canonical")
+
+
+__all__ = [
+    "CANONICAL_CACHE",
+    "canonical_script",
+    "canonicalize_script",
+    "script_fingerprint",
+]
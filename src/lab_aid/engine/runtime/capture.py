@@ -0,0 +1,314 @@
+"""評価ごとの入力・出力・所要時間をログへ記録するワークロードキャプチャ。
+
+`capture` の間に呼ばれた `evaluate`・`evaluate_detailed`・`evaluate_many`・
+`evaluate_column_R` の各評価を、JSON Lines 形式のログ（拡張子が `.gz` なら
+gzip 圧縮）へ追記する。同じ計算式の本文は最初の 1 回だけ書き出し、以降の
+評価は計算式の番号で参照する。記録したログは `lab_aid.replay_cli` で現在の
+エンジンに対して再実行できる。
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import gzip
+import hashlib
+import json
+import os
+import re
+import secrets
+import threading
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any
+
+from .limits import EvaluationLimits
+from .result import EvaluationResult
+
+CAPTURE_FORMAT = 1
+# 記録中の評価を遅らせないよう、圧縮率より速度を優先する。
+CAPTURE_GZIP_LEVEL = 1
+# 匿名化で文字列の値を置き換える文字（単一引用符・区切り文字を含まない）。
+PSEUDONYM_ALPHABET = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+_QUOTED_RE = re.compile(r"'((?:[^']|'')*)'")
+
+
+@dataclass(frozen=True, slots=True)
+class CapturedEvaluation:
+    """記録した 1 回の評価。
+
+    Attributes:
+        calc_type: 計算種別（呼び出し時の値のまま）。
+        script: 計算式。
+        inputs: 入力文字列（匿名化した場合は置き換え後）。
+        outputs: `(生データ, 編集後, 報告値)`。
+        error_code: 失敗した場合のエラーコード。
+        micros: 評価の所要時間（マイクロ秒）。
+        limits: 評価に適用した実行予算。
+        anonymized: 入力の文字列を置き換えた場合は ``True``。置き換えた入力では
+            記録時と出力が異なり得るため、再実行時の比較から除く。
+        strict_inputs: 評価時の `strict_inputs`。
+        measurement_dir: 評価時の測定値ファイルの基準ディレクトリ。
+    """
+
+    calc_type: str
+    script: str
+    inputs: str
+    outputs: tuple[str | None, str | None, str | None]
+    error_code: str | None
+    micros: int
+    limits: EvaluationLimits | None = None
+    anonymized: bool = False
+    strict_inputs: bool = True
+    measurement_dir: str | None = None
+
+
+class WorkloadRecorder:
+    """評価を記録するレコーダー。複数スレッドから同時に呼び出せる。
+
+    `path` を省略した場合はファイルへ書かずに `entries` へ蓄積する（ワーカー
+    プロセスで記録し、親プロセスの `extend` で書き出す用途）。
+
+    Attributes:
+        path: ログファイルのパス。
+        anonymize: 入力の単一引用符で囲んだ文字列を置き換える場合は ``True``。
+        key: 匿名化に使う鍵。同じ鍵では同じ文字列が同じ置き換え後の文字列になる。
+        entries: `path` を省略した場合の記録。
+        count: 記録した評価の件数。
+    """
+
+    def __init__(
+        self,
+        path: Path | None = None,
+        *,
+        anonymize: bool = False,
+        key: bytes | None = None,
+    ) -> None:
+        self.path = path
+        self.anonymize = anonymize
+        self.key = key if key is not None else secrets.token_bytes(16)
+        self.entries: list[CapturedEvaluation] = []
+        self.count = 0
+        self._scripts: dict[tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        self._file: IO[str] | None = None
+
+    def record(
+        self,
+        calc_type: str,
+        script: str,
+        inputs: str,
+        result: EvaluationResult,
+        seconds: float,
+        limits: EvaluationLimits | None,
+        strict_inputs: bool = True,
+        measurement_dir: str | os.PathLike[str] | None = None,
+    ) -> None:
+        """1 回の評価を記録する。
+
+        再実行で同じ条件を再現できるよう、入力の解析に関わる `strict_inputs`・
+        `measurement_dir` も記録する。
+        """
+        anonymized = False
+        if self.anonymize and "'" in inputs:
+            replaced = _QUOTED_RE.sub(self._pseudonym, inputs)
+            anonymized = replaced != inputs
+            inputs = replaced
+        entry = CapturedEvaluation(
+            calc_type,
+            script,
+            inputs,
+            (result.raw, result.edited, result.reported),
+            result.error_code,
+            round(seconds * 1_000_000),
+            limits,
+            anonymized,
+            strict_inputs,
+            None if measurement_dir is None else os.fspath(measurement_dir),
+        )
+        self.extend((entry,))
+
+    def extend(self, entries: Iterable[CapturedEvaluation]) -> None:
+        """記録済みの評価を追加する。"""
+        with self._lock:
+            if self.path is None:
+                before = len(self.entries)
+                self.entries.extend(entries)
+                self.count += len(self.entries) - before
+                return
+            fh = self._open()
+            for entry in entries:
+                fh.write(self._line(entry))
+                self.count += 1
+
+    def close(self) -> None:
+        """ログファイルを閉じる。"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _open(self) -> IO[str]:
+        if self._file is None:
+            assert self.path is not None
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = _open_log(self.path, "wt")
+            self._file.write(
+                _dumps({"capture": CAPTURE_FORMAT, "anonymized": self.anonymize})
+            )
+        return self._file
+
+    def _line(self, entry: CapturedEvaluation) -> str:
+        """評価 1 件分の行（未出力の計算式があればその定義行を含む）を返す。"""
+        lines = ""
+        script_key = (entry.calc_type, entry.script)
+        number = self._scripts.get(script_key)
+        if number is None:
+            number = self._scripts[script_key] = len(self._scripts)
+            lines += _dumps(
+                {"s": number, "type": entry.calc_type, "script": entry.script}
+            )
+        record: dict[str, Any] = {
+            "s": number,
+            "i": entry.inputs,
+            "o": list(entry.outputs),
+            "us": entry.micros,
+        }
+        if entry.error_code is not None:
+            record["e"] = entry.error_code
+        if entry.limits is not None:
+            record["l"] = dataclasses.asdict(entry.limits)
+        if entry.anonymized:
+            record["a"] = 1
+        if not entry.strict_inputs:
+            record["x"] = 0
+        if entry.measurement_dir is not None:
+            record["m"] = entry.measurement_dir
+        return lines + _dumps(record)
+
+    def _pseudonym(self, match: re.Match[str]) -> str:
+        """文字列の値を、同じ長さの鍵付きハッシュ由来の文字列へ置き換える。"""
+        value = match.group(1).replace("''", "'")
+        if not value:
+            return match.group(0)
+        digest = b""
+        counter = 0
+        while len(digest) < len(value):
+            digest += hashlib.blake2b(
+                value.encode("utf-8") + counter.to_bytes(4, "big"),
+                key=self.key,
+                digest_size=64,
+            ).digest()
+            counter += 1
+        size = len(PSEUDONYM_ALPHABET)
+        return (
+            "'"
+            + "".join(PSEUDONYM_ALPHABET[b % size] for b in digest[: len(value)])
+            + "'"
+        )
+
+
+_ACTIVE: WorkloadRecorder | None = None
+
+
+def current_recorder() -> WorkloadRecorder | None:
+    """記録中のレコーダーを返す。記録していなければ ``None``。"""
+    return _ACTIVE
+
+
+def start_capture(recorder: WorkloadRecorder) -> None:
+    """以降の評価を `recorder` へ記録する。"""
+    global _ACTIVE
+    _ACTIVE = recorder
+
+
+def stop_capture() -> WorkloadRecorder | None:
+    """記録を終了し、それまで記録していたレコーダーを返す（ファイルは閉じる）。"""
+    global _ACTIVE
+    recorder, _ACTIVE = _ACTIVE, None
+    if recorder is not None:
+        recorder.close()
+    return recorder
+
+
+@contextmanager
+def capture(
+    path: Path | None = None, *, anonymize: bool = False
+) -> Iterator[WorkloadRecorder]:
+    """`with` ブロック内の評価をログへ記録する。
+
+    Args:
+        path: ログファイルのパス。``None`` の場合はメモリ上の `entries` に蓄積する。
+        anonymize: 入力の単一引用符で囲んだ文字列を、同じ長さの別の文字列へ
+            置き換えて記録する場合は ``True``。
+
+    Yields:
+        記録先の `WorkloadRecorder`。
+    """
+    recorder = WorkloadRecorder(path, anonymize=anonymize)
+    previous = _ACTIVE
+    start_capture(recorder)
+    try:
+        yield recorder
+    finally:
+        stop_capture()
+        if previous is not None:
+            start_capture(previous)
+
+
+def read_capture(path: Path) -> Iterator[CapturedEvaluation]:
+    """ログファイルから記録した評価を順に読み込む。
+
+    Raises:
+        ValueError: ログの形式に対応していない場合。
+    """
+    with _open_log(path, "rt") as fh:
+        header = json.loads(fh.readline() or "{}")
+        if header.get("capture") != CAPTURE_FORMAT:
+            raise ValueError(f"{path} はワークロードのログではありません。")
+        scripts: dict[int, tuple[str, str]] = {}
+        for line in fh:
+            record = json.loads(line)
+            if "script" in record:
+                scripts[record["s"]] = (record["type"], record["script"])
+                continue
+            calc_type, script = scripts[record["s"]]
+            limits = record.get("l")
+            yield CapturedEvaluation(
+                calc_type,
+                script,
+                record["i"],
+                tuple(record["o"]),
+                record.get("e"),
+                record["us"],
+                None if limits is None else EvaluationLimits(**limits),
+                bool(record.get("a")),
+                bool(record.get("x", 1)),
+                record.get("m"),
+            )
+
+
+def _open_log(path: Path, mode: str) -> IO[str]:
+    """ログファイルを開く。拡張子が `.gz` なら gzip として扱う。"""
+    if path.suffix == ".gz":
+        return gzip.open(  # type: ignore[return-value]
+            path, mode, compresslevel=CAPTURE_GZIP_LEVEL, encoding="utf-8"
+        )
+    return path.open(mode, encoding="utf-8")
+
+
+def _dumps(value: dict[str, Any]) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+__all__ = [
+    "CAPTURE_FORMAT",
+    "CapturedEvaluation",
+    "WorkloadRecorder",
+    "capture",
+    "current_recorder",
+    "read_capture",
+    "start_capture",
+    "stop_capture",
+]
@@ -2,3 +2,8 @@
 
 MAX_NEST_DEPTH = 10
 MAX_FOR_ITERS = 1_000_000
+# 1 回の評価でメモ化するビルトイン呼び出し結果の上限件数。
+MAX_BUILTIN_MEMO = 1024
+
+ERROR_TEXT = "エラー"
+BUDGET_EXCEEDED_TEXT = "上限超過"
@@ -0,0 +1,408 @@
+"""スクリプトの評価コストを実行せずに見積もる。"""
+
+from __future__ import annotations
+
+import ast
+import math
+from dataclasses import dataclass
+from typing import Any
+
+from .cache import BoundedCache
+from .canonical import canonical_script
+from .constants import MAX_FOR_ITERS
+from .engine_core import CompiledExpr, CompiledProgram, Statement, compile_script
+from .inputs import input_line_key, replace_rhs_this_for_R
+
+# 反復回数を静的に決められない FOR ループに仮定する反復回数。
+DEFAULT_LOOP_ITERATIONS = 10
+# 1 回の評価に共通する固定コスト（検証・Engine の生成・結果の整形）。
+EVALUATION_BASE_COST = 20.0
+# スクリプトが参照する項目の測定値 1 件あたりの入力解析コスト。
+INPUT_VALUE_COST = 2.0
+# `strcat` 等の関数ステートメントの実行ごとの構文解析コスト。
+STATEMENT_CALL_COST = 20.0
+# 式の 1 ノードを 1 とした、ビルトイン 1 回の呼び出しコスト（引数の評価を除く）。
+BUILTIN_COSTS: dict[str, float] = {
+    "modd": 4.0,
+    "round": 6.0,
+    "roundjisb": 6.0,
+    "floor": 3.0,
+    "trunc": 3.0,
+    "str_comp": 2.0,
+    "strncpy": 2.0,
+}
+# 項目の測定値全体を読むビルトインの、測定値 1 件あたりのコスト。
+PER_VALUE_COSTS: dict[str, float] = {
+    "max": 0.1,
+    "min": 0.1,
+    "ave": 0.1,
+    "sum": 0.1,
+    "stdev": 1.5,
+    "stdeva": 1.5,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class LineCost:
+    """1 行分の見積もり。
+
+    Attributes:
+        line: スクリプト行番号（1 始まり）。
+        source: 行（コメント除去後）。
+        executions: 1 回の評価で行が実行される回数の見積もり。
+        cost: 行の実行回数を掛けたコスト。
+    """
+
+    line: int
+    source: str
+    executions: float
+    cost: float
+
+
+@dataclass(frozen=True, slots=True)
+class CostEstimate:
+    """1 回の評価にかかるコストの見積もり。
+
+    単位は式の AST ノード 1 つの評価を 1 とした相対値で、評価の並べ替えや
+    ワーカーへの割り振りに用いる。IF は両方の分岐を実行するとみなす。
+
+    Attributes:
+        total: 固定コスト・入力解析・全行のコストの合計。
+        lines: 実行される行の `LineCost`（行番号順）。
+        inputs: 参照される項目の入力解析コスト。
+        estimated_loops: 反復回数を静的に決められず `DEFAULT_LOOP_ITERATIONS` を
+            仮定した FOR ループの数。
+    """
+
+    total: float
+    lines: tuple[LineCost, ...]
+    inputs: float = 0.0
+    estimated_loops: int = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        """JSON 化しやすい辞書へ変換する。`lines` はコストの降順。"""
+        lines = sorted(self.lines, key=lambda item: -item.cost)
+        return {
+            "total": self.total,
+            "inputs": self.inputs,
+            "estimated_loops": self.estimated_loops,
+            "lines": [
+                {
+                    "line": item.line,
+                    "text": item.source.strip(),
+                    "executions": item.executions,
+                    "cost": item.cost,
+                }
+                for item in lines
+            ],
+        }
+
+    def render(self, limit: int = 10, indent: str = "") -> str:
+        """端末表示用のテキストレポートを生成する。
+
+        Args:
+            limit: 表示する行の上限（コストの降順）。
+            indent: 各行の先頭に付与する文字列。
+
+        Returns:
+            複数行のレポート文字列。
+        """
+        report = self.to_dict()
+        out = [f"{indent}推定コスト {report['total']:,.0f}"]
+        if self.estimated_loops:
+            out[0] += (
+                f"（反復回数不明の FOR {self.estimated_loops} 件は"
+                f" {DEFAULT_LOOP_ITERATIONS} 回と仮定）"
+            )
+        if self.inputs:
+            out.append(f"{indent}  入力解析: {self.inputs:,.0f}")
+        for entry in report["lines"][:limit]:
+            out.append(
+                f"{indent}  行 {entry['line']}: {entry['cost']:,.0f}"
+                f" ({entry['executions']:,.0f} 回) {entry['text']}"
+            )
+        return "\n".join(out)
+
+
+@dataclass(frozen=True, slots=True)
+class _LineTerm:
+    """入力に依存しない 1 行分の見積もり。`items` は項目キーと測定値 1 件の係数。"""
+
+    line: int
+    source: str
+    executions: float
+    constant: float
+    items: tuple[tuple[Any, float], ...]
+
+
+@dataclass(frozen=True, slots=True)
+class _StaticCost:
+    terms: tuple[_LineTerm, ...]
+    referenced: frozenset[Any]
+    estimated_loops: int
+
+
+def explain(calc_type: str, script: str, inputs: str = "") -> CostEstimate:
+    """スクリプトを実行せずに 1 回の評価コストを見積もる。
+
+    FOR ループは範囲が定数（または定数を代入した変数）であれば反復回数を求め、
+    ループ内の行に掛ける。ビルトインは `BUILTIN_COSTS`、測定値全体を読む集計系は
+    `PER_VALUE_COSTS` に E タイプ入力の測定値の件数を掛けて加算する。参照される
+    項目の入力解析は測定値 1 件につき `INPUT_VALUE_COST` とする。
+
+    Args:
+        calc_type: "E" または "R" を示す計算種別。
+        script: Lab-Aid 形式の計算スクリプト。
+        inputs: 評価に渡す入力。E タイプでは項目ごとの測定値の件数を数える。
+
+    Returns:
+        `CostEstimate`。計算種別が不正な場合は固定コストのみ。
+    """
+    static = _static_cost(calc_type, script)
+    sizes = _item_sizes(calc_type, inputs)
+    lines = tuple(
+        LineCost(term.line, term.source, term.executions, _term_cost(term, sizes))
+        for term in static.terms
+    )
+    parsing = _input_cost(static, sizes)
+    total = _base_cost(inputs) + parsing + sum(item.cost for item in lines)
+    return CostEstimate(total, lines, parsing, static.estimated_loops)
+
+
+def estimate_cost(calc_type: str, script: str, inputs: str = "") -> float:
+    """`explain(...).total` と同じ値を、行ごとの内訳を作らずに返す。"""
+    static = _static_cost(calc_type, script)
+    sizes = _item_sizes(calc_type, inputs)
+    return (
+        _base_cost(inputs)
+        + _input_cost(static, sizes)
+        + sum(_term_cost(term, sizes) for term in static.terms)
+    )
+
+
+def schedule_chunks(
+    costs: list[float], workers: int, *, split: int = 4, max_size: int = 64
+) -> list[list[int]]:
+    """見積もりコストの大きい順に、合計コストがほぼ等しいチャンクへ分ける。
+
+    チャンクを先頭から共有キューに投入し、空いたワーカーが順に取り出すと、
+    重い処理から着手し（longest-job-first）、終盤は小さなチャンクで負荷が均される。
+    1 チャンクの合計コストの目安は全体の ``1 / (workers * split)``。コストが等しい
+    要素は元の順序を保つ。
+
+    Args:
+        costs: 要素ごとの見積もりコスト。
+        workers: ワーカー数。
+        split: ワーカー 1 つあたりのチャンク数の目安。
+        max_size: 1 チャンクの要素数の上限。
+
+    Returns:
+        `costs` の添字のリストを投入順に並べたもの。
+    """
+    order = sorted(range(len(costs)), key=lambda index: -costs[index])
+    target = sum(costs) / (max(1, workers) * max(1, split))
+    chunks: list[list[int]] = []
+    current: list[int] = []
+    total = 0.0
+    for index in order:
+        current.append(index)
+        total += costs[index]
+        if total >= target or len(current) >= max_size:
+            chunks.append(current)
+            current = []
+            total = 0.0
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _base_cost(inputs: str) -> float:
+    return EVALUATION_BASE_COST + inputs.count("\n")
+
+
+def _input_cost(static: _StaticCost, sizes: dict[Any, int]) -> float:
+    return INPUT_VALUE_COST * sum(sizes.get(key, 0) for key in static.referenced)
+
+
+def _term_cost(term: _LineTerm, sizes: dict[Any, int]) -> float:
+    cost = term.constant
+    for key, weight in term.items:
+        cost += weight * sizes.get(key, 1)
+    return term.executions * cost
+
+
+def _item_sizes(calc_type: str, inputs: str) -> dict[Any, int]:
+    """E タイプ入力の項目ごとの測定値の件数（カンマ区切りの要素数）を返す。"""
+    if (calc_type or "").strip().upper() != "E" or not inputs:
+        return {}
+    sizes: dict[Any, int] = {}
+    for raw in inputs.splitlines():
+        key = input_line_key(raw)
+        if key is not None:
+            sizes[key] = raw.count(",") + 1
+    return sizes
+
+
+def _static_cost(calc_type: str, script: str) -> _StaticCost:
+    ctype = (calc_type or "").strip().upper()
+    if ctype not in ("E", "R"):
+        return _StaticCost((), frozenset(), 0)
+    return COST_CACHE.get_or_create((ctype, canonical_script(script)), _analyze)
+
+
+def _analyze(key: tuple[str, str]) -> _StaticCost:
+    ctype, script = key
+    if ctype == "R":
+        script = replace_rhs_this_for_R(script)
+    return _ProgramCost(compile_script(script)).run()
+
+
+class _ProgramCost:
+    """`CompiledProgram` を先頭から走査し、ループの反復回数を掛けた行コストを求める。"""
+
+    def __init__(self, program: CompiledProgram) -> None:
+        self.program = program
+        self.loops: list[float] = []
+        self.blocks = 0
+        self.constants: dict[str, float] = {}
+        self.referenced: set[Any] = set()
+        self.estimated_loops = 0
+
+    def run(self) -> _StaticCost:
+        terms: list[_LineTerm] = []
+        for number, statement in enumerate(self.program.statements, 1):
+            if statement.kind == "skip":
+                continue
+            executions = math.prod(self.loops)
+            constant = STATEMENT_CALL_COST if statement.kind == "call" else 1.0
+            items: list[tuple[Any, float]] = []
+            for compiled in statement.compiled:
+                if compiled is None or compiled.node is None:
+                    constant += 1
+                    continue
+                placeholders = _placeholders(compiled)
+                self.referenced.update(placeholders.values())
+                constant += _expr_cost(compiled.node, placeholders, items)
+            terms.append(
+                _LineTerm(number, statement.source, executions, constant, tuple(items))
+            )
+            self._track(statement)
+        return _StaticCost(
+            tuple(terms), frozenset(self.referenced), self.estimated_loops
+        )
+
+    def _track(self, statement: Statement) -> None:
+        """制御構文の入れ子と、定数を代入した変数を追跡する。"""
+        kind = statement.kind
+        if kind == "for":
+            self.loops.append(self._iterations(statement))
+            self.constants.pop(statement.name or "", None)
+        elif kind == "next":
+            if self.loops:
+                self.loops.pop()
+        elif kind == "if":
+            self.blocks += 1
+        elif kind == "end":
+            self.blocks = max(0, self.blocks - 1)
+        elif kind == "assign":
+            name = statement.source.split("=", 1)[0].strip()
+            compiled = statement.compiled[0] if statement.compiled else None
+            value = self._number(compiled.node if compiled is not None else None)
+            # 分岐・ループ内の代入は実行されるか不明なため定数として扱わない。
+            if value is not None and not self.blocks and not self.loops:
+                self.constants[name] = value
+            else:
+                self.constants.pop(name, None)
+
+    def _iterations(self, statement: Statement) -> float:
+        """FOR の反復回数。範囲を静的に決められなければ既定値とする。"""
+        bounds = [
+            self._number(compiled.node if compiled is not None else None)
+            for compiled in statement.compiled
+        ]
+        if len(bounds) == 2:
+            bounds.append(1)
+        start, stop, step = bounds if len(bounds) == 3 else (None, None, None)
+        if start is None or stop is None or step is None:
+            self.estimated_loops += 1
+            return DEFAULT_LOOP_ITERATIONS
+        if step == 0 or (stop - start) * step < 0:
+            return 1
+        span = (stop - start) / step
+        # 無限大の範囲（`1e400` 等）は実行時に反復上限で中断されるため上限とみなす。
+        if not math.isfinite(span):
+            return MAX_FOR_ITERS
+        return min(math.floor(span) + 1, MAX_FOR_ITERS)
+
+    def _number(self, node: ast.AST | None) -> float | None:
+        if isinstance(node, ast.Constant):
+            value = node.value
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return value
+            return None
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            operand = self._number(node.operand)
+            return -operand if operand is not None else None
+        if isinstance(node, ast.Name):
+            return self.constants.get(node.id)
+        return None
+
+
+def _placeholders(compiled: CompiledExpr) -> dict[str, Any]:
+    return {
+        placeholder: (code, unit) if unit is not None else code
+        for code, unit, placeholder in compiled.items
+    }
+
+
+def _expr_cost(
+    node: ast.AST,
+    placeholders: dict[str, Any],
+    items: list[tuple[Any, float]],
+    per_value: float | None = None,
+) -> float:
+    """式のノード数とビルトインのコストを合計し、集計系の項目参照を `items` に追加する。
+
+    Args:
+        node: 式のノード。
+        placeholders: プレースホルダ名から項目キーへの対応。
+        items: 測定値の件数に比例するコストの追加先。
+        per_value: 親が集計系ビルトインの場合の測定値 1 件あたりのコスト。
+
+    Returns:
+        入力に依存しないコスト。
+    """
+    if isinstance(node, ast.Name) and node.id in placeholders:
+        if per_value is not None:
+            items.append((placeholders[node.id], per_value))
+        return 1.0
+    cost = 1.0
+    child_per_value = None
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        name = node.func.id.lower()
+        cost += BUILTIN_COSTS.get(name, 1.0)
+        child_per_value = PER_VALUE_COSTS.get(name)
+    for child in ast.iter_child_nodes(node):
+        if isinstance(child, ast.expr):
+            cost += _expr_cost(child, placeholders, items, child_per_value)
+    return cost
+
+
+# `(計算種別, 正規形のスクリプト)` ごとの入力に依存しない見積もり。
+COST_CACHE: BoundedCache[tuple[str, str], _StaticCost] = BoundedCache("cost")
+
+
+__all__ = [
+    "BUILTIN_COSTS",
+    "COST_CACHE",
+    "DEFAULT_LOOP_ITERATIONS",
+    "EVALUATION_BASE_COST",
+    "INPUT_VALUE_COST",
+    "PER_VALUE_COSTS",
+    "STATEMENT_CALL_COST",
+    "CostEstimate",
+    "LineCost",
+    "estimate_cost",
+    "explain",
+    "schedule_chunks",
+]
@@ -0,0 +1,167 @@
+"""スクリプトが参照する試験項目を静的に抽出する。"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any
+
+from .cache import BoundedCache
+from .canonical import canonical_script
+from .engine_core import (
+    EXPRESSION_CACHE,
+    FOR_RE,
+    IF_RE,
+    PRINT2_RE,
+    PRINT_RE,
+    CompiledExpr,
+    compile_expr,
+)
+from .inputs import input_line_key
+from .text import strip_comment_quote_aware
+
+
+@dataclass(frozen=True, slots=True)
+class ItemUsage:
+    """1 つの試験項目の参照状況。
+
+    Attributes:
+        code: 試験項目コード。
+        unit: 単位。未指定なら ``None``。
+        indices: 個別に参照する測定値の番号（1 始まり）。
+        all_values: 測定値全体を参照する（`sum(#A)`・四則演算など）か、
+            参照する測定値を静的に決められない場合に ``True``。
+        lines: 参照しているスクリプト行番号（1 始まり、昇順）。
+    """
+
+    code: str
+    unit: str | None
+    indices: frozenset[int]
+    all_values: bool
+    lines: tuple[int, ...]
+
+    @property
+    def key(self) -> str | tuple[str, str]:
+        """`parse_inputs_E` が返す辞書のキー。"""
+        return (self.code, self.unit) if self.unit is not None else self.code
+
+
+@dataclass(frozen=True, slots=True)
+class ScriptDependencies:
+    """スクリプトが参照する試験項目の一覧。
+
+    Attributes:
+        items: 初出順の `ItemUsage`。
+    """
+
+    items: tuple[ItemUsage, ...]
+
+    def keys(self) -> frozenset[str | tuple[str, str]]:
+        """参照される項目のキー集合を返す。"""
+        return frozenset(usage.key for usage in self.items)
+
+    def filter_inputs(self, inputs: str) -> str:
+        """E タイプの入力から、参照される項目の行だけを残した文字列を返す。
+
+        書式の検証は行わず、`NAME=` 部分が参照項目に一致しない行を除く。
+        `=` を含まない行は `parse_inputs_E` で書式エラーとなるよう残す。
+
+        Args:
+            inputs: 複数行の `NAME=VALUE` 形式の入力。
+
+        Returns:
+            不要な行を除いた入力文字列。
+        """
+        keys = self.keys()
+        kept = [
+            raw
+            for raw in inputs.splitlines()
+            if (key := input_line_key(raw)) is None or key in keys
+        ]
+        return "\n".join(kept)
+
+
+def extract_dependencies(script: str) -> ScriptDependencies:
+    """スクリプトが読む `#CODE[UNIT]` 項目を実行せずに抽出する。
+
+    引用符内とコメントを除いた `RE_ITEM_ANY` の一致を対象とし、IF の分岐に
+    関係なくすべての行を走査する。結果は正規形（`canonical_script`）単位で
+    キャッシュする。
+
+    Args:
+        script: E タイプの計算スクリプト。
+
+    Returns:
+        `ScriptDependencies`。
+
+    Raises:
+        ValueError: `#` 変数名が Lab-Aid 仕様に違反していた場合。
+    """
+    return DEPENDENCY_CACHE.get_or_create(canonical_script(script), _extract)
+
+
+def _extract(script: str) -> ScriptDependencies:
+    usages: dict[tuple[str, str | None], dict[str, Any]] = {}
+    for number, raw in enumerate(script.splitlines(), 1):
+        line = strip_comment_quote_aware(raw).strip()
+        if not line or line.lower().startswith("rem") or "#" not in line:
+            continue
+        for expr in _line_expressions(line):
+            compiled = EXPRESSION_CACHE.get_or_create(expr, compile_expr)
+            for (code, unit), index in _item_references(compiled):
+                usage = usages.setdefault(
+                    (code, unit), {"indices": set(), "all": False, "lines": []}
+                )
+                if index is None:
+                    usage["all"] = True
+                else:
+                    usage["indices"].add(index)
+                if not usage["lines"] or usage["lines"][-1] != number:
+                    usage["lines"].append(number)
+    return ScriptDependencies(
+        tuple(
+            ItemUsage(
+                code,
+                unit,
+                frozenset(usage["indices"]),
+                usage["all"],
+                tuple(usage["lines"]),
+            )
+            for (code, unit), usage in usages.items()
+        )
+    )
+
+
+def _line_expressions(line: str) -> list[str]:
+    """1 行から `Engine.run_lines` が評価する式を取り出す。"""
+    for pattern in (PRINT_RE, PRINT2_RE, IF_RE):
+        match = pattern.match(line)
+        if match:
+            return [match.group(1).strip()]
+    match = FOR_RE.match(line)
+    if match:
+        return [expr for expr in match.groups()[1:] if expr is not None]
+    lhs, sep, rhs = line.partition("=")
+    if sep and lhs.strip().isidentifier() and not rhs.startswith("="):
+        return [rhs.strip()]
+    # strcat 等の関数ステートメント、または構文エラーの行は行全体を式とみなす。
+    return [line]
+
+
+def _item_references(
+    compiled: CompiledExpr,
+) -> list[tuple[tuple[str, str | None], int | None]]:
+    """式中の項目参照と、1 件だけ読む測定値の番号（全体なら ``None``）を返す。"""
+    keys = {placeholder: (code, unit) for code, unit, placeholder in compiled.items}
+    return [(keys[placeholder], index) for placeholder, index in compiled.references]
+
+
+# 正規形のスクリプトごとの `ScriptDependencies`。
+DEPENDENCY_CACHE: BoundedCache[str, ScriptDependencies] = BoundedCache("dependencies")
+
+
+__all__ = [
+    "DEPENDENCY_CACHE",
+    "ItemUsage",
+    "ScriptDependencies",
+    "extract_dependencies",
+]
@@ -4,19 +4,27 @@
 
 import ast
 import re
-from collections.abc import Iterable
+from collections.abc import Iterable, Mapping
 from dataclasses import dataclass, field
+from functools import partial
+from time import perf_counter
 from typing import Any, Match
 
-from .constants import MAX_FOR_ITERS, MAX_NEST_DEPTH
+from .cache import BoundedCache
+from .constants import MAX_BUILTIN_MEMO, MAX_FOR_ITERS, MAX_NEST_DEPTH
 from .functions import (
     NUMERIC_FUNCTIONS,
+    PURE_FUNCTIONS,
     STRING_FUNCTIONS,
     BuiltinNumericResult,
+    FormatHint,
     format_roundjisb_output,
 )
 from .functions.package import execute_print, execute_print2
-from .inputs import RE_ITEM_ANY, VarRef
+from .inputs import RE_ITEM_ANY, LazyInputs, VarRef
+from .limits import BudgetExceededError, EvaluationLimits
+from .profiler import Profiler
+from .series import MeasurementSeries
 from .text import (
     parse_number_like,
     replace_word_ci_outside_quotes,
@@ -27,10 +35,33 @@
 
 PRINT_RE = re.compile(r"^\s*print\s*\(\s*this\s*,\s*(.+)\)\s*$", re.IGNORECASE)
 PRINT2_RE = re.compile(r"^\s*print2\s*\(\s*this\s*,\s*(.+)\)\s*$", re.IGNORECASE)
+IF_RE = re.compile(r"^\s*if\s+(.+?)\s*$", re.IGNORECASE)
+ELSE_RE = re.compile(r"^\s*else\s*$", re.IGNORECASE)
+END_RE = re.compile(r"^\s*end\s*$", re.IGNORECASE)
+FOR_RE = re.compile(
+    r"^\s*for\s+([A-Za-z_][A-Za-z0-9_]*)\s*=\s*(.+?)\s+to\s+(.+?)(?:\s+step\s+(.+?))?\s*$",
+    re.IGNORECASE,
+)
+NEXT_RE = re.compile(r"^\s*next(?:\s+([A-Za-z_][A-Za-z0-9_]*))?\s*$", re.IGNORECASE)
+IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
 
 FUNCTION_DISPATCH = {**NUMERIC_FUNCTIONS, **STRING_FUNCTIONS}
 STATEMENT_FUNCTIONS = {"strcat", "strncpy"}
 
+# 測定値を 1 件だけ取り出す関数の引数数ごとの `(値の引数位置, 試験回の引数位置)`。
+# 試験回の引数位置が ``None`` の場合は先頭（1 回目）の測定値を用いる。
+SELECTING_FUNCTIONS: dict[str, dict[int, tuple[tuple[int, int | None], ...]]] = {
+    "is_char": {1: ((0, None),), 2: ((0, 1),)},
+    "strlen": {1: ((0, None),), 2: ((0, 1),)},
+    "isempty": {1: ((0, None),), 2: ((0, 1),)},
+    "isspace": {1: ((0, None),), 2: ((0, 1),)},
+    "str_comp": {
+        2: ((0, None), (1, None)),
+        3: ((0, 1), (2, None)),
+        4: ((0, 2), (1, 3)),
+    },
+}
+
 OP_MAPPING = {
     "eq": "==",
     "ne": "!=",
@@ -43,45 +74,424 @@
 }
 
 
+class ConditionError(RuntimeError):
+    """IF 条件式の評価に失敗したことを表す例外（原因は `__cause__` に保持）。"""
+
+
 class FormatAwareNumber(float):
-    """フォーマット済み文字列表現を保持する数値ラッパー。"""
+    """表示形式のヒントを保持する数値ラッパー。
 
-    formatted: str | None
+    表示文字列は `str()` 等で初めて必要になった時点で生成し、以後は再利用する。
 
-    def __new__(cls, value: float, formatted: str | None) -> FormatAwareNumber:
+    Attributes:
+        source: 変換前の値。表示文字列はこの値から生成する。
+        hint: 表示形式。
+    """
+
+    __slots__ = ("_formatted", "hint", "source")
+
+    source: int | float
+    hint: FormatHint
+    _formatted: str | None
+
+    def __new__(cls, value: float, hint: FormatHint) -> FormatAwareNumber:
         obj = float.__new__(cls, value)
-        obj.formatted = formatted
+        obj.source = value
+        obj.hint = hint
+        obj._formatted = None
         return obj
 
+    @property
+    def formatted(self) -> str | None:
+        """`hint` に従った表示文字列。"""
+        if self._formatted is None:
+            self._formatted = format_roundjisb_output(self.source, self.hint)
+        return self._formatted
+
     def __str__(self) -> str:
-        formatted = getattr(self, "formatted", None)
+        formatted = self.formatted
         return formatted if formatted is not None else super().__str__()
 
 
+@dataclass(frozen=True, slots=True)
+class CompiledExpr:
+    """`#CODE[UNIT]` の置換と構文解析を済ませた式。
+
+    入力値に依存しないため、同じ式文字列であれば行・ブックを跨いで再利用できる。
+
+    Attributes:
+        items: `(コード, 単位, プレースホルダ名)` のタプル（出現順）。
+        node: 構文解析済みの式ノード。構文エラーの場合は ``None``。
+        error: 構文エラー時の元例外。
+        references: 式中の項目参照ごとの `(プレースホルダ名, 測定値の番号)`。
+            `strlen(#A, 2)` のように 1 件の測定値だけを読む参照は番号（1 始まり）、
+            それ以外は ``None``。
+        selections: `items` と同じ並びで、その項目のすべての参照が同じ 1 件の
+            測定値だけを読む場合の番号。それ以外は ``None``。
+    """
+
+    items: tuple[tuple[str, str | None, str], ...]
+    node: ast.expr | None
+    error: SyntaxError | None = None
+    references: tuple[tuple[str, int | None], ...] = ()
+    selections: tuple[int | None, ...] = ()
+
+
+def _build_quote_mask(text: str) -> list[bool]:
+    """単一引用符で囲まれた位置を ``True`` とするマスクを返す。"""
+    mask = [False] * len(text)
+    in_sq = False
+    index = 0
+    while index < len(text):
+        char = text[index]
+        if char == "'":
+            if in_sq and index + 1 < len(text) and text[index + 1] == "'":
+                mask[index] = True
+                mask[index + 1] = True
+                index += 2
+                continue
+            in_sq = not in_sq
+            mask[index] = True
+        else:
+            mask[index] = in_sq
+        index += 1
+    return mask
+
+
+def compile_expr(expr: str) -> CompiledExpr:
+    """Lab-Aid 互換の式文字列を Python AST へ変換する。
+
+    `#CODE[UNIT]` 表記をプレースホルダ名へ置換し、`gt` 等の比較演算子を
+    Python の演算子へ書き換えてから構文解析する。構文エラーは例外とせず
+    `CompiledExpr.error` に保持し、項目の解決後に送出できるようにする。
+
+    Args:
+        expr: Lab-Aid 互換の式文字列。
+
+    Returns:
+        構文解析済みの `CompiledExpr`。
+
+    Raises:
+        ValueError: `#` 変数名が Lab-Aid 仕様に違反していた場合。
+    """
+    quote_mask = _build_quote_mask(expr)
+    matches: list[tuple[int, int, Match[str]]] = []
+    for match in RE_ITEM_ANY.finditer(expr):
+        start, end = match.span()
+        if any(quote_mask[start:end]):
+            continue
+        code, unit = match.group(1), match.group(2)
+        validate_hash_name(code, unit)
+        matches.append((start, end, match))
+
+    items: list[tuple[str, str | None, str]] = []
+    rewritten_parts: list[str] = []
+    last_index = 0
+
+    for start, end, match in matches:
+        code = match.group(1)
+        unit = match.group(2)
+        placeholder = f"__item_{code}__{unit}" if unit else f"__item_{code}"
+        placeholder = re.sub(r"[^A-Za-z0-9_]", "_", placeholder).lower()
+        items.append((code, unit, placeholder))
+        rewritten_parts.append(expr[last_index:start])
+        rewritten_parts.append(placeholder)
+        last_index = end
+
+    rewritten_parts.append(expr[last_index:])
+    rewritten = "".join(rewritten_parts)
+    rewritten = replace_word_ci_outside_quotes(rewritten, OP_MAPPING)
+
+    try:
+        node = ast.parse(rewritten, mode="eval")
+    except SyntaxError as exc:
+        return CompiledExpr(
+            tuple(items),
+            None,
+            exc,
+            tuple((placeholder, None) for _code, _unit, placeholder in items),
+            (None,) * len(items),
+        )
+    references = _item_references(node.body, {item[2] for item in items})
+    indices: dict[str, set[int | None]] = {}
+    for placeholder, index in references:
+        indices.setdefault(placeholder, set()).add(index)
+    selections = tuple(
+        next(iter(found)) if len(found := indices[placeholder]) == 1 else None
+        for _code, _unit, placeholder in items
+    )
+    return CompiledExpr(tuple(items), node.body, None, references, selections)
+
+
+def _item_references(
+    node: ast.expr, placeholders: set[str]
+) -> tuple[tuple[str, int | None], ...]:
+    """式中の項目参照と、1 件だけ読む測定値の番号（全体なら ``None``）を返す。"""
+    selected: dict[int, int] = {}
+    for call in ast.walk(node):
+        if not (isinstance(call, ast.Call) and isinstance(call.func, ast.Name)):
+            continue
+        positions = SELECTING_FUNCTIONS.get(call.func.id.lower(), {})
+        for value_pos, index_pos in positions.get(len(call.args), ()):
+            value_node = call.args[value_pos]
+            if not (isinstance(value_node, ast.Name) and value_node.id in placeholders):
+                continue
+            if index_pos is None:
+                selected[id(value_node)] = 1
+                continue
+            index_node = call.args[index_pos]
+            if (
+                isinstance(index_node, ast.Constant)
+                and type(index_node.value) is int
+                and index_node.value >= 1
+            ):
+                selected[id(value_node)] = index_node.value
+    return tuple(
+        (name.id, selected.get(id(name)))
+        for name in ast.walk(node)
+        if isinstance(name, ast.Name) and name.id in placeholders
+    )
+
+
+def _memo_key(name: str, args: list[Any]) -> tuple[Any, ...] | None:
+    """ビルトイン呼び出しのメモ化キーを返す。照合できない引数があれば ``None``。"""
+    key: list[Any] = [name]
+    for arg in args:
+        if isinstance(arg, (list, MeasurementSeries)):
+            key.append((type(arg), id(arg)))
+        elif isinstance(arg, (int, float, str)):
+            key.append(_memo_value(arg))
+        else:
+            return None
+    return tuple(key)
+
+
+def _memo_value(value: float | str) -> tuple[Any, ...]:
+    """スカラー引数の照合キー。`FormatAwareNumber` は変換前の値と表示ヒントで照合する。"""
+    if isinstance(value, FormatAwareNumber):
+        return (FormatAwareNumber, _memo_value(value.source), value.hint)
+    return (type(value), value)
+
+
+def validate_call(call: ast.Call, name: str) -> None:
+    """`str_comp` 呼び出し専用の構文検証を行う。
+
+    Args:
+        call: 解析済みの関数呼び出しノード。
+        name: 小文字化された関数名。
+
+    Raises:
+        TypeError: Lab-Aid の `str_comp` 仕様に違反する引数構成だった場合。
+    """
+    if name != "str_comp":
+        return
+    argc = len(call.args)
+    if argc < 2:
+        raise TypeError("str_comp: 引数数が不正です。")
+    first = call.args[0]
+    if isinstance(first, ast.Constant) and isinstance(first.value, str):
+        raise TypeError("str_comp: 第1引数には文字列リテラルを指定できません。")
+    if argc == 3:
+        index_node = call.args[1]
+        target = call.args[2]
+        if not isinstance(index_node, ast.Name):
+            raise TypeError("str_comp: 第2引数には変数を指定してください。")
+        if not isinstance(target, ast.Constant) or not isinstance(target.value, str):
+            raise TypeError("str_comp: 第3引数には文字列リテラルを指定してください。")
+    if argc == 4:
+        for idx_node in call.args[2:]:
+            if not isinstance(idx_node, (ast.Constant, ast.Name)):
+                raise TypeError("str_comp: 試験回指定が不正です。")
+            if isinstance(idx_node, ast.Constant) and not isinstance(
+                idx_node.value, int
+            ):
+                raise TypeError("str_comp: 試験回には整数を指定してください。")
+
+
+# 式文字列ごとの `CompiledExpr`。ワーカープロセス内で全ブック・全行が共有する。
+EXPRESSION_CACHE: BoundedCache[str, CompiledExpr] = BoundedCache("expression")
+
+
+@dataclass(frozen=True, slots=True)
+class Statement:
+    """実行前に構文の種類を判定したスクリプト 1 行。
+
+    Attributes:
+        kind: `skip`・`print`・`print2`・`if`・`else`・`end`・`for`・`next`・
+            `call`（`strcat` 等の関数ステートメント）・`assign` のいずれか。
+        source: コメント除去後の行。エラー詳細とプロファイラの表示に用いる。
+        exprs: 行が評価する式（print の引数・IF 条件・FOR の範囲・代入の右辺等）。
+        compiled: `exprs` と同じ並びの `CompiledExpr`。`#` 項目名が不正な式は
+            実行時に同じ例外を送出させるため ``None`` とする。
+        name: FOR・NEXT の変数名。
+    """
+
+    kind: str
+    source: str
+    exprs: tuple[str, ...] = ()
+    compiled: tuple[CompiledExpr | None, ...] = ()
+    name: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledProgram:
+    """行の判定と式の構文解析を済ませた、入力値に依存しないスクリプト。
+
+    不変オブジェクトのため、スレッド・行・ブックを跨いで共有できる。評価ごとの
+    変数やフォーマットヒントは `Engine` が保持する。
+
+    Attributes:
+        statements: 行番号順の `Statement`。
+    """
+
+    statements: tuple[Statement, ...]
+
+
+def compile_program(lines: Iterable[str]) -> CompiledProgram:
+    """スクリプト行を `Engine.run_program` が実行する `CompiledProgram` へ変換する。
+
+    行の判定は `run_lines` の実行時と同じ順序で行う。この段階では例外を送出せず、
+    構文エラー等は該当行の実行時に送出される。
+
+    Args:
+        lines: スクリプト行のイテラブル。
+
+    Returns:
+        `CompiledProgram`。
+    """
+    return CompiledProgram(tuple(_compile_statement(line) for line in lines))
+
+
+def compile_script(script: str) -> CompiledProgram:
+    """スクリプト文字列の `CompiledProgram` を `PROGRAM_CACHE` 経由で返す。"""
+    return PROGRAM_CACHE.get_or_create(script, _compile_script)
+
+
+def _compile_script(script: str) -> CompiledProgram:
+    return compile_program(script.splitlines())
+
+
+def _compile_statement(line: str) -> Statement:
+    source = strip_comment_quote_aware(line)
+    raw = source.strip()
+    if not raw or raw.lower().startswith("rem"):
+        return Statement("skip", source)
+    for kind, pattern in (("print", PRINT_RE), ("print2", PRINT2_RE)):
+        match = pattern.match(raw)
+        if match:
+            return _statement(kind, source, match.group(1).strip())
+    match = IF_RE.match(raw)
+    if match:
+        return _statement("if", source, match.group(1))
+    if ELSE_RE.match(raw):
+        return Statement("else", source)
+    if END_RE.match(raw):
+        return Statement("end", source)
+    match = FOR_RE.match(raw)
+    if match:
+        var_name, from_expr, to_expr, step_expr = match.groups()
+        exprs = [expr for expr in (from_expr, to_expr, step_expr) if expr is not None]
+        return _statement("for", source, *exprs, name=var_name)
+    match = NEXT_RE.match(raw)
+    if match:
+        return Statement("next", source, name=match.group(1))
+    if statement_call(raw) is not None:
+        return _statement("call", source, raw)
+    lhs, sep, rhs = raw.partition("=")
+    if sep and IDENTIFIER_RE.fullmatch(lhs.strip()):
+        return _statement("assign", source, rhs.strip())
+    return Statement("assign", source)
+
+
+def _statement(
+    kind: str, source: str, *exprs: str, name: str | None = None
+) -> Statement:
+    return Statement(kind, source, exprs, tuple(map(_precompile, exprs)), name)
+
+
+def _precompile(expr: str) -> CompiledExpr | None:
+    try:
+        return EXPRESSION_CACHE.get_or_create(expr, compile_expr)
+    except ValueError:
+        return None
+
+
+def statement_call(line: str) -> tuple[str, ast.Call] | None:
+    """行が `strcat(B, A)` 形式の関数ステートメントなら関数名と呼び出しを返す。
+
+    Args:
+        line: 前後の空白を除いたスクリプト行。
+
+    Returns:
+        `STATEMENT_FUNCTIONS` の関数呼び出しであれば `(小文字の関数名, ast.Call)`、
+        それ以外は ``None``。
+    """
+    try:
+        node = ast.parse(line, mode="eval").body
+    except SyntaxError:
+        return None
+    if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Name):
+        return None
+    name = node.func.id.lower()
+    if name not in STATEMENT_FUNCTIONS:
+        return None
+    return name, node
+
+
+# 正規形のスクリプト（R タイプは `this` 置換後）ごとの `CompiledProgram`。
+PROGRAM_CACHE: BoundedCache[str, CompiledProgram] = BoundedCache("program")
+
+
 @dataclass
 class Engine:
     """Lab-Aid のスクリプトを評価するエンジン。
 
+    1 回の評価に固有の可変状態（変数・直近のフォーマットヒント・出力）を保持する。
+    スレッド間で共有せず評価ごとに生成し、共有してよい構文解析結果は不変の
+    `CompiledProgram`・`CompiledExpr` として受け取る。
+
     Attributes:
         items: `#CODE[UNIT]` 参照に対応する試験項目の値マップ。
         vars: 通常変数と `this` を保持する可変辞書。
-        var_formats: 変数毎の表示ヒントとフォーマット済み文字列。
+        var_formats: 変数毎の表示ヒント。
         last_format_hint: 直近の式評価で得られたフォーマットヒント。
-        this_formatted: `this` に対して適用されたフォーマット済み文字列。
+        this_output: 最後に `this` へ代入した値とその表示ヒント。ヒントがなければ
+            ``None``。表示文字列は `this_formatted` で必要になった時点で生成する。
         last_print: `print` によって最後に出力された文字列。
         last_print2: `print2` によって最後に出力された文字列。
         this_assigned_count: `this` への代入回数。E タイプでは 1 以上が要求される。
+        profiler: 行・ビルトイン単位の計測先。``None`` の場合は計測しない。
+        limits: ステップ数・実行時間・サイズの予算。``None`` の場合は無制限。
+        steps: `limits` 指定時に計上した実行ステートメント数。
+        error_line: 実行を中断した行番号（1 始まり）。正常終了時は ``None``。
+        error_source: 実行を中断した行（コメント除去後）。
+        error_expr: 例外発生時に評価していた式。
+        builtin_memo: `PURE_FUNCTIONS` の呼び出し結果。キーは関数名と引数で、
+            リストは同一オブジェクト、それ以外は型と値（`FormatAwareNumber` は
+            変換前の値と表示ヒント）で照合する。値は参照した引数と結果。
     """
 
-    items: dict[Any, Any] = field(default_factory=dict)
+    items: Mapping[Any, Any] = field(default_factory=dict)
     vars: dict[str, Any] = field(default_factory=lambda: {"this": 0})
-    var_formats: dict[str, tuple[str | None, str | None]] = field(default_factory=dict)
+    var_formats: dict[str, FormatHint] = field(default_factory=dict)
 
-    last_format_hint: str | None = None
-    this_formatted: str | None = None
+    last_format_hint: FormatHint | None = None
+    this_output: tuple[Any, FormatHint] | None = None
     last_print: str | None = None
     last_print2: str | None = None
     this_assigned_count: int = 0
+    profiler: Profiler | None = None
+    limits: EvaluationLimits | None = None
+    steps: int = 0
+    error_line: int | None = None
+    error_source: str | None = None
+    error_expr: str | None = None
+    builtin_memo: dict[tuple[Any, ...], tuple[list[Any], BuiltinNumericResult]] = field(
+        default_factory=dict
+    )
+    # `for This = ...` のように大小文字だけ異なる `this` の変数を最後に作った名前。
+    # 式中の `this` はこの変数を参照する。
+    _this_alias: str | None = field(default=None, init=False, repr=False)
 
     @staticmethod
     def _coerce_numeric(value: Any) -> int | float | None:
@@ -94,6 +504,16 @@ def _coerce_numeric(value: Any) -> int | float | None:
                 return parsed
         return None
 
+    @property
+    def this_formatted(self) -> str | None:
+        """`this` に最後に代入した値の表示文字列。ヒントがなければ ``None``。"""
+        if self.this_output is None:
+            return None
+        value, hint = self.this_output
+        if isinstance(value, FormatAwareNumber):
+            return value.formatted
+        return format_roundjisb_output(value, hint)
+
     def _format_to_text(self, value: Any) -> str | None:
         """直近のフォーマットヒントを考慮して文字列化する。"""
         formatted = format_roundjisb_output(value, self.last_format_hint)
@@ -102,15 +522,37 @@ def _format_to_text(self, value: Any) -> str | None:
             return formatted
         return to_text(value)
 
-    def eval_expr(self, expr: str) -> Any:
+    def eval_expr(self, expr: str, compiled: CompiledExpr | None = None) -> Any:
+        """Lab-Aid 互換の式文字列を評価し、失敗時は式を `error_expr` に残す。
+
+        Args:
+            expr: Lab-Aid 互換の式文字列。
+            compiled: `expr` を構文解析済みの場合はその結果。
+
+        Returns:
+            式の評価結果。
+
+        Raises:
+            Exception: `_eval_expr` が送出した例外をそのまま送出する。
+        """
+        try:
+            return self._eval_expr(expr, compiled)
+        except Exception:
+            if self.error_expr is None:
+                self.error_expr = expr
+            raise
+
+    def _eval_expr(self, expr: str, compiled: CompiledExpr | None = None) -> Any:
         """Lab-Aid 互換の式文字列を評価する。
 
         Lab-Aid 特有の `#CODE[UNIT]` 表記や大小比較演算子を Python AST に変換し、
-        安全に評価した結果を返す。評価途中で取得したフォーマットヒントは
-        `last_format_hint` に保持する。
+        安全に評価した結果を返す。`compiled` 未指定時は `EXPRESSION_CACHE` から
+        変換結果を得る。評価途中で取得したフォーマットヒントは `last_format_hint`
+        に保持する。
 
         Args:
             expr: Lab-Aid 互換の式文字列。
+            compiled: `expr` を構文解析済みの場合はその結果。
 
         Returns:
             式の評価結果。数値・文字列・真偽値などを返却する。
@@ -122,74 +564,32 @@ def eval_expr(self, expr: str) -> Any:
             KeyError: 未定義の試験項目を参照した場合。
         """
         self.last_format_hint = None
+        profiler = self.profiler
+        parse_started = perf_counter() if profiler is not None else 0.0
+        if compiled is None:
+            compiled = EXPRESSION_CACHE.get_or_create(expr, compile_expr)
+        subst_map = {
+            placeholder: self.resolve_item(code, unit, index)
+            for (code, unit, placeholder), index in zip(
+                compiled.items, compiled.selections, strict=True
+            )
+        }
+        if compiled.node is None:
+            raise SyntaxError(f"式の構文エラー: {expr}") from compiled.error
+        if profiler is not None:
+            profiler.record_phase("parse", perf_counter() - parse_started)
 
-        def build_quote_mask(text: str) -> list[bool]:
-            mask = [False] * len(text)
-            in_sq = False
-            index = 0
-            while index < len(text):
-                char = text[index]
-                if char == "'":
-                    if in_sq and index + 1 < len(text) and text[index + 1] == "'":
-                        mask[index] = True
-                        mask[index + 1] = True
-                        index += 2
-                        continue
-                    in_sq = not in_sq
-                    mask[index] = True
-                else:
-                    mask[index] = in_sq
-                index += 1
-            return mask
-
-        quote_mask = build_quote_mask(expr)
-        matches: list[tuple[int, int, Match[str]]] = []
-        for match in RE_ITEM_ANY.finditer(expr):
-            start, end = match.span()
-            if any(quote_mask[start:end]):
-                continue
-            code, unit = match.group(1), match.group(2)
-            validate_hash_name(code, unit)
-            matches.append((start, end, match))
-
-        subst_map: dict[str, Any] = {}
-        rewritten_parts: list[str] = []
-        last_index = 0
-
-        for start, end, match in matches:
-            code = match.group(1)
-            unit = match.group(2)
-            value = self.resolve_item(code, unit)
-            placeholder = f"__item_{code}__{unit}" if unit else f"__item_{code}"
-            placeholder = re.sub(r"[^A-Za-z0-9_]", "_", placeholder).lower()
-            subst_map[placeholder] = value
-            rewritten_parts.append(expr[last_index:start])
-            rewritten_parts.append(placeholder)
-            last_index = end
-
-        rewritten_parts.append(expr[last_index:])
-        rewritten = "".join(rewritten_parts)
-        rewritten = replace_word_ci_outside_quotes(rewritten, OP_MAPPING)
-
-        try:
-            node = ast.parse(rewritten, mode="eval")
-        except SyntaxError as exc:
-            raise SyntaxError(f"式の構文エラー: {expr}") from exc
-
-        names: dict[str, Any] = {}
-        for key, value in self.vars.items():
-            canonical = "this" if key.lower() == "this" else key
-            names[canonical] = value
-        names.update(subst_map)
-
-        return self.eval_ast(node.body, names)
+        # 通常変数は `eval_ast` が `vars` から直接引くため、変数の数によらず
+        # 式ごとに作る辞書は試験項目の分だけで済む。
+        return self.eval_ast(compiled.node, subst_map)
 
     def eval_ast(self, node: ast.AST, names: dict[str, Any]) -> Any:
         """AST ノードを再帰的に評価する。
 
         Args:
             node: 評価対象の AST ノード。
-            names: 変数名と値を紐付けた辞書。
+            names: 名前と値を紐付けた辞書。含まれない名前は通常変数（`vars`）
+                から解決する。
 
         Returns:
             ノードに対応する評価結果。
@@ -272,11 +672,32 @@ def eval_ast(self, node: ast.AST, names: dict[str, Any]) -> Any:
             func = FUNCTION_DISPATCH.get(name)
             if func is None:
                 raise TypeError(f"未対応の関数: {name}")
-            self._validate_call(node, name)
+            validate_call(node, name)
             args = [self.eval_ast(arg, names) for arg in node.args]
-            result = func(args)
+            profiler = self.profiler
+            memo_key = _memo_key(name, args) if name in PURE_FUNCTIONS else None
+            memoized = self.builtin_memo.get(memo_key) if memo_key else None
+            if memoized is not None:
+                result = memoized[1]
+                if profiler is not None:
+                    profiler.record_memo_hit(name)
+            elif profiler is None:
+                result = func(args)
+            else:
+                started = perf_counter()
+                result = func(args)
+                profiler.record_builtin(name, perf_counter() - started)
             if not isinstance(result, BuiltinNumericResult):
                 raise TypeError(f"{name}: 無効なビルトイン関数の戻り値です。")
+            if (
+                memo_key is not None
+                and memoized is None
+                and len(self.builtin_memo) < MAX_BUILTIN_MEMO
+            ):
+                # 引数のリストを保持し、照合に使う `id` が再利用されないようにする。
+                self.builtin_memo[memo_key] = (args, result)
+            if self.limits is not None:
+                self.limits.check_value(result.value)
             self.last_format_hint = result.format_hint
             return result.value
 
@@ -288,26 +709,34 @@ def eval_ast(self, node: ast.AST, names: dict[str, Any]) -> Any:
         if isinstance(node, ast.Name):
             key = "this" if node.id.lower() == "this" else node.id
             if key in names:
-                fmt = self.var_formats.get(key)
-                if fmt is not None:
-                    hint, _formatted = fmt
-                    self.last_format_hint = hint
-                return names[key]
-            if re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", node.id):
-                return 0
-            raise NameError(f"未定義名: {node.id}")
+                value = names[key]
+            else:
+                variable = (self._this_alias or key) if key == "this" else key
+                if variable not in self.vars:
+                    if IDENTIFIER_RE.fullmatch(node.id):
+                        return 0
+                    raise NameError(f"未定義名: {node.id}")
+                value = self.vars[variable]
+            hint = self.var_formats.get(key)
+            if hint is not None:
+                self.last_format_hint = hint
+            return value
 
         if isinstance(node, ast.Expr):
             return self.eval_ast(node.value, names)
 
         raise TypeError(f"未対応の式: {ast.dump(node)}")
 
-    def resolve_item(self, code: str, unit: str | None) -> Any:
+    def resolve_item(
+        self, code: str, unit: str | None, position: int | None = None
+    ) -> Any:
         """`#CODE[UNIT]` 形式の試験項目値を取得する。
 
         Args:
             code: 試験項目コード。
             unit: 単位を指定する場合の文字列。未指定なら ``None``。
+            position: 式がこの項目の測定値を 1 件だけ読む場合の番号（1 始まり）。
+                `items` が `LazyInputs` なら、その測定値だけを解析する。
 
         Returns:
             対応する値、もしくは `VarRef` を解決した通常変数の値。
@@ -318,9 +747,15 @@ def resolve_item(self, code: str, unit: str | None) -> Any:
         key = (code, unit) if unit is not None else code
         if key not in self.items:
             raise KeyError(f"試験項目が見つかりません: #{code}[{unit}]")
-        value = self.items[key]
+        items = self.items
+        if position is not None and isinstance(items, LazyInputs):
+            value = items.select(key, position)
+        else:
+            value = items[key]
         if isinstance(value, VarRef):
             return self.vars.get(value.name, 0)
+        if self.limits is not None:
+            self.limits.check_value(value)
         return value
 
     def run_lines(self, lines: Iterable[str]) -> dict[str, Any]:
@@ -335,184 +770,250 @@ def run_lines(self, lines: Iterable[str]) -> dict[str, Any]:
         Raises:
             SyntaxError: IF/ELSE/END・FOR/NEXT の対応が崩れた場合。
             RuntimeError: FOR ループの反復上限超過など、実行時の制約違反が起きた場合。
+            BudgetExceededError: `limits` の予算を超過した場合。
+            TypeError: 構文上許可されないステートメントが実行された場合。
+        """
+        return self.run_program(compile_program(lines))
+
+    def run_program(self, program: CompiledProgram) -> dict[str, Any]:
+        """`compile_program` で変換済みのスクリプトを逐次実行する。
+
+        Args:
+            program: 実行対象の `CompiledProgram`。
+
+        Returns:
+            実行完了時点の通常変数および `this` の辞書。
+
+        Raises:
+            SyntaxError: IF/ELSE/END・FOR/NEXT の対応が崩れた場合。
+            RuntimeError: FOR ループの反復上限超過など、実行時の制約違反が起きた場合。
+            BudgetExceededError: `limits` の予算を超過した場合。
             TypeError: 構文上許可されないステートメントが実行された場合。
         """
-        # コメントを除去し、解析しやすいプログラム（行リスト）を構築する。
-        program = [strip_comment_quote_aware(line) for line in lines]
+        statements = program.statements
         pc = 0
-        count = len(program)
+        count = len(statements)
         stack: list[dict[str, Any]] = []
 
+        # 各フレームの `active` は親ブロックの状態を含めて決まるため、
+        # 最内のフレームだけを見ればネストの深さによらず判定できる。
         def is_active() -> bool:
-            return all(frame["active"] for frame in stack)
-
-        while pc < count:
-            raw = program[pc].strip()
-            pc += 1
-            if not raw or raw.lower().startswith("rem"):
-                continue
+            return stack[-1]["active"] if stack else True
+
+        # 計測は直前に実行した行の経過時間を次の行の先頭で確定させる方式とし、
+        # profiler 未指定時は分岐 1 回以外のコストを発生させない。
+        profiler = self.profiler
+        profiled_line = 0
+        profiled_started = 0.0
+        limits = self.limits
+        deadline = limits.deadline() if limits is not None else None
+        try:
+            while pc < count:
+                if profiler is not None:
+                    now = perf_counter()
+                    if profiled_line:
+                        profiler.record_line(
+                            profiled_line,
+                            statements[profiled_line - 1].source,
+                            now - profiled_started,
+                        )
+                    profiled_line = 0
+                    profiled_started = now
+                statement = statements[pc]
+                pc += 1
+                kind = statement.kind
+                if kind == "skip":
+                    continue
+                if profiler is not None:
+                    profiled_line = pc
+                if limits is not None:
+                    self.steps += 1
+                    limits.check_step(self.steps, deadline)
+
+                if kind in ("print", "print2"):
+                    if is_active():
+                        arg_expr = statement.exprs[0]
+                        if RE_ITEM_ANY.search(arg_expr):
+                            raise SyntaxError(
+                                f"{kind}: 引数には #項目を直接指定できません（通常変数か '文字' を使用）"
+                            )
+                        evaluator = partial(
+                            self.eval_expr, compiled=statement.compiled[0]
+                        )
+                        if kind == "print":
+                            self.last_print = execute_print(
+                                arg_expr, evaluator, self._format_to_text
+                            )
+                        else:
+                            self.last_print2 = execute_print2(
+                                arg_expr, evaluator, self._format_to_text
+                            )
+                    continue
 
-            match = PRINT_RE.match(raw)
-            if match:
-                if is_active():
-                    arg_expr = match.group(1).strip()
-                    if RE_ITEM_ANY.search(arg_expr):
+                if kind == "if":
+                    if len(stack) >= MAX_NEST_DEPTH:
                         raise SyntaxError(
-                            "print: 引数には #項目を直接指定できません（通常変数か '文字' を使用）"
+                            f"制御構文のネストが上限を超えました（最大{MAX_NEST_DEPTH}）"
                         )
-                    self.last_print = execute_print(
-                        arg_expr, self.eval_expr, self._format_to_text
+                    condition = statement.exprs[0]
+                    parent_active = is_active()
+                    cond_value = False
+                    if parent_active:
+                        try:
+                            cond_value = bool(
+                                self.eval_expr(condition, statement.compiled[0])
+                            )
+                        except BudgetExceededError:
+                            raise
+                        except Exception as exc:
+                            raise ConditionError(
+                                f"IF 条件評価エラー: {condition} : {exc}"
+                            ) from exc
+                    stack.append(
+                        {
+                            "type": "IF",
+                            "active": parent_active and cond_value,
+                            "parent": parent_active,
+                            "in_else": False,
+                            "cond": cond_value,
+                        }
                     )
-                continue
+                    continue
 
-            match = PRINT2_RE.match(raw)
-            if match:
-                if is_active():
-                    arg_expr = match.group(1).strip()
-                    if RE_ITEM_ANY.search(arg_expr):
+                if kind == "else":
+                    if not stack or stack[-1]["type"] != "IF":
+                        raise SyntaxError("ELSE に対応する IF がありません。")
+                    frame = stack[-1]
+                    if frame["in_else"]:
                         raise SyntaxError(
-                            "print2: 引数には #項目を直接指定できません（通常変数か '文字' を使用）"
+                            "同一 IF ブロック内で複数の ELSE は使えません。"
                         )
-                    self.last_print2 = execute_print2(
-                        arg_expr, self.eval_expr, self._format_to_text
-                    )
-                continue
-
-            match = re.match(r"^\s*if\s+(.+?)\s*$", raw, re.IGNORECASE)
-            if match:
-                if len(stack) >= MAX_NEST_DEPTH:
-                    raise SyntaxError(
-                        f"制御構文のネストが上限を超えました（最大{MAX_NEST_DEPTH}）"
-                    )
-                condition = match.group(1)
-                parent_active = is_active()
-                cond_value = False
-                if parent_active:
-                    try:
-                        cond_value = bool(self.eval_expr(condition))
-                    except Exception as exc:
-                        raise RuntimeError(
-                            f"IF 条件評価エラー: {condition} : {exc}"
-                        ) from exc
-                stack.append(
-                    {
-                        "type": "IF",
-                        "active": parent_active and cond_value,
-                        "parent": parent_active,
-                        "in_else": False,
-                        "cond": cond_value,
-                    }
-                )
-                continue
-
-            if re.match(r"^\s*else\s*$", raw, re.IGNORECASE):
-                if not stack or stack[-1]["type"] != "IF":
-                    raise SyntaxError("ELSE に対応する IF がありません。")
-                frame = stack[-1]
-                if frame["in_else"]:
-                    raise SyntaxError("同一 IF ブロック内で複数の ELSE は使えません。")
-                frame["in_else"] = True
-                frame["active"] = (not frame["cond"]) and frame["parent"]
-                continue
+                    frame["in_else"] = True
+                    frame["active"] = (not frame["cond"]) and frame["parent"]
+                    continue
 
-            if re.match(r"^\s*end\s*$", raw, re.IGNORECASE):
-                if not stack or stack[-1]["type"] != "IF":
-                    raise SyntaxError("END に対応する IF がありません。")
-                stack.pop()
-                continue
+                if kind == "end":
+                    if not stack or stack[-1]["type"] != "IF":
+                        raise SyntaxError("END に対応する IF がありません。")
+                    stack.pop()
+                    continue
 
-            match = re.match(
-                r"^\s*for\s+([A-Za-z_][A-Za-z0-9_]*)\s*=\s*(.+?)\s+to\s+(.+?)(?:\s+step\s+(.+?))?\s*$",
-                raw,
-                re.IGNORECASE,
-            )
-            if match:
-                if len(stack) >= MAX_NEST_DEPTH:
-                    raise SyntaxError(
-                        f"制御構文のネストが上限を超えました（最大{MAX_NEST_DEPTH}）"
+                if kind == "for":
+                    if len(stack) >= MAX_NEST_DEPTH:
+                        raise SyntaxError(
+                            f"制御構文のネストが上限を超えました（最大{MAX_NEST_DEPTH}）"
+                        )
+                    var_name = statement.name or ""
+                    parent_active = is_active()
+                    if not parent_active:
+                        stack.append(
+                            {
+                                "type": "FOR",
+                                "active": False,
+                                "parent": False,
+                                "skipping": True,
+                            }
+                        )
+                        continue
+                    exprs, compiled_exprs = statement.exprs, statement.compiled
+                    from_val = self.eval_expr(exprs[0], compiled_exprs[0])
+                    to_val = self.eval_expr(exprs[1], compiled_exprs[1])
+                    step_val = (
+                        self.eval_expr(exprs[2], compiled_exprs[2])
+                        if len(exprs) > 2
+                        else 1
                     )
-                var_name, from_expr, to_expr, step_expr = match.groups()
-                parent_active = is_active()
-                if not parent_active:
+                    if not all(
+                        isinstance(x, (int, float))
+                        for x in (from_val, to_val, step_val)
+                    ):
+                        raise TypeError(
+                            "FOR の範囲/ステップは数値である必要があります。"
+                        )
+                    if step_val == 0:
+                        raise ValueError("FOR の STEP に 0 は指定できません。")
+                    if (
+                        var_name != "this"
+                        and var_name.lower() == "this"
+                        and var_name not in self.vars
+                    ):
+                        self._this_alias = var_name
+                    self.vars[var_name] = from_val
                     stack.append(
                         {
                             "type": "FOR",
-                            "active": False,
-                            "parent": False,
-                            "skipping": True,
+                            "active": True,
+                            "parent": True,
+                            "var": var_name,
+                            "to": to_val,
+                            "step": step_val,
+                            "start_pc": pc,
+                            "iters": 0,
+                            "skipping": False,
                         }
                     )
                     continue
-                from_val = self.eval_expr(from_expr)
-                to_val = self.eval_expr(to_expr)
-                step_val = self.eval_expr(step_expr) if step_expr is not None else 1
-                if not all(
-                    isinstance(x, (int, float)) for x in (from_val, to_val, step_val)
-                ):
-                    raise TypeError("FOR の範囲/ステップは数値である必要があります。")
-                if step_val == 0:
-                    raise ValueError("FOR の STEP に 0 は指定できません。")
-                self.vars[var_name] = from_val
-                stack.append(
-                    {
-                        "type": "FOR",
-                        "active": True,
-                        "parent": True,
-                        "var": var_name,
-                        "to": to_val,
-                        "step": step_val,
-                        "start_pc": pc,
-                        "iters": 0,
-                        "skipping": False,
-                    }
-                )
-                continue
 
-            match = re.match(
-                r"^\s*next(?:\s+([A-Za-z_][A-Za-z0-9_]*))?\s*$", raw, re.IGNORECASE
-            )
-            if match:
-                if not stack or stack[-1]["type"] != "FOR":
-                    raise SyntaxError("NEXT に対応する FOR がありません。")
-                frame = stack[-1]
-                var_name = match.group(1)
-                if var_name and frame.get("var") != var_name:
-                    raise SyntaxError("NEXT の変数名が対応する FOR と一致しません。")
-                if frame.get("skipping"):
-                    stack.pop()
+                if kind == "next":
+                    if not stack or stack[-1]["type"] != "FOR":
+                        raise SyntaxError("NEXT に対応する FOR がありません。")
+                    frame = stack[-1]
+                    if statement.name and frame.get("var") != statement.name:
+                        raise SyntaxError(
+                            "NEXT の変数名が対応する FOR と一致しません。"
+                        )
+                    if frame.get("skipping"):
+                        stack.pop()
+                        continue
+                    variable = frame["var"]
+                    current = self.vars.get(variable, 0)
+                    step = frame["step"]
+                    limit = frame["to"]
+                    frame["iters"] += 1
+                    if frame["iters"] > MAX_FOR_ITERS:
+                        raise RuntimeError("FOR 反復回数が上限を超えました。")
+                    next_val = current + step
+                    condition = (next_val <= limit) if step > 0 else (next_val >= limit)
+                    if condition:
+                        self.vars[variable] = next_val
+                        pc = frame["start_pc"]
+                    else:
+                        stack.pop()
                     continue
-                variable = frame["var"]
-                current = self.vars.get(variable, 0)
-                step = frame["step"]
-                limit = frame["to"]
-                frame["iters"] += 1
-                if frame["iters"] > MAX_FOR_ITERS:
-                    raise RuntimeError("FOR 反復回数が上限を超えました。")
-                next_val = current + step
-                condition = (next_val <= limit) if step > 0 else (next_val >= limit)
-                if condition:
-                    self.vars[variable] = next_val
-                    pc = frame["start_pc"]
-                else:
-                    stack.pop()
-                continue
-
-            if is_active() and self.exec_function_statement(raw):
-                continue
 
-            if is_active():
-                self.exec_assign(raw)
+                if not is_active():
+                    continue
+                raw = statement.source.strip()
+                compiled = statement.compiled[0] if statement.compiled else None
+                if kind == "call":
+                    self.exec_function_statement(raw, compiled)
+                else:
+                    self.exec_assign(raw, compiled)
+        except Exception:
+            self.error_line = pc
+            self.error_source = statements[pc - 1].source if pc else None
+            raise
+        finally:
+            if profiled_line and profiler is not None:
+                profiler.record_line(
+                    profiled_line,
+                    statements[profiled_line - 1].source,
+                    perf_counter() - profiled_started,
+                )
 
         if stack:
             raise SyntaxError("ブロックの閉じ忘れがあります（END/NEXT の不足）。")
 
         return dict(self.vars)
 
-    def exec_function_statement(self, line: str) -> bool:
+    def exec_function_statement(
+        self, line: str, compiled: CompiledExpr | None = None
+    ) -> bool:
         """`strcat(B, A)` のような関数ステートメントを実行する。
 
         Args:
             line: ステートメント形式の関数呼び出し文字列。
+            compiled: `line` を構文解析済みの場合はその結果。
 
         Returns:
             ステートメントとして解釈できた場合は ``True``、それ以外は ``False``。
@@ -520,16 +1021,10 @@ def exec_function_statement(self, line: str) -> bool:
         Raises:
             TypeError: 引数数や引数型がステートメント仕様に反した場合。
         """
-        try:
-            expr = ast.parse(line, mode="eval")
-        except SyntaxError:
-            return False
-        node = expr.body
-        if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Name):
-            return False
-        name = node.func.id.lower()
-        if name not in STATEMENT_FUNCTIONS:
+        call = statement_call(line)
+        if call is None:
             return False
+        name, node = call
         if not node.args:
             raise TypeError(f"{name}: 引数が不足しています。")
         dest_node = node.args[0]
@@ -538,60 +1033,20 @@ def exec_function_statement(self, line: str) -> bool:
         dest = "this" if dest_node.id.lower() == "this" else dest_node.id
         if dest == "this":
             raise TypeError(f"{name}: 第1引数に this は指定できません。")
-        value = self.eval_expr(line)
-        formatted_value = format_roundjisb_output(value, self.last_format_hint)
-        if formatted_value is not None and isinstance(value, (int, float)):
-            value = FormatAwareNumber(float(value), formatted_value)
+        value = self._with_format(self.eval_expr(line, compiled))
         self.vars[dest] = value
-        if self.last_format_hint is not None or formatted_value is not None:
-            self.var_formats[dest] = (self.last_format_hint, formatted_value)
+        if self.last_format_hint is not None:
+            self.var_formats[dest] = self.last_format_hint
         else:
             self.var_formats.pop(dest, None)
         return True
 
-    def _validate_call(self, call: ast.Call, name: str) -> None:
-        """`str_comp` 呼び出し専用の構文検証を行う。
-
-        Args:
-            call: 解析済みの関数呼び出しノード。
-            name: 小文字化された関数名。
-
-        Raises:
-            TypeError: Lab-Aid の `str_comp` 仕様に違反する引数構成だった場合。
-        """
-        if name != "str_comp":
-            return
-        argc = len(call.args)
-        if argc < 2:
-            raise TypeError("str_comp: 引数数が不正です。")
-        first = call.args[0]
-        if isinstance(first, ast.Constant) and isinstance(first.value, str):
-            raise TypeError("str_comp: 第1引数には文字列リテラルを指定できません。")
-        if argc == 3:
-            index_node = call.args[1]
-            target = call.args[2]
-            if not isinstance(index_node, ast.Name):
-                raise TypeError("str_comp: 第2引数には変数を指定してください。")
-            if not isinstance(target, ast.Constant) or not isinstance(
-                target.value, str
-            ):
-                raise TypeError(
-                    "str_comp: 第3引数には文字列リテラルを指定してください。"
-                )
-        if argc == 4:
-            for idx_node in call.args[2:]:
-                if not isinstance(idx_node, (ast.Constant, ast.Name)):
-                    raise TypeError("str_comp: 試験回指定が不正です。")
-                if isinstance(idx_node, ast.Constant) and not isinstance(
-                    idx_node.value, int
-                ):
-                    raise TypeError("str_comp: 試験回には整数を指定してください。")
-
-    def exec_assign(self, line: str) -> None:
+    def exec_assign(self, line: str, compiled: CompiledExpr | None = None) -> None:
         """代入文を解析して右辺式を評価し、変数へ格納する。
 
         Args:
             line: `=` を含む Lab-Aid の代入文。
+            compiled: 右辺式を構文解析済みの場合はその結果。
 
         Raises:
             SyntaxError: `=` を含まない、または REM 行以外の不正な代入文だった場合。
@@ -609,20 +1064,25 @@ def exec_assign(self, line: str) -> None:
         if lhs.lower() == "this":
             lhs = "this"
 
-        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", lhs) and lhs != "this":
+        if not IDENTIFIER_RE.fullmatch(lhs) and lhs != "this":
             raise NameError(f"左辺変数名が不正: {lhs}")
 
-        value = self.eval_expr(rhs)
-        formatted_value = format_roundjisb_output(value, self.last_format_hint)
-        if formatted_value is not None and isinstance(value, (int, float)):
-            value = FormatAwareNumber(float(value), formatted_value)
+        value = self._with_format(self.eval_expr(rhs, compiled))
         self.vars[lhs] = value
 
-        if self.last_format_hint is not None or formatted_value is not None:
-            self.var_formats[lhs] = (self.last_format_hint, formatted_value)
+        hint = self.last_format_hint
+        if hint is not None:
+            self.var_formats[lhs] = hint
         else:
             self.var_formats.pop(lhs, None)
 
         if lhs == "this":
             self.this_assigned_count += 1
-            self.this_formatted = formatted_value
+            self.this_output = (value, hint) if hint is not None else None
+
+    def _with_format(self, value: Any) -> Any:
+        """直近のヒントがあれば数値を `FormatAwareNumber` で包む（整形は行わない）。"""
+        hint = self.last_format_hint
+        if hint is None or not isinstance(value, (int, float)):
+            return value
+        return FormatAwareNumber(value, hint)
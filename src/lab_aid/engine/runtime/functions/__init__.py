@@ -4,15 +4,17 @@
 
 from .base import (
     BuiltinNumericResult,
+    FormatHint,
     collect_numeric_values,
     ensure_int,
     ensure_number,
     force_int_if_integral,
+    iter_numeric_values,
     normalize_number,
     select_value,
     to_decimal,
 )
-from .numeric import NUMERIC_FUNCTIONS, format_roundjisb_output
+from .numeric import NUMERIC_FUNCTIONS, PURE_FUNCTIONS, format_roundjisb_output
 from .package import PACKAGE_FUNCTIONS
 from .string import STRING_FUNCTIONS, str_comp
 
@@ -20,11 +22,14 @@
     "NUMERIC_FUNCTIONS",
     "STRING_FUNCTIONS",
     "PACKAGE_FUNCTIONS",
+    "PURE_FUNCTIONS",
     "BuiltinNumericResult",
+    "FormatHint",
     "collect_numeric_values",
     "ensure_int",
     "ensure_number",
     "force_int_if_integral",
+    "iter_numeric_values",
     "normalize_number",
     "to_decimal",
     "select_value",
@@ -2,10 +2,39 @@
 
 from __future__ import annotations
 
+from collections.abc import Iterable
 from dataclasses import dataclass
 from decimal import Decimal
 from typing import Any
 
+from ..series import MeasurementSeries
+
+
+@dataclass(frozen=True, slots=True)
+class FormatHint:
+    """`roundjisb` 系のビルトインが返す表示形式の指定。
+
+    文字列への変換は `format_roundjisb_output` で表示が必要になった時点で行う。
+
+    Attributes:
+        kind: 小数部の桁数を固定する ``"fixed"``、または有効数字の ``"sig"``。
+        digits: 桁数。
+    """
+
+    kind: str
+    digits: int
+
+    @classmethod
+    def parse(cls, text: str) -> FormatHint | None:
+        """`fixed:n`・`sig:n` 形式の文字列を変換する。該当しなければ ``None``。"""
+        kind, sep, digits = text.partition(":")
+        if not sep or kind not in ("fixed", "sig"):
+            return None
+        return cls(kind, int(digits))
+
+    def __str__(self) -> str:
+        return f"{self.kind}:{self.digits}"
+
 
 @dataclass
 class BuiltinNumericResult:
@@ -17,7 +46,7 @@ class BuiltinNumericResult:
     """
 
     value: Any
-    format_hint: str | None = None
+    format_hint: FormatHint | None = None
 
 
 def to_decimal(value: Any) -> Decimal:
@@ -117,6 +146,8 @@ def collect_numeric_values(source: Any, func: str) -> list[float]:
         ValueError: 空リストが指定された場合。
         TypeError: リスト内に非数値が含まれる場合。
     """
+    if isinstance(source, MeasurementSeries):
+        return list(source.numbers())
     if isinstance(source, list):
         values = [ensure_number(item, func) for item in source]
         if not values:
@@ -125,17 +156,39 @@ def collect_numeric_values(source: Any, func: str) -> list[float]:
     return [ensure_number(source, func)]
 
 
+def iter_numeric_values(source: Any, func: str) -> tuple[int, Iterable[float]]:
+    """`collect_numeric_values` と同じ値を、件数と値の並びの組で返す。
+
+    `MeasurementSeries` はリストへ展開せず、ファイルの値を順に読む並びを返す。
+
+    Args:
+        source: 単一値・値リスト・測定値ファイルの列。
+        func: エラーメッセージに利用する関数名。
+
+    Returns:
+        `(件数, 値の並び)` のタプル。
+
+    Raises:
+        ValueError: 空リストが指定された場合。
+        TypeError: リスト内に非数値が含まれる場合。
+    """
+    if isinstance(source, MeasurementSeries):
+        return len(source), source.numbers()
+    values = collect_numeric_values(source, func)
+    return len(values), values
+
+
 def select_value(source: Any, index: int | None) -> Any:
     """リストから指定位置の値を取り出すか、単一値をそのまま返す。
 
     Args:
-        source: 単一値または値リスト。
+        source: 単一値・値リスト・測定値ファイルの列。
         index: 1 始まりのインデックス。省略時は先頭を選択。
 
     Returns:
         選択された値。範囲外の場合は空文字列を返す。
     """
-    if isinstance(source, list):
+    if isinstance(source, (list, MeasurementSeries)):
         if not source:
             return ""
         if index is None:
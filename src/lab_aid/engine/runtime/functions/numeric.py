@@ -4,7 +4,7 @@
 
 import math
 import statistics
-from collections.abc import Sequence
+from collections.abc import Iterable, Sequence
 from decimal import (
     ROUND_DOWN,
     ROUND_FLOOR,
@@ -13,14 +13,16 @@
     Decimal,
     InvalidOperation,
 )
+from itertools import chain
 from typing import Any
 
 from .base import (
     BuiltinNumericResult,
-    collect_numeric_values,
+    FormatHint,
     ensure_int,
     ensure_number,
     force_int_if_integral,
+    iter_numeric_values,
     normalize_number,
     to_decimal,
 )
@@ -165,7 +167,7 @@ def modd_func(args: Sequence[Any]) -> BuiltinNumericResult:
     exponent = int(fraction_dec.as_tuple().exponent)
     digits = max(0, -exponent)
     fraction = float(fraction_dec)
-    format_hint = f"fixed:{digits}" if digits > 0 else None
+    format_hint = FormatHint("fixed", digits) if digits > 0 else None
     return BuiltinNumericResult(normalize_number(fraction), format_hint)
 
 
@@ -203,7 +205,7 @@ def round_func(args: Sequence[Any]) -> BuiltinNumericResult:
             quantum = Decimal(1).scaleb(exponent)
             quantized = dec.quantize(quantum, rounding=ROUND_HALF_UP)
         value = force_int_if_integral(quantized, ROUND_HALF_UP)
-        format_hint = f"sig:{x}" if x > 0 else None
+        format_hint = FormatHint("sig", x) if x > 0 else None
         return BuiltinNumericResult(value, format_hint)
 
     step = to_decimal(z) * Decimal(1).scaleb(-x)
@@ -213,7 +215,7 @@ def round_func(args: Sequence[Any]) -> BuiltinNumericResult:
     rounded = scaled.quantize(Decimal(1), rounding=ROUND_HALF_UP)
     quantized = (rounded * step).quantize(step, rounding=ROUND_HALF_UP)
     value = force_int_if_integral(quantized, ROUND_HALF_UP)
-    format_hint = f"fixed:{x}" if x >= 0 else None
+    format_hint = FormatHint("fixed", x) if x >= 0 else None
     return BuiltinNumericResult(value, format_hint)
 
 
@@ -244,7 +246,7 @@ def roundjisb_func(args: Sequence[Any]) -> BuiltinNumericResult:
     if f == 1:
         quantized = dec_value.quantize(Decimal(f"1e-{p}"), rounding=ROUND_HALF_UP)
         value = force_int_if_integral(quantized, ROUND_HALF_UP)
-        return BuiltinNumericResult(normalize_number(value), f"fixed:{p}")
+        return BuiltinNumericResult(normalize_number(value), FormatHint("fixed", p))
     if dec_value.is_zero():
         quantized = Decimal(0)
     else:
@@ -254,7 +256,7 @@ def roundjisb_func(args: Sequence[Any]) -> BuiltinNumericResult:
             Decimal(f"1e{quant_exp}"), rounding=ROUND_HALF_UP
         )
     value = force_int_if_integral(quantized, ROUND_HALF_UP)
-    return BuiltinNumericResult(normalize_number(value), f"sig:{p}")
+    return BuiltinNumericResult(normalize_number(value), FormatHint("sig", p))
 
 
 def floor_func(args: Sequence[Any]) -> BuiltinNumericResult:
@@ -322,6 +324,19 @@ def trunc_func(args: Sequence[Any]) -> BuiltinNumericResult:
     return BuiltinNumericResult(force_int_if_integral(quantized, ROUND_HALF_EVEN))
 
 
+def _chain_numeric_values(
+    args: Sequence[Any], func: str
+) -> tuple[int, Iterable[float]]:
+    """全引数の値を 1 つの並びとしてつなぎ、件数とともに返す。
+
+    値を 1 つのリストへ集めた場合と同じ順に読むため、`sum` や `statistics` の
+    結果はリストの場合と一致する。測定値ファイルの列は展開せずに読む。
+    """
+    parts = [iter_numeric_values(arg, func) for arg in args]
+    count = sum(size for size, _values in parts)
+    return count, chain.from_iterable(values for _size, values in parts)
+
+
 def max_func(args: Sequence[Any]) -> BuiltinNumericResult:
     """最大値を返す。
 
@@ -337,12 +352,12 @@ def max_func(args: Sequence[Any]) -> BuiltinNumericResult:
     if not args:
         raise TypeError("max: 引数を1つ以上指定してください。")
     if len(args) == 1:
-        numbers = collect_numeric_values(args[0], "max")
+        _count, numbers = iter_numeric_values(args[0], "max")
         return BuiltinNumericResult(normalize_number(max(numbers)))
     best: float | None = None
     for arg in args:
-        values = collect_numeric_values(arg, "max")
-        candidate = sum(values) / len(values)
+        count, values = iter_numeric_values(arg, "max")
+        candidate = sum(values) / count
         if best is None or candidate > best:
             best = candidate
     if best is None:
@@ -365,12 +380,12 @@ def min_func(args: Sequence[Any]) -> BuiltinNumericResult:
     if not args:
         raise TypeError("min: 引数を1つ以上指定してください。")
     if len(args) == 1:
-        numbers = collect_numeric_values(args[0], "min")
+        _count, numbers = iter_numeric_values(args[0], "min")
         return BuiltinNumericResult(normalize_number(min(numbers)))
     best: float | None = None
     for arg in args:
-        values = collect_numeric_values(arg, "min")
-        candidate = sum(values) / len(values)
+        count, values = iter_numeric_values(arg, "min")
+        candidate = sum(values) / count
         if best is None or candidate < best:
             best = candidate
     if best is None:
@@ -392,10 +407,8 @@ def ave_func(args: Sequence[Any]) -> BuiltinNumericResult:
     """
     if not args:
         raise TypeError("ave: 引数を1つ以上指定してください。")
-    values: list[float] = []
-    for arg in args:
-        values.extend(collect_numeric_values(arg, "ave"))
-    result = sum(values) / len(values)
+    count, values = _chain_numeric_values(args, "ave")
+    result = sum(values) / count
     return BuiltinNumericResult(normalize_number(result))
 
 
@@ -415,7 +428,7 @@ def sum_func(args: Sequence[Any]) -> BuiltinNumericResult:
         raise TypeError("sum: 引数を1つ以上指定してください。")
     total = 0.0
     for arg in args:
-        total += sum(collect_numeric_values(arg, "sum"))
+        total += sum(iter_numeric_values(arg, "sum")[1])
     return BuiltinNumericResult(normalize_number(total))
 
 
@@ -434,10 +447,8 @@ def stdev_func(args: Sequence[Any]) -> BuiltinNumericResult:
     """
     if not args:
         raise TypeError("stdev: 引数を2つ以上指定してください。")
-    values: list[float] = []
-    for arg in args:
-        values.extend(collect_numeric_values(arg, "stdev"))
-    if len(values) < 2:
+    count, values = _chain_numeric_values(args, "stdev")
+    if count < 2:
         raise ValueError("stdev: 少なくとも2つの値が必要です。")
     return BuiltinNumericResult(normalize_number(statistics.stdev(values)))
 
@@ -457,10 +468,8 @@ def stdeva_func(args: Sequence[Any]) -> BuiltinNumericResult:
     """
     if not args:
         raise TypeError("stdeva: 引数を2つ以上指定してください。")
-    values: list[float] = []
-    for arg in args:
-        values.extend(collect_numeric_values(arg, "stdeva"))
-    if len(values) < 2:
+    count, values = _chain_numeric_values(args, "stdeva")
+    if count < 2:
         raise ValueError("stdeva: 少なくとも2つの値が必要です。")
     return BuiltinNumericResult(normalize_number(statistics.pstdev(values)))
 
@@ -485,6 +494,9 @@ def stdeva_func(args: Sequence[Any]) -> BuiltinNumericResult:
     "stdeva": stdeva_func,
 }
 
+# 結果が引数だけで決まり、同じ引数で呼び直すと同じ値・フォーマットヒントを返す関数。
+PURE_FUNCTIONS = frozenset(NUMERIC_FUNCTIONS)
+
 
 def _format_fixed_frac(dec: Decimal, digits: int) -> str:
     """固定小数点形式で文字列整形する。
@@ -523,29 +535,32 @@ def _format_sig_digits(dec: Decimal, sig: int) -> str:
     return f"{quantized:.{frac}f}"
 
 
-def format_roundjisb_output(value: Any, format_hint: str | None) -> str | None:
+def format_roundjisb_output(
+    value: Any, format_hint: FormatHint | str | None
+) -> str | None:
     """`roundjisb` 系のフォーマットヒントに従い文字列化する。
 
     Args:
         value: 整形対象の値。
-        format_hint: `fixed:n` または `sig:n` 形式のヒント。`None` なら変換しない。
+        format_hint: `FormatHint`、または `fixed:n`・`sig:n` 形式の文字列。
+            `None` なら変換しない。
 
     Returns:
         整形済み文字列。ヒントが無効な場合は `None`。
     """
-    if not format_hint:
+    if isinstance(format_hint, str):
+        format_hint = FormatHint.parse(format_hint)
+    if format_hint is None:
         return None
     try:
         dec_value = to_decimal(value)
     except (InvalidOperation, TypeError, ValueError):
         return None
-    if format_hint.startswith("fixed:"):
-        digits = int(format_hint.split(":", 1)[1])
-        return _format_fixed_frac(dec_value, digits)
-    if format_hint.startswith("sig:"):
-        digits = int(format_hint.split(":", 1)[1])
-        return _format_sig_digits(dec_value, digits)
+    if format_hint.kind == "fixed":
+        return _format_fixed_frac(dec_value, format_hint.digits)
+    if format_hint.kind == "sig":
+        return _format_sig_digits(dec_value, format_hint.digits)
     return None
 
 
-__all__ = ["NUMERIC_FUNCTIONS", "format_roundjisb_output"]
+__all__ = ["NUMERIC_FUNCTIONS", "PURE_FUNCTIONS", "format_roundjisb_output"]
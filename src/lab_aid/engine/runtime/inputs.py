@@ -2,10 +2,13 @@
 
 from __future__ import annotations
 
+import os
 import re
+from collections.abc import Collection, Iterable, Iterator, Mapping
 from dataclasses import dataclass
 from typing import Any
 
+from .series import MeasurementSeries, open_measurements
 from .text import (
     parse_number_like,
     replace_word_ci_outside_quotes,
@@ -22,6 +25,10 @@
     r"^\s*(#?[A-Za-z0-9_]+(?:\.[A-Za-z0-9_]+)?(?:\[[A-Za-z0-9_]+\])?)\s*=\s*(.+?)\s*$"
 )
 THIS_ASSIGN_RE = re.compile(r"^\s*this\s*=", re.IGNORECASE)
+# `NAME=file('path')`・`NAME=file('path', 'f64')` 形式の測定値ファイルの参照。
+RE_FILE_VALUE = re.compile(
+    r"^file\(\s*'((?:[^']|'')+)'\s*(?:,\s*'([A-Za-z0-9]+)'\s*)?\)$", re.IGNORECASE
+)
 
 
 @dataclass
@@ -98,14 +105,102 @@ def _parse_value(token: str, line_no: int) -> Any:
     )
 
 
-def parse_inputs_E(inputs: str) -> dict[Any, Any]:
+def input_line_key(raw: str) -> str | tuple[str, str] | None:
+    """入力行 `#CODE[UNIT]=VALUE` から項目のキーを取り出す（書式は検証しない）。
+
+    Args:
+        raw: E タイプ入力の 1 行。
+
+    Returns:
+        `CODE` または `(CODE, UNIT)`。`=` を含まない行は ``None``。
+    """
+    name, sep, _value = raw.partition("=")
+    if not sep:
+        return None
+    name = name.strip().removeprefix("#")
+    if "[" in name and name.endswith("]"):
+        code, unit = name[:-1].split("[", 1)
+        return (code, unit)
+    return name
+
+
+def _split_input_line(raw: str, index: int) -> tuple[Any, str]:
+    """入力 1 行の書式と項目名を検証し、`(キー, 値文字列)` を返す。
+
+    Args:
+        raw: E タイプ入力の 1 行。
+        index: エラーメッセージ用の行番号。
+
+    Returns:
+        `CODE` または `(CODE, UNIT)` のキーと、`=` 以降の値文字列。
+
+    Raises:
+        ValueError: 行の書式が `NAME=VALUE` に一致しない、または項目名が不正な場合。
+    """
+    match = RE_INPUT_LINE.match(raw.strip())
+    if not match:
+        raise ValueError(f"E入力の書式エラー（{index}行目）: {raw!r}")
+    name, value_str = match.group(1), match.group(2).strip()
+
+    name_no_hash = name[1:] if name.startswith("#") else name
+    unit = None
+    if "[" in name_no_hash and name_no_hash.endswith("]"):
+        code, unit = name_no_hash[:-1].split("[", 1)
+    else:
+        code = name_no_hash
+
+    validate_hash_name(code, unit)
+    return (code if unit is None else (code, unit)), value_str
+
+
+def _parse_values(
+    value_str: str, index: int, measurement_dir: str | os.PathLike[str] | None
+) -> Any:
+    """値文字列を単一値、または複数値（測定値）のリストへ変換する。
+
+    `file('path')` 形式は `measurement_dir` 配下の測定値ファイルを開き、
+    `MeasurementSeries` を返す。`measurement_dir` が ``None`` の場合は参照できない。
+    """
+    match = RE_FILE_VALUE.match(value_str)
+    if match:
+        if measurement_dir is None:
+            raise ValueError(
+                f"測定値ファイルの参照は許可されていません（{index}行目）。"
+                "基準ディレクトリ（measurement_dir）を指定してください。"
+            )
+        path = match.group(1).replace("''", "'")
+        try:
+            return open_measurements(path, match.group(2), base_dir=measurement_dir)
+        except OSError as exc:
+            raise ValueError(
+                f"測定値ファイルを開けません（{index}行目）: {path} : {exc.strerror}"
+            ) from exc
+    values_raw = _split_multi_values(value_str)
+    if values_raw:
+        parsed_values = [_parse_value(token, index) for token in values_raw]
+        return parsed_values if len(parsed_values) > 1 else parsed_values[0]
+    return _parse_value(value_str.strip(), index)
+
+
+def parse_inputs_E(
+    inputs: str,
+    only: Collection[str | tuple[str, str]] | None = None,
+    *,
+    measurement_dir: str | os.PathLike[str] | None = None,
+) -> dict[Any, Any]:
     """E タイプ計算のために複数行の `NAME=VALUE` を解析する。
 
     Args:
         inputs: 複数行で構成される Lab-Aid 入力文字列。
+        only: 指定した場合、このキー（`CODE` または `(CODE, UNIT)`）に一致しない
+            行は書式・値の検証をせずに読み飛ばす。キーはスクリプトの
+            `extract_dependencies(...).keys()` から得られる。
+        measurement_dir: `file('path')` で参照できる測定値ファイルの基準
+            ディレクトリ。``None`` の場合、`file('path')` はエラーになる。
 
     Returns:
         試験項目コードや単位をキーにした辞書。複数値はリストで保持する。
+        測定値ファイルの `MeasurementSeries` は `close_measurements` で閉じる。
 
     Raises:
         ValueError: 行の書式が `NAME=VALUE` に一致しない場合。
@@ -113,38 +208,219 @@ def parse_inputs_E(inputs: str) -> dict[Any, Any]:
     items: dict[Any, Any] = {}
     if not inputs or not inputs.strip():
         return items
-    for index, raw in enumerate(inputs.splitlines(), 1):
-        line = raw.strip()
-        if not line or line.lower().startswith("rem"):
-            continue
-        match = RE_INPUT_LINE.match(line)
-        if not match:
-            raise ValueError(f"E入力の書式エラー（{index}行目）: {raw!r}")
-        name, value_str = match.group(1), match.group(2).strip()
-
-        name_no_hash = name[1:] if name.startswith("#") else name
-        unit = None
-        if "[" in name_no_hash and name_no_hash.endswith("]"):
-            code, unit = name_no_hash[:-1].split("[", 1)
-        else:
-            code = name_no_hash
-
-        validate_hash_name(code, unit)
-
-        values_raw = _split_multi_values(value_str)
-        if values_raw:
-            parsed_values = [_parse_value(token, index) for token in values_raw]
-            value: Any = parsed_values if len(parsed_values) > 1 else parsed_values[0]
-        else:
-            value = _parse_value(value_str.strip(), index)
-
-        if unit is None:
-            items[code] = value
-        else:
-            items[(code, unit)] = value
+    try:
+        for index, raw in enumerate(inputs.splitlines(), 1):
+            line = raw.strip()
+            if not line or line.lower().startswith("rem"):
+                continue
+            if only is not None:
+                key = input_line_key(line)
+                if key is not None and key not in only:
+                    continue
+            key, value_str = _split_input_line(raw, index)
+            items[key] = _parse_values(value_str, index, measurement_dir)
+    except BaseException:
+        close_measurements(items.values())
+        raise
     return items
 
 
+class LazyInputs(Mapping[Any, Any]):
+    """E タイプ入力を参照時に解析する試験項目マップ。
+
+    構築時は各行の `NAME=` 部分からキーと行位置の索引だけを作り、書式・項目名・
+    値の検証と変換は、その項目が初めて参照されたときに行う。参照されない行の
+    誤りは検出しないため、`parse_inputs_E` と同じ検証が必要な場合はそちらを使う。
+    同じ項目が複数行にある場合は `parse_inputs_E` と同じく後の行を採用する。
+
+    Args:
+        inputs: 複数行で構成される Lab-Aid 入力文字列。
+        measurement_dir: `file('path')` で参照できる測定値ファイルの基準
+            ディレクトリ。
+    """
+
+    def __init__(
+        self, inputs: str, *, measurement_dir: str | os.PathLike[str] | None = None
+    ) -> None:
+        self._measurement_dir = measurement_dir
+        self._lines: dict[Any, tuple[int, str]] = {}
+        self._values: dict[Any, Any] = {}
+        self._tokens: dict[Any, list[str]] = {}
+        for index, raw in enumerate((inputs or "").splitlines(), 1):
+            line = raw.strip()
+            if not line or line.lower().startswith("rem"):
+                continue
+            key = input_line_key(line)
+            if key is not None:
+                self._lines[key] = (index, raw)
+
+    def __getitem__(self, key: Any) -> Any:
+        if key in self._values:
+            return self._values[key]
+        index, raw = self._lines[key]
+        _key, value_str = _split_input_line(raw, index)
+        value = self._values[key] = _parse_values(
+            value_str, index, self._measurement_dir
+        )
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._lines
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._lines)
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def close(self) -> None:
+        """解析済みの項目が開いた測定値ファイルを閉じる。"""
+        close_measurements(self._values.values())
+
+    def select(self, key: Any, position: int) -> Any:
+        """1 件の測定値だけを解析し、`select_value(値, position)` が同じ結果を返す値を作る。
+
+        複数値の項目では、要素数は元のリストと同じで `position` 番目だけが解析済みの
+        リストを返す（他の要素は ``None``）。単一値の項目は値そのものを返す。
+
+        Args:
+            key: `CODE` または `(CODE, UNIT)`。
+            position: 1 始まりの測定値の番号。
+
+        Returns:
+            `position` 番目以外を参照しない呼び出し元向けの値。
+
+        Raises:
+            KeyError: 項目が存在しない場合。
+            ValueError: 行の書式・項目名、または対象の測定値が不正な場合。
+        """
+        if key in self._values:
+            return self._values[key]
+        index, raw = self._lines[key]
+        tokens = self._tokens.get(key)
+        if tokens is None:
+            _key, value_str = _split_input_line(raw, index)
+            if RE_FILE_VALUE.match(value_str):
+                return self[key]
+            tokens = self._tokens[key] = _split_multi_values(value_str)
+        if len(tokens) <= 1:
+            return self[key]
+        selected: list[Any] = [None] * len(tokens)
+        if position <= len(tokens):
+            selected[position - 1] = _parse_value(tokens[position - 1], index)
+        return selected
+
+
+def close_measurements(values: Iterable[Any]) -> None:
+    """値のうち `MeasurementSeries` をすべて閉じる。
+
+    Args:
+        values: `parse_inputs_E` が返した辞書の値など。
+    """
+    for value in values:
+        if isinstance(value, MeasurementSeries):
+            value.close()
+
+
+def structured_inputs_E(values: Mapping[Any, Any]) -> Mapping[Any, Any]:
+    """E タイプの入力を、文字列を介さずにキーと値のマップとして受け取る。
+
+    キーは `parse_inputs_E` と同じ `CODE` または `(CODE, UNIT)`。値は数値・文字列・
+    `VarRef`、または測定値の列（リスト・タプル・`tolist()` を持つ配列）を受け付ける。
+    リストはコピーせずにそのまま用い、それ以外の列はリストへ変換する。要素が 1 つの
+    列は `NAME=VALUE` 形式と同じく単一値として扱う。値の変換が不要な場合は
+    `values` 自体を返す。
+
+    Args:
+        values: 試験項目のキーと値のマップ。
+
+    Returns:
+        `Engine.items` に渡せるマップ。
+
+    Raises:
+        TypeError: キーや値の型が不正な場合。
+        ValueError: 項目名が Lab-Aid 仕様に違反する、または測定値の列が空の場合。
+    """
+    if not isinstance(values, Mapping):
+        raise TypeError(
+            "Eタイプの入力には試験項目のキーと値のマップを指定してください。"
+        )
+    normalized: dict[Any, Any] | None = None
+    for key, value in values.items():
+        label = _validate_input_key(key)
+        item = _structured_value(value, label)
+        if item is not value:
+            if normalized is None:
+                normalized = dict(values)
+            normalized[key] = item
+    return values if normalized is None else normalized
+
+
+def _validate_input_key(key: Any) -> str:
+    """構造化入力のキーを検証し、エラーメッセージ用の `#CODE[UNIT]` 表記を返す。"""
+    if isinstance(key, str):
+        validate_hash_name(key, None)
+        return f"#{key}"
+    if (
+        isinstance(key, tuple)
+        and len(key) == 2
+        and all(isinstance(part, str) for part in key)
+    ):
+        validate_hash_name(key[0], key[1])
+        return f"#{key[0]}[{key[1]}]"
+    raise TypeError(
+        f"E入力のキーは 'CODE' または ('CODE', 'UNIT') を指定してください: {key!r}"
+    )
+
+
+def _structured_value(value: Any, label: str) -> Any:
+    """構造化入力の値を検証し、`_parse_values` と同じ形の値を返す。"""
+    if isinstance(value, (VarRef, MeasurementSeries)) or _is_scalar(value):
+        return value
+    if not isinstance(value, list):
+        if hasattr(value, "tolist"):
+            return _structured_value(value.tolist(), label)
+        if isinstance(value, (bytes, Mapping)) or not isinstance(value, Iterable):
+            raise TypeError(
+                f"E入力の値は数値・文字列・測定値の列を指定してください: {label}={value!r}"
+            )
+        value = list(value)
+    if not value:
+        raise ValueError(f"E入力の測定値が空です: {label}")
+    for element in value:
+        if not _is_scalar(element):
+            raise TypeError(
+                f"E入力の測定値は数値または文字列を指定してください: {label}={element!r}"
+            )
+    return value if len(value) > 1 else value[0]
+
+
+def _is_scalar(value: Any) -> bool:
+    return isinstance(value, (int, float, str)) and not isinstance(value, bool)
+
+
+def structured_input_R(value: Any) -> tuple[Any, str]:
+    """R タイプの入力値を、文字列を介さずに受け取る。
+
+    Args:
+        value: 数値または文字列。`tolist()` を持つ配列のスカラーも受け付ける。
+
+    Returns:
+        `parse_input_R` と同じ `(値, リテラル文字列)` のタプル。数値のリテラルは
+        `str()` 相当の表記になる。
+
+    Raises:
+        TypeError: 数値・文字列以外が指定された場合。
+    """
+    if not _is_scalar(value) and hasattr(value, "tolist"):
+        value = value.tolist()
+    if not _is_scalar(value):
+        raise TypeError(
+            f"Rタイプの入力値は数値または文字列を指定してください: {value!r}"
+        )
+    return value, value if isinstance(value, str) else f"{value}"
+
+
 def parse_input_R(value: str) -> tuple[Any, str]:
     """R タイプ計算で用いる単一値を解析する。
 
@@ -217,9 +493,14 @@ def replace_rhs_this_for_R(script: str) -> str:
 __all__ = [
     "RE_ITEM_ANY",
     "RE_ITEM_STRICT",
+    "LazyInputs",
     "VarRef",
+    "close_measurements",
+    "input_line_key",
     "parse_inputs_E",
     "parse_input_R",
     "ensure_has_this_assignment_E",
     "replace_rhs_this_for_R",
+    "structured_input_R",
+    "structured_inputs_E",
 ]
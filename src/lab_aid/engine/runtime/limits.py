@@ -0,0 +1,94 @@
+"""1 回の評価に割り当てる実行予算（ステップ数・時間・サイズ）。"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Any
+
+from .series import MeasurementSeries
+
+
+class BudgetExceededError(RuntimeError):
+    """評価予算を超過した場合に送出される例外。
+
+    Attributes:
+        budget: 超過した予算の種別（`steps`・`timeout`・`text`・`list`）。
+    """
+
+    def __init__(self, budget: str, message: str) -> None:
+        super().__init__(message)
+        self.budget = budget
+
+
+@dataclass(frozen=True)
+class EvaluationLimits:
+    """評価 1 回あたりの実行予算。
+
+    `MAX_FOR_ITERS` がループ単体の上限であるのに対し、こちらはスクリプト全体に
+    対する上限を表す。``None`` の項目は無制限として扱う。
+
+    Attributes:
+        max_steps: 実行するステートメント数の上限（FOR の反復による再実行も含む）。
+        timeout: 実行開始からの経過時間の上限（秒）。
+        max_text_length: 変数・関数結果として保持できる文字列長の上限。
+        max_list_length: 参照できる複数測定値（リスト・測定値ファイル）の要素数の上限。
+    """
+
+    max_steps: int | None = None
+    timeout: float | None = None
+    max_text_length: int | None = None
+    max_list_length: int | None = None
+
+    def deadline(self) -> float | None:
+        """現在時刻を起点とした `perf_counter` 基準の締め切り時刻を返す。"""
+        if self.timeout is None:
+            return None
+        return perf_counter() + self.timeout
+
+    def check_step(self, steps: int, deadline: float | None) -> None:
+        """ステップ数と締め切り時刻を検査する。
+
+        Args:
+            steps: これまでに実行したステートメント数。
+            deadline: `deadline()` で得た締め切り時刻。
+
+        Raises:
+            BudgetExceededError: いずれかの予算を超過した場合。
+        """
+        if self.max_steps is not None and steps > self.max_steps:
+            raise BudgetExceededError(
+                "steps", f"実行ステップ数が上限を超えました（最大{self.max_steps}）"
+            )
+        if deadline is not None and perf_counter() > deadline:
+            raise BudgetExceededError(
+                "timeout", f"実行時間が上限を超えました（最大{self.timeout}秒）"
+            )
+
+    def check_value(self, value: Any) -> None:
+        """値の文字列長・要素数を検査する。
+
+        Args:
+            value: 検査対象の値。
+
+        Raises:
+            BudgetExceededError: 文字列長または要素数が上限を超えた場合。
+        """
+        if isinstance(value, str):
+            if self.max_text_length is not None and len(value) > self.max_text_length:
+                raise BudgetExceededError(
+                    "text",
+                    f"文字列長が上限を超えました（最大{self.max_text_length}）",
+                )
+        elif (
+            isinstance(value, (list, MeasurementSeries))
+            and self.max_list_length is not None
+            and len(value) > self.max_list_length
+        ):
+            raise BudgetExceededError(
+                "list",
+                f"測定値の個数が上限を超えました（最大{self.max_list_length}）",
+            )
+
+
+__all__ = ["BudgetExceededError", "EvaluationLimits"]
@@ -0,0 +1,287 @@
+"""Lab-Aid スクリプトを実行せずに検査する静的解析。"""
+
+from __future__ import annotations
+
+import ast
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from .api import assert_no_hash_usage
+from .constants import MAX_NEST_DEPTH
+from .engine_core import (
+    ELSE_RE,
+    END_RE,
+    FOR_RE,
+    FUNCTION_DISPATCH,
+    IDENTIFIER_RE,
+    IF_RE,
+    NEXT_RE,
+    PRINT2_RE,
+    PRINT_RE,
+    STATEMENT_FUNCTIONS,
+    compile_expr,
+    validate_call,
+)
+from .inputs import RE_ITEM_ANY, ensure_has_this_assignment_E, replace_rhs_this_for_R
+from .result import error_code_for
+from .text import strip_comment_quote_aware
+
+_BIN_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div)
+_UNARY_OPS = (ast.UAdd, ast.USub)
+_COMPARE_OPS = (ast.Eq, ast.NotEq, ast.Gt, ast.GtE, ast.Lt, ast.LtE)
+
+
+@dataclass(frozen=True, slots=True)
+class LintDiagnostic:
+    """静的解析で検出した 1 件のエラー。
+
+    Attributes:
+        line: スクリプト行番号（1 始まり）。スクリプト全体に対する指摘は ``None``。
+        code: `evaluate_detailed` と同じエラーコード（`SYNTAX`・`TYPE` 等）。
+        message: エラーメッセージ。
+        source: 指摘対象の行（コメント除去後）。
+    """
+
+    line: int | None
+    code: str
+    message: str
+    source: str | None = None
+
+    def describe(self) -> str:
+        """`行3: SYNTAX メッセージ` 形式の 1 行表現を返す。"""
+        where = f"行{self.line}" if self.line is not None else "全体"
+        return f"{where}: {self.code} {self.message}"
+
+    def to_dict(self) -> dict[str, Any]:
+        """JSON 出力向けの辞書へ変換する。"""
+        return asdict(self)
+
+
+def lint_script(calc_type: str, script: str) -> list[LintDiagnostic]:
+    """スクリプトを実行せずに検査し、検出したエラーをすべて返す。
+
+    `Engine.run_lines` と同じ行の解釈で全行を走査する。実行時と異なり、
+    IF の条件に関係なくすべての分岐を検査し、最初のエラーで打ち切らない。
+    入力値に依存する検査（項目の有無・型・FOR の反復回数）は対象外。
+
+    Args:
+        calc_type: "E" または "R" を示す計算種別。
+        script: Lab-Aid 形式の計算スクリプト。
+
+    Returns:
+        行番号順の `LintDiagnostic` のリスト。問題がなければ空リスト。
+    """
+    ctype = (calc_type or "").strip().upper()
+    if ctype not in ("E", "R"):
+        return [
+            _diagnostic(
+                None, ValueError("calc_type は 'E' または 'R' を指定してください。")
+            )
+        ]
+
+    diagnostics: list[LintDiagnostic] = []
+    lines = script.splitlines()
+    if ctype == "E":
+        try:
+            ensure_has_this_assignment_E(script)
+        except ValueError as exc:
+            diagnostics.append(_diagnostic(None, exc))
+        runnable = lines
+    else:
+        runnable = replace_rhs_this_for_R(script).splitlines()
+
+    # (種別, 開始行, FOR 変数) のスタックで IF/END・FOR/NEXT の対応を追う。
+    stack: list[tuple[str, int, str | None]] = []
+    else_seen: set[int] = set()
+    for number, (original, line) in enumerate(zip(lines, runnable, strict=True), 1):
+        raw = strip_comment_quote_aware(line).strip()
+        if not raw or raw.lower().startswith("rem"):
+            continue
+        try:
+            if ctype == "R":
+                assert_no_hash_usage(original, "第2引数（計算式）")
+            _check_line(raw, number, stack, else_seen)
+        # 実行時と同じ種類の例外（深すぎる式の RecursionError を含む）だけを診断にする。
+        except (SyntaxError, ValueError, TypeError, NameError, RecursionError) as exc:
+            diagnostics.append(_diagnostic(number, exc, raw))
+
+    for kind, number, _var in stack:
+        closer = "END" if kind == "IF" else "NEXT"
+        diagnostics.append(
+            _diagnostic(
+                number,
+                SyntaxError(f"{kind} に対応する {closer} がありません。"),
+                strip_comment_quote_aware(runnable[number - 1]).strip(),
+            )
+        )
+    diagnostics.sort(key=lambda item: item.line or 0)
+    return diagnostics
+
+
+def _diagnostic(
+    line: int | None, exc: Exception, source: str | None = None
+) -> LintDiagnostic:
+    return LintDiagnostic(line, error_code_for(exc), str(exc), source)
+
+
+def _check_line(
+    raw: str,
+    number: int,
+    stack: list[tuple[str, int, str | None]],
+    else_seen: set[int],
+) -> None:
+    """1 行を検査する。問題があれば実行時と同じ種類の例外を送出する。"""
+    for name, pattern in (("print", PRINT_RE), ("print2", PRINT2_RE)):
+        match = pattern.match(raw)
+        if match:
+            arg_expr = match.group(1).strip()
+            if RE_ITEM_ANY.search(arg_expr):
+                raise SyntaxError(
+                    f"{name}: 引数には #項目を直接指定できません（通常変数か '文字' を使用）"
+                )
+            check_expr(arg_expr)
+            return
+
+    match = IF_RE.match(raw)
+    if match:
+        _push(stack, ("IF", number, None))
+        check_expr(match.group(1))
+        return
+
+    if ELSE_RE.match(raw):
+        if not stack or stack[-1][0] != "IF":
+            raise SyntaxError("ELSE に対応する IF がありません。")
+        opened = stack[-1][1]
+        if opened in else_seen:
+            raise SyntaxError("同一 IF ブロック内で複数の ELSE は使えません。")
+        else_seen.add(opened)
+        return
+
+    if END_RE.match(raw):
+        if not stack or stack[-1][0] != "IF":
+            raise SyntaxError("END に対応する IF がありません。")
+        stack.pop()
+        return
+
+    match = FOR_RE.match(raw)
+    if match:
+        var_name, from_expr, to_expr, step_expr = match.groups()
+        _push(stack, ("FOR", number, var_name))
+        for expr in (from_expr, to_expr):
+            check_expr(expr)
+        if step_expr is not None:
+            node = check_expr(step_expr)
+            if isinstance(node, ast.Constant) and node.value == 0:
+                raise ValueError("FOR の STEP に 0 は指定できません。")
+        return
+
+    match = NEXT_RE.match(raw)
+    if match:
+        if not stack or stack[-1][0] != "FOR":
+            raise SyntaxError("NEXT に対応する FOR がありません。")
+        var_name = match.group(1)
+        if var_name and stack[-1][2] != var_name:
+            raise SyntaxError("NEXT の変数名が対応する FOR と一致しません。")
+        stack.pop()
+        return
+
+    if _check_function_statement(raw):
+        return
+
+    if "=" not in raw:
+        raise SyntaxError(f"代入行のみ対応: {raw}")
+    lhs, rhs = raw.split("=", 1)
+    lhs = lhs.strip()
+    if not IDENTIFIER_RE.fullmatch(lhs):
+        raise NameError(f"左辺変数名が不正: {lhs}")
+    check_expr(rhs.strip())
+
+
+def _push(
+    stack: list[tuple[str, int, str | None]], frame: tuple[str, int, str | None]
+) -> None:
+    if len(stack) >= MAX_NEST_DEPTH:
+        raise SyntaxError(f"制御構文のネストが上限を超えました（最大{MAX_NEST_DEPTH}）")
+    stack.append(frame)
+
+
+def _check_function_statement(raw: str) -> bool:
+    """`Engine.exec_function_statement` と同じ判定でステートメントを検査する。"""
+    try:
+        node = ast.parse(raw, mode="eval").body
+    except SyntaxError:
+        return False
+    if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Name):
+        return False
+    name = node.func.id.lower()
+    if name not in STATEMENT_FUNCTIONS:
+        return False
+    if not node.args:
+        raise TypeError(f"{name}: 引数が不足しています。")
+    dest_node = node.args[0]
+    if not isinstance(dest_node, ast.Name):
+        raise TypeError(f"{name}: 第1引数には変数を指定してください。")
+    if dest_node.id.lower() == "this":
+        raise TypeError(f"{name}: 第1引数に this は指定できません。")
+    check_expr(raw)
+    return True
+
+
+def check_expr(expr: str) -> ast.expr:
+    """式を構文解析し、エンジンが評価できない構文が含まれないか検査する。
+
+    Args:
+        expr: Lab-Aid の式文字列。
+
+    Returns:
+        検査済みの AST。
+
+    Raises:
+        ValueError: `#` 記法の項目名が不正な場合。
+        SyntaxError: 式の構文が不正な場合。
+        TypeError: 未対応の演算子・関数・リテラルが含まれる場合。
+    """
+    compiled = compile_expr(expr)
+    if compiled.node is None:
+        raise SyntaxError(f"式の構文エラー: {expr}") from compiled.error
+    _check_node(compiled.node)
+    return compiled.node
+
+
+def _check_node(node: ast.AST) -> None:
+    """`Engine.eval_ast` が受け付けるノードだけで構成されているか検査する。"""
+    if isinstance(node, ast.BinOp):
+        if not isinstance(node.op, _BIN_OPS):
+            raise TypeError(f"未対応の演算子: {type(node.op).__name__}")
+        _check_node(node.left)
+        _check_node(node.right)
+    elif isinstance(node, ast.UnaryOp):
+        if not isinstance(node.op, _UNARY_OPS):
+            raise TypeError(f"未対応の単項演算子: {type(node.op).__name__}")
+        _check_node(node.operand)
+    elif isinstance(node, ast.BoolOp):
+        for value in node.values:
+            _check_node(value)
+    elif isinstance(node, ast.Compare):
+        if not all(isinstance(op, _COMPARE_OPS) for op in node.ops):
+            raise TypeError("未対応の比較子")
+        _check_node(node.left)
+        for comparator in node.comparators:
+            _check_node(comparator)
+    elif isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name):
+            raise TypeError("未対応の関数呼び出しです。")
+        name = node.func.id.lower()
+        if name not in FUNCTION_DISPATCH:
+            raise TypeError(f"未対応の関数: {name}")
+        validate_call(node, name)
+        for arg in node.args:
+            _check_node(arg)
+    elif isinstance(node, ast.Constant):
+        if not isinstance(node.value, (int, float, str, bool)):
+            raise TypeError(f"未対応のリテラル: {node.value!r}")
+    elif not isinstance(node, ast.Name):
+        raise TypeError(f"未対応の式: {ast.dump(node)}")
+
+
+__all__ = ["LintDiagnostic", "check_expr", "lint_script"]
@@ -0,0 +1,436 @@
+"""評価処理のメトリクスを保持し、Prometheus テキスト形式で出力するモジュール。"""
+
+from __future__ import annotations
+
+import os
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any
+
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+    10.0,
+    60.0,
+)
+
+
+def _escape(value: str) -> str:
+    """ラベル値を Prometheus テキスト形式向けにエスケープする。"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """`{name="value",...}` 形式のラベル文字列を生成する。"""
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)
+    )
+    return "{" + pairs + "}"
+
+
+def _format_number(value: float) -> str:
+    """整数値は小数点なしで、それ以外は `repr` 相当で文字列化する。"""
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class _CounterChild:
+    """ラベル値を固定したカウンタの実体。"""
+
+    __slots__ = ("_lock", "value")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        """値を加算する。"""
+        with self._lock:
+            self.value += amount
+
+    def reset(self) -> None:
+        """値を 0 に戻す。"""
+        with self._lock:
+            self.value = 0.0
+
+
+class _HistogramChild:
+    """ラベル値を固定したヒストグラムの実体。"""
+
+    __slots__ = ("_lock", "buckets", "counts", "total")
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, count: int = 1) -> None:
+        """観測値を記録する。`count` を指定すると同じ値を `count` 件記録する。"""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += count
+            self.total += value * count
+
+    def snapshot(self) -> tuple[list[int], float]:
+        """バケット件数と合計値の複製を返す。"""
+        with self._lock:
+            return list(self.counts), self.total
+
+    def merge(self, counts: Sequence[int], total: float) -> None:
+        """別プロセスで記録したバケット件数と合計値を加算する。"""
+        with self._lock:
+            for index, hits in enumerate(counts):
+                self.counts[index] += hits
+            self.total += total
+
+    def reset(self) -> None:
+        """記録を破棄する。"""
+        with self._lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.total = 0.0
+
+
+class _Metric(ABC):
+    """ラベル値ごとの実体（child）を管理する共通基底。"""
+
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str]) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _new_child(self) -> Any:
+        """ラベル値の組に対応する実体を新しく作る。"""
+
+    def _child(self, labels: tuple[str, ...]) -> Any:
+        child = self._children.get(labels)
+        if child is None:
+            if len(labels) != len(self.labelnames):
+                raise ValueError(f"{self.name}: ラベル数が一致しません: {labels!r}")
+            with self._lock:
+                child = self._children.setdefault(labels, self._new_child())
+        return child
+
+    def _items(self) -> list[tuple[tuple[str, ...], Any]]:
+        with self._lock:
+            return sorted(self._children.items(), key=lambda item: item[0])
+
+    def reset(self) -> None:
+        """記録済みの値をすべて 0 に戻す（ラベルの組は維持する）。"""
+        for _labels, child in self._items():
+            child.reset()
+
+
+class Counter(_Metric):
+    """単調増加するカウンタ。
+
+    頻繁に記録する箇所では `labels` で取得した実体を保持しておくと、
+    ラベル解決のコストを省ける。
+
+    Attributes:
+        name: メトリクス名。
+        help: `# HELP` 行に出力する説明。
+        labelnames: ラベル名のタプル。
+    """
+
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def labels(self, *values: str) -> _CounterChild:
+        """ラベル値を固定した実体を返す。"""
+        child: _CounterChild = self._child(values)
+        return child
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        """ラベルの組に対応する値を加算する。
+
+        Args:
+            *labels: `labelnames` と同じ順序のラベル値。
+            amount: 加算量。
+        """
+        self.labels(*labels).inc(amount)
+
+    def value(self, *labels: str) -> float:
+        """ラベルの組に対応する現在値を返す。"""
+        return self.labels(*labels).value
+
+    def samples(self) -> list[str]:
+        """テキスト形式のサンプル行を返す。"""
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} "
+            f"{_format_number(child.value)}"
+            for labels, child in self._items()
+        ]
+
+
+class Histogram(_Metric):
+    """累積バケットを持つヒストグラム。
+
+    `_count` 系列は観測件数のカウンタとしてそのまま利用できる。
+
+    Attributes:
+        name: メトリクス名。
+        help: `# HELP` 行に出力する説明。
+        labelnames: ラベル名のタプル。
+        buckets: 昇順のバケット上限値（`+Inf` は自動で付与）。
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def labels(self, *values: str) -> _HistogramChild:
+        """ラベル値を固定した実体を返す。"""
+        child: _HistogramChild = self._child(values)
+        return child
+
+    def observe(self, value: float, *labels: str) -> None:
+        """観測値を 1 件記録する。
+
+        Args:
+            value: 観測値（秒など）。
+            *labels: `labelnames` と同じ順序のラベル値。
+        """
+        self.labels(*labels).observe(value)
+
+    def count(self, *labels: str) -> int:
+        """ラベルの組に対応する観測件数を返す。"""
+        counts, _total = self.labels(*labels).snapshot()
+        return sum(counts)
+
+    def samples(self) -> list[str]:
+        """テキスト形式のサンプル行を返す。"""
+        lines: list[str] = []
+        names = (*self.labelnames, "le")
+        for labels, child in self._items():
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, hits in zip((*self.buckets, None), counts, strict=True):
+                cumulative += hits
+                le = "+Inf" if bound is None else _format_number(bound)
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(names, (*labels, le))} "
+                    f"{cumulative}"
+                )
+            suffix = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {_format_number(total)}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """プロセス内のメトリクスを束ねるレジストリ。"""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        """カウンタを登録する。同名のカウンタが既にあればそれを返す。"""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Counter(name, help, labelnames)
+        if not isinstance(metric, Counter):
+            raise TypeError(f"{name} はカウンタではありません。")
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """ヒストグラムを登録する。同名のヒストグラムが既にあればそれを返す。"""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Histogram(
+                    name, help, labelnames, buckets
+                )
+        if not isinstance(metric, Histogram):
+            raise TypeError(f"{name} はヒストグラムではありません。")
+        return metric
+
+    def reset(self) -> None:
+        """全メトリクスの値を破棄する（登録は維持する）。"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+    def snapshot(self) -> dict[str, list[tuple[tuple[str, ...], Any]]]:
+        """現在値を pickle 可能な形で返す。
+
+        ワーカープロセスの記録を親プロセスへ集約する際に `merge` と組み合わせる。
+
+        Returns:
+            メトリクス名をキーに、ラベル値の組と値（カウンタは数値、
+            ヒストグラムは `(バケット件数, 合計値)`）のリストを持つ辞書。
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        result: dict[str, list[tuple[tuple[str, ...], Any]]] = {}
+        for metric in metrics:
+            if isinstance(metric, Counter):
+                result[metric.name] = [
+                    (labels, child.value) for labels, child in metric._items()
+                ]
+            else:
+                result[metric.name] = [
+                    (labels, child.snapshot()) for labels, child in metric._items()
+                ]
+        return result
+
+    def merge(self, snapshot: dict[str, list[tuple[tuple[str, ...], Any]]]) -> None:
+        """`snapshot` で取得した値を加算する。未登録のメトリクスは無視する。
+
+        Args:
+            snapshot: 別プロセスの `MetricsRegistry.snapshot()` の戻り値。
+        """
+        for name, samples in snapshot.items():
+            metric = self._metrics.get(name)
+            if metric is None:
+                continue
+            for labels, value in samples:
+                if isinstance(metric, Counter):
+                    if value:
+                        metric.labels(*labels).inc(value)
+                else:
+                    counts, total = value
+                    if any(counts):
+                        metric.labels(*labels).merge(counts, total)
+
+    def render(self) -> str:
+        """Prometheus テキスト形式（exposition format 0.0.4）で出力する。"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines: list[str] = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Path) -> None:
+        """テキスト形式のメトリクスをファイルへ原子的に書き出す。
+
+        node_exporter の textfile collector が書き込み途中のファイルを読まない
+        よう、同じディレクトリの一時ファイルへ書いてから置き換える。
+
+        Args:
+            path: 出力先のパス。
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(self.render(), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+
+class PeriodicExporter:
+    """一定間隔でメトリクスをファイルへ書き出すバックグラウンドスレッド。
+
+    常駐実行（監視モード等）で利用し、`stop` 時にも最終値を書き出す。
+
+    Attributes:
+        registry: 出力対象のレジストリ。
+        path: 出力先のパス。
+        interval: 書き出し間隔（秒）。
+    """
+
+    def __init__(self, registry: MetricsRegistry, path: Path, interval: float) -> None:
+        if interval <= 0:
+            raise ValueError("メトリクスの出力間隔は正の秒数を指定してください。")
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="lab-aid-metrics", daemon=True
+        )
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.registry.write_textfile(self.path)
+
+    def start(self) -> PeriodicExporter:
+        """書き出しスレッドを開始する。"""
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """書き出しスレッドを停止し、最終値を書き出す。"""
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.registry.write_textfile(self.path)
+
+
+REGISTRY = MetricsRegistry()
+
+EVALUATION_SECONDS = REGISTRY.histogram(
+    "lab_aid_evaluation_seconds",
+    "Latency of a single evaluate() call by calc type; _count is rows evaluated.",
+    ("calc_type",),
+)
+EVALUATION_ERRORS = REGISTRY.counter(
+    "lab_aid_evaluation_errors_total",
+    "Evaluation failures by calc type and exception class.",
+    ("calc_type", "exception"),
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "lab_aid_cache_requests_total",
+    "Cache lookups by cache name and result (hit/miss).",
+    ("cache", "result"),
+)
+PHASE_SECONDS = REGISTRY.histogram(
+    "lab_aid_phase_seconds",
+    "Latency of batch phases (load, evaluate, save) in seconds.",
+    ("phase",),
+)
+
+
+__all__ = [
+    "CACHE_REQUESTS",
+    "EVALUATION_ERRORS",
+    "EVALUATION_SECONDS",
+    "PHASE_SECONDS",
+    "REGISTRY",
+    "Counter",
+    "Histogram",
+    "MetricsRegistry",
+    "PeriodicExporter",
+]
@@ -0,0 +1,175 @@
+"""スクリプト行・ビルトイン単位の実行プロファイラ。"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any
+
+
+@dataclass
+class ProfileStat:
+    """1 計測対象の呼び出し回数と累積時間。
+
+    Attributes:
+        hits: 計測対象が実行された回数。
+        seconds: 累積の経過時間（秒）。
+    """
+
+    hits: int = 0
+    seconds: float = 0.0
+
+    def add(self, elapsed: float, hits: int = 1) -> None:
+        """計測値を加算する。"""
+        self.hits += hits
+        self.seconds += elapsed
+
+    def to_dict(self) -> dict[str, Any]:
+        """JSON 化しやすい辞書へ変換する。"""
+        return {"hits": self.hits, "seconds": self.seconds}
+
+
+def _merge_stats(
+    target: dict[Any, ProfileStat], source: dict[Any, ProfileStat]
+) -> None:
+    """集計辞書同士を加算する。"""
+    for key, stat in source.items():
+        current = target.get(key)
+        if current is None:
+            current = target[key] = ProfileStat()
+        current.add(stat.seconds, stat.hits)
+
+
+@dataclass
+class Profiler:
+    """`Engine.run_lines` の実行時間を行・ビルトイン・フェーズ別に集計する。
+
+    `Engine.profiler` や `evaluate(..., profiler=...)` に渡した場合のみ計測が
+    行われ、未指定時はエンジン側で計測処理そのものをスキップする。複数回の
+    評価に同じインスタンスを渡すか、`merge` で結合するとブック全体の集計になる。
+
+    Attributes:
+        lines: `(行番号, 行テキスト)` をキーにした行単位の集計。
+        builtins: `FUNCTION_DISPATCH` の関数名をキーにした集計（引数評価を除く）。
+            メモ化された結果を再利用した呼び出しは含まない。
+        phases: 入力解析 (`inputs`)・式の構文解析 (`parse`)・実行 (`run`) の集計。
+        memo_hits: 関数名ごとの、同じ評価内のメモ化結果を再利用した回数。
+    """
+
+    lines: dict[tuple[int, str], ProfileStat] = field(default_factory=dict)
+    builtins: dict[str, ProfileStat] = field(default_factory=dict)
+    phases: dict[str, ProfileStat] = field(default_factory=dict)
+    memo_hits: dict[str, int] = field(default_factory=dict)
+
+    def record_line(self, line_no: int, text: str, elapsed: float) -> None:
+        """スクリプト 1 行分の実行時間を記録する。"""
+        key = (line_no, text)
+        stat = self.lines.get(key)
+        if stat is None:
+            stat = self.lines[key] = ProfileStat()
+        stat.add(elapsed)
+
+    def record_builtin(self, name: str, elapsed: float) -> None:
+        """ビルトイン関数 1 回分の実行時間を記録する。"""
+        stat = self.builtins.get(name)
+        if stat is None:
+            stat = self.builtins[name] = ProfileStat()
+        stat.add(elapsed)
+
+    def record_memo_hit(self, name: str) -> None:
+        """ビルトイン関数の呼び出しをメモ化結果で済ませたことを記録する。"""
+        self.memo_hits[name] = self.memo_hits.get(name, 0) + 1
+
+    def record_phase(self, name: str, elapsed: float) -> None:
+        """評価フェーズ 1 回分の実行時間を記録する。"""
+        stat = self.phases.get(name)
+        if stat is None:
+            stat = self.phases[name] = ProfileStat()
+        stat.add(elapsed)
+
+    def merge(self, other: Profiler) -> None:
+        """別のプロファイラの集計結果を取り込む。
+
+        Args:
+            other: 取り込むプロファイラ。
+        """
+        _merge_stats(self.lines, other.lines)
+        _merge_stats(self.builtins, other.builtins)
+        _merge_stats(self.phases, other.phases)
+        for name, hits in other.memo_hits.items():
+            self.memo_hits[name] = self.memo_hits.get(name, 0) + hits
+
+    @property
+    def total_seconds(self) -> float:
+        """`run` フェーズの累積時間。未計測の場合は行時間の合計。"""
+        run = self.phases.get("run")
+        if run is not None:
+            return run.seconds
+        return sum(stat.seconds for stat in self.lines.values())
+
+    def to_dict(self) -> dict[str, Any]:
+        """構造化されたプロファイルレポートを返す。
+
+        Returns:
+            `total_seconds`・`phases`・`lines`・`builtins`・`memo` を持つ辞書。
+            `lines` は累積時間の降順に並べたリスト。`memo` は関数名ごとの
+            再利用回数 (`hits`)・呼び出し回数 (`calls`)・再利用率 (`hit_rate`)。
+        """
+        lines = sorted(self.lines.items(), key=lambda item: -item[1].seconds)
+        builtins = sorted(self.builtins.items(), key=lambda item: -item[1].seconds)
+        return {
+            "total_seconds": self.total_seconds,
+            "phases": {name: stat.to_dict() for name, stat in self.phases.items()},
+            "lines": [
+                {"line": line_no, "text": text, **stat.to_dict()}
+                for (line_no, text), stat in lines
+            ],
+            "builtins": {name: stat.to_dict() for name, stat in builtins},
+            "memo": {
+                name: self._memo_stat(name, hits)
+                for name, hits in sorted(
+                    self.memo_hits.items(), key=lambda item: -item[1]
+                )
+            },
+        }
+
+    def _memo_stat(self, name: str, hits: int) -> dict[str, Any]:
+        executed = self.builtins.get(name)
+        calls = hits + (executed.hits if executed is not None else 0)
+        return {"hits": hits, "calls": calls, "hit_rate": hits / calls}
+
+    def render(self, limit: int = 10, indent: str = "") -> str:
+        """端末表示用のテキストレポートを生成する。
+
+        Args:
+            limit: 行・ビルトインそれぞれの表示上限。
+            indent: 各行の先頭に付与する文字列。
+
+        Returns:
+            複数行のレポート文字列。
+        """
+        report = self.to_dict()
+        out = [f"{indent}合計 {report['total_seconds'] * 1000:.3f} ms"]
+        for name, stat in report["phases"].items():
+            out.append(
+                f"{indent}  フェーズ {name}: {stat['seconds'] * 1000:.3f} ms"
+                f" ({stat['hits']} 回)"
+            )
+        for entry in report["lines"][:limit]:
+            out.append(
+                f"{indent}  行 {entry['line']}: {entry['seconds'] * 1000:.3f} ms"
+                f" ({entry['hits']} 回) {entry['text']}"
+            )
+        for name, stat in list(report["builtins"].items())[:limit]:
+            out.append(
+                f"{indent}  関数 {name}: {stat['seconds'] * 1000:.3f} ms"
+                f" ({stat['hits']} 回)"
+            )
+        for name, stat in list(report["memo"].items())[:limit]:
+            out.append(
+                f"{indent}  メモ化 {name}: {stat['hits']}/{stat['calls']} 回を再利用"
+                f" ({stat['hit_rate']:.0%})"
+            )
+        return "\n".join(out)
+
+
+__all__ = ["ProfileStat", "Profiler"]
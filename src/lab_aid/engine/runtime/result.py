@@ -0,0 +1,93 @@
+"""評価結果とエラー詳細を保持する構造化結果型。"""
+
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from .limits import BudgetExceededError
+
+ERROR_CODES: tuple[tuple[type[BaseException], str], ...] = (
+    (BudgetExceededError, "BUDGET_EXCEEDED"),
+    (SyntaxError, "SYNTAX"),
+    (NameError, "NAME"),
+    (KeyError, "MISSING_ITEM"),
+    (ZeroDivisionError, "ZERO_DIVISION"),
+    (TypeError, "TYPE"),
+    (ValueError, "VALUE"),
+    (RuntimeError, "RUNTIME"),
+)
+
+
+def error_code_for(exc: BaseException) -> str:
+    """例外に対応するエラーコードを返す。
+
+    Args:
+        exc: 評価中に発生した例外。
+
+    Returns:
+        `ERROR_CODES` の先頭から最初に一致したコード。該当なしは `"INTERNAL"`。
+    """
+    for exc_type, code in ERROR_CODES:
+        if isinstance(exc, exc_type):
+            return code
+    return "INTERNAL"
+
+
+@dataclass(slots=True)
+class EvaluationResult:
+    """`evaluate_detailed` の戻り値。
+
+    成功時はエラー関連の属性がすべて ``None`` になる。失敗時の `raw`/`edited`/
+    `reported` は `evaluate` と同じく `"エラー"`（予算超過時は `"上限超過"`）。
+
+    Attributes:
+        raw: 生データ（E タイプのみ）。
+        edited: 編集後の値。
+        reported: 報告値。
+        error_code: `SYNTAX`・`TYPE`・`MISSING_ITEM`・`BUDGET_EXCEEDED` 等の分類。
+        exception_class: 原因となった例外のクラス名。
+        message: 例外メッセージ。
+        phase: 失敗した段階（`validate`・`inputs`・`run`・`output`）。
+        line: 失敗したスクリプト行番号（1 始まり）。`run` 以外では ``None``。
+        source: 失敗したスクリプト行（コメント除去後）。
+        expression: 失敗時に評価していた式。
+    """
+
+    raw: str | None
+    edited: str | None
+    reported: str | None
+    error_code: str | None = None
+    exception_class: str | None = None
+    message: str | None = None
+    phase: str | None = None
+    line: int | None = None
+    source: str | None = None
+    expression: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        """エラーなく評価できた場合は ``True``。"""
+        return self.error_code is None
+
+    def as_tuple(self) -> tuple[str | None, str | None, str | None]:
+        """`evaluate` 互換の `(raw, edited, reported)` を返す。"""
+        return self.raw, self.edited, self.reported
+
+    def to_dict(self) -> dict[str, Any]:
+        """JSON 化しやすい辞書へ変換する。"""
+        return asdict(self)
+
+    def describe(self) -> str:
+        """エラー詳細を 1 行の文字列にまとめる。成功時は空文字列。"""
+        if self.ok:
+            return ""
+        where = f" 行{self.line}" if self.line is not None else ""
+        expr = f" 式: {self.expression}" if self.expression else ""
+        return (
+            f"{self.error_code} [{self.exception_class}] {self.phase}{where}:"
+            f" {self.message}{expr}"
+        )
+
+
+__all__ = ["ERROR_CODES", "EvaluationResult", "error_code_for"]
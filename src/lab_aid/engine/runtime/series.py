@@ -0,0 +1,277 @@
+"""外部ファイルに置いた大量の測定値を読み取り専用の列として参照するモジュール。
+
+E タイプ入力の `NAME=file('path')` で参照する。参照できるのは呼び出し元が
+許可した基準ディレクトリ配下の相対パスに限る。float64 のバイナリ形式は
+ファイルをメモリマップし、コピーせずに `memoryview` として要素を読む。テキスト
+形式は参照のたびにファイルを先頭から読み進め、全体をメモリへ展開しない。
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import re
+import sys
+from abc import abstractmethod
+from array import array
+from collections.abc import Iterable, Iterator, Sequence
+from itertools import islice
+from pathlib import Path, PurePath
+from types import TracebackType
+from typing import Any, Self, overload
+
+from .text import parse_number_like
+
+SERIES_FORMATS = ("f64", "text")
+# 形式を省略した場合にバイナリ（float64）として扱う拡張子。
+BINARY_SUFFIXES = frozenset({".f64", ".bin"})
+FLOAT64_SIZE = 8
+_TEXT_SEPARATOR_RE = re.compile(r"[\s,]+")
+
+
+class MeasurementSeries(Sequence[Any]):
+    """外部ファイルの測定値の列（読み取り専用）。
+
+    `select_value` と集計関数（`ave`・`sum`・`stdev`・`max`・`min` 等）は
+    リストと同じ結果を返す。要素数が 1 のファイルは `open_measurements` が
+    単一値として返すため、この列になるのは要素数が 2 以上の場合に限られる。
+    使い終えたら `close` するか、`with` 文で用いる。
+
+    Attributes:
+        path: 測定値ファイルのパス。
+        name: エラーメッセージに用いるパスの表記（`file('...')` に書いたもの）。
+        kind: ``"f64"``（リトルエンディアンの float64）または ``"text"``。
+    """
+
+    path: Path
+    name: str
+    kind: str
+
+    @abstractmethod
+    def numbers(self) -> Iterable[float]:
+        """集計用に全要素を float として順に返す。"""
+
+    def close(self) -> None:
+        """ファイルの資源を解放する。以後は要素を参照できない。"""
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"<測定値ファイル {self.path} ({self.kind})>"
+
+
+class _Float64Series(MeasurementSeries):
+    """メモリマップした float64 の列。"""
+
+    kind = "f64"
+
+    def __init__(self, path: Path, name: str) -> None:
+        self.path = path
+        self.name = name
+        self._mapped: mmap.mmap | None = None
+        self._views: list[memoryview[Any]] = []
+        with path.open("rb") as fh:
+            size = os.fstat(fh.fileno()).st_size
+            if size == 0:
+                raise ValueError(f"測定値ファイルが空です: {name}")
+            if size % FLOAT64_SIZE:
+                raise ValueError(
+                    f"float64 の測定値ファイルの大きさが 8 バイトの倍数ではありません: {name}"
+                )
+            mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if sys.byteorder == "little":
+            # マップは `close` まで保持し、`memoryview` を解放してから閉じる。
+            self._mapped = mapped
+            self._views = [memoryview(mapped)]
+            self._views.append(self._views[0].cast("d"))
+            self._values: Sequence[float] = self._views[1]
+        else:  # pragma: no cover - ビッグエンディアン環境のみ
+            values = array("d", mapped)
+            values.byteswap()
+            mapped.close()
+            self._values = values
+
+    def close(self) -> None:
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+
+    def numbers(self) -> Iterable[float]:
+        return self._values
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    @overload
+    def __getitem__(self, index: int) -> float: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[float]: ...
+
+    def __getitem__(self, index: int | slice) -> float | list[float]:
+        if isinstance(index, slice):
+            return list(self._values[index])
+        return self._values[index]
+
+    def __iter__(self) -> Iterator[float]:
+        return iter(self._values)
+
+
+class _TextSeries(MeasurementSeries):
+    """参照のたびにファイルを読み進めるテキスト形式の列。
+
+    値はカンマ・空白・改行で区切り、`NAME=VALUE` 形式と同じく整数または
+    浮動小数点数として解釈する。
+    """
+
+    kind = "text"
+
+    def __init__(self, path: Path, name: str) -> None:
+        self.path = path
+        self.name = name
+        self._length: int | None = None
+
+    def numbers(self) -> Iterable[float]:
+        return map(float, self)
+
+    def __len__(self) -> int:
+        if self._length is None:
+            # 件数だけなら値を解釈する必要はない（誤りは値を読む時点で検出する）。
+            self._length = sum(1 for _line_no, _token in self._tokens())
+        return self._length
+
+    @overload
+    def __getitem__(self, index: int) -> Any: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[Any]: ...
+
+    def __getitem__(self, index: int | slice) -> Any:
+        if isinstance(index, slice):
+            return list(islice(self, *index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if index >= 0:
+            # 対象より前の値は解釈せずに読み飛ばす。
+            for line_no, token in islice(self._tokens(), index, None):
+                return self._parse(line_no, token)
+        raise IndexError("測定値の番号が範囲外です。")
+
+    def __iter__(self) -> Iterator[Any]:
+        for line_no, token in self._tokens():
+            yield self._parse(line_no, token)
+
+    def _parse(self, line_no: int, token: str) -> Any:
+        number = parse_number_like(token)
+        if number is None:
+            # ファイルの内容はエラーの出力先へ書き出さない。
+            raise ValueError(
+                f"測定値ファイルの値は数値を指定してください（{self.name} {line_no}行目）"
+            )
+        return number
+
+    def _tokens(self) -> Iterator[tuple[int, str]]:
+        """`(行番号, 値の文字列)` をファイルの先頭から順に返す。"""
+        with self.path.open(encoding="utf-8") as fh:
+            for line_no, line in enumerate(fh, 1):
+                for token in _TEXT_SEPARATOR_RE.split(line.strip()):
+                    if token:
+                        yield line_no, token
+
+
+def open_measurements(
+    path: str | os.PathLike[str],
+    kind: str | None = None,
+    *,
+    base_dir: str | os.PathLike[str] | None = None,
+) -> Any:
+    """測定値ファイルを開き、`Engine.items` の値として使える形で返す。
+
+    Args:
+        path: 測定値ファイルのパス。`base_dir` を指定した場合はその配下の相対パス。
+        kind: ``"f64"`` または ``"text"``。省略時は拡張子が `.f64`・`.bin` なら
+            ``"f64"``、それ以外は ``"text"``。
+        base_dir: 指定した場合、`path` をこのディレクトリ配下に制限する。
+
+    Returns:
+        要素が 2 つ以上なら `MeasurementSeries`、1 つならその値。
+
+    Raises:
+        OSError: ファイルを開けない場合。
+        ValueError: パス・形式の指定が不正、ファイルが空、または値が数値でない場合。
+    """
+    name = os.fspath(path)
+    resolved = (
+        Path(path) if base_dir is None else resolve_measurement_path(path, base_dir)
+    )
+    if kind is None:
+        kind = "f64" if resolved.suffix.lower() in BINARY_SUFFIXES else "text"
+    if kind not in SERIES_FORMATS:
+        raise ValueError(
+            f"測定値ファイルの形式は {' / '.join(SERIES_FORMATS)} を指定してください: {kind!r}"
+        )
+    series: MeasurementSeries = (
+        _Float64Series(resolved, name) if kind == "f64" else _TextSeries(resolved, name)
+    )
+    try:
+        head = list(islice(series, 2))
+    except BaseException:
+        series.close()
+        raise
+    if not head:
+        series.close()
+        raise ValueError(f"測定値ファイルが空です: {name}")
+    if len(head) > 1:
+        return series
+    series.close()
+    return head[0]
+
+
+def resolve_measurement_path(
+    path: str | os.PathLike[str], base_dir: str | os.PathLike[str]
+) -> Path:
+    """`base_dir` 配下の相対パスを検証し、絶対パスへ解決する。
+
+    Args:
+        path: `base_dir` を基準とする相対パス。
+        base_dir: 参照を許可するディレクトリ。
+
+    Returns:
+        解決したパス。
+
+    Raises:
+        ValueError: 絶対パス・`..` を含むパス、またはシンボリックリンク等で
+            `base_dir` の外を指すパスの場合。
+    """
+    relative = PurePath(path)
+    if relative.is_absolute() or relative.drive or ".." in relative.parts:
+        raise ValueError(
+            f"測定値ファイルは基準ディレクトリからの相対パス（.. を含まない）で指定してください: {os.fspath(path)}"
+        )
+    base = Path(base_dir).resolve()
+    resolved = (base / relative).resolve()
+    if not resolved.is_relative_to(base):
+        raise ValueError(
+            f"測定値ファイルが基準ディレクトリの外を指しています: {os.fspath(path)}"
+        )
+    return resolved
+
+
+__all__ = [
+    "SERIES_FORMATS",
+    "MeasurementSeries",
+    "open_measurements",
+    "resolve_measurement_path",
+]
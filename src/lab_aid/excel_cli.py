@@ -3,15 +3,50 @@
 from __future__ import annotations
 
 import argparse
+import glob
+import io
+import json
+import os
+import sqlite3
 import sys
+import zipfile
 from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import redirect_stdout
+from dataclasses import dataclass, field
 from pathlib import Path
+from time import perf_counter
+from typing import Any
 
 from openpyxl import Workbook, load_workbook
 from openpyxl.utils import get_column_letter
+from openpyxl.utils.exceptions import InvalidFileException
 from openpyxl.worksheet.worksheet import Worksheet
 
-from .engine import evaluate
+from .engine import EvaluationLimits, EvaluationResult, Profiler, evaluate_detailed
+from .engine.runtime.capture import (
+    CapturedEvaluation,
+    WorkloadRecorder,
+    current_recorder,
+    start_capture,
+    stop_capture,
+)
+from .engine.runtime.metrics import PHASE_SECONDS, REGISTRY, PeriodicExporter
+from .formula_library import (
+    FORMULA_SHEET,
+    FormulaLibrary,
+    FormulaLibraryError,
+    formula_reference,
+    load_library,
+)
+from .row_graph import (
+    RowGraph,
+    RowKey,
+    RowOutputs,
+    RowReferenceError,
+    substitute_references,
+)
+from .tracing import TraceEvent, TraceRecorder, row_range, script_hash
 
 DEFAULT_WORKBOOK = Path("windows") / "lab_aid_input.xlsx"
 TOP_HEADERS = ["入力", "入力", "入力", "出力", "出力", "出力"]
@@ -24,6 +59,10 @@
     "報告値",
     "status",
 ]
+ERROR_DETAIL_COLUMN = 8
+ERROR_DETAIL_HEADER = "エラー詳細"
+EVALUATION_CHUNK_ROWS = 256
+WORKBOOK_SUFFIXES = (".xlsx", ".xlsm")
 
 
 def _to_text(value: object | None) -> str:
@@ -70,6 +109,14 @@ def ensure_template(path: Path) -> bool:
     if path.exists():
         return False
 
+    wb = _template_workbook()
+    wb.save(path)
+    print(f"[情報] 入力テンプレートを作成しました: {path}")
+    return True
+
+
+def _template_workbook() -> Workbook:
+    """見出し・書式・サンプル行を設定した入力テンプレートのブックを作成する。"""
     wb = Workbook()
     ws = wb.active
     ws.title = "LabAid"
@@ -97,9 +144,7 @@ def ensure_template(path: Path) -> bool:
         for row in (1, 2, 3):
             cell = ws.cell(row=row, column=column)
             cell.number_format = "@"
-    wb.save(path)
-    print(f"[情報] 入力テンプレートを作成しました: {path}")
-    return True
+    return wb
 
 
 def _iter_data_rows(ws: Worksheet) -> Iterable[int]:
@@ -120,32 +165,104 @@ def _iter_data_rows(ws: Worksheet) -> Iterable[int]:
 
 
 def _evaluate_row(
-    ws: Worksheet, row: int
-) -> tuple[str | None, str | None, str | None, str]:
+    ws: Worksheet,
+    row: int,
+    profiler: Profiler | None = None,
+    limits: EvaluationLimits | None = None,
+    strict_inputs: bool = True,
+    library: FormulaLibrary | None = None,
+    measurement_dir: str | None = None,
+) -> tuple[EvaluationResult, str]:
     """1 行分の入力を評価し、結果を返す。
 
     Args:
         ws: 評価対象のワークシート。
         row: 評価する行番号。
+        profiler: 指定した場合、評価の実行時間をこのプロファイラへ記録する。
+        limits: 1 行の評価に割り当てる実行予算。
+        strict_inputs: 変数列を評価前にすべて検証するか。
+        library: 計算式列の `@ID` を解決する計算式マスタ。
+        measurement_dir: 変数列の `file('path')` で参照できる測定値ファイルの
+            基準ディレクトリ。
+
+    Returns:
+        `(評価結果, status)` のタプル。
+    """
+    return _evaluate_values(
+        ws.cell(row=row, column=1).value,
+        ws.cell(row=row, column=2).value,
+        ws.cell(row=row, column=3).value,
+        profiler,
+        limits,
+        strict_inputs,
+        library,
+        measurement_dir,
+    )
+
+
+def _evaluate_values(
+    calc_type_value: object | None,
+    script_value: object | None,
+    inputs_value: object | None,
+    profiler: Profiler | None = None,
+    limits: EvaluationLimits | None = None,
+    strict_inputs: bool = True,
+    library: FormulaLibrary | None = None,
+    measurement_dir: str | None = None,
+) -> tuple[EvaluationResult, str]:
+    """入力 3 列の値を評価し、結果を返す。
+
+    計算式列が `@ID` の場合は計算式マスタの計算式を評価する。このとき計算式
+    タイプ列は空欄でもよい。
+
+    Args:
+        calc_type_value: 計算式タイプ列の値。
+        script_value: 計算式列の値。
+        inputs_value: 変数列の値。
+        profiler: 指定した場合、評価の実行時間をこのプロファイラへ記録する。
+        limits: 1 行の評価に割り当てる実行予算。
+        strict_inputs: 変数列を評価前にすべて検証するか。
+        library: 計算式列の `@ID` を解決する計算式マスタ。
+        measurement_dir: 変数列の `file('path')` で参照できる測定値ファイルの
+            基準ディレクトリ。
 
     Returns:
-        `(raw, edited, reported, status)` のタプル。
+        `(評価結果, status)` のタプル。
     """
-    calc_type = _to_text(ws.cell(row=row, column=1).value).strip()
-    script = _normalize_multiline(ws.cell(row=row, column=2).value)
-    inputs = _normalize_multiline(ws.cell(row=row, column=3).value)
+    calc_type = _to_text(calc_type_value).strip()
+    script = _normalize_multiline(script_value)
+    inputs = _normalize_multiline(inputs_value)
+
+    if formula_reference(script) is not None:
+        if library is None:
+            return (
+                EvaluationResult(None, None, None),
+                "ERROR: 計算式マスタが指定されていません (--formulas)",
+            )
+        try:
+            calc_type, script = library.resolve(calc_type, script)
+        except FormulaLibraryError as exc:
+            return EvaluationResult(None, None, None), f"ERROR: {exc}"
 
     if not calc_type:
-        return None, None, None, "行が空です (calc_type が未入力)"
+        return EvaluationResult(None, None, None), "行が空です (calc_type が未入力)"
 
     try:
-        raw, edited, reported = evaluate(calc_type, script, inputs)
-        status = "OK"
+        result = evaluate_detailed(
+            calc_type,
+            script,
+            inputs,
+            profiler=profiler,
+            limits=limits,
+            strict_inputs=strict_inputs,
+            measurement_dir=measurement_dir,
+        )
+        status = "BUDGET_EXCEEDED" if result.error_code == "BUDGET_EXCEEDED" else "OK"
     except Exception as exc:  # pragma: no cover - unexpected path
-        raw = edited = reported = None
+        result = EvaluationResult(None, None, None)
         status = f"ERROR: {exc}"
 
-    return raw, edited, reported, status
+    return result, status
 
 
 def _write_text_cell(
@@ -187,15 +304,46 @@ def _record_results(
     _write_text_cell(ws, row, 7, status)
 
 
-def main(argv: list[str] | None = None) -> int:
-    """Excel ベースの Lab-Aid 計算を一括実行するエントリーポイント。
+def _chunk_script_hashes(ws: Worksheet, rows: list[int]) -> list[str]:
+    """行範囲に含まれる計算式のハッシュ一覧を返す。
 
     Args:
-        argv: コマンドライン引数リスト。``None`` の場合は `sys.argv` を使用。
+        ws: 対象のワークシート。
+        rows: 行番号のリスト。
+
+    Returns:
+        重複を除いて整列したスクリプトハッシュ。
+    """
+    return sorted(
+        {
+            script_hash(_normalize_multiline(ws.cell(row=row, column=2).value))
+            for row in rows
+        }
+    )
+
+
+def _limits_from_args(args: argparse.Namespace) -> EvaluationLimits | None:
+    """コマンドライン引数から評価予算を組み立てる。
+
+    Args:
+        args: `argparse` の解析結果。
 
     Returns:
-        成功時は 0、評価対象がない場合は 1 を返す。
+        いずれかの予算が指定されていれば `EvaluationLimits`、なければ ``None``。
     """
+    limits = EvaluationLimits(
+        max_steps=args.max_steps,
+        timeout=args.timeout,
+        max_text_length=args.max_text_length,
+        max_list_length=args.max_list_length,
+    )
+    if limits == EvaluationLimits():
+        return None
+    return limits
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    """コマンドライン引数の定義を組み立てる。"""
     parser = argparse.ArgumentParser(
         description=(
             "Excel ブックに記載された Lab-Aid の計算条件を読み込み、"
@@ -203,45 +351,876 @@ def main(argv: list[str] | None = None) -> int:
         )
     )
     parser.add_argument(
-        "workbook",
-        nargs="?",
-        default=str(DEFAULT_WORKBOOK),
-        help="Excel ファイルのパス",
+        "workbooks",
+        nargs="*",
+        metavar="workbook",
+        help=(
+            "Excel ファイルのパス。ディレクトリやワイルドカード（`**/*.xlsx` 等）も"
+            f"指定可能。省略時は {DEFAULT_WORKBOOK}"
+        ),
     )
     parser.add_argument(
         "--create-template",
         action="store_true",
         help="テンプレートだけ作成して終了",
     )
+    parser.add_argument(
+        "--all-sheets",
+        action="store_true",
+        help="アクティブシートだけでなく全シートを評価",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        help="複数ブックを並列処理するワーカープロセス数（既定: CPU 数とブック数の小さい方）",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="ブックの更新を監視し、変更された行だけを再評価し続ける（Ctrl+C で終了）",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=0.5,
+        help="--watch のポーリング間隔（秒）",
+    )
+    parser.add_argument(
+        "--summary-json",
+        default=None,
+        metavar="SUMMARY.json",
+        help="ブックごとの処理件数・所要時間の集計を JSON で書き出す",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="行・ビルトイン単位の実行時間を行ごと・ブック全体で表示",
+    )
+    parser.add_argument(
+        "--max-steps",
+        type=int,
+        default=None,
+        help="1 行の評価で実行できるステートメント数の上限",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="1 行の評価に許可する実行時間の上限（秒）",
+    )
+    parser.add_argument(
+        "--max-text-length",
+        type=int,
+        default=None,
+        help="変数・関数結果の文字列長の上限",
+    )
+    parser.add_argument(
+        "--max-list-length",
+        type=int,
+        default=None,
+        help="複数測定値の要素数の上限",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        default=None,
+        help="Prometheus テキスト形式のメトリクスを書き出すファイル",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=None,
+        help="指定した秒数ごとに --metrics-file を更新（常駐実行向け）",
+    )
+    parser.add_argument(
+        "--trace",
+        default=None,
+        metavar="OUT.json",
+        help="処理段階ごとの所要時間を Chrome/Perfetto の trace-event 形式で出力",
+    )
+    parser.add_argument(
+        "--error-column",
+        action="store_true",
+        help=f"エラー詳細を {ERROR_DETAIL_COLUMN} 列目（{ERROR_DETAIL_HEADER}）へ書き出す",
+    )
+    parser.add_argument(
+        "--error-log",
+        default=None,
+        metavar="ERRORS.jsonl",
+        help="失敗した行のエラー詳細を JSON Lines 形式で書き出す",
+    )
+    parser.add_argument(
+        "--strict-inputs",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help=(
+            "変数列を評価前にすべて検証する（既定）。--no-strict-inputs では"
+            "計算式が参照した項目だけを解析し、参照されない行の誤りはエラーにしない"
+        ),
+    )
+    parser.add_argument(
+        "--measurement-dir",
+        default=None,
+        metavar="DIR",
+        help=(
+            "変数列の file('path') で参照できる測定値ファイルの基準ディレクトリ。"
+            "DIR 配下の相対パスのみ許可（未指定時は file() を参照できない）"
+        ),
+    )
+    parser.add_argument(
+        "--formulas",
+        default=None,
+        metavar="FORMULAS.json",
+        help=(
+            f"計算式列の `@ID` を解決する計算式マスタ（.json・.toml、または {FORMULA_SHEET}"
+            " シートを持つ .xlsx）。ブック内の同名シートはこれより優先"
+        ),
+    )
+    parser.add_argument(
+        "--job",
+        default=None,
+        metavar="JOBS.sqlite",
+        help=(
+            "ジョブモード: 行を SQLite のキューへ登録してバッチごとに結果を記録する。"
+            "中断しても同じコマンドの再実行で評価済みの行から再開"
+        ),
+    )
+    parser.add_argument(
+        "--capture",
+        default=None,
+        metavar="LOG.jsonl.gz",
+        help=(
+            "各評価の計算式・入力・出力・所要時間をログへ記録する"
+            "（`python -m lab_aid.replay_cli` で再実行）"
+        ),
+    )
+    parser.add_argument(
+        "--capture-anonymize",
+        action="store_true",
+        help="--capture で入力の文字列の値を同じ長さの別の文字列へ置き換えて記録する",
+    )
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Excel ベースの Lab-Aid 計算を一括実行するエントリーポイント。
+
+    Args:
+        argv: コマンドライン引数リスト。``None`` の場合は `sys.argv` を使用。
+
+    Returns:
+        すべてのブックを処理できた場合は 0、評価対象がない・読み書きに失敗した
+        ブックがある場合は 1 を返す。
+    """
+    parser = _build_parser()
     args = parser.parse_args(argv)
+    limits = _limits_from_args(args)
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs には 1 以上を指定してください。")
+    if args.watch_interval <= 0:
+        parser.error("--watch-interval には正の秒数を指定してください。")
+    if args.formulas is not None:
+        try:
+            library = load_library(Path(args.formulas))
+        except (OSError, FormulaLibraryError) as exc:
+            print(f"[エラー] 計算式マスタを読み込めませんでした: {exc}")
+            return 1
+        print(f"[情報] 計算式マスタ 版 {library.version}（{len(library)} 件）")
+
+    targets = args.workbooks or [str(DEFAULT_WORKBOOK)]
+    template_created = False
+    if (
+        len(targets) == 1
+        and not _is_pattern(targets[0])
+        and not Path(targets[0]).is_dir()
+    ):
+        # 単一ブックの指定時のみ、従来どおりテンプレートを用意する。
+        workbook_path = Path(targets[0]).resolve()
+        template_created = ensure_template(workbook_path)
+        if args.create_template:
+            return 0
+        workbooks = [workbook_path]
+    else:
+        if args.create_template:
+            parser.error("--create-template は単一のブック指定時のみ利用できます。")
+        workbooks = discover_workbooks(targets)
+        if not workbooks:
+            print("[警告] 対象のブックが見つかりませんでした。")
+            return 1
+
+    metrics_path = Path(args.metrics_file).resolve() if args.metrics_file else None
+    exporter = None
+    if metrics_path is not None and args.metrics_interval:
+        exporter = PeriodicExporter(
+            REGISTRY, metrics_path, args.metrics_interval
+        ).start()
+    tracer = TraceRecorder(enabled=args.trace is not None, process_name="excel_cli")
+    if args.capture:
+        start_capture(
+            WorkloadRecorder(
+                Path(args.capture).resolve(), anonymize=args.capture_anonymize
+            )
+        )
+    started = perf_counter()
+    try:
+        if args.watch:
+            from .excel_watch import watch_workbooks
+
+            return watch_workbooks(
+                workbooks, args, limits, tracer, interval=args.watch_interval
+            )
+        summaries = _run_workbooks(workbooks, args, limits, tracer)
+    finally:
+        if args.trace is not None:
+            tracer.write(Path(args.trace).resolve())
+        if exporter is not None:
+            exporter.stop()
+        elif metrics_path is not None:
+            REGISTRY.write_textfile(metrics_path)
+        recorder = stop_capture() if args.capture else None
+        if recorder is not None:
+            print(f"[情報] 評価 {recorder.count} 件を記録しました: {recorder.path}")
+    elapsed = perf_counter() - started
+
+    if args.error_log:
+        entries = [entry for summary in summaries for entry in summary.error_log]
+        _write_error_log(Path(args.error_log).resolve(), entries)
+    if len(summaries) > 1:
+        _print_summary(summaries, elapsed)
+    if args.summary_json:
+        _write_summary_json(Path(args.summary_json).resolve(), summaries, elapsed)
+    if template_created:
+        print("[ヒント] テンプレートにデータを入力して再実行してください。")
+    return 0 if all(summary.status == "OK" for summary in summaries) else 1
+
+
+def _is_pattern(target: str) -> bool:
+    """ワイルドカードを含む指定かどうかを判定する。"""
+    return any(char in target for char in "*?[")
+
+
+def discover_workbooks(targets: Iterable[str]) -> list[Path]:
+    """ファイル・ディレクトリ・ワイルドカードの指定から処理対象のブックを列挙する。
+
+    ディレクトリは直下の `.xlsx`/`.xlsm` を対象とし、Excel のロックファイル
+    （`~$` 始まり）と隠しファイルは除外する。
+
+    Args:
+        targets: コマンドラインで指定されたパスまたはパターン。
+
+    Returns:
+        重複を除いた絶対パスのリスト（指定順、各指定内は名前順）。
+    """
+    found: dict[Path, None] = {}
+    for target in targets:
+        if _is_pattern(target):
+            candidates = sorted(Path(p) for p in glob.glob(target, recursive=True))
+        elif Path(target).is_dir():
+            candidates = sorted(Path(target).iterdir())
+        else:
+            found.setdefault(Path(target).resolve())
+            continue
+        for candidate in candidates:
+            if (
+                candidate.is_file()
+                and candidate.suffix.lower() in WORKBOOK_SUFFIXES
+                and not candidate.name.startswith(("~$", "."))
+            ):
+                found.setdefault(candidate.resolve())
+    return list(found)
+
+
+@dataclass
+class WorkbookSummary:
+    """1 ブック分の処理結果。ワーカープロセスから親プロセスへ返却する。
+
+    Attributes:
+        path: ブックのパス。
+        status: `OK`・`EMPTY`（評価対象行なし）・`FAILED`（読み書きの失敗）。
+        sheets: 評価したシート数。
+        rows: 評価した行数。
+        ok: エラーなく評価できた行数。
+        errors: `"エラー"` となった行数（calc_type 未入力を含む）。
+        budget_exceeded: 予算超過となった行数。
+        seconds: ブックの読み込みから保存までの所要時間（秒）。
+        message: `FAILED` 時の例外メッセージ。
+        output: ワーカーで処理した場合の標準出力。
+        error_log: `--error-log` 向けのエラー詳細。
+        formulas: 使用した計算式マスタの `FormulaLibrary.to_dict()`。
+        trace_events: ワーカーで記録した trace-event。
+        metrics: ワーカーで記録したメトリクスのスナップショット。
+        captured: ワーカーで記録した評価（`--capture`）。
+    """
+
+    path: Path
+    status: str = "OK"
+    sheets: int = 0
+    rows: int = 0
+    ok: int = 0
+    errors: int = 0
+    budget_exceeded: int = 0
+    seconds: float = 0.0
+    message: str = ""
+    output: str = ""
+    error_log: list[dict[str, object]] = field(default_factory=list)
+    formulas: dict[str, object] | None = None
+    trace_events: list[TraceEvent] = field(default_factory=list)
+    metrics: dict[str, Any] | None = None
+    captured: list[CapturedEvaluation] = field(default_factory=list)
+
+    def to_dict(self) -> dict[str, object]:
+        """`--summary-json` 向けの辞書へ変換する。"""
+        return {
+            "path": str(self.path),
+            "status": self.status,
+            "sheets": self.sheets,
+            "rows": self.rows,
+            "ok": self.ok,
+            "errors": self.errors,
+            "budget_exceeded": self.budget_exceeded,
+            "seconds": self.seconds,
+            "message": self.message,
+            "formulas": self.formulas,
+        }
+
+
+def _resolve_jobs(jobs: int | None, workbook_count: int) -> int:
+    """ワーカープロセス数を決定する。"""
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    return max(1, min(jobs, workbook_count))
+
+
+def _worker_args(args: argparse.Namespace, processes: int) -> argparse.Namespace:
+    """ワーカープロセスへ渡す引数を返す。
+
+    行参照の段（ウェーブ）を評価するスレッド数（`wave_jobs`）は、`--jobs` を
+    プロセス数で分け合った値とする。各プロセスが `--jobs` 個のスレッドを作ると、
+    全体で最大 `--jobs` の 2 乗のスレッドが動くため。
+
+    Args:
+        args: `argparse` の解析結果。
+        processes: ワーカープロセス数。
+
+    Returns:
+        `wave_jobs` を設定した `args` の複製。
+    """
+    total = args.jobs if args.jobs is not None else os.cpu_count() or 1
+    return argparse.Namespace(**{**vars(args), "wave_jobs": max(1, total // processes)})
 
-    workbook_path = Path(args.workbook).resolve()
 
-    template_created = ensure_template(workbook_path)
-    if args.create_template:
+def _run_workbooks(
+    workbooks: list[Path],
+    args: argparse.Namespace,
+    limits: EvaluationLimits | None,
+    tracer: TraceRecorder,
+) -> list[WorkbookSummary]:
+    """複数のブックを処理する。2 件以上かつ `--jobs` が 2 以上ならプロセス並列。
+
+    ワーカーはプロセスプールで再利用されるため、式の構文解析キャッシュ
+    （`EXPRESSION_CACHE`）は同じワーカーが処理する全ブックで共有される。
+    処理時間の長いブックが最後に残らないよう、ファイルサイズの大きい順に投入する。
+
+    Args:
+        workbooks: 対象ブックのパス。
+        args: `argparse` の解析結果。
+        limits: 1 行の評価に割り当てる実行予算。
+        tracer: 処理段階の所要時間の記録先。
+
+    Returns:
+        `workbooks` と同じ順序の処理結果。
+    """
+    jobs = _resolve_jobs(args.jobs, len(workbooks))
+    if jobs == 1:
+        return [_process_workbook(path, args, limits, tracer) for path in workbooks]
+
+    order = sorted(
+        range(len(workbooks)),
+        key=lambda index: -_file_size(workbooks[index]),
+    )
+    summaries: dict[int, WorkbookSummary] = {}
+    recorder = current_recorder()
+    worker_args = _worker_args(args, jobs)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(
+                _process_workbook_in_worker,
+                workbooks[index],
+                worker_args,
+                limits,
+                tracer.enabled,
+                None if recorder is None else recorder.key,
+            ): index
+            for index in order
+        }
+        for future in as_completed(futures):
+            summary = future.result()
+            print(summary.output, end="")
+            tracer.extend(summary.trace_events)
+            if recorder is not None:
+                recorder.extend(summary.captured)
+            if summary.metrics is not None:
+                REGISTRY.merge(summary.metrics)
+            summaries[futures[future]] = summary
+    return [summaries[index] for index in range(len(workbooks))]
+
+
+def _file_size(path: Path) -> int:
+    """ファイルサイズを返す。取得できない場合は 0。"""
+    try:
+        return path.stat().st_size
+    except OSError:
         return 0
 
-    wb = load_workbook(workbook_path)
-    ws = wb.active
 
-    data_rows = list(_iter_data_rows(ws))
-    if not data_rows:
+def _process_workbook_in_worker(
+    path: Path,
+    args: argparse.Namespace,
+    limits: EvaluationLimits | None,
+    trace_enabled: bool,
+    capture_key: bytes | None = None,
+) -> WorkbookSummary:
+    """ワーカープロセスで 1 ブックを処理し、出力・トレース・メトリクスを添えて返す。
+
+    Args:
+        path: 対象ブックのパス。
+        args: `argparse` の解析結果。
+        limits: 1 行の評価に割り当てる実行予算。
+        trace_enabled: trace-event を記録する場合は ``True``。
+        capture_key: `--capture` 指定時の、親プロセスのレコーダーの匿名化の鍵。
+
+    Returns:
+        処理結果。
+    """
+    # ワーカーのレジストリは親へ差分を返すためだけに使う。
+    REGISTRY.reset()
+    tracer = TraceRecorder(
+        enabled=trace_enabled, process_name=f"excel_cli worker {os.getpid()}"
+    )
+    recorder = None
+    if capture_key is not None:
+        recorder = WorkloadRecorder(anonymize=args.capture_anonymize, key=capture_key)
+        start_capture(recorder)
+    buffer = io.StringIO()
+    try:
+        with redirect_stdout(buffer):
+            summary = _process_workbook(path, args, limits, tracer)
+    finally:
+        if recorder is not None:
+            stop_capture()
+    summary.output = buffer.getvalue()
+    summary.trace_events = tracer.events
+    summary.metrics = REGISTRY.snapshot()
+    if recorder is not None:
+        summary.captured = recorder.entries
+    return summary
+
+
+def _process_workbook(
+    workbook_path: Path,
+    args: argparse.Namespace,
+    limits: EvaluationLimits | None,
+    tracer: TraceRecorder,
+) -> WorkbookSummary:
+    """1 つのブックを読み込み、対象シートの全データ行を評価して保存する。
+
+    Args:
+        workbook_path: 対象ブックのパス。
+        args: `argparse` の解析結果。
+        limits: 1 行の評価に割り当てる実行予算。
+        tracer: 処理段階の所要時間の記録先。
+
+    Returns:
+        処理結果。読み書きに失敗した場合も例外は送出せず `FAILED` を返す。
+    """
+    summary = WorkbookSummary(path=workbook_path)
+    started = perf_counter()
+    try:
+        if getattr(args, "job", None):
+            from .job_queue import run_job
+
+            run_job(workbook_path, args, limits, tracer, summary)
+        else:
+            _run_workbook(workbook_path, args, limits, tracer, summary)
+    except (
+        OSError,
+        KeyError,
+        ValueError,
+        zipfile.BadZipFile,
+        InvalidFileException,
+        sqlite3.Error,
+    ) as exc:
+        # 読み込めないブック（壊れた zip・必要なパーツの欠落）・保存の失敗・
+        # 計算式マスタの誤り・ジョブデータベースの異常。
+        summary.status = "FAILED"
+        summary.message = f"{type(exc).__name__}: {exc}"
+        print(f"[エラー] ブックを処理できませんでした: {workbook_path}: {exc}")
+    summary.seconds = perf_counter() - started
+    return summary
+
+
+def _run_workbook(
+    workbook_path: Path,
+    args: argparse.Namespace,
+    limits: EvaluationLimits | None,
+    tracer: TraceRecorder,
+    summary: WorkbookSummary,
+) -> None:
+    """ブックを読み込み、対象シートを評価して原子的に保存する。
+
+    Args:
+        workbook_path: 対象ブックのパス。
+        args: `argparse` の解析結果。
+        limits: 1 行の評価に割り当てる実行予算。
+        tracer: 処理段階の所要時間の記録先。
+        summary: 件数の集計先。
+    """
+    started = perf_counter()
+    with tracer.span("load_workbook", path=str(workbook_path)):
+        wb = load_workbook(workbook_path)
+    PHASE_SECONDS.observe(perf_counter() - started, "load")
+
+    library = _workbook_library(wb, args, workbook_path)
+    if library is not None:
+        summary.formulas = library.to_dict()
+    sheets = [
+        ws
+        for ws in (wb.worksheets if args.all_sheets else [wb.active])
+        if ws.title != FORMULA_SHEET
+    ]
+    total_profile = Profiler() if args.profile else None
+    started = perf_counter()
+    sheet_rows: list[tuple[Worksheet, list[int]]] = []
+    for ws in sheets:
+        with tracer.span("iter_data_rows", sheet=ws.title):
+            data_rows = list(_iter_data_rows(ws))
+        if data_rows:
+            sheet_rows.append((ws, data_rows))
+    graph = RowGraph(
+        {
+            (ws.title, row): _normalize_multiline(ws.cell(row=row, column=3).value)
+            for ws, data_rows in sheet_rows
+            for row in data_rows
+        }
+    )
+    evaluated = None
+    if graph:
+        evaluated = _evaluate_graph(
+            graph, sheet_rows, args, limits, tracer, library, total_profile is not None
+        )
+    for ws, data_rows in sheet_rows:
+        summary.sheets += 1
+        if args.all_sheets:
+            print(f"[情報] シート {ws.title}: {len(data_rows)} 行の評価を開始します。")
+        else:
+            print(f"[情報] {len(data_rows)} 行の評価を開始します。")
+        _run_sheet(
+            ws,
+            data_rows,
+            args,
+            limits,
+            tracer,
+            summary,
+            total_profile,
+            library,
+            evaluated,
+        )
+    PHASE_SECONDS.observe(perf_counter() - started, "evaluate")
+
+    if not summary.rows:
+        summary.status = "EMPTY"
         print(
             "[警告] 評価対象の行が見つかりませんでした。テンプレートを編集して再実行してください。"
         )
-        return 1
+        return
 
-    print(f"[情報] {len(data_rows)} 行の評価を開始します。")
-    for row in data_rows:
-        raw, edited, reported, status = _evaluate_row(ws, row)
-        _record_results(ws, row, raw, edited, reported, status)
-        print(f"  行 {row}: {status}")
+    if total_profile is not None:
+        print("[情報] プロファイル（ブック全体）")
+        print(total_profile.render(indent="  "))
 
-    wb.save(workbook_path)
+    started = perf_counter()
+    with tracer.span("save", path=str(workbook_path)):
+        _save_workbook(wb, workbook_path)
+    PHASE_SECONDS.observe(perf_counter() - started, "save")
     print(f"[情報] 結果を保存しました: {workbook_path}")
-    if template_created:
-        print("[ヒント] テンプレートにデータを入力して再実行してください。")
-    return 0
+
+
+def _run_sheet(
+    ws: Worksheet,
+    data_rows: list[int],
+    args: argparse.Namespace,
+    limits: EvaluationLimits | None,
+    tracer: TraceRecorder,
+    summary: WorkbookSummary,
+    total_profile: Profiler | None,
+    library: FormulaLibrary | None = None,
+    evaluated: dict[RowKey, tuple[EvaluationResult, str, Profiler | None]]
+    | None = None,
+) -> None:
+    """1 シートのデータ行を評価し、結果を書き戻す。
+
+    Args:
+        ws: 対象のワークシート。
+        data_rows: 評価する行番号。
+        args: `argparse` の解析結果。
+        limits: 1 行の評価に割り当てる実行予算。
+        tracer: 処理段階の所要時間の記録先。
+        summary: 件数・エラー詳細の集計先。
+        total_profile: ブック全体のプロファイル集計先。
+        library: 計算式列の `@ID` を解決する計算式マスタ。
+        evaluated: 行参照のあるブックで `_evaluate_graph` が評価済みの結果。
+            指定した場合は評価せずに書き戻す。
+    """
+    if args.error_column:
+        ws.cell(row=2, column=ERROR_DETAIL_COLUMN, value=ERROR_DETAIL_HEADER)
+    for offset in range(0, len(data_rows), EVALUATION_CHUNK_ROWS):
+        chunk = data_rows[offset : offset + EVALUATION_CHUNK_ROWS]
+        tags: dict[str, object] = {}
+        if tracer.enabled:
+            tags = {
+                "sheet": ws.title,
+                "rows": row_range(chunk),
+                "scripts": _chunk_script_hashes(ws, chunk),
+            }
+            if library is not None:
+                tags["formulas"] = library.version
+        results = []
+        profiles: list[Profiler | None] = []
+        with tracer.span("evaluate_rows", cat="evaluate", **tags):
+            for row in chunk:
+                if evaluated is not None:
+                    result, status, row_profile = evaluated[(ws.title, row)]
+                    results.append((result, status))
+                    profiles.append(row_profile)
+                    continue
+                row_profile = Profiler() if total_profile is not None else None
+                results.append(
+                    _evaluate_row(
+                        ws,
+                        row,
+                        row_profile,
+                        limits,
+                        args.strict_inputs,
+                        library,
+                        getattr(args, "measurement_dir", None),
+                    )
+                )
+                profiles.append(row_profile)
+        with tracer.span("record_results", rows=tags.get("rows", "")):
+            for row, (result, status), row_profile in zip(
+                chunk, results, profiles, strict=True
+            ):
+                _record_results(
+                    ws, row, result.raw, result.edited, result.reported, status
+                )
+                if args.error_column:
+                    _write_text_cell(ws, row, ERROR_DETAIL_COLUMN, result.describe())
+                summary.rows += 1
+                if status == "BUDGET_EXCEEDED":
+                    summary.budget_exceeded += 1
+                elif status == "OK" and result.ok:
+                    summary.ok += 1
+                else:
+                    summary.errors += 1
+                if args.error_log and not result.ok:
+                    summary.error_log.append(
+                        {
+                            "workbook": str(summary.path),
+                            "sheet": ws.title,
+                            "row": row,
+                            **result.to_dict(),
+                        }
+                    )
+                print(f"  行 {row}: {status}")
+                if total_profile is not None and row_profile is not None:
+                    print(row_profile.render(limit=3, indent="    "))
+                    total_profile.merge(row_profile)
+
+
+def _evaluate_graph(
+    graph: RowGraph,
+    sheet_rows: list[tuple[Worksheet, list[int]]],
+    args: argparse.Namespace,
+    limits: EvaluationLimits | None,
+    tracer: TraceRecorder,
+    library: FormulaLibrary | None,
+    profile: bool,
+) -> dict[RowKey, tuple[EvaluationResult, str, Profiler | None]]:
+    """行参照の依存関係の順に、参照し合わない行の段（ウェーブ）ごとに評価する。
+
+    各段の行はスレッドプールで評価する（`evaluate_many` と同じく、並列に
+    実行されるのは GIL のないビルドの場合）。スレッド数は `--jobs`、ワーカー
+    プロセス内では `--jobs` をプロセス数で分けた `wave_jobs`。変数列の
+    `{行番号}` は前の段までの評価結果で置き換える。循環参照に含まれる行、参照先の評価に
+    失敗した行は評価せずに status を `ERROR: ...` とする。
+
+    Args:
+        graph: 評価対象の全行の依存関係。
+        sheet_rows: 評価対象のシートと行番号。
+        args: `argparse` の解析結果。
+        limits: 1 行の評価に割り当てる実行予算。
+        tracer: 処理段階の所要時間の記録先。
+        library: 計算式列の `@ID` を解決する計算式マスタ。
+        profile: 行ごとのプロファイルを記録するか（記録する場合は逐次評価）。
+
+    Returns:
+        `(シート名, 行番号)` をキーとした `(評価結果, status, プロファイル)`。
+    """
+    # openpyxl のセル参照はスレッドセーフでないため、入力列は先に読み出しておく。
+    cells = {
+        (ws.title, row): tuple(
+            ws.cell(row=row, column=column).value for column in (1, 2, 3)
+        )
+        for ws, data_rows in sheet_rows
+        for row in data_rows
+    }
+    waves, failures = graph.waves(cells)
+    evaluated: dict[RowKey, tuple[EvaluationResult, str, Profiler | None]] = {
+        key: (EvaluationResult(None, None, None), f"ERROR: {message}", None)
+        for key, message in failures.items()
+    }
+
+    def outputs(key: RowKey) -> RowOutputs | None:
+        result, status, _profile = evaluated[key]
+        if status != "OK" or not result.ok:
+            return None
+        return result.as_tuple()
+
+    def run(key: RowKey) -> tuple[EvaluationResult, str, Profiler | None]:
+        calc_type, script, inputs_value = cells[key]
+        try:
+            inputs = substitute_references(
+                _normalize_multiline(inputs_value), key[0], outputs
+            )
+        except RowReferenceError as exc:
+            return EvaluationResult(None, None, None), f"ERROR: {exc}", None
+        row_profile = Profiler() if profile else None
+        result, status = _evaluate_values(
+            calc_type,
+            script,
+            inputs,
+            row_profile,
+            limits,
+            args.strict_inputs,
+            library,
+            getattr(args, "measurement_dir", None),
+        )
+        return result, status, row_profile
+
+    widest = max((len(wave) for wave in waves), default=1)
+    jobs = getattr(args, "wave_jobs", None) or args.jobs
+    workers = 1 if profile else _resolve_jobs(jobs, widest)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for number, wave in enumerate(waves, start=1):
+            with tracer.span(
+                "evaluate_wave", cat="evaluate", wave=number, rows=len(wave)
+            ):
+                # 1 行だけの段（鎖状の参照）はスレッドへ渡さずに評価する。
+                entries = pool.map(run, wave) if len(wave) > 1 else map(run, wave)
+                for key, entry in zip(wave, entries, strict=True):
+                    evaluated[key] = entry
+    return evaluated
+
+
+def _workbook_library(
+    wb: Workbook, args: argparse.Namespace, path: Path
+) -> FormulaLibrary | None:
+    """ブックの評価に用いる計算式マスタを返す。
+
+    `--formulas` のファイルと、ブック内の `計算式マスタ` シートの両方がある
+    場合は、同じ ID についてブック内のシートを優先する。
+
+    Args:
+        wb: 対象のブック。
+        args: `argparse` の解析結果。
+        path: ブックのパス（エラーメッセージ用）。
+
+    Returns:
+        計算式マスタ。どちらもなければ ``None``。
+    """
+    formulas = getattr(args, "formulas", None)
+    library = load_library(Path(formulas)) if formulas else None
+    if FORMULA_SHEET in wb.sheetnames:
+        own = FormulaLibrary.from_worksheet(
+            wb[FORMULA_SHEET], f"{path.name}:{FORMULA_SHEET}"
+        )
+        library = own if library is None else library.merged(own)
+    return library
+
+
+def _save_workbook(wb: Workbook, path: Path) -> None:
+    """ブックを同じディレクトリの一時ファイルへ保存してから置き換える。
+
+    保存途中で中断しても元のブックが壊れないようにする。
+
+    Args:
+        wb: 保存するブック。
+        path: 保存先のパス。
+    """
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        wb.save(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def _write_error_log(path: Path, entries: list[dict[str, object]]) -> None:
+    """失敗した行のエラー詳細を JSON Lines 形式で書き出す。
+
+    Args:
+        path: 出力先のパス。
+        entries: ブック・シート・行番号と `EvaluationResult.to_dict()` を結合した
+            辞書のリスト。
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as fh:
+        for entry in entries:
+            fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    print(f"[情報] エラー詳細を書き出しました: {path} ({len(entries)} 件)")
+
+
+def _print_summary(summaries: list[WorkbookSummary], elapsed: float) -> None:
+    """複数ブックの処理結果の集計を表示する。
+
+    Args:
+        summaries: ブックごとの処理結果。
+        elapsed: 全体の所要時間（秒）。
+    """
+    failed = sum(1 for summary in summaries if summary.status != "OK")
+    print(
+        f"[集計] ブック {len(summaries)} 件"
+        f"・シート {sum(summary.sheets for summary in summaries)} 件"
+        f"・行 {sum(summary.rows for summary in summaries)} 件"
+        f"（OK {sum(summary.ok for summary in summaries)}"
+        f" / エラー {sum(summary.errors for summary in summaries)}"
+        f" / 上限超過 {sum(summary.budget_exceeded for summary in summaries)}）"
+        f"・失敗 {failed} 件・{elapsed:.2f} 秒"
+    )
+    for summary in summaries:
+        print(
+            f"  {summary.status:<6} {summary.path}: {summary.rows} 行"
+            f" ({summary.seconds:.2f} 秒) {summary.message}".rstrip()
+        )
+
+
+def _write_summary_json(
+    path: Path, summaries: list[WorkbookSummary], elapsed: float
+) -> None:
+    """処理結果の集計を JSON で書き出す。
+
+    Args:
+        path: 出力先のパス。
+        summaries: ブックごとの処理結果。
+        elapsed: 全体の所要時間（秒）。
+    """
+    payload = {
+        "seconds": elapsed,
+        "workbooks": [summary.to_dict() for summary in summaries],
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), "utf-8")
 
 
 if __name__ == "__main__":  # pragma: no cover - CLI entry point
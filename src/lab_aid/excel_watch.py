@@ -0,0 +1,498 @@
+"""Excel ブックの変更を監視し、変更された行だけを再評価するモジュール。"""
+
+from __future__ import annotations
+
+import argparse
+import time
+import zipfile
+from pathlib import Path
+from time import perf_counter
+
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+from openpyxl.worksheet.worksheet import Worksheet
+
+from .engine import EvaluationLimits, EvaluationResult
+from .engine.runtime.constants import ERROR_TEXT
+from .engine.runtime.metrics import PHASE_SECONDS
+from .excel_cli import (
+    ERROR_DETAIL_COLUMN,
+    ERROR_DETAIL_HEADER,
+    _evaluate_values,
+    _save_workbook,
+    _to_text,
+    _write_text_cell,
+)
+from .formula_library import (
+    FORMULA_SHEET,
+    FormulaLibrary,
+    formula_reference,
+    load_library,
+)
+from .row_graph import (
+    RowGraph,
+    RowOutputs,
+    RowReferenceError,
+    substitute_references,
+)
+from .tracing import TraceRecorder
+from .xlsx_patch import SheetXml, UnsupportedWorkbookError, XlsxPackage, parse_row
+
+RowKey = tuple[str, int]
+RowValues = tuple[str, ...]
+
+
+def _file_signature(path: Path) -> tuple[int, int] | None:
+    """変更検知に用いる `(mtime_ns, size)` を返す。存在しない場合は ``None``。"""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class WorkbookWatcher:
+    """1 つのブックについて、前回評価時点の行内容との差分だけを再評価する。
+
+    行の比較は入力列と出力列の両方で行うため、入力を編集した行だけでなく
+    出力セルを消した行も再評価の対象になる。自分で保存した後のファイル署名を
+    記録しておくことで、書き戻しによる変更は検知しない。
+
+    読み書きは `XlsxPackage` による行単位の高速経路で行い、行要素の XML が
+    前回と同一で、参照する共有文字列も変わっていない行は解析自体を省く。
+    高速経路で扱えないブックは openpyxl による処理へ切り替える。
+
+    計算式マスタ（`--formulas` のファイルまたはブック内の `計算式マスタ` シート）の
+    内容が変わった場合は、`@ID` を参照する行を入力の変化に関係なく再評価する。
+    変数列で他の行の出力を参照する行（`{行番号}`）は、参照先が再評価された場合も
+    再評価の対象とし、依存関係の順に評価する。
+
+    Attributes:
+        path: 監視対象のブック。
+        args: `argparse` の解析結果（`all_sheets`・`error_column`・`strict_inputs`・
+            `formulas` を参照）。
+        limits: 1 行の評価に割り当てる実行予算。
+        tracer: 処理段階の所要時間の記録先。
+        signature: 直近に処理したファイルの `(mtime_ns, size)`。
+        snapshot: `(シート名, 行番号)` をキーにした、前回評価後の行内容。
+        library: 直近の評価に用いた計算式マスタ。
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        args: argparse.Namespace,
+        limits: EvaluationLimits | None = None,
+        tracer: TraceRecorder | None = None,
+    ) -> None:
+        self.path = path
+        self.args = args
+        self.limits = limits
+        self.tracer = tracer or TraceRecorder(enabled=False)
+        self.signature: tuple[int, int] | None = None
+        self.snapshot: dict[RowKey, RowValues] = {}
+        self._columns = ERROR_DETAIL_COLUMN if args.error_column else 7
+        self._fast = True
+        self._row_xml: dict[RowKey, tuple[str, tuple[int, ...]]] = {}
+        self._shared_digest: bytes | None = None
+        self._shared: list[str] | None = None
+        self.library: FormulaLibrary | None = None
+        formulas = getattr(args, "formulas", None)
+        self._formulas_path = Path(formulas) if formulas else None
+        self._formulas_signature: tuple[int, int] | None = None
+
+    def changed(self) -> bool:
+        """前回処理した時点からブックまたは計算式マスタのファイルが更新されていれば ``True``。"""
+        current = _file_signature(self.path)
+        if current is not None and current != self.signature:
+            return True
+        return (
+            self._formulas_path is not None
+            and _file_signature(self._formulas_path) != self._formulas_signature
+        )
+
+    def refresh(self) -> int:
+        """ブックを読み込み、変更された行だけを評価して書き戻す。
+
+        Returns:
+            再評価した行数。0 の場合はブックを保存しない。
+
+        Raises:
+            OSError: ブックの保存に失敗した場合（Excel で開いている場合など）。
+                次回の `changed` が ``True`` となるよう署名は更新しない。
+        """
+        if self._fast:
+            try:
+                return self._refresh_package()
+            except UnsupportedWorkbookError as exc:
+                print(f"[情報] openpyxl による処理へ切り替えます: {exc}")
+                self._fast = False
+                self._row_xml.clear()
+        return self._refresh_openpyxl()
+
+    def _evaluate_rows(
+        self, current: dict[RowKey, RowValues], changed: list[RowKey]
+    ) -> list[tuple[RowKey, list[str]]]:
+        """変更行と、それらを直接・間接に参照する行を依存関係の順に評価する。
+
+        評価した行の `current` の出力列は評価結果で更新する。
+
+        Args:
+            current: 今回読み込んだ全行の内容。
+            changed: 前回から内容の変わった行。
+
+        Returns:
+            評価した行と、出力列（4 列目以降）へ書き込む文字列。
+        """
+        graph = RowGraph({key: values[2] for key, values in current.items()})
+        failures: dict[RowKey, str] = {}
+        order = changed
+        if graph:
+            closure = graph.downstream(changed)
+            waves, failures = graph.waves([key for key in current if key in closure])
+            order = [*failures, *(key for wave in waves for key in wave)]
+        evaluated = []
+        for key in order:
+            written = self._evaluate(key, current, failures.get(key))
+            current[key] = (*current[key][:3], *written)
+            evaluated.append((key, written))
+        return evaluated
+
+    def _evaluate(
+        self, key: RowKey, current: dict[RowKey, RowValues], failure: str | None
+    ) -> list[str]:
+        """1 行を評価し、出力列（4 列目以降）へ書き込む文字列を返す。"""
+        title, row = key
+        values = current[key]
+        inputs = values[2]
+        if failure is None:
+            try:
+                inputs = substitute_references(
+                    inputs, title, lambda target: _row_outputs(current.get(target))
+                )
+            except RowReferenceError as exc:
+                failure = str(exc)
+        if failure is not None:
+            result, status = EvaluationResult(None, None, None), f"ERROR: {failure}"
+        else:
+            result, status = _evaluate_values(
+                values[0],
+                values[1],
+                inputs,
+                None,
+                self.limits,
+                self.args.strict_inputs,
+                self.library,
+                getattr(self.args, "measurement_dir", None),
+            )
+        written = [
+            _to_text(result.raw),
+            _to_text(result.edited),
+            _to_text(result.reported),
+            status,
+        ]
+        if self.args.error_column:
+            written.append(result.describe())
+        print(f"  {title} 行 {row}: {status}")
+        return written
+
+    def _update_library(self, own: FormulaLibrary | None) -> None:
+        """計算式マスタを読み直し、内容が変わっていれば参照行の前回内容を破棄する。
+
+        Args:
+            own: ブック内の `計算式マスタ` シートから作成した計算式マスタ。
+        """
+        library = None
+        if self._formulas_path is not None:
+            self._formulas_signature = _file_signature(self._formulas_path)
+            library = load_library(self._formulas_path)
+        if own is not None:
+            library = own if library is None else library.merged(own)
+        previous = None if self.library is None else self.library.digest
+        current = None if library is None else library.digest
+        if previous != current:
+            stale = [
+                key
+                for key, values in self.snapshot.items()
+                if formula_reference(values[1]) is not None
+            ]
+            for key in stale:
+                del self.snapshot[key]
+                self._row_xml.pop(key, None)
+        self.library = library
+
+    def _refresh_package(self) -> int:
+        """`XlsxPackage` で差分の検出と変更行の書き戻しを行う。"""
+        signature = _file_signature(self.path)
+        started = perf_counter()
+        with self.tracer.span("load_workbook", path=str(self.path)):
+            package = XlsxPackage(self.path)
+        PHASE_SECONDS.observe(perf_counter() - started, "load")
+
+        started = perf_counter()
+        indexes = [
+            index
+            for index in (
+                range(len(package.sheets))
+                if self.args.all_sheets
+                else [package.active_index]
+            )
+            if package.sheets[index][0] != FORMULA_SHEET
+        ]
+        own = None
+        for title, part in package.sheets:
+            if title == FORMULA_SHEET:
+                master = package.sheet(title, part)
+                own = FormulaLibrary.from_rows(
+                    (
+                        parse_row(master.text[begin:end], package.shared_strings, 3)[0]
+                        for row, (begin, end) in master.rows.items()
+                        if row >= 2
+                    ),
+                    f"{self.path.name}:{FORMULA_SHEET}",
+                )
+        self._update_library(own)
+        stale = self._stale_shared_strings(package)
+        current: dict[RowKey, RowValues] = {}
+        current_xml: dict[RowKey, tuple[str, tuple[int, ...]]] = {}
+        changed: list[RowKey] = []
+        sheets: list[SheetXml] = []
+        for index in indexes:
+            sheet = package.sheet(*package.sheets[index])
+            sheets.append(sheet)
+            with self.tracer.span("diff_rows", sheet=sheet.title):
+                for row, (begin, end) in sheet.rows.items():
+                    if row < 3:
+                        continue
+                    key = (sheet.title, row)
+                    xml = sheet.text[begin:end]
+                    previous_xml = self._row_xml.get(key)
+                    if (
+                        stale is not None
+                        and previous_xml is not None
+                        and previous_xml[0] == xml
+                        and stale.isdisjoint(previous_xml[1])
+                    ):
+                        current_xml[key] = previous_xml
+                        previous = self.snapshot.get(key)
+                        if previous is not None:
+                            current[key] = previous
+                        continue
+                    values, refs = parse_row(xml, package.shared_strings, self._columns)
+                    current_xml[key] = (xml, refs)
+                    if not any(value.strip() for value in values[:3]):
+                        continue
+                    current[key] = values
+                    if self.snapshot.get(key) != values:
+                        changed.append(key)
+
+        parts = {sheet.title: sheet.part for sheet in sheets}
+        updates: dict[str, dict[int, dict[int, str]]] = {}
+        with self.tracer.span("evaluate_rows", cat="evaluate"):
+            evaluated = self._evaluate_rows(current, changed)
+            for (title, row), written in evaluated:
+                sheet_updates = updates.setdefault(parts[title], {})
+                sheet_updates[row] = dict(enumerate(written, start=4))
+        PHASE_SECONDS.observe(perf_counter() - started, "evaluate")
+
+        if evaluated:
+            started = perf_counter()
+            with self.tracer.span("save", rows=len(evaluated)):
+                patched_sheets = []
+                for sheet in sheets:
+                    rows_to_patch = updates.get(sheet.part)
+                    if not rows_to_patch:
+                        continue
+                    if self.args.error_column and 2 in sheet.rows:
+                        rows_to_patch[2] = {ERROR_DETAIL_COLUMN: ERROR_DETAIL_HEADER}
+                    for row, xml in sheet.patch(rows_to_patch).items():
+                        key = (sheet.title, row)
+                        if key in current_xml:
+                            # 出力列はインライン文字列で書くため、参照番号は入力列分のまま。
+                            current_xml[key] = (xml, current_xml[key][1])
+                    patched_sheets.append(sheet)
+                package.save(patched_sheets)
+            PHASE_SECONDS.observe(perf_counter() - started, "save")
+            signature = _file_signature(self.path)
+        self.snapshot = current
+        self._row_xml = current_xml
+        self.signature = signature
+        return len(evaluated)
+
+    def _stale_shared_strings(self, package: XlsxPackage) -> set[int] | None:
+        """前回から内容の変わった共有文字列の番号を返す。
+
+        Args:
+            package: 今回読み込んだパッケージ。
+
+        Returns:
+            変わった番号の集合（変化なしは空集合）。前回の共有文字列がない場合は
+            ``None`` を返し、全行を解析し直す。
+        """
+        previous = self._shared
+        if package.shared_digest == self._shared_digest:
+            return set()
+        current = package.shared_strings
+        self._shared = current
+        self._shared_digest = package.shared_digest
+        if previous is None:
+            return None
+        stale = {
+            index
+            for index, text in enumerate(previous)
+            if index >= len(current) or current[index] != text
+        }
+        return stale
+
+    def _refresh_openpyxl(self) -> int:
+        """openpyxl でブック全体を読み込み、変更行を評価して保存する。"""
+        signature = _file_signature(self.path)
+        started = perf_counter()
+        with self.tracer.span("load_workbook", path=str(self.path)):
+            wb = load_workbook(self.path)
+        PHASE_SECONDS.observe(perf_counter() - started, "load")
+
+        started = perf_counter()
+        self._update_library(
+            FormulaLibrary.from_worksheet(
+                wb[FORMULA_SHEET], f"{self.path.name}:{FORMULA_SHEET}"
+            )
+            if FORMULA_SHEET in wb.sheetnames
+            else None
+        )
+        sheets = [
+            ws
+            for ws in (wb.worksheets if self.args.all_sheets else [wb.active])
+            if ws.title != FORMULA_SHEET
+        ]
+        current: dict[RowKey, RowValues] = {}
+        changed: list[RowKey] = []
+        for ws in sheets:
+            with self.tracer.span("diff_rows", sheet=ws.title):
+                for row, values in self._read_rows(ws):
+                    key = (ws.title, row)
+                    current[key] = values
+                    if self.snapshot.get(key) != values:
+                        changed.append(key)
+
+        with self.tracer.span("evaluate_rows", cat="evaluate"):
+            evaluated = self._evaluate_rows(current, changed)
+            for (title, row), written in evaluated:
+                ws = wb[title]
+                for column, value in enumerate(written, start=4):
+                    _write_text_cell(ws, row, column, value)
+                if self.args.error_column:
+                    ws.cell(
+                        row=2, column=ERROR_DETAIL_COLUMN, value=ERROR_DETAIL_HEADER
+                    )
+        PHASE_SECONDS.observe(perf_counter() - started, "evaluate")
+
+        if evaluated:
+            started = perf_counter()
+            with self.tracer.span("save", rows=len(evaluated)):
+                _save_workbook(wb, self.path)
+            PHASE_SECONDS.observe(perf_counter() - started, "save")
+            signature = _file_signature(self.path)
+        self.snapshot = current
+        self.signature = signature
+        return len(evaluated)
+
+    def _read_rows(self, ws: Worksheet) -> list[tuple[int, RowValues]]:
+        """入力のあるデータ行を `(行番号, 比較用の列値)` として読み出す。"""
+        rows: list[tuple[int, RowValues]] = []
+        columns = self._columns
+        for row, cells in enumerate(
+            ws.iter_rows(min_row=3, max_col=columns, values_only=True), start=3
+        ):
+            values = tuple(_to_text(value) for value in cells)
+            values += ("",) * (columns - len(values))
+            if any(value.strip() for value in values[:3]):
+                rows.append((row, values))
+        return rows
+
+
+def _row_outputs(values: RowValues | None) -> RowOutputs | None:
+    """前回の書き戻し内容から、行参照に用いる `(生データ, 編集後, 報告値)` を返す。
+
+    評価に失敗した行（status が `OK` 以外、または出力が `エラー`）は ``None``。
+    """
+    if values is None or len(values) < 7 or values[6] != "OK":
+        return None
+    outputs = values[3:6]
+    if ERROR_TEXT in outputs:
+        return None
+    return outputs[0] or None, outputs[1] or None, outputs[2] or None
+
+
+def watch_workbooks(
+    paths: list[Path],
+    args: argparse.Namespace,
+    limits: EvaluationLimits | None = None,
+    tracer: TraceRecorder | None = None,
+    *,
+    interval: float = 0.5,
+    max_cycles: int | None = None,
+) -> int:
+    """ブックの更新をポーリングし、変更された行だけを再評価し続ける。
+
+    ファイルの `mtime`・サイズが 1 回のポーリング間隔の間変化しなくなった
+    時点で保存完了とみなし、再評価する。`Ctrl+C` で終了する。
+
+    Args:
+        paths: 監視対象のブック。
+        args: `argparse` の解析結果。
+        limits: 1 行の評価に割り当てる実行予算。
+        tracer: 処理段階の所要時間の記録先。
+        interval: ポーリング間隔（秒）。
+        max_cycles: ポーリング回数の上限（テスト用）。``None`` は無制限。
+
+    Returns:
+        常に 0。
+    """
+    watchers = [WorkbookWatcher(path, args, limits, tracer) for path in paths]
+    pending: dict[Path, tuple[int, int] | None] = {}
+    print(f"[情報] {len(watchers)} 件のブックを監視します（Ctrl+C で終了）。")
+    cycles = 0
+    try:
+        while max_cycles is None or cycles < max_cycles:
+            cycles += 1
+            for watcher in watchers:
+                if not watcher.changed():
+                    pending.pop(watcher.path, None)
+                    continue
+                signature = _file_signature(watcher.path)
+                if watcher.signature is not None and pending.get(watcher.path) != (
+                    signature
+                ):
+                    # 書き込み途中の可能性があるため、次のポーリングまで待つ。
+                    pending[watcher.path] = signature
+                    continue
+                pending.pop(watcher.path, None)
+                _refresh(watcher)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("[情報] 監視を終了しました。")
+    return 0
+
+
+def _refresh(watcher: WorkbookWatcher) -> None:
+    """再評価を実行し、結果を表示する。失敗しても監視は継続する。"""
+    started = perf_counter()
+    try:
+        count = watcher.refresh()
+    except (
+        OSError,
+        UnsupportedWorkbookError,
+        ValueError,
+        zipfile.BadZipFile,
+        InvalidFileException,
+    ) as exc:
+        # 保存の失敗（Excel で開いている等）・書き込み途中のブック・計算式マスタの
+        # 誤り（`FormulaLibraryError` は ValueError）。
+        print(f"[警告] {watcher.path} を処理できませんでした（再試行します）: {exc}")
+        return
+    elapsed = (perf_counter() - started) * 1000
+    print(f"[情報] {watcher.path.name}: {count} 行を再評価しました ({elapsed:.0f} ms)")
+
+
+__all__ = ["WorkbookWatcher", "watch_workbooks"]
@@ -0,0 +1,380 @@
+"""計算式 ID から計算式を引く計算式マスタ（フォーミュラライブラリ）。"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import tomllib
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from openpyxl import load_workbook
+from openpyxl.worksheet.worksheet import Worksheet
+
+from .engine.runtime.canonical import canonical_script, script_fingerprint
+from .engine.runtime.engine_core import compile_script
+from .engine.runtime.inputs import replace_rhs_this_for_R
+from .engine.runtime.lint import lint_script
+
+FORMULA_SHEET = "計算式マスタ"
+FORMULA_SHEET_HEADERS = ["ID", "計算式タイプ", "計算式"]
+FORMULA_REFERENCE_RE = re.compile(r"@(\S+)")
+
+
+class FormulaLibraryError(ValueError):
+    """計算式マスタの内容が不正な場合に送出する例外。"""
+
+
+@dataclass(frozen=True, slots=True)
+class Formula:
+    """計算式マスタの 1 件。
+
+    Attributes:
+        formula_id: 計算式 ID。
+        calc_type: 計算種別（`E` または `R`）。
+        script: 正規形の計算スクリプト。
+        fingerprint: `script_fingerprint` の値。
+    """
+
+    formula_id: str
+    calc_type: str
+    script: str
+    fingerprint: str
+
+
+class FormulaLibrary:
+    """計算式 ID と計算式の対応表。
+
+    読み込み時に各計算式を正規化・静的検査・構文解析し、`PROGRAM_CACHE` へ
+    登録する。行の評価では正規形の文字列を共有するため、同じ計算式を参照する
+    行がいくつあっても解析は 1 回で済む。
+
+    Attributes:
+        formulas: 計算式 ID をキーとした `Formula`。
+        digest: 全計算式の `(ID, 計算種別, フィンガープリント)` から求めた
+            BLAKE2b（16 バイト）の 16 進表記。内容が変わると必ず変わる。
+        version: マスタに記載された版。記載がなければ `digest` の先頭 12 桁。
+        source: 読み込み元の表示名。
+    """
+
+    def __init__(
+        self,
+        formulas: Iterable[Formula],
+        version: str | None = None,
+        source: str = "",
+    ) -> None:
+        self.formulas: dict[str, Formula] = {}
+        for formula in formulas:
+            if formula.formula_id in self.formulas:
+                raise FormulaLibraryError(
+                    f"{source}: 計算式 ID '{formula.formula_id}' が重複しています。"
+                )
+            self.formulas[formula.formula_id] = formula
+        self.digest = _library_digest(self.formulas.values())
+        self.version = version or self.digest[:12]
+        self.source = source
+
+    def __len__(self) -> int:
+        return len(self.formulas)
+
+    def __contains__(self, formula_id: object) -> bool:
+        return formula_id in self.formulas
+
+    @classmethod
+    def from_entries(
+        cls,
+        entries: Iterable[tuple[str, str, str]],
+        version: str | None = None,
+        source: str = "",
+    ) -> FormulaLibrary:
+        """`(ID, 計算種別, 計算式)` の並びから計算式マスタを作成する。
+
+        Args:
+            entries: 計算式の定義。
+            version: マスタの版。
+            source: エラーメッセージに用いる読み込み元の表示名。
+
+        Returns:
+            `FormulaLibrary`。
+
+        Raises:
+            FormulaLibraryError: ID の重複・空欄、計算種別の誤り、計算式の
+                静的検査エラーがあった場合。
+        """
+        return cls(
+            (
+                _compile_formula(formula_id, calc_type, script, source)
+                for formula_id, calc_type, script in entries
+            ),
+            version,
+            source,
+        )
+
+    @classmethod
+    def from_mapping(cls, data: Mapping[str, Any], source: str = "") -> FormulaLibrary:
+        """`{"version": ..., "formulas": {ID: {"type": ..., "script": ...}}}` から作成する。
+
+        Args:
+            data: JSON・TOML を読み込んだ辞書。
+            source: エラーメッセージに用いる読み込み元の表示名。
+
+        Returns:
+            `FormulaLibrary`。
+
+        Raises:
+            FormulaLibraryError: 形式が不正な場合。
+        """
+        formulas = data.get("formulas")
+        if not isinstance(formulas, Mapping):
+            raise FormulaLibraryError(f"{source}: 'formulas' の表がありません。")
+        entries: list[tuple[str, str, str]] = []
+        for formula_id, body in formulas.items():
+            if not isinstance(body, Mapping):
+                raise FormulaLibraryError(
+                    f"{source}: 計算式 ID '{formula_id}' は type と script の表で"
+                    "指定してください。"
+                )
+            entries.append(
+                (
+                    str(formula_id),
+                    str(body.get("type", "")),
+                    str(body.get("script", "")),
+                )
+            )
+        version = data.get("version")
+        return cls.from_entries(
+            entries, None if version is None else str(version), source
+        )
+
+    @classmethod
+    def from_worksheet(cls, ws: Worksheet, source: str = "") -> FormulaLibrary:
+        """`計算式マスタ` シート（2 行目以降の ID・計算式タイプ・計算式列）から作成する。
+
+        Args:
+            ws: 計算式マスタのシート。
+            source: エラーメッセージに用いる読み込み元の表示名。
+
+        Returns:
+            `FormulaLibrary`。
+        """
+        rows = ws.iter_rows(min_row=2, max_col=3, values_only=True)
+        return cls.from_rows(rows, source or ws.title)
+
+    @classmethod
+    def from_rows(
+        cls, rows: Iterable[Iterable[object]], source: str = ""
+    ) -> FormulaLibrary:
+        """`計算式マスタ` シートのデータ行（先頭 3 列のセル値）から作成する。
+
+        ID 列が空の行は読み飛ばす。
+
+        Args:
+            rows: 各行の ID・計算式タイプ・計算式列の値。
+            source: エラーメッセージに用いる読み込み元の表示名。
+
+        Returns:
+            `FormulaLibrary`。
+        """
+        entries: list[tuple[str, str, str]] = []
+        for values in rows:
+            formula_id, calc_type, script = (
+                [_cell_text(value) for value in values] + ["", "", ""]
+            )[:3]
+            if not formula_id.strip():
+                continue
+            entries.append((formula_id.strip(), calc_type, script))
+        return cls.from_entries(entries, None, source)
+
+    @classmethod
+    def load(cls, path: Path) -> FormulaLibrary:
+        """JSON・TOML・ブック（`計算式マスタ` シート）から計算式マスタを読み込む。
+
+        Args:
+            path: `.json`・`.toml`・`.xlsx`/`.xlsm` のパス。
+
+        Returns:
+            `FormulaLibrary`。
+
+        Raises:
+            FormulaLibraryError: 形式・内容が不正な場合。
+            OSError: ファイルを読み込めない場合。
+        """
+        suffix = path.suffix.lower()
+        source = str(path)
+        if suffix == ".json":
+            return cls.from_mapping(_load_json(path), source)
+        if suffix == ".toml":
+            try:
+                data = tomllib.loads(path.read_text("utf-8"))
+            except tomllib.TOMLDecodeError as exc:
+                raise FormulaLibraryError(f"{source}: {exc}") from exc
+            return cls.from_mapping(data, source)
+        if suffix in (".xlsx", ".xlsm"):
+            wb = load_workbook(path, read_only=True, data_only=True)
+            try:
+                if FORMULA_SHEET not in wb.sheetnames:
+                    raise FormulaLibraryError(
+                        f"{source}: '{FORMULA_SHEET}' シートがありません。"
+                    )
+                return cls.from_worksheet(wb[FORMULA_SHEET], source)
+            finally:
+                wb.close()
+        raise FormulaLibraryError(
+            f"{source}: 計算式マスタは .json・.toml・.xlsx のいずれかで指定してください。"
+        )
+
+    def merged(self, other: FormulaLibrary) -> FormulaLibrary:
+        """`other` の計算式で同じ ID を上書きした計算式マスタを返す。
+
+        Args:
+            other: 優先する計算式マスタ（ブック内の `計算式マスタ` シート等）。
+
+        Returns:
+            版を `self.version+other.version` とした新しい `FormulaLibrary`。
+        """
+        formulas = {**self.formulas, **other.formulas}
+        return FormulaLibrary(
+            formulas.values(),
+            f"{self.version}+{other.version}",
+            f"{self.source}+{other.source}",
+        )
+
+    def resolve(self, calc_type: str, script: str) -> tuple[str, str]:
+        """行の計算式タイプ・計算式列を、参照先の計算式で置き換える。
+
+        計算式列が `@ID` の形式でなければそのまま返す。参照時の計算式タイプ列は
+        空欄とするか、計算式マスタと同じ種別を指定する。
+
+        Args:
+            calc_type: 計算式タイプ列の値。
+            script: 計算式列の値。
+
+        Returns:
+            `(計算種別, 計算スクリプト)` のタプル。
+
+        Raises:
+            FormulaLibraryError: ID が未登録の場合、または計算式タイプ列が
+                計算式マスタの計算種別と一致しない場合。
+        """
+        formula_id = formula_reference(script)
+        if formula_id is None:
+            return calc_type, script
+        formula = self.formulas.get(formula_id)
+        if formula is None:
+            raise FormulaLibraryError(
+                f"計算式 ID '{formula_id}' は計算式マスタ（版 {self.version}）に"
+                "登録されていません。"
+            )
+        if calc_type and calc_type.upper() != formula.calc_type:
+            raise FormulaLibraryError(
+                f"計算式タイプ '{calc_type}' が計算式 ID '{formula_id}' の"
+                f"計算種別 '{formula.calc_type}' と一致しません。"
+            )
+        return formula.calc_type, formula.script
+
+    def to_dict(self) -> dict[str, object]:
+        """`--summary-json` 向けの辞書へ変換する。"""
+        return {
+            "source": self.source,
+            "version": self.version,
+            "digest": self.digest,
+            "formulas": len(self.formulas),
+        }
+
+
+def load_library(path: Path) -> FormulaLibrary:
+    """計算式マスタのファイルを読み込む。プロセス内では更新されるまで再利用する。
+
+    ファイルの `(mtime_ns, サイズ)` が前回の読み込み時と同じであれば、正規化・
+    検査・構文解析を繰り返さずに前回の `FormulaLibrary` を返す。
+
+    Args:
+        path: `.json`・`.toml`・`.xlsx`/`.xlsm` のパス。
+
+    Returns:
+        `FormulaLibrary`。
+
+    Raises:
+        FormulaLibraryError: 形式・内容が不正な場合。
+        OSError: ファイルを読み込めない場合。
+    """
+    path = path.resolve()
+    stat = path.stat()
+    signature = (stat.st_mtime_ns, stat.st_size)
+    loaded = _LOADED.get(path)
+    if loaded is not None and loaded[0] == signature:
+        return loaded[1]
+    library = FormulaLibrary.load(path)
+    _LOADED[path] = (signature, library)
+    return library
+
+
+def formula_reference(script: str) -> str | None:
+    """計算式列が `@ID` 形式であれば ID を、そうでなければ ``None`` を返す。"""
+    match = FORMULA_REFERENCE_RE.fullmatch(script.strip())
+    return match.group(1) if match else None
+
+
+def _compile_formula(
+    formula_id: str, calc_type: str, script: str, source: str
+) -> Formula:
+    """1 件の計算式を検査・正規化し、`PROGRAM_CACHE` へ構文解析結果を登録する。"""
+    formula_id = formula_id.strip()
+    ctype = calc_type.strip().upper()
+    where = f"{source}: 計算式 ID '{formula_id}'"
+    if not formula_id or FORMULA_REFERENCE_RE.fullmatch(f"@{formula_id}") is None:
+        raise FormulaLibraryError(f"{where} は空白を含まない文字列で指定してください。")
+    if ctype not in ("E", "R"):
+        raise FormulaLibraryError(f"{where} の計算式タイプは 'E' または 'R' です。")
+    script = script.replace("\r\n", "\n").replace("\r", "\n")
+    diagnostics = lint_script(ctype, script)
+    if diagnostics:
+        details = " / ".join(diagnostic.describe() for diagnostic in diagnostics)
+        raise FormulaLibraryError(f"{where}: {details}")
+    canonical = canonical_script(script)
+    compile_script(canonical if ctype == "E" else replace_rhs_this_for_R(canonical))
+    return Formula(formula_id, ctype, canonical, script_fingerprint(canonical))
+
+
+def _library_digest(formulas: Iterable[Formula]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for formula in sorted(formulas, key=lambda item: item.formula_id):
+        for part in (formula.formula_id, formula.calc_type, formula.fingerprint):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _load_json(path: Path) -> Mapping[str, Any]:
+    try:
+        data = json.loads(path.read_text("utf-8"))
+    except json.JSONDecodeError as exc:
+        raise FormulaLibraryError(f"{path}: {exc}") from exc
+    if not isinstance(data, Mapping):
+        raise FormulaLibraryError(f"{path}: 最上位はオブジェクトで指定してください。")
+    return data
+
+
+# 読み込み済みの計算式マスタ（パスごとのファイル署名と内容）。
+_LOADED: dict[Path, tuple[tuple[int, int], FormulaLibrary]] = {}
+
+
+def _cell_text(value: object | None) -> str:
+    if value is None:
+        return ""
+    text = str(value)
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+__all__ = [
+    "FORMULA_SHEET",
+    "FORMULA_SHEET_HEADERS",
+    "Formula",
+    "FormulaLibrary",
+    "FormulaLibraryError",
+    "formula_reference",
+    "load_library",
+]
@@ -0,0 +1,558 @@
+"""SQLite の作業キューでブックの評価を中断・再開可能に実行するモジュール。"""
+
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import json
+import sqlite3
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from time import perf_counter
+
+from openpyxl import Workbook, load_workbook
+
+from .engine import EvaluationLimits, EvaluationResult
+from .engine.runtime.metrics import PHASE_SECONDS
+from .excel_cli import (
+    ERROR_DETAIL_COLUMN,
+    ERROR_DETAIL_HEADER,
+    WorkbookSummary,
+    _evaluate_values,
+    _iter_data_rows,
+    _normalize_multiline,
+    _record_results,
+    _save_workbook,
+    _to_text,
+    _workbook_library,
+    _write_text_cell,
+)
+from .formula_library import FORMULA_SHEET, FormulaLibraryError, formula_reference
+from .row_graph import (
+    RowGraph,
+    RowKey,
+    RowOutputs,
+    RowReferenceError,
+    substitute_references,
+)
+from .tracing import TraceRecorder
+
+# 1 トランザクションで結果を記録する行数（チェックポイントの間隔）。
+JOB_BATCH_ROWS = 512
+# 評価中にプロセスが終了した行を再試行する回数の上限。
+JOB_MAX_ATTEMPTS = 3
+# 進捗を表示する間隔（秒）。
+JOB_PROGRESS_SECONDS = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    workbook TEXT NOT NULL UNIQUE,
+    signature TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scripts (
+    job INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (job, id)
+);
+CREATE TABLE IF NOT EXISTS rows (
+    job INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    sheet TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    wave INTEGER NOT NULL,
+    calc_type TEXT NOT NULL,
+    script INTEGER NOT NULL,
+    inputs TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    status TEXT,
+    raw TEXT,
+    edited TEXT,
+    reported TEXT,
+    ok INTEGER,
+    error TEXT,
+    PRIMARY KEY (job, seq)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS rows_by_cell ON rows (job, sheet, row);
+CREATE INDEX IF NOT EXISTS rows_pending ON rows (job, wave, seq) WHERE status IS NULL;
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class QueuedRow:
+    """キューから取り出した未評価の行。
+
+    Attributes:
+        seq: ジョブ内の通し番号（シート・行の順）。
+        sheet: シート名。
+        row: 行番号。
+        wave: 行参照の依存関係の段。参照のない行は 0。
+        calc_type: 計算式タイプ列の値（`@ID` は解決済み）。
+        script: 計算式（`@ID` は解決済み）。
+        inputs: 変数列の値（行参照は未置換）。
+        attempts: これまでに評価を開始した回数。
+    """
+
+    seq: int
+    sheet: str
+    row: int
+    wave: int
+    calc_type: str
+    script: str
+    inputs: str
+    attempts: int
+
+
+class JobQueue:
+    """1 つの SQLite データベース上の、ブックごとの評価ジョブのキュー。
+
+    行の入力はジョブ開始時に一括で登録し、評価結果は `JOB_BATCH_ROWS` 行ごとに
+    1 トランザクションで記録する。プロセスが途中で終了しても、記録済みの行は
+    次回の実行で評価し直さない。データベースは WAL モードで開くため、複数の
+    ワーカープロセスが同じファイルを共有できる。
+
+    Attributes:
+        path: データベースファイルのパス。
+        connection: SQLite の接続（自動コミット、トランザクションは明示的に開始）。
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=60.0, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # WAL では NORMAL でもコミット済みのトランザクションはプロセスの異常終了で
+        # 失われない（OS のクラッシュ時のみ直近のチェックポイントまで戻る）。
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """データベースを閉じる。"""
+        self.connection.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """書き込みトランザクションを開始し、正常終了時にコミットする。"""
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.connection
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def open_job(self, workbook: Path, signature: str, settings: str) -> int | None:
+        """再開できる未完了のジョブを探す。
+
+        ブックの署名（`mtime_ns:サイズ`）と評価設定が登録時と同じ未完了の
+        ジョブだけを再開の対象とし、それ以外の同じブックのジョブは削除する。
+
+        Args:
+            workbook: ブックの絶対パス。
+            signature: ブックの現在の署名。
+            settings: 評価結果に影響する設定の JSON。
+
+        Returns:
+            再開するジョブの ID。なければ ``None``。
+        """
+        found = self.connection.execute(
+            "SELECT id, signature, settings, state FROM jobs WHERE workbook = ?",
+            (str(workbook),),
+        ).fetchone()
+        if found is None:
+            return None
+        job, old_signature, old_settings, state = found
+        if state != "done" and (old_signature, old_settings) == (signature, settings):
+            return int(job)
+        self.drop_job(job)
+        return None
+
+    def drop_job(self, job: int) -> None:
+        """ジョブと登録済みの行を削除する。"""
+        with self.transaction() as db:
+            db.execute("DELETE FROM rows WHERE job = ?", (job,))
+            db.execute("DELETE FROM scripts WHERE job = ?", (job,))
+            db.execute("DELETE FROM jobs WHERE id = ?", (job,))
+
+    def create_job(
+        self,
+        workbook: Path,
+        signature: str,
+        settings: str,
+        rows: Iterable[tuple[str, int, int, str, str, str, str | None]],
+    ) -> int:
+        """ジョブを作成し、全行を 1 トランザクションで登録する。
+
+        同じ計算式は `scripts` 表に 1 回だけ格納する。
+
+        Args:
+            workbook: ブックの絶対パス。
+            signature: ブックの署名。
+            settings: 評価結果に影響する設定の JSON。
+            rows: `(シート名, 行番号, 段, 計算式タイプ, 計算式, 変数, status)`。
+                status が ``None`` 以外の行は評価済み（評価前に失敗が確定した行）
+                として登録する。
+
+        Returns:
+            ジョブの ID。
+        """
+        with self.transaction() as db:
+            cursor = db.execute(
+                "INSERT INTO jobs (workbook, signature, settings, state)"
+                " VALUES (?, ?, ?, 'running')",
+                (str(workbook), signature, settings),
+            )
+            job = int(cursor.lastrowid or 0)
+            scripts: dict[str, int] = {}
+
+            def records() -> Iterator[tuple[object, ...]]:
+                for seq, entry in enumerate(rows):
+                    sheet, row, wave, calc_type, script, inputs, status = entry
+                    script_id = scripts.setdefault(script, len(scripts))
+                    ok = None if status is None else 0
+                    record = (job, seq, sheet, row, wave, calc_type, script_id)
+                    yield (*record, inputs, status, ok)
+
+            db.executemany(
+                "INSERT INTO rows (job, seq, sheet, row, wave, calc_type, script,"
+                " inputs, status, ok) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                records(),
+            )
+            db.executemany(
+                "INSERT INTO scripts (job, id, text) VALUES (?, ?, ?)",
+                ((job, script_id, text) for text, script_id in scripts.items()),
+            )
+        return job
+
+    def counts(self, job: int) -> tuple[int, int]:
+        """`(全行数, 評価済みの行数)` を返す。"""
+        total, done = self.connection.execute(
+            "SELECT COUNT(*), COUNT(status) FROM rows WHERE job = ?", (job,)
+        ).fetchone()
+        return int(total), int(done)
+
+    def pending(self, job: int, limit: int) -> list[QueuedRow]:
+        """未評価の行を、行参照の段・通し番号の順に最大 `limit` 行返す。
+
+        参照先と同じバッチに入らないよう、返す行は 1 つの段に限る。前回の実行で
+        評価を開始したまま記録されなかった行（`attempts` が 1 以上）を含む場合は、
+        異常終了の原因となった行を特定できるよう 1 行だけを返す。
+        """
+        found = self.connection.execute(
+            "SELECT r.seq, r.sheet, r.row, r.wave, r.calc_type, s.text, r.inputs,"
+            " r.attempts FROM rows AS r JOIN scripts AS s"
+            " ON s.job = r.job AND s.id = r.script"
+            " WHERE r.job = ? AND r.status IS NULL ORDER BY r.wave, r.seq LIMIT ?",
+            (job, limit),
+        ).fetchall()
+        batch = [QueuedRow(*values) for values in found]
+        if not batch:
+            return []
+        batch = [item for item in batch if item.wave == batch[0].wave]
+        if any(item.attempts for item in batch):
+            return batch[:1]
+        return batch
+
+    def start(self, job: int, batch: list[QueuedRow]) -> None:
+        """バッチの評価開始を記録する（`attempts` を 1 増やす）。"""
+        with self.transaction() as db:
+            db.executemany(
+                "UPDATE rows SET attempts = attempts + 1 WHERE job = ? AND seq = ?",
+                ((job, item.seq) for item in batch),
+            )
+
+    def complete(
+        self, job: int, results: list[tuple[int, EvaluationResult, str]]
+    ) -> None:
+        """評価結果を 1 トランザクションで記録する。
+
+        Args:
+            job: ジョブの ID。
+            results: `(通し番号, 評価結果, status)` のリスト。
+        """
+        with self.transaction() as db:
+            db.executemany(
+                "UPDATE rows SET status = ?, raw = ?, edited = ?, reported = ?,"
+                " ok = ?, error = ? WHERE job = ? AND seq = ?",
+                (
+                    (
+                        status,
+                        result.raw,
+                        result.edited,
+                        result.reported,
+                        int(result.ok),
+                        None
+                        if result.ok
+                        else json.dumps(result.to_dict(), ensure_ascii=False),
+                        job,
+                        seq,
+                    )
+                    for seq, result, status in results
+                ),
+            )
+
+    def outputs(self, job: int, key: RowKey) -> RowOutputs | None:
+        """評価済みの行の `(生データ, 編集後, 報告値)` を返す。失敗・未評価は ``None``。"""
+        found = self.connection.execute(
+            "SELECT status, ok, raw, edited, reported FROM rows"
+            " WHERE job = ? AND sheet = ? AND row = ?",
+            (job, key[0], key[1]),
+        ).fetchone()
+        if found is None or found[0] != "OK" or not found[1]:
+            return None
+        return found[2], found[3], found[4]
+
+    def results(self, job: int) -> Iterator[tuple[str, int, str, EvaluationResult]]:
+        """全行の `(シート名, 行番号, status, 評価結果)` を通し番号の順に返す。"""
+        cursor = self.connection.execute(
+            "SELECT sheet, row, status, raw, edited, reported, error"
+            " FROM rows WHERE job = ? ORDER BY seq",
+            (job,),
+        )
+        for sheet, row, status, raw, edited, reported, error in cursor:
+            if error is None:
+                result = EvaluationResult(raw, edited, reported)
+            else:
+                result = EvaluationResult(**json.loads(error))
+            yield sheet, row, status, result
+
+    def finish(self, job: int) -> None:
+        """ジョブを完了済みにする。"""
+        with self.transaction() as db:
+            db.execute("UPDATE jobs SET state = 'done' WHERE id = ?", (job,))
+
+
+def run_job(
+    workbook_path: Path,
+    args: argparse.Namespace,
+    limits: EvaluationLimits | None,
+    tracer: TraceRecorder,
+    summary: WorkbookSummary,
+) -> None:
+    """1 ブックをジョブモード（`--job DB`）で評価する。
+
+    初回はブックの対象行をキューへ登録し、以降は未評価の行だけを評価して
+    バッチごとに記録する。キューが空になった時点でブックへ書き戻して保存する。
+    中断した場合も、同じコマンドを再実行すれば記録済みの行から再開する。
+
+    Args:
+        workbook_path: 対象ブックのパス。
+        args: `argparse` の解析結果（`job` にデータベースのパス）。
+        limits: 1 行の評価に割り当てる実行予算。
+        tracer: 処理段階の所要時間の記録先。
+        summary: 件数の集計先。
+    """
+    queue = JobQueue(Path(args.job).resolve())
+    try:
+        workbook_path = workbook_path.resolve()
+        signature = _signature(workbook_path)
+        settings = json.dumps(
+            {
+                "limits": None if limits is None else dataclasses.asdict(limits),
+                "strict_inputs": args.strict_inputs,
+                "all_sheets": args.all_sheets,
+                "formulas": getattr(args, "formulas", None),
+                "measurement_dir": getattr(args, "measurement_dir", None),
+            },
+            sort_keys=True,
+        )
+        wb = None
+        job = queue.open_job(workbook_path, signature, settings)
+        if job is None:
+            started = perf_counter()
+            with tracer.span("load_workbook", path=str(workbook_path)):
+                wb = load_workbook(workbook_path)
+            PHASE_SECONDS.observe(perf_counter() - started, "load")
+            with tracer.span("enqueue", path=str(workbook_path)):
+                job = queue.create_job(
+                    workbook_path,
+                    signature,
+                    settings,
+                    _queued_rows(wb, workbook_path, args, summary),
+                )
+        total, done = queue.counts(job)
+        if done:
+            print(f"[情報] ジョブを再開します: {done}/{total} 行は評価済みです。")
+        else:
+            print(f"[情報] {total} 行をジョブに登録しました: {queue.path}")
+
+        started = perf_counter()
+        _drain(queue, job, total, done, args, limits, tracer)
+        PHASE_SECONDS.observe(perf_counter() - started, "evaluate")
+
+        if wb is None:
+            started = perf_counter()
+            with tracer.span("load_workbook", path=str(workbook_path)):
+                wb = load_workbook(workbook_path)
+            PHASE_SECONDS.observe(perf_counter() - started, "load")
+        with tracer.span("materialize", rows=total):
+            _materialize(queue, job, wb, args, summary)
+        if not summary.rows:
+            summary.status = "EMPTY"
+            queue.finish(job)
+            print(
+                "[警告] 評価対象の行が見つかりませんでした。"
+                "テンプレートを編集して再実行してください。"
+            )
+            return
+        started = perf_counter()
+        with tracer.span("save", path=str(workbook_path)):
+            _save_workbook(wb, workbook_path)
+        PHASE_SECONDS.observe(perf_counter() - started, "save")
+        queue.finish(job)
+        print(f"[情報] 結果を保存しました: {workbook_path}")
+    finally:
+        queue.close()
+
+
+def _signature(path: Path) -> str:
+    stat = path.stat()
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def _queued_rows(
+    wb: Workbook, path: Path, args: argparse.Namespace, summary: WorkbookSummary
+) -> Iterator[tuple[str, int, int, str, str, str, str | None]]:
+    """ブックの対象行を、キューへ登録する形式で返す。
+
+    計算式列の `@ID` はこの時点で計算式マスタから解決するため、再開時に
+    計算式マスタを読み直す必要はない。行参照の段もここで求める。
+    """
+    library = _workbook_library(wb, args, path)
+    if library is not None:
+        summary.formulas = library.to_dict()
+    sheets = [
+        ws
+        for ws in (wb.worksheets if args.all_sheets else [wb.active])
+        if ws.title != FORMULA_SHEET
+    ]
+    cells: dict[RowKey, tuple[str, str, str]] = {}
+    for ws in sheets:
+        for row in _iter_data_rows(ws):
+            cells[(ws.title, row)] = (
+                _to_text(ws.cell(row=row, column=1).value).strip(),
+                _normalize_multiline(ws.cell(row=row, column=2).value),
+                _normalize_multiline(ws.cell(row=row, column=3).value),
+            )
+    graph = RowGraph({key: values[2] for key, values in cells.items()})
+    waves: dict[RowKey, int] = {}
+    failures: dict[RowKey, str] = {}
+    if graph:
+        levels, failures = graph.waves(cells)
+        waves = {key: number for number, level in enumerate(levels) for key in level}
+    for key, (calc_type, script, inputs) in cells.items():
+        status = None
+        if key in failures:
+            status = f"ERROR: {failures[key]}"
+        elif formula_reference(script) is not None:
+            if library is None:
+                status = "ERROR: 計算式マスタが指定されていません (--formulas)"
+            else:
+                try:
+                    calc_type, script = library.resolve(calc_type, script)
+                except FormulaLibraryError as exc:
+                    status = f"ERROR: {exc}"
+        yield (*key, waves.get(key, 0), calc_type, script, inputs, status)
+
+
+def _drain(
+    queue: JobQueue,
+    job: int,
+    total: int,
+    done: int,
+    args: argparse.Namespace,
+    limits: EvaluationLimits | None,
+    tracer: TraceRecorder,
+) -> None:
+    """キューが空になるまで、バッチ単位で評価して記録する。"""
+    reported_at = perf_counter()
+    while batch := queue.pending(job, JOB_BATCH_ROWS):
+        queue.start(job, batch)
+        results: list[tuple[int, EvaluationResult, str]] = []
+        with tracer.span("evaluate_batch", cat="evaluate", rows=len(batch)):
+            for item in batch:
+                results.append(
+                    (item.seq, *_evaluate_queued(queue, job, item, args, limits))
+                )
+        with tracer.span("checkpoint", rows=len(results)):
+            queue.complete(job, results)
+        done += len(results)
+        if perf_counter() - reported_at >= JOB_PROGRESS_SECONDS:
+            reported_at = perf_counter()
+            print(f"[情報] {done}/{total} 行を評価しました。")
+
+
+def _evaluate_queued(
+    queue: JobQueue,
+    job: int,
+    item: QueuedRow,
+    args: argparse.Namespace,
+    limits: EvaluationLimits | None,
+) -> tuple[EvaluationResult, str]:
+    """キューの 1 行を評価する。再試行の上限に達した行は評価しない。"""
+    if item.attempts >= JOB_MAX_ATTEMPTS:
+        return (
+            EvaluationResult(None, None, None),
+            f"ERROR: 評価中にプロセスが終了しました（{item.attempts} 回）",
+        )
+    try:
+        inputs = substitute_references(
+            item.inputs, item.sheet, lambda key: queue.outputs(job, key)
+        )
+    except RowReferenceError as exc:
+        return EvaluationResult(None, None, None), f"ERROR: {exc}"
+    return _evaluate_values(
+        item.calc_type,
+        item.script,
+        inputs,
+        None,
+        limits,
+        args.strict_inputs,
+        measurement_dir=getattr(args, "measurement_dir", None),
+    )
+
+
+def _materialize(
+    queue: JobQueue,
+    job: int,
+    wb: Workbook,
+    args: argparse.Namespace,
+    summary: WorkbookSummary,
+) -> None:
+    """記録済みの結果をブックへ書き戻し、件数を集計する。"""
+    sheets: set[str] = set()
+    for sheet, row, status, result in queue.results(job):
+        ws = wb[sheet]
+        if sheet not in sheets:
+            sheets.add(sheet)
+            if args.error_column:
+                ws.cell(row=2, column=ERROR_DETAIL_COLUMN, value=ERROR_DETAIL_HEADER)
+        _record_results(ws, row, result.raw, result.edited, result.reported, status)
+        if args.error_column:
+            _write_text_cell(ws, row, ERROR_DETAIL_COLUMN, result.describe())
+        print(f"  {sheet}!{row}: {status}")
+        summary.rows += 1
+        if status == "BUDGET_EXCEEDED":
+            summary.budget_exceeded += 1
+        elif status == "OK" and result.ok:
+            summary.ok += 1
+        else:
+            summary.errors += 1
+        if args.error_log and not result.ok:
+            summary.error_log.append(
+                {
+                    "workbook": str(summary.path),
+                    "sheet": sheet,
+                    "row": row,
+                    **result.to_dict(),
+                }
+            )
+    summary.sheets = len(sheets)
+
+
+__all__ = ["JOB_BATCH_ROWS", "JOB_MAX_ATTEMPTS", "JobQueue", "QueuedRow", "run_job"]
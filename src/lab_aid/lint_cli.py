@@ -0,0 +1,197 @@
+"""Lab-Aid の計算式を実行せずに一括検査するコマンドライン補助モジュール。"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from time import perf_counter
+
+from openpyxl import load_workbook
+
+from .engine.runtime.canonical import script_fingerprint
+from .engine.runtime.lint import LintDiagnostic, lint_script
+from .excel_cli import WORKBOOK_SUFFIXES, _normalize_multiline, discover_workbooks
+from .formula_library import FORMULA_SHEET, formula_reference
+
+LINT_CHUNK_SCRIPTS = 256
+
+
+@dataclass(frozen=True, slots=True)
+class ScriptSource:
+    """検査対象の計算式 1 件とその所在。
+
+    Attributes:
+        location: `book.xlsx:LabAid!3` または `script.txt` 形式の所在表示。
+        calc_type: 計算種別。
+        script: 計算式。
+    """
+
+    location: str
+    calc_type: str
+    script: str
+
+
+def collect_sources(
+    targets: Iterable[str], default_type: str = "E"
+) -> list[ScriptSource]:
+    """ブックとスクリプトファイルから検査対象の計算式を集める。
+
+    ブックはすべてのシートの 3 行目以降から、計算式タイプ列と計算式列を読む。
+    `計算式マスタ` シートは 2 行目以降の計算式タイプ列（B 列）と計算式列（C 列）
+    を読み、他のシートで `@ID` を参照する行は対象外とする。それ以外のファイルは
+    ファイル全体を 1 つの計算式として扱う。
+
+    Args:
+        targets: ファイル・ディレクトリ・ワイルドカードの指定。
+        default_type: スクリプトファイルに適用する計算種別。
+
+    Returns:
+        計算式が空でない `ScriptSource` のリスト。
+    """
+    sources: list[ScriptSource] = []
+    for path in discover_workbooks(targets):
+        if path.suffix.lower() not in WORKBOOK_SUFFIXES:
+            script = path.read_text("utf-8")
+            sources.append(ScriptSource(str(path), default_type, script))
+            continue
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            for ws in wb.worksheets:
+                master = ws.title == FORMULA_SHEET
+                first = 2 if master else 3
+                rows = ws.iter_rows(min_row=first, max_col=3, values_only=True)
+                for row, values in enumerate(rows, start=first):
+                    padded = tuple(values) + (None, None, None)
+                    calc_type, script = padded[1:3] if master else padded[:2]
+                    script_text = _normalize_multiline(script)
+                    if not script_text.strip() or formula_reference(script_text):
+                        continue
+                    sources.append(
+                        ScriptSource(
+                            f"{path}:{ws.title}!{row}",
+                            _normalize_multiline(calc_type).strip(),
+                            script_text,
+                        )
+                    )
+        finally:
+            wb.close()
+    return sources
+
+
+def lint_sources(
+    sources: list[ScriptSource], jobs: int | None = None
+) -> dict[tuple[str, str], list[LintDiagnostic]]:
+    """計算式を重複除去して検査する。
+
+    マスタの計算式は同一内容（大小文字・空白・コメントのみ異なるものを含む）が
+    多数の行に現れるため、`(計算種別, フィンガープリント)` ごとに最初の 1 件だけを
+    検査する。件数が多い場合はプロセスプールでチャンク単位に並列化する。
+
+    Args:
+        sources: 検査対象。
+        jobs: ワーカープロセス数。``None`` は CPU 数。
+
+    Returns:
+        `(計算種別, フィンガープリント)` をキーとした指摘のリスト。
+    """
+    groups: dict[tuple[str, str], tuple[str, str]] = {}
+    for source in sources:
+        groups.setdefault(_group_key(source), (source.calc_type, source.script))
+    keys = list(groups)
+    unique = list(groups.values())
+    chunks = [
+        unique[offset : offset + LINT_CHUNK_SCRIPTS]
+        for offset in range(0, len(unique), LINT_CHUNK_SCRIPTS)
+    ]
+    workers = max(1, min(jobs or os.cpu_count() or 1, len(chunks)))
+    if workers == 1:
+        results = [_lint_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_lint_chunk, chunks))
+    flat = [diagnostics for chunk_results in results for diagnostics in chunk_results]
+    return dict(zip(keys, flat, strict=True))
+
+
+def _group_key(source: ScriptSource) -> tuple[str, str]:
+    return (source.calc_type.upper(), script_fingerprint(source.script))
+
+
+def _lint_chunk(chunk: list[tuple[str, str]]) -> list[list[LintDiagnostic]]:
+    """ワーカープロセスで計算式のチャンクを検査する。"""
+    return [lint_script(calc_type, script) for calc_type, script in chunk]
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Lab-Aid の計算式を実行せずに検査し、エラーを行番号付きで一覧します。"
+    )
+    parser.add_argument(
+        "targets",
+        nargs="+",
+        help="検査するブック・スクリプトファイル・ディレクトリ・ワイルドカード",
+    )
+    parser.add_argument(
+        "--type",
+        dest="calc_type",
+        choices=("E", "R"),
+        default="E",
+        help="スクリプトファイルの計算種別（ブックは計算式タイプ列を使用）",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="検査に使うワーカープロセス数（既定: CPU 数）",
+    )
+    parser.add_argument(
+        "--format",
+        choices=("text", "json"),
+        default="text",
+        help="出力形式",
+    )
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """計算式を一括検査するエントリーポイント。
+
+    Args:
+        argv: コマンドライン引数リスト。``None`` の場合は `sys.argv` を使用。
+
+    Returns:
+        指摘がなければ 0、1 件以上あれば 1。
+    """
+    args = _build_parser().parse_args(argv)
+    started = perf_counter()
+    sources = collect_sources(args.targets, args.calc_type)
+    results = lint_sources(sources, args.jobs)
+    findings = [
+        (source, diagnostic)
+        for source in sources
+        for diagnostic in results[_group_key(source)]
+    ]
+    if args.format == "json":
+        payload = [
+            {"location": source.location, **diagnostic.to_dict()}
+            for source, diagnostic in findings
+        ]
+        print(json.dumps(payload, ensure_ascii=False, indent=2))
+    else:
+        for source, diagnostic in findings:
+            print(f"{source.location}: {diagnostic.describe()}")
+        print(
+            f"[集計] 計算式 {len(sources)} 件（重複除外後 {len(results)} 件）・"
+            f"指摘 {len(findings)} 件・{perf_counter() - started:.2f} 秒"
+        )
+    return 1 if findings else 0
+
+
+if __name__ == "__main__":  # pragma: no cover - CLI entry point
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""記録したワークロードを現在のエンジンで再実行して計測するモジュール。
+
+`excel_cli --capture` や `lab_aid.engine.capture` で記録したログの評価を順に
+再実行し、計算式ごとのスループット・レイテンシの分位点と、記録時との出力の
+差分を報告する。
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import perf_counter_ns
+
+from .engine import evaluate_detailed
+from .engine.runtime.canonical import script_fingerprint
+from .engine.runtime.capture import CapturedEvaluation, read_capture
+
+REPLAY_PERCENTILES = (50, 90, 99)
+
+
+@dataclass
+class ScriptReplay:
+    """1 つの計算式の再実行結果。
+
+    Attributes:
+        calc_type: 計算種別。
+        fingerprint: 計算式の `script_fingerprint`。
+        script: 計算式。
+        captured: 記録時の所要時間（マイクロ秒）。
+        replayed: 再実行の所要時間（マイクロ秒、`repeat` 回のうち最短）。
+        differences: 出力が記録時と異なった評価の件数。
+        skipped: 匿名化した入力のため出力を比較しなかった評価の件数。
+    """
+
+    calc_type: str
+    fingerprint: str
+    script: str
+    captured: list[int] = field(default_factory=list)
+    replayed: list[float] = field(default_factory=list)
+    differences: int = 0
+    skipped: int = 0
+
+    @property
+    def throughput(self) -> float:
+        """再実行の 1 秒あたりの評価件数。"""
+        total = sum(self.replayed)
+        return len(self.replayed) / total * 1_000_000 if total else 0.0
+
+    def to_dict(self) -> dict[str, object]:
+        """`--format json` 向けの辞書へ変換する。"""
+        return {
+            "calc_type": self.calc_type,
+            "fingerprint": self.fingerprint,
+            "evaluations": len(self.replayed),
+            "throughput": self.throughput,
+            "replayed_us": _percentiles(self.replayed),
+            "captured_us": _percentiles(self.captured),
+            "differences": self.differences,
+            "skipped": self.skipped,
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class OutputDifference:
+    """記録時と出力が異なった評価。
+
+    Attributes:
+        fingerprint: 計算式の `script_fingerprint`。
+        inputs: 入力文字列。
+        expected: 記録時の `(生データ, 編集後, 報告値)`。
+        actual: 再実行の `(生データ, 編集後, 報告値)`。
+    """
+
+    fingerprint: str
+    inputs: str
+    expected: tuple[str | None, ...]
+    actual: tuple[str | None, ...]
+
+
+def replay(
+    entries: Iterable[CapturedEvaluation], repeat: int = 1
+) -> tuple[list[ScriptReplay], list[OutputDifference]]:
+    """記録した評価を現在のエンジンで再実行する。
+
+    各評価は記録時の `limits`・`strict_inputs`・`measurement_dir` で `repeat` 回
+    実行し、最短の所要時間を採用する。出力の比較は 1 回目の結果で行う。
+
+    Args:
+        entries: 記録した評価。
+        repeat: 評価ごとの実行回数。
+
+    Returns:
+        `(計算式ごとの結果（評価件数の多い順）, 出力の差分)` のタプル。
+    """
+    scripts: dict[tuple[str, str], ScriptReplay] = {}
+    differences: list[OutputDifference] = []
+    for entry in entries:
+        key = (entry.calc_type, entry.script)
+        stats = scripts.get(key)
+        if stats is None:
+            stats = scripts[key] = ScriptReplay(
+                entry.calc_type, script_fingerprint(entry.script), entry.script
+            )
+        best = None
+        actual = None
+        for _ in range(max(1, repeat)):
+            started = perf_counter_ns()
+            result = evaluate_detailed(
+                entry.calc_type,
+                entry.script,
+                entry.inputs,
+                limits=entry.limits,
+                strict_inputs=entry.strict_inputs,
+                measurement_dir=entry.measurement_dir,
+            )
+            elapsed = (perf_counter_ns() - started) / 1000
+            best = elapsed if best is None else min(best, elapsed)
+            if actual is None:
+                actual = result.as_tuple()
+        assert best is not None and actual is not None
+        stats.captured.append(entry.micros)
+        stats.replayed.append(best)
+        if entry.anonymized:
+            stats.skipped += 1
+        elif actual != entry.outputs:
+            stats.differences += 1
+            differences.append(
+                OutputDifference(stats.fingerprint, entry.inputs, entry.outputs, actual)
+            )
+    ordered = sorted(scripts.values(), key=lambda item: -len(item.replayed))
+    return ordered, differences
+
+
+def _percentiles(values: Sequence[float]) -> dict[str, float]:
+    """`REPLAY_PERCENTILES` の分位点（最近順位法）を返す。"""
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+    return {
+        f"p{percent}": ordered[max(0, -(-len(ordered) * percent // 100) - 1)]
+        for percent in REPLAY_PERCENTILES
+    }
+
+
+def _render(
+    scripts: list[ScriptReplay],
+    differences: list[OutputDifference],
+    top: int,
+    show: int,
+) -> str:
+    """テキスト形式のレポートを組み立てる。"""
+    total = sum(len(item.replayed) for item in scripts)
+    seconds = sum(sum(item.replayed) for item in scripts) / 1_000_000
+    captured = sum(sum(item.captured) for item in scripts) / 1_000_000
+    skipped = sum(item.skipped for item in scripts)
+    lines = [
+        (
+            f"評価 {total} 件・計算式 {len(scripts)} 件: 再実行 {seconds:.3f} 秒"
+            f"（記録時 {captured:.3f} 秒）"
+        )
+    ]
+    header = "  {:<6} {:<12} {:>8} {:>10} {:>9} {:>9} {:>9} {:>9} {:>6}"
+    lines.append(
+        header.format(
+            "種別",
+            "計算式",
+            "件数",
+            "件/秒",
+            "p50µs",
+            "p90µs",
+            "p99µs",
+            "記録p50",
+            "差分",
+        )
+    )
+    for item in scripts[:top]:
+        replayed = _percentiles(item.replayed)
+        recorded = _percentiles(item.captured)
+        lines.append(
+            header.format(
+                item.calc_type,
+                item.fingerprint[:12],
+                len(item.replayed),
+                f"{item.throughput:.0f}",
+                f"{replayed['p50']:.1f}",
+                f"{replayed['p90']:.1f}",
+                f"{replayed['p99']:.1f}",
+                f"{recorded['p50']:.1f}",
+                item.differences,
+            )
+        )
+    if len(scripts) > top:
+        lines.append(f"  ほか {len(scripts) - top} 件")
+    lines.append(
+        f"出力の差分 {len(differences)} 件"
+        + (f"（匿名化した入力 {skipped} 件は比較対象外）" if skipped else "")
+    )
+    for difference in differences[:show]:
+        inputs = difference.inputs.replace("\n", "\\n")
+        if len(inputs) > 60:
+            inputs = inputs[:57] + "..."
+        lines.append(
+            f"  {difference.fingerprint[:12]} 入力 {inputs}: "
+            f"記録時 {list(difference.expected)} → 再実行 {list(difference.actual)}"
+        )
+    return "\n".join(lines)
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description=(
+            "記録したワークロードを現在のエンジンで再実行し、スループット・"
+            "レイテンシと出力の差分を報告します。"
+        )
+    )
+    parser.add_argument("logs", nargs="+", help="`--capture` で記録したログファイル")
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="評価ごとの実行回数（最短の所要時間を採用、既定: 3）",
+    )
+    parser.add_argument(
+        "--top", type=int, default=20, help="表示する計算式の件数（既定: 20）"
+    )
+    parser.add_argument(
+        "--diffs", type=int, default=10, help="表示する出力の差分の件数（既定: 10）"
+    )
+    parser.add_argument(
+        "--format", choices=("text", "json"), default="text", help="出力形式"
+    )
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """ワークロードを再実行するエントリーポイント。
+
+    Args:
+        argv: コマンドライン引数リスト。``None`` の場合は `sys.argv` を使用。
+
+    Returns:
+        出力の差分がなければ 0、差分があれば 1、ログを読めなければ 2。
+    """
+    args = _build_parser().parse_args(argv)
+    try:
+        entries = [entry for log in args.logs for entry in read_capture(Path(log))]
+    except (OSError, ValueError) as exc:
+        print(f"[エラー] ログを読み込めませんでした: {exc}")
+        return 2
+    scripts, differences = replay(entries, args.repeat)
+    if args.format == "json":
+        payload = {
+            "evaluations": len(entries),
+            "scripts": [item.to_dict() for item in scripts],
+            "differences": [
+                {
+                    "fingerprint": difference.fingerprint,
+                    "inputs": difference.inputs,
+                    "expected": list(difference.expected),
+                    "actual": list(difference.actual),
+                }
+                for difference in differences
+            ],
+        }
+        print(json.dumps(payload, ensure_ascii=False, indent=2))
+    else:
+        print(_render(scripts, differences, args.top, args.diffs))
+    return 1 if differences else 0
+
+
+if __name__ == "__main__":  # pragma: no cover - CLI entry point
+    sys.exit(main())
@@ -0,0 +1,307 @@
+"""変数列から他の行の出力を参照する行の依存関係グラフ。"""
+
+from __future__ import annotations
+
+import re
+from collections.abc import Callable, Collection, Iterable, Mapping
+from dataclasses import dataclass
+
+from .engine.runtime.text import parse_number_like
+
+RowKey = tuple[str, int]
+RowOutputs = tuple[str | None, str | None, str | None]
+
+# 引用符内の `{...}` は参照とみなさないよう、単一引用符の文字列も同時に照合する。
+ROW_REFERENCE_RE = re.compile(r"'(?:[^']|'')*'|\{(?:([^{}!]+)!)?(\d+)(?:\.(\w+))?\}")
+# 循環参照のメッセージに列挙する行数の上限。
+CYCLE_LABELS = 5
+OUTPUT_COLUMNS = {
+    "raw": 0,
+    "生データ": 0,
+    "edited": 1,
+    "編集後": 1,
+    "reported": 2,
+    "報告値": 2,
+}
+
+
+class RowReferenceError(ValueError):
+    """行参照が解決できない場合に送出する例外。"""
+
+
+@dataclass(frozen=True, slots=True)
+class RowReference:
+    """変数列に書かれた `{[シート名!]行番号[.列]}` 形式の参照。
+
+    Attributes:
+        sheet: 参照先のシート名。
+        row: 参照先の行番号。
+        column: 出力列の位置（0: 生データ、1: 編集後、2: 報告値）。未指定は
+            ``None`` で、報告値・編集後・生データのうち最初の空でない値を使う。
+    """
+
+    sheet: str
+    row: int
+    column: int | None
+
+    @property
+    def key(self) -> RowKey:
+        """参照先の `(シート名, 行番号)`。"""
+        return self.sheet, self.row
+
+    @property
+    def label(self) -> str:
+        """メッセージ用の `シート名!行番号` 表記。"""
+        return f"{self.sheet}!{self.row}"
+
+
+def find_references(inputs: str, sheet: str) -> list[RowReference]:
+    """変数列の文字列から行参照を取り出す。
+
+    Args:
+        inputs: 変数列の値。
+        sheet: 変数列のあるシート名（シート名を省略した参照の参照先）。
+
+    Returns:
+        出現順の `RowReference`。
+
+    Raises:
+        RowReferenceError: 列名が `raw`・`edited`・`reported`（`生データ`・
+            `編集後`・`報告値`）のいずれでもない場合。
+    """
+    if "{" not in inputs:
+        return []
+    return [
+        _reference(match, sheet)
+        for match in ROW_REFERENCE_RE.finditer(inputs)
+        if match.group(2) is not None
+    ]
+
+
+def substitute_references(
+    inputs: str, sheet: str, outputs: Callable[[RowKey], RowOutputs | None]
+) -> str:
+    """行参照を参照先の出力値で置き換えた変数列を返す。
+
+    数値として解釈できる値はそのまま、それ以外は単一引用符で囲んで埋め込む。
+
+    Args:
+        inputs: 変数列の値。
+        sheet: 変数列のあるシート名。
+        outputs: `(シート名, 行番号)` から `(生データ, 編集後, 報告値)` を返す関数。
+            参照先の評価に失敗していれば ``None`` を返す。
+
+    Returns:
+        参照を置き換えた変数列。
+
+    Raises:
+        RowReferenceError: 参照先の評価に失敗している、または参照する値が空の場合。
+    """
+    if "{" not in inputs:
+        return inputs
+
+    def replace(match: re.Match[str]) -> str:
+        if match.group(2) is None:
+            return match.group(0)
+        reference = _reference(match, sheet)
+        values = outputs(reference.key)
+        if values is None:
+            raise RowReferenceError(f"参照先 {reference.label} の評価に失敗しました。")
+        if reference.column is None:
+            value = next((text for text in reversed(values) if text), None)
+        else:
+            value = values[reference.column]
+        if not value:
+            raise RowReferenceError(f"参照先 {reference.label} の出力が空です。")
+        if parse_number_like(value) is not None:
+            return value
+        return "'" + value.replace("'", "''") + "'"
+
+    return ROW_REFERENCE_RE.sub(replace, inputs)
+
+
+class RowGraph:
+    """行参照による行間の依存関係（参照先 → 参照元）の有向グラフ。
+
+    評価対象の各行の変数列（`(シート名, 行番号)` をキーとした辞書）から作成する。
+
+    Attributes:
+        dependencies: 各行が参照する行（参照がない行はキーを持たない）。
+        dependents: 各行を参照する行。
+        errors: 参照を解決できない行とそのメッセージ（評価対象でない行・
+            不正な列名への参照）。
+    """
+
+    def __init__(self, inputs: Mapping[RowKey, str]) -> None:
+        self.dependencies: dict[RowKey, tuple[RowKey, ...]] = {}
+        self.dependents: dict[RowKey, list[RowKey]] = {}
+        self.errors: dict[RowKey, str] = {}
+        for key, text in inputs.items():
+            try:
+                references = find_references(text, key[0])
+            except RowReferenceError as exc:
+                self.errors[key] = str(exc)
+                continue
+            if not references:
+                continue
+            missing = [ref.label for ref in references if ref.key not in inputs]
+            if missing:
+                self.errors[key] = (
+                    f"参照先 {', '.join(missing)} は評価対象の行ではありません。"
+                )
+                continue
+            targets = tuple(dict.fromkeys(ref.key for ref in references))
+            self.dependencies[key] = targets
+            for target in targets:
+                self.dependents.setdefault(target, []).append(key)
+
+    def __bool__(self) -> bool:
+        return bool(self.dependencies or self.errors)
+
+    def downstream(self, keys: Iterable[RowKey]) -> set[RowKey]:
+        """`keys` と、それらを直接・間接に参照するすべての行を返す。"""
+        closure = set(keys)
+        stack = list(closure)
+        while stack:
+            for dependent in self.dependents.get(stack.pop(), ()):
+                if dependent not in closure:
+                    closure.add(dependent)
+                    stack.append(dependent)
+        return closure
+
+    def waves(
+        self, targets: Collection[RowKey]
+    ) -> tuple[list[list[RowKey]], dict[RowKey, str]]:
+        """`targets` を、同じ段の行どうしが互いに参照しない段（ウェーブ）へ分ける。
+
+        `targets` 外の参照先は評価済みとみなす。循環参照に含まれる行と参照を
+        解決できない行は段に含めず、エラーメッセージとともに返す。それらを
+        参照する行は段に含まれ、評価時の `substitute_references` で失敗する。
+
+        Args:
+            targets: 評価する行。
+
+        Returns:
+            `(段のリスト, 評価できない行とメッセージ)` のタプル。各段の行は
+            `targets` の並び順。
+        """
+        members = dict.fromkeys(targets)
+        failures = {key: self.errors[key] for key in members if key in self.errors}
+        waves = self._levels(members, failures)
+        scheduled = sum(len(wave) for wave in waves)
+        if scheduled + len(failures) < len(members):
+            # 段に入らなかった行は循環参照か、その下流にある。循環だけを失敗とし、
+            # 下流の行は参照先の失敗として評価時に扱う。
+            placed = {key for wave in waves for key in wave}
+            leftover = [
+                key for key in members if key not in placed and key not in failures
+            ]
+            for component in self._cycles(dict.fromkeys(leftover)):
+                rows = sorted(component)
+                labels = ", ".join(
+                    f"{sheet}!{row}" for sheet, row in rows[:CYCLE_LABELS]
+                )
+                if len(rows) > CYCLE_LABELS:
+                    labels += f" ほか {len(rows) - CYCLE_LABELS} 行"
+                message = f"循環参照（{labels}）"
+                for key in component:
+                    failures[key] = message
+            waves = self._levels(members, failures)
+        return waves, failures
+
+    def _levels(
+        self, members: Mapping[RowKey, None], failures: Mapping[RowKey, str]
+    ) -> list[list[RowKey]]:
+        """Kahn 法で、参照先がすべて前の段にある行を段ごとにまとめる。"""
+        pending: dict[RowKey, int] = {}
+        for key in members:
+            if key in failures:
+                continue
+            pending[key] = sum(
+                1
+                for target in self.dependencies.get(key, ())
+                if target in members and target not in failures
+            )
+        order = {key: position for position, key in enumerate(pending)}
+        waves: list[list[RowKey]] = []
+        ready = [key for key, count in pending.items() if count == 0]
+        while ready:
+            waves.append(ready)
+            following: list[RowKey] = []
+            for key in ready:
+                for dependent in self.dependents.get(key, ()):
+                    if dependent in pending:
+                        pending[dependent] -= 1
+                        if pending[dependent] == 0:
+                            following.append(dependent)
+            ready = sorted(following, key=order.__getitem__)
+        return waves
+
+    def _cycles(self, targets: Collection[RowKey]) -> list[list[RowKey]]:
+        """`targets` 内の循環参照（強連結成分）を Tarjan 法で求める。"""
+        index: dict[RowKey, int] = {}
+        low: dict[RowKey, int] = {}
+        stack: list[RowKey] = []
+        on_stack: set[RowKey] = set()
+        components: list[list[RowKey]] = []
+        for root in targets:
+            if root in index or root not in self.dependencies:
+                continue
+            # 行数が多い場合も再帰の深さ制限に掛からないよう、明示的なスタックで辿る。
+            work: list[tuple[RowKey, int]] = [(root, 0)]
+            while work:
+                node, position = work.pop()
+                if position == 0:
+                    index[node] = low[node] = len(index)
+                    stack.append(node)
+                    on_stack.add(node)
+                edges = [
+                    target
+                    for target in self.dependencies.get(node, ())
+                    if target in targets
+                ]
+                if position < len(edges):
+                    work.append((node, position + 1))
+                    target = edges[position]
+                    if target not in index:
+                        work.append((target, 0))
+                    elif target in on_stack:
+                        low[node] = min(low[node], index[target])
+                    continue
+                if low[node] == index[node]:
+                    component: list[RowKey] = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1 or node in self.dependencies.get(node, ()):
+                        components.append(component)
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+        return components
+
+
+def _reference(match: re.Match[str], sheet: str) -> RowReference:
+    name = match.group(3)
+    column = None
+    if name is not None:
+        column = OUTPUT_COLUMNS.get(name.lower())
+        if column is None:
+            raise RowReferenceError(
+                f"行参照 {match.group(0)} の列は raw・edited・reported"
+                "（生データ・編集後・報告値）のいずれかを指定してください。"
+            )
+    return RowReference((match.group(1) or sheet).strip(), int(match.group(2)), column)
+
+
+__all__ = [
+    "RowGraph",
+    "RowKey",
+    "RowReference",
+    "RowReferenceError",
+    "find_references",
+    "substitute_references",
+]
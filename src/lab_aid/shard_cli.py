@@ -0,0 +1,631 @@
+"""大量の行を複数のマシンで評価するため、入力を分割し結果を結合するモジュール。
+
+`shard` はブックまたは CSV を N 個の分割ブックへ分け、`merge` は各マシンで
+`excel_cli` を実行した後の分割ブックから結果を集めて元の入力へ書き戻す。
+分割ブックの各行は元の行番号のまま置き、分割の情報（元の入力・内容の
+ダイジェスト・担当する行）をブックのユーザー設定プロパティに記録する。
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import dataclasses
+import hashlib
+import json
+import sys
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass
+from pathlib import Path
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.packaging.custom import StringProperty
+
+from .engine.runtime.cost import estimate_cost
+from .excel_cli import (
+    COLUMN_HEADERS,
+    ERROR_DETAIL_COLUMN,
+    ERROR_DETAIL_HEADER,
+    WORKBOOK_SUFFIXES,
+    _iter_data_rows,
+    _normalize_multiline,
+    _record_results,
+    _save_workbook,
+    _template_workbook,
+    _to_text,
+    _write_text_cell,
+    discover_workbooks,
+)
+from .formula_library import FORMULA_SHEET
+from .row_graph import RowGraph, RowKey
+
+SHARD_PROPERTY = "lab_aid.shard"
+SHARD_FORMAT = 1
+# CSV の n 件目のレコードは分割ブックの LabAid シートの n + 2 行目に置く。
+CSV_SHEET = "LabAid"
+CSV_FIRST_ROW = 3
+CSV_INPUT_COLUMNS = COLUMN_HEADERS[:3]
+CSV_RESULT_COLUMNS = COLUMN_HEADERS[3:]
+
+RowInputs = tuple[str, str, str]
+
+
+class ShardError(ValueError):
+    """分割・結合ができない場合に送出する例外。"""
+
+
+@dataclass(frozen=True, slots=True)
+class ShardInfo:
+    """分割ブックに記録する分割の情報。
+
+    Attributes:
+        source: 元の入力のファイル名。
+        kind: 元の入力の形式（``"xlsx"`` または ``"csv"``）。
+        digest: 元の入力の評価対象行の内容のダイジェスト。
+        shard: 分割の番号（1 始まり）。
+        shards: 分割数。
+        rows: シート名ごとの担当行（`"3-100,105"` 形式）。
+        encoding: CSV の文字コード。
+        delimiter: CSV の区切り文字。
+    """
+
+    source: str
+    kind: str
+    digest: str
+    shard: int
+    shards: int
+    rows: dict[str, str]
+    encoding: str = "utf-8-sig"
+    delimiter: str = ","
+
+    @property
+    def label(self) -> str:
+        """メッセージ用の `分割 2/4` 表記。"""
+        return f"分割 {self.shard}/{self.shards}"
+
+    def keys(self) -> list[RowKey]:
+        """担当行の `(シート名, 行番号)` を返す。"""
+        return [
+            (sheet, row) for sheet, text in self.rows.items() for row in _parse(text)
+        ]
+
+    def to_json(self) -> str:
+        """ユーザー設定プロパティへ格納する JSON を返す。"""
+        return json.dumps(
+            {"format": SHARD_FORMAT, **dataclasses.asdict(self)},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def read(cls, path: Path) -> ShardInfo:
+        """分割ブックから分割の情報を読み込む。
+
+        Raises:
+            ShardError: 分割の情報がない、または形式が異なる場合。
+        """
+        wb = load_workbook(path, read_only=True)
+        try:
+            value = wb.custom_doc_props[SHARD_PROPERTY].value
+        except KeyError:
+            raise ShardError(f"{path} は分割ブックではありません。") from None
+        finally:
+            wb.close()
+        data = json.loads(value)
+        if data.pop("format", None) != SHARD_FORMAT:
+            raise ShardError(f"{path} の分割の形式に対応していません。")
+        return cls(**data)
+
+
+def partition_rows(
+    cells: Mapping[RowKey, RowInputs], shards: int
+) -> list[list[RowKey]]:
+    """評価対象の行を、見積もりコストがほぼ等しい `shards` 個の組に分ける。
+
+    行参照で互いにつながる行は同じ組に入れ、各分割ブックが単独で評価できる
+    ようにする。組はつながった行のまとまり（最初の行の位置で並べる）を
+    前から順に詰めて作るため、参照のない入力では連続した行範囲になる。
+
+    Args:
+        cells: `(シート名, 行番号)` ごとの `(計算式タイプ, 計算式, 変数)`。
+        shards: 分割数。
+
+    Returns:
+        組ごとの行（元の並び順）のリスト。
+
+    Raises:
+        ShardError: 分割数が行のまとまりの数より多い場合。
+    """
+    keys = list(cells)
+    graph = RowGraph({key: values[2] for key, values in cells.items()})
+    anchors = _anchors(keys, graph)
+    costs: dict[RowKey, float] = {}
+    for key, (calc_type, script, inputs) in cells.items():
+        anchor = anchors[key]
+        costs[anchor] = costs.get(anchor, 0.0) + estimate_cost(
+            calc_type.upper(), script, inputs
+        )
+    if shards < 1 or shards > len(costs):
+        raise ShardError(
+            f"分割数は 1 以上、行参照でつながった行のまとまりの数（{len(costs)}）"
+            f"以下にしてください: {shards}"
+        )
+    # コストの累計が目標を半分以上超える手前で次の組へ移り、残りの組には少なくとも
+    # 1 つのまとまりを残す。
+    total = sum(costs.values())
+    shard_of: dict[RowKey, int] = {}
+    current = members = 0
+    load = closed = 0.0
+    target = total / shards
+    for position, (anchor, cost) in enumerate(costs.items()):
+        remaining = shards - 1 - current
+        if (
+            members
+            and remaining
+            and (load + cost / 2 > target or len(costs) - position <= remaining)
+        ):
+            current += 1
+            closed += load
+            members = 0
+            load = 0.0
+            target = (total - closed) / (shards - current)
+        shard_of[anchor] = current
+        members += 1
+        load += cost
+    groups: list[list[RowKey]] = [[] for _ in range(shards)]
+    for key in keys:
+        groups[shard_of[anchors[key]]].append(key)
+    return groups
+
+
+def shard_input(
+    path: Path,
+    shards: int,
+    output_dir: Path | None = None,
+    *,
+    all_sheets: bool = False,
+    encoding: str = "utf-8-sig",
+    delimiter: str = ",",
+) -> list[Path]:
+    """ブックまたは CSV を分割ブックへ分ける。
+
+    各分割ブックは元のブック（CSV は入力テンプレート）の写しで、担当外の行の
+    入力と全行の出力を空にしたもの。`excel_cli` でそのまま評価できる。
+
+    Args:
+        path: 元の入力（`.xlsx`・`.xlsm`・`.csv`）。
+        shards: 分割数。
+        output_dir: 分割ブックの出力先。省略時は `<名前>.shards` ディレクトリ。
+        all_sheets: ブックの全シートを対象にする場合は ``True``。
+        encoding: CSV の文字コード。
+        delimiter: CSV の区切り文字。
+
+    Returns:
+        分割ブックのパス（番号順）。
+
+    Raises:
+        ShardError: 形式に対応していない、または評価対象の行がない場合。
+    """
+    kind = _kind(path)
+    header: list[str] = []
+    if kind == "csv":
+        header, records = _read_csv(path, encoding, delimiter)
+        cells = _csv_cells(header, records)
+        wb = _template_workbook()
+        for column in range(1, 4):
+            wb[CSV_SHEET].cell(row=CSV_FIRST_ROW, column=column).value = None
+        originals: dict[RowKey, tuple[object, ...]] = dict(cells)
+    else:
+        wb = load_workbook(path)
+        sheets = wb.worksheets if all_sheets else [wb.active]
+        cells = _workbook_cells(wb, [ws.title for ws in sheets])
+        originals = {
+            key: tuple(wb[key[0]].cell(row=key[1], column=c).value for c in (1, 2, 3))
+            for key in cells
+        }
+        for sheet, row in cells:
+            for column in range(1, ERROR_DETAIL_COLUMN + 1):
+                wb[sheet].cell(row=row, column=column).value = None
+    if not cells:
+        raise ShardError(f"{path} に評価対象の行がありません。")
+    digest = _digest(cells, header)
+    groups = partition_rows(cells, shards)
+
+    output_dir = output_dir or path.with_name(f"{path.stem}.shards")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths: list[Path] = []
+    for number, group in enumerate(groups, start=1):
+        rows: dict[str, list[int]] = {}
+        for sheet, row in group:
+            rows.setdefault(sheet, []).append(row)
+            for column, value in enumerate(originals[(sheet, row)], start=1):
+                if kind == "csv":
+                    _write_text_cell(wb[sheet], row, column, value or None)
+                else:
+                    wb[sheet].cell(row=row, column=column, value=value)
+        info = ShardInfo(
+            source=path.name,
+            kind=kind,
+            digest=digest,
+            shard=number,
+            shards=len(groups),
+            rows={sheet: _format(numbers) for sheet, numbers in rows.items()},
+            encoding=encoding,
+            delimiter=delimiter,
+        )
+        wb.custom_doc_props.props = [
+            prop for prop in wb.custom_doc_props.props if prop.name != SHARD_PROPERTY
+        ]
+        wb.custom_doc_props.append(StringProperty(SHARD_PROPERTY, info.to_json()))
+        target = (
+            output_dir / f"{path.stem}.shard-{number:02d}-of-{len(groups):02d}.xlsx"
+        )
+        _save_workbook(wb, target)
+        paths.append(target)
+        for sheet, row in group:
+            for column in range(1, 4):
+                wb[sheet].cell(row=row, column=column).value = None
+    return paths
+
+
+def merge_shards(
+    path: Path, shard_paths: Iterable[Path], output: Path | None = None
+) -> tuple[Path, int]:
+    """評価済みの分割ブックの結果を、元の入力の並びへ書き戻す。
+
+    すべての分割がそろっていること、元の入力が分割後に変更されていないこと、
+    各分割ブックの担当行の入力が元と同じで評価済みであることを検証してから
+    書き込む。分割ブックにエラー詳細列があれば、それも書き戻す。
+
+    Args:
+        path: 分割した元の入力。
+        shard_paths: 分割ブックのパス。
+        output: 結合結果の出力先。省略時はブックは元のブックへ上書きし、CSV は
+            `<名前>.results.csv` へ出力する。
+
+    Returns:
+        `(出力先, 行数)` のタプル。
+
+    Raises:
+        ShardError: 検証に失敗した場合。
+    """
+    infos = [(shard, ShardInfo.read(shard)) for shard in shard_paths]
+    if not infos:
+        raise ShardError("分割ブックが指定されていません。")
+    first_path, first = infos[0]
+    by_number: dict[int, tuple[Path, ShardInfo]] = {}
+    for shard, info in infos:
+        if (info.source, info.kind, info.digest, info.shards) != (
+            first.source,
+            first.kind,
+            first.digest,
+            first.shards,
+        ):
+            raise ShardError(f"{shard} は {first_path} と別の入力を分割したものです。")
+        if info.shard in by_number:
+            raise ShardError(
+                f"{info.label} が重複しています: {by_number[info.shard][0]}, {shard}"
+            )
+        by_number[info.shard] = (shard, info)
+    missing = [str(n) for n in range(1, first.shards + 1) if n not in by_number]
+    if missing:
+        raise ShardError(
+            f"分割 {', '.join(missing)}（全 {first.shards} 件中）が見つかりません。"
+        )
+
+    header: list[str] = []
+    records: list[list[str]] = []
+    if first.kind == "csv":
+        header, records = _read_csv(path, first.encoding, first.delimiter)
+        cells = _csv_cells(header, records)
+    else:
+        wb = load_workbook(path)
+        sheets = {sheet for _, info in infos for sheet in info.rows}
+        cells = _workbook_cells(wb, [ws.title for ws in wb if ws.title in sheets])
+    if _digest(cells, header) != first.digest:
+        raise ShardError(f"{path} は分割後に変更されています。")
+
+    results: dict[RowKey, tuple[str | None, ...]] = {}
+    details = False
+    for number in sorted(by_number):
+        shard, info = by_number[number]
+        found, has_details = _shard_results(shard, info, cells)
+        results.update(found)
+        details = details or has_details
+
+    if first.kind == "csv":
+        output = output or path.with_name(f"{path.stem}.results.csv")
+        _write_csv(output, header, records, results, details, first)
+    else:
+        output = output or path
+        for (sheet, row), values in results.items():
+            ws = wb[sheet]
+            raw, edited, reported, status, detail = values
+            _record_results(ws, row, raw, edited, reported, status or "")
+            if details:
+                ws.cell(row=2, column=ERROR_DETAIL_COLUMN, value=ERROR_DETAIL_HEADER)
+                _write_text_cell(ws, row, ERROR_DETAIL_COLUMN, detail)
+        _save_workbook(wb, output)
+    return output, len(results)
+
+
+def _kind(path: Path) -> str:
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        return "csv"
+    if suffix in WORKBOOK_SUFFIXES:
+        return "xlsx"
+    raise ShardError(f"{path} の形式には対応していません（.xlsx・.xlsm・.csv）。")
+
+
+def _workbook_cells(wb: Workbook, sheets: list[str]) -> dict[RowKey, RowInputs]:
+    """ブックの対象シートの評価対象行の入力を読む。"""
+    cells: dict[RowKey, RowInputs] = {}
+    for title in sheets:
+        if title == FORMULA_SHEET:
+            continue
+        ws = wb[title]
+        for row in _iter_data_rows(ws):
+            cells[(title, row)] = _inputs(
+                ws.cell(row=row, column=c).value for c in (1, 2, 3)
+            )
+    return cells
+
+
+def _inputs(values: Iterable[object]) -> RowInputs:
+    calc_type, script, inputs = (list(values) + [None, None, None])[:3]
+    return (
+        _to_text(calc_type).strip(),
+        _normalize_multiline(script),
+        _normalize_multiline(inputs),
+    )
+
+
+def _read_csv(
+    path: Path, encoding: str, delimiter: str
+) -> tuple[list[str], list[list[str]]]:
+    """CSV を読み、見出しとレコードを返す。"""
+    with path.open(encoding=encoding, newline="") as fh:
+        rows = list(csv.reader(fh, delimiter=delimiter))
+    if not rows:
+        raise ShardError(f"{path} に見出し行がありません。")
+    header = rows[0]
+    missing = [name for name in CSV_INPUT_COLUMNS if name not in header]
+    if missing:
+        raise ShardError(f"{path} に列 {', '.join(missing)} がありません。")
+    return header, rows[1:]
+
+
+def _csv_cells(header: list[str], records: list[list[str]]) -> dict[RowKey, RowInputs]:
+    """CSV のレコードを分割ブックの行に対応付けた入力を返す（空のレコードは除く）。"""
+    positions = [header.index(name) for name in CSV_INPUT_COLUMNS]
+    cells: dict[RowKey, RowInputs] = {}
+    for offset, record in enumerate(records):
+        values = _inputs(
+            record[position] if position < len(record) else None
+            for position in positions
+        )
+        if any(value.strip() for value in values):
+            cells[(CSV_SHEET, CSV_FIRST_ROW + offset)] = values
+    return cells
+
+
+def _write_csv(
+    path: Path,
+    header: list[str],
+    records: list[list[str]],
+    results: Mapping[RowKey, tuple[str | None, ...]],
+    details: bool,
+    info: ShardInfo,
+) -> None:
+    """元の CSV の列に結果列（既にあれば上書き）を加えて書き出す。"""
+    names = CSV_RESULT_COLUMNS + ([ERROR_DETAIL_HEADER] if details else [])
+    header = list(header)
+    for name in names:
+        if name not in header:
+            header.append(name)
+    positions = [header.index(name) for name in names]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding=info.encoding, newline="") as fh:
+        writer = csv.writer(fh, delimiter=info.delimiter)
+        writer.writerow(header)
+        for offset, record in enumerate(records):
+            record = record + [""] * (len(header) - len(record))
+            values = results.get((CSV_SHEET, CSV_FIRST_ROW + offset))
+            if values is not None:
+                for position, value in zip(positions, values, strict=False):
+                    record[position] = value or ""
+            writer.writerow(record)
+
+
+def _shard_results(
+    path: Path, info: ShardInfo, cells: Mapping[RowKey, RowInputs]
+) -> tuple[dict[RowKey, tuple[str | None, ...]], bool]:
+    """分割ブックから担当行の結果を読み、入力と評価の有無を検証する。
+
+    Returns:
+        `(行ごとの (生データ, 編集後, 報告値, status, エラー詳細), エラー詳細列の有無)`。
+    """
+    expected = set(info.keys())
+    results: dict[RowKey, tuple[str | None, ...]] = {}
+    details = False
+    wb = load_workbook(path, read_only=True)
+    try:
+        for sheet in info.rows:
+            rows = wb[sheet].iter_rows(
+                min_row=2, max_col=ERROR_DETAIL_COLUMN, values_only=True
+            )
+            for row, values in enumerate(rows, start=2):
+                padded = tuple(values) + (None,) * ERROR_DETAIL_COLUMN
+                if row == 2:
+                    details = padded[ERROR_DETAIL_COLUMN - 1] == ERROR_DETAIL_HEADER
+                    continue
+                key = (sheet, row)
+                inputs = _inputs(padded[:3])
+                if key not in expected:
+                    if any(inputs):
+                        raise ShardError(
+                            f"{info.label}（{path}）に担当外の行 {sheet}!{row} があります。"
+                        )
+                    continue
+                if inputs != cells.get(key):
+                    raise ShardError(
+                        f"{info.label}（{path}）の {sheet}!{row} の入力が元と異なります。"
+                    )
+                outputs = tuple(
+                    None if value is None else _to_text(value)
+                    for value in padded[3:ERROR_DETAIL_COLUMN]
+                )
+                if not outputs[3]:
+                    raise ShardError(
+                        f"{info.label}（{path}）の {sheet}!{row} は評価されていません。"
+                    )
+                results[key] = outputs if details else (*outputs[:4], None)
+    finally:
+        wb.close()
+    unread = expected - results.keys()
+    if unread:
+        sheet, row = min(unread)
+        raise ShardError(f"{info.label}（{path}）に {sheet}!{row} がありません。")
+    return results, details
+
+
+def _anchors(keys: list[RowKey], graph: RowGraph) -> dict[RowKey, RowKey]:
+    """行参照でつながった行のまとまりごとに、最初の行を代表として返す。"""
+    order = {key: position for position, key in enumerate(keys)}
+    parent = {key: key for key in keys}
+
+    def find(key: RowKey) -> RowKey:
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    for key, targets in graph.dependencies.items():
+        for target in targets:
+            first, second = sorted((find(key), find(target)), key=order.__getitem__)
+            parent[second] = first
+    return {key: find(key) for key in keys}
+
+
+def _digest(cells: Mapping[RowKey, RowInputs], header: list[str]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps(header, ensure_ascii=False).encode("utf-8"))
+    for key, values in cells.items():
+        digest.update(json.dumps([*key, *values], ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _format(rows: list[int]) -> str:
+    """昇順の行番号を `"3-100,105"` 形式にする。"""
+    ranges: list[str] = []
+    start = previous = rows[0]
+    for row in [*rows[1:], None]:
+        if row is not None and row == previous + 1:
+            previous = row
+            continue
+        ranges.append(f"{start}" if start == previous else f"{start}-{previous}")
+        if row is not None:
+            start = previous = row
+    return ",".join(ranges)
+
+
+def _parse(text: str) -> list[int]:
+    rows: list[int] = []
+    for part in text.split(","):
+        first, _, last = part.partition("-")
+        rows.extend(range(int(first), int(last or first) + 1))
+    return rows
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description=(
+            "ブック・CSV を複数のマシンで評価できる分割ブックへ分け、"
+            "評価後の結果を元の並びへ結合します。"
+        )
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    shard = commands.add_parser("shard", help="入力を分割ブックへ分ける")
+    shard.add_argument("input", help="分割するブック（.xlsx・.xlsm）または CSV")
+    shard.add_argument(
+        "-n", "--shards", type=int, required=True, help="分割数（マシン数）"
+    )
+    shard.add_argument(
+        "-o",
+        "--output-dir",
+        default=None,
+        help="分割ブックの出力先（既定: <名前>.shards）",
+    )
+    shard.add_argument(
+        "--all-sheets",
+        action="store_true",
+        help="ブックのすべてのシートを対象にする（既定はアクティブシートのみ）",
+    )
+    shard.add_argument(
+        "--encoding", default="utf-8-sig", help="CSV の文字コード（既定: utf-8-sig）"
+    )
+    shard.add_argument("--delimiter", default=",", help="CSV の区切り文字")
+    merge = commands.add_parser("merge", help="分割ブックの結果を元の入力へ結合する")
+    merge.add_argument("input", help="分割した元のブックまたは CSV")
+    merge.add_argument(
+        "shards",
+        nargs="+",
+        help="評価済みの分割ブック・ディレクトリ・ワイルドカード",
+    )
+    merge.add_argument(
+        "-o",
+        "--output",
+        default=None,
+        help="結合結果の出力先（既定: ブックは上書き、CSV は <名前>.results.csv）",
+    )
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """入力の分割・結果の結合を行うエントリーポイント。
+
+    Args:
+        argv: コマンドライン引数リスト。``None`` の場合は `sys.argv` を使用。
+
+    Returns:
+        成功時は 0、分割・結合できなかった場合は 1。
+    """
+    args = _build_parser().parse_args(argv)
+    source = Path(args.input).resolve()
+    try:
+        if args.command == "shard":
+            paths = shard_input(
+                source,
+                args.shards,
+                Path(args.output_dir) if args.output_dir else None,
+                all_sheets=args.all_sheets,
+                encoding=args.encoding,
+                delimiter=args.delimiter,
+            )
+            for path in paths:
+                print(f"[情報] 分割ブックを作成しました: {path}")
+            option = " --all-sheets" if args.all_sheets else ""
+            print(
+                "[情報] 各マシンで `python -m lab_aid.excel_cli 分割ブック"
+                f"{option}` を実行し、評価後に merge で結合してください。"
+            )
+        else:
+            shard_paths = [
+                path for path in discover_workbooks(args.shards) if path != source
+            ]
+            output, rows = merge_shards(
+                source, shard_paths, Path(args.output) if args.output else None
+            )
+            print(
+                f"[情報] {len(shard_paths)} 件の分割ブックから {rows} 行を結合しました: "
+                f"{output}"
+            )
+    except (OSError, ShardError) as exc:
+        print(f"[エラー] {exc}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover - CLI entry point
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""バッチ処理の各段階を Chrome/Perfetto の trace-event 形式で記録するモジュール。"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from time import perf_counter_ns
+from typing import Any
+
+from .engine.runtime.canonical import script_fingerprint
+
+TraceEvent = dict[str, Any]
+
+
+def script_hash(script: str) -> str:
+    """トレースのタグ付けに用いるスクリプトの短いハッシュを返す。
+
+    表記揺れのみ異なるスクリプトが同じ値になるよう、正規形の
+    フィンガープリントを用いる。
+
+    Args:
+        script: 計算スクリプト。
+
+    Returns:
+        `script_fingerprint` の先頭 12 桁。
+    """
+    return script_fingerprint(script)[:12]
+
+
+def row_range(rows: Iterable[int]) -> str:
+    """行番号の並びを `"3-258"` 形式の範囲表記にする。"""
+    ordered = list(rows)
+    if not ordered:
+        return ""
+    first, last = min(ordered), max(ordered)
+    return f"{first}" if first == last else f"{first}-{last}"
+
+
+class TraceRecorder:
+    """trace-event（`ph: "X"` の完了イベント）を蓄積するレコーダー。
+
+    `enabled=False` で生成した場合は `span` が何も記録しないため、呼び出し側は
+    トレースの有無で分岐せずに済む。タイムスタンプは OS の単調時計
+    （`perf_counter_ns`）をマイクロ秒にしたもので、同一マシン上の別プロセスで
+    記録したイベントも `extend` で同じ時間軸に並べられる。
+
+    Attributes:
+        enabled: 記録を行う場合は ``True``。
+        events: 記録済みのイベント。
+    """
+
+    def __init__(self, enabled: bool = True, process_name: str | None = None) -> None:
+        self.enabled = enabled
+        self.events: list[TraceEvent] = []
+        self._lock = threading.Lock()
+        if enabled and process_name:
+            self.events.append(
+                {
+                    "name": "process_name",
+                    "ph": "M",
+                    "pid": os.getpid(),
+                    "tid": 0,
+                    "args": {"name": process_name},
+                }
+            )
+
+    @contextmanager
+    def span(self, name: str, cat: str = "stage", **args: Any) -> Iterator[None]:
+        """`with` ブロックの所要時間を 1 件のイベントとして記録する。
+
+        Args:
+            name: イベント名（処理段階名）。
+            cat: イベントのカテゴリ。
+            **args: トレースビューアで表示する付加情報（行範囲・ハッシュ等）。
+        """
+        if not self.enabled:
+            yield
+            return
+        started = perf_counter_ns()
+        try:
+            yield
+        finally:
+            ended = perf_counter_ns()
+            event: TraceEvent = {
+                "name": name,
+                "cat": cat,
+                "ph": "X",
+                "ts": started // 1000,
+                "dur": max((ended - started) // 1000, 1),
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            }
+            if args:
+                event["args"] = args
+            with self._lock:
+                self.events.append(event)
+
+    def extend(self, events: Iterable[TraceEvent]) -> None:
+        """別プロセス等で記録したイベントを取り込む。"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.events.extend(events)
+
+    def write(self, path: Path) -> None:
+        """`chrome://tracing` / Perfetto で読み込める JSON を書き出す。
+
+        Args:
+            path: 出力先のパス。
+        """
+        with self._lock:
+            events = sorted(self.events, key=lambda event: event.get("ts", 0))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"traceEvents": events, "displayTimeUnit": "ms"}
+        path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+
+
+__all__ = ["TraceEvent", "TraceRecorder", "row_range", "script_hash"]
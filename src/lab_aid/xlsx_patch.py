@@ -0,0 +1,405 @@
+"""xlsx パッケージを直接読み書きし、変更行だけを書き換える高速経路。
+
+openpyxl はブック全体をオブジェクト化してから保存するため、数万行のブックでは
+読み込みと保存だけで数秒かかる。監視モードでは変更された数行だけを再評価する
+ため、シート XML を行要素単位で扱い、書き戻しも該当行の XML だけを差し替える。
+想定外の構造（Strict OOXML 等）は `UnsupportedWorkbookError` とし、呼び出し側で
+openpyxl による処理へ切り替える。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import html
+import os
+import posixpath
+import re
+import zipfile
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+from xml.etree import ElementTree
+
+from openpyxl.utils import column_index_from_string, get_column_letter
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+WORKSHEET_REL_TYPE = f"{REL_NS}/worksheet"
+
+ROW_RE = re.compile(r"<row\b[^>]*?\br=\"(\d+)\"[^>]*?(?:/>|>.*?</row>)", re.DOTALL)
+ROW_START_RE = re.compile(r"<row\b[^>]*?(/?)>", re.DOTALL)
+CELL_RE = re.compile(r"<c\b([^>]*?)(?:/>|>(.*?)</c>)", re.DOTALL)
+CELL_REF_RE = re.compile(r"\br=\"([A-Z]+)\d+\"")
+CELL_TYPE_RE = re.compile(r"\bt=\"(\w+)\"")
+CELL_STYLE_RE = re.compile(r"\s+s=\"\d+\"")
+SPANS_RE = re.compile(r"\s+spans=\"[^\"]*\"")
+VALUE_RE = re.compile(r"<v>(.*?)</v>", re.DOTALL)
+TEXT_RE = re.compile(r"<t(?:\s[^>]*)?>(.*?)</t>", re.DOTALL)
+PHONETIC_RE = re.compile(r"<rPh\b.*?</rPh>", re.DOTALL)
+SHARED_ITEM_RE = re.compile(r"<si>(.*?)</si>|<si/>", re.DOTALL)
+ESCAPED_CHAR_RE = re.compile(r"_x([0-9A-Fa-f]{4})_")
+DIMENSION_RE = re.compile(
+    r"(<dimension\b[^>]*?\bref=\")([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?(\")"
+)
+
+
+class UnsupportedWorkbookError(ValueError):
+    """高速経路で扱えない構造のブックであることを表す例外。"""
+
+
+def _unescape(text: str) -> str:
+    """XML 実体参照と OOXML の `_xHHHH_` エスケープを復元する。"""
+    if "&" in text:
+        text = html.unescape(text)
+    if "_x" in text:
+        text = ESCAPED_CHAR_RE.sub(lambda match: chr(int(match.group(1), 16)), text)
+    return text
+
+
+def _rich_text(body: str) -> str:
+    """`<si>`・`<is>` の中身から表示文字列を取り出す（ふりがなは除く）。"""
+    if "<rPh" in body:
+        body = PHONETIC_RE.sub("", body)
+    return "".join(_unescape(part) for part in TEXT_RE.findall(body))
+
+
+def _number_text(raw: str) -> str:
+    """数値セルの値を openpyxl で読み込んだ場合と同じ文字列にする。"""
+    try:
+        if "." in raw or "E" in raw or "e" in raw:
+            return f"{float(raw)}"
+        return f"{int(raw)}"
+    except ValueError:
+        return raw
+
+
+@dataclass
+class SheetXml:
+    """1 シート分の XML と、データ行の位置。
+
+    Attributes:
+        title: シート名。
+        part: パッケージ内のパス（例: `xl/worksheets/sheet1.xml`）。
+        text: シート XML 全体。
+        rows: 行番号をキーにした行要素の `(開始位置, 終了位置)`。
+    """
+
+    title: str
+    part: str
+    text: str
+    rows: dict[int, tuple[int, int]] = field(default_factory=dict)
+
+    def row_xml(self, row: int) -> str:
+        """行要素の XML を返す。行が存在しない場合は空文字列。"""
+        span = self.rows.get(row)
+        if span is None:
+            return ""
+        return self.text[span[0] : span[1]]
+
+    def patch(self, updates: Mapping[int, Mapping[int, str]]) -> dict[int, str]:
+        """指定したセルをインライン文字列で書き換えた XML を `text` へ反映する。
+
+        値を書いたセルが `<dimension>` の範囲外であれば、範囲を広げる。
+
+        Args:
+            updates: 行番号 → (列番号 → 値) の辞書。空文字列はセルの値を消す。
+                いずれの行も既存の行要素である必要がある。
+
+        Returns:
+            書き換え後の行要素の XML（行番号をキーにした辞書）。
+
+        Raises:
+            UnsupportedWorkbookError: 行要素が存在しない場合。
+        """
+        patched: dict[int, str] = {}
+        parts: list[str] = []
+        last = 0
+        for row in sorted(updates):
+            span = self.rows.get(row)
+            if span is None:
+                raise UnsupportedWorkbookError(f"行 {row} の行要素がありません。")
+            new_xml = _patch_row(self.text[span[0] : span[1]], row, updates[row])
+            parts.append(self.text[last : span[0]])
+            parts.append(new_xml)
+            last = span[1]
+            patched[row] = new_xml
+        parts.append(self.text[last:])
+        self.text = "".join(parts)
+        # 行要素は文書順に索引化されているため、差分長を累積して位置をずらす。
+        shift = 0
+        rows: dict[int, tuple[int, int]] = {}
+        for row, (start, end) in self.rows.items():
+            replaced = patched.get(row)
+            if replaced is None:
+                rows[row] = (start + shift, end + shift)
+            else:
+                rows[row] = (start + shift, start + shift + len(replaced))
+                shift += len(replaced) - (end - start)
+        self.rows = rows
+        written = [
+            (row, column)
+            for row, values in updates.items()
+            for column, value in values.items()
+            if value
+        ]
+        if written:
+            self._extend_dimension(
+                max(row for row, _column in written),
+                max(column for _row, column in written),
+            )
+        return patched
+
+    def _extend_dimension(self, max_row: int, max_column: int) -> None:
+        """`<dimension ref="...">` の範囲が指定したセルを含むよう広げる。"""
+        match = DIMENSION_RE.search(self.text)
+        if match is None:
+            return
+        first_col, first_row = match.group(2), int(match.group(3))
+        last_col = match.group(4) or first_col
+        last_row = int(match.group(5) or first_row)
+        last_col = get_column_letter(
+            max(column_index_from_string(last_col), max_column)
+        )
+        last_row = max(last_row, max_row)
+        ref = f"{first_col}{first_row}:{last_col}{last_row}"
+        start, end = match.start(2), match.start(6)
+        if ref == self.text[start:end]:
+            return
+        self.text = f"{self.text[:start]}{ref}{self.text[end:]}"
+        shift = len(ref) - (end - start)
+        if shift and start < min((span[0] for span in self.rows.values()), default=0):
+            self.rows = {
+                row: (begin + shift, finish + shift)
+                for row, (begin, finish) in self.rows.items()
+            }
+
+
+def _index_rows(text: str) -> dict[int, tuple[int, int]]:
+    """シート XML 中の行要素の位置を行番号ごとに返す。"""
+    start = text.find("<sheetData")
+    if start < 0:
+        raise UnsupportedWorkbookError("sheetData が見つかりません。")
+    return {int(match.group(1)): match.span() for match in ROW_RE.finditer(text, start)}
+
+
+def _cells(row_xml: str) -> list[tuple[int, str, str | None]]:
+    """行要素を `(列番号, 属性文字列, 内容)` のリストへ分解する。"""
+    cells: list[tuple[int, str, str | None]] = []
+    column = 0
+    for attrs, body in CELL_RE.findall(row_xml):
+        ref = CELL_REF_RE.search(attrs)
+        column = column_index_from_string(ref.group(1)) if ref else column + 1
+        # 自己終了タグと空要素は区別せず、どちらも内容なし（None）とする。
+        cells.append((column, attrs, body or None))
+    return cells
+
+
+def _cell_text(attrs: str, body: str | None, shared: list[str], refs: list[int]) -> str:
+    """セルの値を Excel CLI が扱う文字列へ変換する。
+
+    共有文字列を参照した場合は、その番号を `refs` へ追加する。
+
+    Raises:
+        UnsupportedWorkbookError: 数式のセル、または日付型（`t="d"`）のセルの場合。
+            openpyxl は数式の文字列・`datetime` を返すため、キャッシュ値や ISO 8601
+            の文字列を読むとこの経路だけ入力が変わる。
+    """
+    if not body:
+        return ""
+    if "<f" in body:
+        raise UnsupportedWorkbookError("数式のセルを含みます。")
+    kind = "n"
+    if ' t="' in attrs:
+        kind_match = CELL_TYPE_RE.search(attrs)
+        if kind_match is not None:
+            kind = kind_match.group(1)
+    if kind == "d":
+        raise UnsupportedWorkbookError("日付型のセルを含みます。")
+    if kind == "inlineStr":
+        # 書式なしの単純な形（`<is><t>...</t></is>`）は正規表現を使わずに取り出す。
+        if body.startswith("<is><t>") and body.endswith("</t></is>"):
+            inner = body[7:-9]
+            if "<" not in inner:
+                return _unescape(inner)
+        return _rich_text(body)
+    if body.startswith("<v>") and body.endswith("</v>"):
+        value = body[3:-4]
+    else:
+        value_match = VALUE_RE.search(body)
+        if value_match is None:
+            return ""
+        value = value_match.group(1)
+    if kind == "s":
+        index = int(value)
+        refs.append(index)
+        return shared[index]
+    if kind == "b":
+        return "True" if value.strip() == "1" else "False"
+    if kind in ("str", "e"):
+        return _unescape(value)
+    return _number_text(value)
+
+
+def parse_row(
+    row_xml: str, shared: list[str], max_col: int
+) -> tuple[tuple[str, ...], tuple[int, ...]]:
+    """行要素から 1〜`max_col` 列目の値を文字列のタプルとして取り出す。
+
+    Args:
+        row_xml: 行要素の XML。
+        shared: 共有文字列のリスト。
+        max_col: 取り出す最大列番号。
+
+    Returns:
+        `(値, 共有文字列の参照番号)` のタプル。値は長さ `max_col` で、空セルは
+        空文字列。参照番号は共有文字列だけが変わった場合の差分判定に用いる。
+    """
+    values = [""] * max_col
+    refs: list[int] = []
+    for column, attrs, body in _cells(row_xml):
+        if column <= max_col:
+            values[column - 1] = _cell_text(attrs, body, shared, refs)
+    return tuple(values), tuple(refs)
+
+
+def _inline_cell(ref: str, style: str, value: str) -> str:
+    """インライン文字列のセル要素を生成する。"""
+    if not value:
+        return f'<c r="{ref}"{style}/>'
+    escaped = html.escape(value, quote=False).replace("\r", "_x000D_")
+    return (
+        f'<c r="{ref}"{style} t="inlineStr">'
+        f'<is><t xml:space="preserve">{escaped}</t></is></c>'
+    )
+
+
+def _patch_row(row_xml: str, row: int, updates: Mapping[int, str]) -> str:
+    """行要素のうち `updates` の列だけを差し替える。"""
+    start = ROW_START_RE.match(row_xml)
+    if start is None:
+        raise UnsupportedWorkbookError(f"行 {row} の行要素を解析できません。")
+    # spans は省略可能な最適化情報のため、列を追加しうる行では取り除く。
+    open_tag = SPANS_RE.sub("", row_xml[: start.end()])
+    if start.group(1):
+        open_tag = open_tag[:-2].rstrip() + ">"
+    cells: dict[int, str] = {}
+    styles: dict[int, str] = {}
+    for column, attrs, body in _cells(row_xml):
+        style = CELL_STYLE_RE.search(attrs)
+        styles[column] = style.group(0) if style else ""
+        if body is None:
+            cells[column] = f"<c{attrs}/>"
+        else:
+            cells[column] = f"<c{attrs}>{body}</c>"
+    for column, value in updates.items():
+        ref = f"{get_column_letter(column)}{row}"
+        cells[column] = _inline_cell(ref, styles.get(column, ""), value)
+    body = "".join(cells[column] for column in sorted(cells))
+    return f"{open_tag}{body}</row>"
+
+
+class XlsxPackage:
+    """xlsx パッケージ（zip）の読み込みと、シート XML を差し替えた保存を行う。
+
+    Attributes:
+        path: ブックのパス。
+        sheets: `(シート名, パッケージ内パス)` のリスト（ブック内の順序）。
+        active_index: アクティブシートの `sheets` 上の位置。
+        shared_digest: 共有文字列パーツのハッシュ。変更検知に用いる。
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        try:
+            with zipfile.ZipFile(path) as archive:
+                self._members = {
+                    info.filename: archive.read(info) for info in archive.infolist()
+                }
+                self._infos = archive.infolist()
+        except zipfile.BadZipFile as exc:
+            raise UnsupportedWorkbookError(f"xlsx として読み込めません: {exc}") from exc
+        self.sheets, self.active_index = self._read_workbook()
+        shared = self._members.get("xl/sharedStrings.xml", b"")
+        self.shared_digest = hashlib.sha1(shared, usedforsecurity=False).digest()
+        self._shared: list[str] | None = None
+
+    def _read_workbook(self) -> tuple[list[tuple[str, str]], int]:
+        """`workbook.xml` とリレーションからシートの一覧を組み立てる。"""
+        try:
+            workbook = ElementTree.fromstring(self._members["xl/workbook.xml"])
+            rels = ElementTree.fromstring(self._members["xl/_rels/workbook.xml.rels"])
+        except (KeyError, ElementTree.ParseError) as exc:
+            raise UnsupportedWorkbookError("workbook.xml を解析できません。") from exc
+        if workbook.tag != f"{{{MAIN_NS}}}workbook":
+            raise UnsupportedWorkbookError("未対応の名前空間のブックです。")
+        targets: dict[str, str] = {}
+        for rel in rels.iter(f"{{{PKG_REL_NS}}}Relationship"):
+            if rel.get("Type") != WORKSHEET_REL_TYPE:
+                continue
+            target = rel.get("Target", "")
+            if target.startswith("/"):
+                targets[rel.get("Id", "")] = target.lstrip("/")
+            else:
+                targets[rel.get("Id", "")] = posixpath.normpath(
+                    posixpath.join("xl", target)
+                )
+        sheets: list[tuple[str, str]] = []
+        for sheet in workbook.iter(f"{{{MAIN_NS}}}sheet"):
+            part = targets.get(sheet.get(f"{{{REL_NS}}}id", ""))
+            if part is None or part not in self._members:
+                raise UnsupportedWorkbookError("ワークシート以外のシートを含みます。")
+            sheets.append((sheet.get("name", ""), part))
+        if not sheets:
+            raise UnsupportedWorkbookError("シートがありません。")
+        view = workbook.find(f"{{{MAIN_NS}}}bookViews/{{{MAIN_NS}}}workbookView")
+        active = int(view.get("activeTab", "0")) if view is not None else 0
+        return sheets, min(active, len(sheets) - 1)
+
+    @property
+    def shared_strings(self) -> list[str]:
+        """共有文字列のリスト（初回参照時に解析する）。"""
+        if self._shared is None:
+            data = self._members.get("xl/sharedStrings.xml", b"").decode("utf-8")
+            self._shared = [
+                _rich_text(match.group(1) or "")
+                for match in SHARED_ITEM_RE.finditer(data)
+            ]
+        return self._shared
+
+    def sheet(self, title: str, part: str) -> SheetXml:
+        """シート XML を読み込み、行要素の位置を索引化する。"""
+        text = self._members[part].decode("utf-8")
+        return SheetXml(title, part, text, _index_rows(text))
+
+    def save(self, sheets: list[SheetXml]) -> None:
+        """書き換えたシート XML でパッケージを保存する。
+
+        同じディレクトリの一時ファイルへ書いてから置き換える。差し替えた
+        シートは速度を優先して低い圧縮レベルで格納する。
+
+        Args:
+            sheets: 差し替えるシート。
+        """
+        replaced = {sheet.part: sheet.text.encode("utf-8") for sheet in sheets}
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        try:
+            with zipfile.ZipFile(tmp_path, "w") as archive:
+                for info in self._infos:
+                    data = replaced.get(info.filename)
+                    if data is None:
+                        archive.writestr(info, self._members[info.filename])
+                    else:
+                        archive.writestr(
+                            info.filename,
+                            data,
+                            compress_type=zipfile.ZIP_DEFLATED,
+                            compresslevel=1,
+                        )
+                        self._members[info.filename] = data
+            os.replace(tmp_path, self.path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+
+__all__ = ["SheetXml", "UnsupportedWorkbookError", "XlsxPackage", "parse_row"]
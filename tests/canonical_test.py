@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import pytest
+
+from lab_aid.engine import (
+    canonicalize_script,
+    evaluate,
+    evaluate_detailed,
+    script_fingerprint,
+)
+
+SCRIPT = """a = #A + 1
+if a gt 2 and strlen(#S) eq 3
+  this = strcat(a, 'X  y')
+else
+  this = 0
+end"""
+
+VARIANTS = [
+    SCRIPT,
+    SCRIPT.replace("\n", "\r\n"),
+    """a=#A + 1 ; 後で消す
+IF a GT 2 AND STRLEN( #S ) EQ 3
+    This   =   StrCat(a ,  'X  y')   ; 連結
+Else
+  this = 0
+END
+
+""",
+]
+
+
+def test_equivalent_scripts_share_fingerprint_and_result() -> None:
+    inputs = "A=5\nS='abc'"
+    fingerprints = {script_fingerprint(script) for script in VARIANTS}
+    assert len(fingerprints) == 1
+    results = {evaluate("E", variant, inputs) for variant in VARIANTS}
+    assert results == {("6X  y", None, None)}
+    assert canonicalize_script(VARIANTS[2]).splitlines()[:3] == [
+        "a = #A + 1",
+        "if a gt 2 and strlen(#S) eq 3",
+        "this = strcat(a, 'X  y')",
+    ]
+
+
+@pytest.mark.parametrize(
+    ("left", "right"),
+    [
+        ("this = 'A'", "this = 'a'"),
+        ("a = 1\nthis = a", "A = 1\nthis = A"),
+        ("this = #A", "this = #a"),
+        ("x = 1\nthis = x", "x = 1\nthis = x + 0"),
+    ],
+)
+def test_semantic_differences_change_fingerprint(left: str, right: str) -> None:
+    assert script_fingerprint(left) != script_fingerprint(right)
+
+
+def test_canonical_form_preserves_error_line_numbers() -> None:
+    script = "; 見出し\n\nA = 1\nB  =  SQRT(A,2)\nthis = B"
+    result = evaluate_detailed("E", script, "")
+    assert result.error_code == "TYPE"
+    assert result.line == 4
+    assert result.source == "B = sqrt(A, 2)"
+
+
+@pytest.mark.parametrize(
+    ("script", "expected"),
+    [
+        ('this = "a  b"', "a  b"),
+        ('this = "This"', "This"),
+        ('THIS = "x  AND  y"', "x  and  y"),
+        ('this = StrCat( "A  ", #S )', "A  abc"),
+    ],
+)
+def test_double_quoted_literals_keep_raw_results(script: str, expected: str) -> None:
+    canonical = canonicalize_script(script)
+    assert canonical == script
+    assert evaluate("E", script, "S='abc'") == (expected, None, None)
+    assert evaluate("E", canonical, "S='abc'") == (expected, None, None)
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import dataclasses
+from pathlib import Path
+
+import pytest
+
+from lab_aid.engine import (
+    capture,
+    evaluate,
+    evaluate_column_R,
+    evaluate_detailed,
+    evaluate_many,
+)
+from lab_aid.engine.runtime.capture import WorkloadRecorder, read_capture
+from lab_aid.replay_cli import main, replay
+
+
+def test_capture_records_evaluations_and_anonymizes_strings(tmp_path: Path) -> None:
+    path = tmp_path / "workload.jsonl.gz"
+    with capture(path, anonymize=True) as recorder:
+        evaluate("E", "this = #A * 2", "A=5")
+        evaluate("E", "this = strlen(#S)", "S='secret'\nT='secret'")
+        evaluate_many([("E", "this = #A * 2", "A=6"), ("E", "this = (1", "A=1")])
+        evaluate_column_R("this = roundjisb(this, 2, 1)", ["1.205", "2.5"])
+    evaluate("E", "this = #A", "A=1")
+
+    entries = list(read_capture(path))
+    assert recorder.count == len(entries) == 6
+    assert [entry.outputs for entry in entries[:1] + entries[2:]] == [
+        ("10", None, None),
+        ("12", None, None),
+        ("エラー", None, None),
+        (None, "1.21", "1.21"),
+        (None, "2.50", "2.50"),
+    ]
+    assert entries[3].error_code == "SYNTAX"
+    anonymized = entries[1]
+    assert anonymized.anonymized and "secret" not in anonymized.inputs
+    first, second = (line.split("=")[1] for line in anonymized.inputs.splitlines())
+    assert first == second and len(first) == len("'secret'")
+    assert all(entry.micros >= 0 for entry in entries)
+
+
+def test_replay_reports_output_differences(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    with capture() as recorder:
+        for value in range(5):
+            evaluate("E", "this = #A + 1", f"A={value}")
+    entries = recorder.entries
+    scripts, differences = replay(entries, repeat=2)
+    assert [len(item.replayed) for item in scripts] == [5]
+    assert differences == []
+
+    path = tmp_path / "workload.jsonl"
+    log = WorkloadRecorder(path)
+    log.extend(
+        entries[:4] + [dataclasses.replace(entries[4], outputs=("4", None, None))]
+    )
+    log.close()
+    assert main([str(path), "--repeat", "1"]) == 1
+    report = capsys.readouterr().out
+    assert "評価 5 件・計算式 1 件" in report
+    assert "記録時 ['4', None, None] → 再実行 ['5', None, None]" in report
+    assert main([str(tmp_path / "missing.jsonl")]) == 2
+
+
+def test_replay_reuses_input_options_of_the_capture(tmp_path: Path) -> None:
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "m.txt").write_text("1, 2, 3\n", encoding="utf-8")
+    path = tmp_path / "workload.jsonl"
+    with capture(path):
+        evaluate("E", "this = #A * 2", "A=3\nbad line", strict_inputs=False)
+        evaluate_detailed(
+            "E", "this = sum(#M)", "M=file('m.txt')", measurement_dir=data
+        )
+        evaluate("E", "this = #A * 2", "A=3\nbad line")
+
+    entries = list(read_capture(path))
+    assert [entry.strict_inputs for entry in entries] == [False, True, True]
+    assert [entry.measurement_dir for entry in entries] == [None, str(data), None]
+    assert [entry.outputs[0] for entry in entries] == ["6", "6", "エラー"]
+    assert main([str(path), "--repeat", "1"]) == 0
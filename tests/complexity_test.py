@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import math
+from collections.abc import Callable, Sequence
+from time import perf_counter
+
+import pytest
+
+from lab_aid.engine import evaluate
+from lab_aid.engine.runtime.engine_core import OP_MAPPING, Engine, compile_expr
+from lab_aid.engine.runtime.text import replace_word_ci_outside_quotes
+
+# 壁時計の計測は CPU の競合で揺れるため、既定では実行せず `-m complexity`
+# （`just test-complexity`）で他の処理と並べずに実行する。
+pytestmark = pytest.mark.complexity
+
+# 線形の処理の指数の上限。2 乗の処理では 2 前後になる。
+LINEAR_BOUND = 1.4
+REPEAT = 5
+
+
+def growth_exponent(
+    build: Callable[[int], Callable[[], object]], sizes: Sequence[int]
+) -> float:
+    """入力の大きさを倍々に増やし、所要時間の増え方の指数を返す。
+
+    大きさごとに `REPEAT` 回計測した最短の所要時間について、両対数での
+    最小二乗の傾きを求める。線形なら 1、2 乗なら 2 に近くなる。
+
+    Args:
+        build: 大きさを受け取り、計測する処理を返す関数。入力の準備は計測外。
+        sizes: 入力の大きさ（倍々に増やす）。
+
+    Returns:
+        所要時間の増え方の指数。
+    """
+    points = []
+    for size in sizes:
+        func = build(size)
+        func()
+        best = math.inf
+        for _ in range(REPEAT):
+            started = perf_counter()
+            func()
+            best = min(best, perf_counter() - started)
+        points.append((math.log(size), math.log(best)))
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / sum(
+        (x - mean_x) ** 2 for x, _ in points
+    )
+
+
+def test_replace_word_ci_outside_quotes_is_linear() -> None:
+    def build(size: int) -> Callable[[], object]:
+        text = "a GT b and 'x gt y' or c_le le d " * size
+        return lambda: replace_word_ci_outside_quotes(text, OP_MAPPING)
+
+    assert growth_exponent(build, (100, 200, 400, 800)) < LINEAR_BOUND
+
+
+def test_compile_expr_quote_mask_is_linear_in_items() -> None:
+    def build(size: int) -> Callable[[], object]:
+        args = ", ".join(f"#A{i} + strlen('#Q{i} ''x'' #R')" for i in range(size))
+        return lambda: compile_expr(f"max({args})")
+
+    assert growth_exponent(build, (100, 200, 400, 800)) < LINEAR_BOUND
+
+
+def test_block_state_does_not_depend_on_nesting_depth() -> None:
+    def build(depth: int) -> Callable[[], object]:
+        lines = [f"if {level} gt 0" for level in range(depth)]
+        lines += [f"v{i} = {i}" for i in range(200)]
+        lines += ["end"] * depth
+        return lambda: Engine().run_lines(lines)
+
+    # 深さを 8 倍にしても、行数がほぼ同じなら所要時間はほぼ変わらない。
+    assert growth_exponent(build, (1, 2, 4, 8)) < 0.3
+
+
+def test_strcat_accumulation_in_loop_is_linear() -> None:
+    def build(size: int) -> Callable[[], object]:
+        script = (
+            f"s = ''\nfor i = 1 to {size}\n  strcat(s, 'abcdefgh')\nnext\n"
+            "this = strlen(s)"
+        )
+        return lambda: evaluate("E", script, "")
+
+    assert growth_exponent(build, (250, 500, 1000, 2000)) < LINEAR_BOUND
+
+
+def test_run_lines_is_linear_in_lines_and_iterations() -> None:
+    def lines_of(size: int) -> Callable[[], object]:
+        lines = ["v0 = #A"] + [f"v{i} = v{i - 1} + 1" for i in range(1, size)]
+        return lambda: Engine(items={"A": 1}).run_lines(lines)
+
+    def iterations_of(size: int) -> Callable[[], object]:
+        lines = [
+            "s = 0",
+            f"for i = 1 to {size}",
+            "  if i gt 3",
+            "    s = s + i",
+            "  end",
+            "next",
+            "this = s",
+        ]
+        return lambda: Engine().run_lines(lines)
+
+    assert growth_exponent(lines_of, (100, 200, 400, 800)) < LINEAR_BOUND
+    assert growth_exponent(iterations_of, (250, 500, 1000, 2000)) < LINEAR_BOUND
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from textwrap import dedent
+
+from lab_aid.engine import evaluate_many, explain
+from lab_aid.engine.runtime.constants import MAX_FOR_ITERS
+from lab_aid.engine.runtime.cost import (
+    DEFAULT_LOOP_ITERATIONS,
+    INPUT_VALUE_COST,
+    estimate_cost,
+    schedule_chunks,
+)
+
+
+def test_explain_multiplies_loop_bodies_by_constant_iterations() -> None:
+    script = dedent(
+        """
+        n = 20
+        s = 0
+        for i = 1 to n
+          for j = 10 to 1 step -2
+            s = s + i * j
+          next
+        next
+        for k = 1 to #A
+          s = s + k
+        next
+        this = s
+        """
+    ).strip()
+    estimate = explain("E", script, "A=3")
+    executions = {item.line: item.executions for item in estimate.lines}
+    assert executions[3] == 1
+    assert executions[5] == 20 * 5
+    assert executions[6] == 20 * 5
+    assert executions[9] == DEFAULT_LOOP_ITERATIONS
+    assert executions[11] == 1
+    assert estimate.estimated_loops == 1
+    assert estimate.total == estimate_cost("E", script, "A=3")
+
+    report = estimate.render(limit=1)
+    assert report.splitlines()[0].startswith("推定コスト ")
+    assert "反復回数不明の FOR 1 件" in report
+    assert "行 5:" in report
+
+
+def test_explain_scales_with_referenced_item_sizes() -> None:
+    script = "this = stdev(#A) + #B"
+    small = explain("E", script, "A=1, 2\nB=1\nC=1")
+    large_inputs = "A=" + ", ".join(["1"] * 1000) + "\nB=1\nC=" + ", ".join(["1"] * 500)
+    large = explain("E", script, large_inputs)
+    assert large.inputs == INPUT_VALUE_COST * 1001
+    assert large.total > small.total * 10
+    assert "入力解析" in large.render()
+
+    r_cost = explain("R", "this = roundjisb(this, 2, 1)", "1.25")
+    assert r_cost.total > explain("R", "this = this", "1.25").total
+    assert explain("X", "this = 1").lines == ()
+
+
+def test_schedule_chunks_starts_with_the_most_expensive_work() -> None:
+    costs = [1.0] * 200 + [500.0, 1.0, 800.0]
+    chunks = schedule_chunks(costs, 2, split=4, max_size=64)
+    assert chunks[0] == [202]
+    assert chunks[1] == [200]
+    assert sorted(index for chunk in chunks for index in chunk) == list(range(203))
+    assert all(len(chunk) <= 64 for chunk in chunks)
+    assert chunks[2] == list(range(64))
+    assert schedule_chunks([], 4) == []
+
+
+def test_infinite_for_bounds_are_capped_without_breaking_the_batch() -> None:
+    overflow = "for i = 1 to 1e400\n  this = i\nnext"
+    wide = "x = 1e308\nfor i = -x to x step 1e-300\n  this = i\nnext"
+    assert explain("E", overflow).lines[1].executions == MAX_FOR_ITERS
+    assert explain("E", wide).lines[2].executions == MAX_FOR_ITERS
+
+    requests = [("E", overflow, ""), ("E", wide, ""), ("E", "this = 1", "")]
+    results = evaluate_many(requests, max_workers=2)
+    assert [result.error_code for result in results] == ["RUNTIME", "RUNTIME", None]
+    assert results[2].as_tuple() == ("1", None, None)
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from textwrap import dedent
+
+import pytest
+
+from lab_aid.engine import ItemUsage, evaluate, extract_dependencies
+from lab_aid.engine.runtime.inputs import parse_inputs_E
+
+
+def test_extract_dependencies_reports_units_indices_and_lines() -> None:
+    script = """
+        rem #UNUSED は参照しない
+        a = sum(#A[MG]) ' #B はコメント
+        if str_comp(#C, #D, 2, 3) eq 0
+          this = strlen(#D) + a
+        else
+          this = str_comp(#C, #D, 1, 3) + strlen('#E')
+        end
+        for i = 1 to #N
+        next
+    """
+    deps = extract_dependencies(dedent(script).strip())
+    assert deps.items == (
+        ItemUsage("A", "MG", frozenset(), True, (2,)),
+        ItemUsage("C", None, frozenset({1, 2}), False, (3, 6)),
+        ItemUsage("D", None, frozenset({1, 3}), False, (3, 4, 6)),
+        ItemUsage("N", None, frozenset(), True, (8,)),
+    )
+    assert deps.keys() == {("A", "MG"), "C", "D", "N"}
+    assert extract_dependencies(dedent(script).strip()) is deps
+
+
+def test_dependencies_filter_inputs_keeps_only_referenced_lines() -> None:
+    script = "this = #A + #B[G]"
+    inputs = "A=1\n#B[G]=2\nC=bad value\nB=3\nbroken"
+    deps = extract_dependencies(script)
+    assert deps.filter_inputs(inputs) == "A=1\n#B[G]=2\nbroken"
+    assert parse_inputs_E("A=1\n#B[G]=2\nC=bad value", only=deps.keys()) == {
+        "A": 1,
+        ("B", "G"): 2,
+    }
+    assert evaluate("E", script, deps.filter_inputs("A=1\n#B[G]=2\nC=bad")) == (
+        "3",
+        None,
+        None,
+    )
+    with pytest.raises(ValueError, match="書式エラー"):
+        parse_inputs_E(deps.filter_inputs(inputs), only=deps.keys())
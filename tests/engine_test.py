@@ -2,10 +2,34 @@
 
 import math
 from textwrap import dedent
+from typing import Any
 
 import pytest
 
-from lab_aid.engine import evaluate
+from lab_aid.engine import (
+    EvaluationLimits,
+    Profiler,
+    evaluate,
+    evaluate_column_R,
+    evaluate_detailed,
+    evaluate_many,
+    evaluate_structured,
+)
+from lab_aid.engine.runtime.engine_core import (
+    EXPRESSION_CACHE,
+    PROGRAM_CACHE,
+    Engine,
+    FormatAwareNumber,
+    compile_script,
+)
+from lab_aid.engine.runtime.functions import FormatHint, format_roundjisb_output
+from lab_aid.engine.runtime.inputs import (
+    LazyInputs,
+    VarRef,
+    parse_inputs_E,
+    structured_inputs_E,
+)
+from lab_aid.engine.runtime.metrics import EVALUATION_ERRORS, EVALUATION_SECONDS
 
 
 def run_e(script: str, inputs: str = "") -> tuple[str | None, str | None, str | None]:
@@ -157,6 +181,16 @@ def test_e_for_loop_accumulates_values() -> None:
     assert run_e(script) == ("6", None, None)
 
 
+def test_e_for_variable_spelled_like_this_shadows_this_in_expressions() -> None:
+    script = """
+        for This = 1 TO 3
+        next
+        this = 7
+        this = this + 1
+    """
+    assert run_e(script) == ("4", None, None)
+
+
 def test_e_deep_nesting_respects_limits() -> None:
     script_ok = """
         total = 0
@@ -617,3 +651,334 @@ def test_r_print2_preserves_roundjisb_formatting() -> None:
         print2(this,a)
     """
     assert run_r(script, "0") == (None, "0.000", "0.00")
+
+
+def test_profiler_records_lines_builtins_and_phases() -> None:
+    profiler = Profiler()
+    script = dedent(
+        """
+        total = 0
+        for I = 1 TO 3
+         total = total + sqrt(I * I)
+        next
+        this = total
+        """
+    ).strip()
+    assert evaluate("E", script, "", profiler=profiler) == ("6", None, None)
+
+    report = profiler.to_dict()
+    hits = {entry["line"]: entry["hits"] for entry in report["lines"]}
+    assert hits == {1: 1, 2: 1, 3: 3, 4: 3, 5: 1}
+    assert report["builtins"]["sqrt"]["hits"] == 3
+    assert {"inputs", "parse", "run"} <= set(report["phases"])
+
+
+def test_format_hints_are_applied_only_when_output() -> None:
+    engine = Engine()
+    engine.run_lines(
+        [
+            "for i = 1 to 3",
+            "  x = roundjisb(i * 1.5, 2, 1)",
+            "next",
+            "y = roundjisb(x, 3, 0)",
+            "this = x",
+        ]
+    )
+    x, y = engine.vars["x"], engine.vars["y"]
+    assert isinstance(x, FormatAwareNumber) and isinstance(y, FormatAwareNumber)
+    assert engine.var_formats == {
+        "x": FormatHint("fixed", 2),
+        "y": FormatHint("sig", 3),
+        "this": FormatHint("fixed", 2),
+    }
+    assert x._formatted is None and y._formatted is None
+    assert engine.this_formatted == "4.50"
+    assert str(y) == "4.50"
+
+    assert format_roundjisb_output(1.5, "fixed:2") == "1.50"
+    assert format_roundjisb_output(1234, FormatHint("sig", 2)) == "1200"
+    assert format_roundjisb_output("abc", FormatHint("fixed", 1)) is None
+    assert str(FormatHint.parse("sig:3")) == "sig:3"
+    assert FormatHint.parse("other:1") is None
+
+
+def test_pure_builtins_are_memoized_within_one_evaluation() -> None:
+    script = dedent(
+        """
+        if stdev(#A) gt 1
+          s = roundjisb(stdev(#A), 3, 2)
+        end
+        this = roundjisb(stdev(#A) / ave(#A) * 100, 2, 1) + sqrt(4) + sqrt(9)
+        """
+    ).strip()
+    profiler = Profiler()
+    assert evaluate("E", script, "A=1, 3, 8", profiler=profiler) == (
+        "95.14",
+        None,
+        None,
+    )
+    assert profiler.builtins["stdev"].hits == 1
+    assert profiler.builtins["sqrt"].hits == 2
+    report = profiler.to_dict()["memo"]
+    assert report["stdev"] == {"hits": 2, "calls": 3, "hit_rate": 2 / 3}
+    assert "sqrt" not in report
+    assert "メモ化 stdev: 2/3 回を再利用" in profiler.render()
+
+    second = Profiler()
+    evaluate("E", script, "A=1, 3, 8", profiler=second)
+    assert second.builtins["stdev"].hits == 1
+
+
+def test_profiler_merge_aggregates_runs() -> None:
+    total = Profiler()
+    for value in ("1", "2"):
+        row = Profiler()
+        evaluate("R", "this = roundjisb(this, 2, 1)", value, profiler=row)
+        total.merge(row)
+    assert total.builtins["roundjisb"].hits == 2
+    assert total.phases["run"].hits == 2
+
+
+def test_limits_stop_runaway_loops_with_budget_status() -> None:
+    script = """
+        total = 0
+        for I = 1 TO 1000
+         for J = 1 TO 1000
+          total = total + 1
+         next
+        next
+        this = total
+    """
+    limits = EvaluationLimits(max_steps=500)
+    assert evaluate("E", dedent(script).strip(), "", limits=limits) == (
+        "上限超過",
+        None,
+        None,
+    )
+    timeout = EvaluationLimits(timeout=0.01)
+    assert evaluate("E", dedent(script).strip(), "", limits=timeout)[0] == "上限超過"
+
+
+def test_limits_restrict_text_and_list_sizes() -> None:
+    script = """
+        B = ''
+        for I = 1 TO 10
+         strcat(B, 'xx')
+        next
+        this = B
+    """
+    limits = EvaluationLimits(max_text_length=8)
+    assert evaluate("E", dedent(script).strip(), "", limits=limits)[0] == "上限超過"
+    limits = EvaluationLimits(max_list_length=2)
+    assert evaluate("R", "this = this", "1", limits=limits) == (None, "1", "1")
+    assert evaluate("E", "this = ave(#A)", "A=1,2,3", limits=limits)[0] == "上限超過"
+    assert evaluate("E", "this = ave(#A)", "A=1,2") == ("1.5", None, None)
+
+
+def test_limits_inside_if_condition_are_not_flattened() -> None:
+    limits = EvaluationLimits(max_list_length=1)
+    script = """
+        this = 0
+        if ave(#A) gt 1
+         this = 1
+        end
+    """
+    assert evaluate("E", dedent(script).strip(), "A=1,2", limits=limits)[0] == (
+        "上限超過"
+    )
+
+
+def test_evaluate_detailed_reports_line_and_expression() -> None:
+    script = """
+        A = 1
+        B = sqrt(A, 2)
+        this = B
+    """
+    result = evaluate_detailed("E", dedent(script).strip(), "")
+    assert result.as_tuple() == ("エラー", None, None)
+    assert result.error_code == "TYPE"
+    assert result.phase == "run"
+    assert result.line == 2
+    assert result.source == "B = sqrt(A, 2)"
+    assert result.expression == "sqrt(A, 2)"
+    assert "行2" in result.describe()
+
+
+def test_evaluate_detailed_unwraps_condition_errors() -> None:
+    script = """
+        this = 0
+        if #X gt 1
+         this = 1
+        end
+    """
+    result = evaluate_detailed("E", dedent(script).strip(), "A=1")
+    assert result.error_code == "MISSING_ITEM"
+    assert result.exception_class == "KeyError"
+    assert result.line == 2
+    ok = evaluate_detailed("R", "this = this", "1")
+    assert ok.ok and ok.describe() == "" and ok.as_tuple() == (None, "1", "1")
+
+
+def test_expression_cache_reuses_compiled_expressions() -> None:
+    EXPRESSION_CACHE.clear()
+    PROGRAM_CACHE.clear()
+    for value in ("1", "2", "3"):
+        assert evaluate("E", "this = #A * 2", f"A={value}")[0] == str(int(value) * 2)
+    assert len(EXPRESSION_CACHE) == 1
+    assert evaluate("E", "this = #A *", "A=1")[0] == "エラー"
+    assert evaluate_detailed("E", "this = #B *", "A=1").error_code == "MISSING_ITEM"
+
+
+def test_compiled_program_is_shared_and_matches_run_lines() -> None:
+    script = "s = 0\nfor i = 1 to 3\n  s = s + #A ; 加算\nnext\nthis = s"
+    program = compile_script(script)
+    assert compile_script(script) is program
+    assert [statement.kind for statement in program.statements] == [
+        "assign",
+        "for",
+        "assign",
+        "next",
+        "assign",
+    ]
+    engine = Engine(items={"A": 2})
+    assert engine.run_program(program)["this"] == 6
+    assert Engine(items={"A": 2}).run_lines(script.splitlines())["this"] == 6
+
+
+def test_evaluate_many_matches_sequential_evaluation() -> None:
+    requests = [
+        ("E", "a = roundjisb(#A, 1, 1)\nthis = a\nprint(this, a)", f"A={value}.25")
+        for value in range(150)
+    ] + [
+        ("R", "this = round(this, 1)", "1.25"),
+        ("E", "this = #B", "A=1"),
+        ("E", "s = 0\nfor i = 1 to 100\n  s = s + i\nnext\nthis = s", ""),
+    ]
+    limits = EvaluationLimits(max_steps=50)
+    expected = [evaluate_detailed(*request, limits=limits) for request in requests]
+    results = evaluate_many(requests, max_workers=4, limits=limits)
+    assert results == expected
+    assert results[0].as_tuple() == ("0.3", "0.3", None)
+    assert results[-2].error_code == "MISSING_ITEM"
+    assert results[-1].error_code == "BUDGET_EXCEEDED"
+    assert evaluate_many([]) == []
+
+
+def test_evaluate_structured_matches_text_inputs() -> None:
+    script = dedent(
+        """
+        n = strlen(#S) + #C
+        x = 2
+        this = roundjisb(ave(#B[G]) + #A + n + #V, 2, 1)
+        c = str_comp(#S, 'abc')
+        print(this, c)
+        """
+    ).strip()
+    text = "A=1.5\n#B[G]=1, 2, 4\nS='abc'\nC=3\nV=2"
+    values = {"A": 1.5, ("B", "G"): [1, 2, 4], "S": "abc", "C": 3, "V": VarRef("x")}
+    assert structured_inputs_E(values) is values
+    result = evaluate_structured("E", script, values)
+    assert result.as_tuple() == evaluate("E", script, text) == ("11.83", "0", None)
+
+    normalized = structured_inputs_E({"A": (1, 2), "B": [5]})
+    assert normalized == {"A": [1, 2], "B": 5}
+    r_script = "this = roundjisb(this, 2, 1)"
+    assert evaluate_structured("R", r_script, 1.234).as_tuple() == evaluate(
+        "R", r_script, "1.234"
+    )
+    assert evaluate_structured("R", "x = 1", 1.5).as_tuple() == (None, "1.5", "1.5")
+
+
+@pytest.mark.parametrize(
+    ("calc_type", "inputs", "code"),
+    [
+        ("E", {"a": 1}, "VALUE"),
+        ("E", {("A",): 1}, "TYPE"),
+        ("E", {"A": True}, "TYPE"),
+        ("E", {"A": []}, "VALUE"),
+        ("E", {"A": [1, None]}, "TYPE"),
+        ("E", "A=1", "TYPE"),
+        ("R", [1, 2], "TYPE"),
+    ],
+)
+def test_evaluate_structured_rejects_invalid_inputs(
+    calc_type: str, inputs: Any, code: str
+) -> None:
+    result = evaluate_structured(calc_type, "this = 1", inputs)
+    assert result.error_code == code
+    assert result.phase == "inputs"
+
+
+@pytest.mark.parametrize(
+    "script",
+    [
+        "this = roundjisb(this, 3, 0)",
+        "This = RoundJISB( this , 2, 1 )",
+        "this = sqrt(this)",
+        "if this > 0\n  this = roundjisb(this, 2, 1)\nelse\n  print(this, 'neg')\nend",
+        "this = #A",
+        "if this > 0",
+    ],
+)
+def test_evaluate_column_R_matches_per_row_evaluate(script: str) -> None:
+    values = ["12.345", "-0.0045", "1e3", "12.345", "abc", "#A", "", "<0.5", "0"]
+    rows = [evaluate("R", script, value) for value in values]
+    expected = ([row[1] for row in rows], [row[2] for row in rows])
+    assert evaluate_column_R(script, values) == expected
+    limits = EvaluationLimits(max_steps=10_000)
+    assert evaluate_column_R(script, values, limits=limits) == expected
+
+
+def test_evaluate_column_R_counts_rows() -> None:
+    rows_before = EVALUATION_SECONDS.count("R")
+    errors_before = EVALUATION_ERRORS.value("R", "ValueError")
+    edited, reported = evaluate_column_R("this = roundjisb(this, 2, 1)", ["1.234", "x"])
+    assert edited == ["1.23", "エラー"] and reported == edited
+    assert EVALUATION_SECONDS.count("R") == rows_before + 2
+    assert EVALUATION_ERRORS.value("R", "ValueError") == errors_before + 1
+    assert evaluate_column_R("this = 1", []) == ([], [])
+
+
+def test_inputs_are_parsed_only_when_referenced() -> None:
+    inputs = "A=1\nB=not a value\nbroken line\nC='x', bad, 'yyy'"
+
+    def lazy(script: str, text: str = inputs) -> tuple[str | None, ...]:
+        return evaluate("E", script, text, strict_inputs=False)
+
+    assert lazy("this = #A + 1") == ("2", None, None)
+    assert lazy("this = strlen(#C, 3)") == ("3", None, None)
+    assert lazy("this = str_comp(#C, 'x', 1, 1)") == ("0", None, None)
+    assert lazy("this = #B")[0] == "エラー"
+    assert lazy("this = #A * 2", "A=3\nbad line") == ("6", None, None)
+    assert lazy("this = #A * 2", "A=3\nB=zz,,") == ("6", None, None)
+    assert (
+        evaluate_detailed(
+            "E", "this = strlen(#C)", "C=bad, 'x'", strict_inputs=False
+        ).error_code
+        == "VALUE"
+    )
+
+
+@pytest.mark.parametrize(
+    "inputs",
+    [
+        "A=1\nB=not a value\nbroken line\nC='x', bad, 'yyy'",
+        "A=3\nbad line",
+        "A=3\nB=zz,,",
+    ],
+)
+def test_strict_inputs_is_the_default(inputs: str) -> None:
+    assert evaluate("E", "this = #A + 1", inputs) == ("エラー", None, None)
+    strict = evaluate_detailed("E", "this = #A + 1", inputs)
+    assert strict.error_code == "VALUE" and strict.phase == "inputs"
+    assert evaluate_many([("E", "this = #A + 1", inputs)])[0] == strict
+
+
+def test_lazy_inputs_match_eager_parsing() -> None:
+    inputs = "A=1\n#B[G]=2.50, 'x'\nrem C=3\nA=4"
+    lazy = LazyInputs(inputs)
+    assert "C" not in lazy and len(lazy) == 2
+    assert dict(lazy) == parse_inputs_E(inputs) == {"A": 4, ("B", "G"): [2.5, "x"]}
+    assert LazyInputs(inputs).select(("B", "G"), 2) == [None, "x"]
+    assert LazyInputs(inputs).select(("B", "G"), 5) == [None, None]
+    assert LazyInputs(inputs).select("A", 3) == 4
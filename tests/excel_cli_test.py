@@ -0,0 +1,448 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from openpyxl import load_workbook
+
+from lab_aid import excel_cli, job_queue
+from lab_aid.engine.runtime.capture import read_capture
+from lab_aid.excel_cli import ensure_template, main
+from lab_aid.excel_watch import WorkbookWatcher, watch_workbooks
+from lab_aid.formula_library import FORMULA_SHEET, FORMULA_SHEET_HEADERS
+from lab_aid.job_queue import JOB_MAX_ATTEMPTS, JobQueue
+
+
+def make_workbook(path: Path, rows: list[tuple[str, str, str]]) -> Path:
+    ensure_template(path)
+    wb = load_workbook(path)
+    ws = wb.active
+    for offset, (calc_type, script, inputs) in enumerate(rows):
+        ws.cell(row=3 + offset, column=1, value=calc_type)
+        ws.cell(row=3 + offset, column=2, value=script)
+        ws.cell(row=3 + offset, column=3, value=inputs)
+    wb.save(path)
+    return path
+
+
+def read_outputs(path: Path) -> list[tuple[object, ...]]:
+    ws = load_workbook(path).active
+    return [
+        tuple(ws.cell(row=row, column=col).value for col in range(4, 8))
+        for row in range(3, ws.max_row + 1)
+    ]
+
+
+def test_main_writes_results(tmp_path: Path) -> None:
+    path = make_workbook(
+        tmp_path / "book.xlsx",
+        [("E", "this = #A * 2", "A=5"), ("R", "this = roundjisb(this, 2, 1)", "1.205")],
+    )
+    assert main([str(path)]) == 0
+    assert read_outputs(path) == [
+        ("10", None, None, "OK"),
+        (None, "1.21", "1.21", "OK"),
+    ]
+
+
+def test_main_profile_reports_rows_and_aggregate(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    path = make_workbook(
+        tmp_path / "book.xlsx",
+        [("R", "this = roundjisb(this, 2, 1)", "1.205")] * 2,
+    )
+    assert main([str(path), "--profile"]) == 0
+    out = capsys.readouterr().out
+    assert "プロファイル（ブック全体）" in out
+    assert "関数 roundjisb" in out
+    assert "(2 回)" in out
+
+
+def test_main_marks_budget_exceeded_rows(tmp_path: Path) -> None:
+    loop = "this = 0\nfor I = 1 TO 100\n this = this + 1\nnext"
+    path = make_workbook(
+        tmp_path / "book.xlsx", [("E", loop, ""), ("E", "this = 1", "")]
+    )
+    assert main([str(path), "--max-steps", "50"]) == 0
+    assert read_outputs(path) == [
+        ("上限超過", None, None, "BUDGET_EXCEEDED"),
+        ("1", None, None, "OK"),
+    ]
+
+
+def test_main_writes_metrics_textfile(tmp_path: Path) -> None:
+    path = make_workbook(tmp_path / "book.xlsx", [("E", "this = #A * 2", "A=5")])
+    metrics_path = tmp_path / "lab_aid.prom"
+    assert main([str(path), "--metrics-file", str(metrics_path)]) == 0
+    text = metrics_path.read_text(encoding="utf-8")
+    for phase in ("load", "evaluate", "save"):
+        assert f'lab_aid_phase_seconds_count{{phase="{phase}"}}' in text
+    assert 'lab_aid_evaluation_seconds_count{calc_type="E"}' in text
+
+
+def test_main_writes_chrome_trace(tmp_path: Path) -> None:
+    path = make_workbook(
+        tmp_path / "book.xlsx",
+        [("E", "this = #A * 2", "A=5"), ("E", "this = #A * 2", "A=6")],
+    )
+    trace_path = tmp_path / "trace.json"
+    assert main([str(path), "--trace", str(trace_path)]) == 0
+    events = json.loads(trace_path.read_text(encoding="utf-8"))["traceEvents"]
+    spans = {event["name"]: event for event in events if event["ph"] == "X"}
+    assert {
+        "load_workbook",
+        "iter_data_rows",
+        "evaluate_rows",
+        "record_results",
+        "save",
+    } <= set(spans)
+    assert spans["evaluate_rows"]["args"]["rows"] == "3-4"
+    assert len(spans["evaluate_rows"]["args"]["scripts"]) == 1
+
+
+def test_main_writes_error_column_and_log(tmp_path: Path) -> None:
+    path = make_workbook(
+        tmp_path / "book.xlsx",
+        [("E", "this = 1", ""), ("E", "this = sqrt(-1)", "")],
+    )
+    log_path = tmp_path / "errors.jsonl"
+    assert main([str(path), "--error-column", "--error-log", str(log_path)]) == 0
+    ws = load_workbook(path).active
+    assert ws.cell(row=2, column=8).value == "エラー詳細"
+    assert ws.cell(row=3, column=8).value in (None, "")
+    assert str(ws.cell(row=4, column=8).value).startswith("VALUE")
+    entries = [json.loads(line) for line in log_path.read_text("utf-8").splitlines()]
+    assert [(entry["row"], entry["line"]) for entry in entries] == [(4, 1)]
+
+
+def test_main_reads_measurement_files_only_under_measurement_dir(
+    tmp_path: Path,
+) -> None:
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "m.txt").write_text("1, 2, 3\n", encoding="utf-8")
+    path = make_workbook(
+        tmp_path / "book.xlsx",
+        [("E", "this = sum(#M)", "M=file('m.txt')")],
+    )
+    assert main([str(path), "--error-column"]) == 0
+    ws = load_workbook(path).active
+    assert ws.cell(row=3, column=4).value == "エラー"
+    assert "許可されていません" in str(ws.cell(row=3, column=8).value)
+    assert main([str(path), "--measurement-dir", str(data)]) == 0
+    assert read_outputs(path)[0] == ("6", None, None, "OK")
+
+
+def test_main_processes_directory_in_parallel_with_all_sheets(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    first = make_workbook(tmp_path / "a.xlsx", [("E", "this = #A * 2", "A=5")])
+    wb = load_workbook(first)
+    extra = wb.create_sheet("追加")
+    extra.cell(row=3, column=1, value="R")
+    extra.cell(row=3, column=2, value="this = roundjisb(this, 2, 1)")
+    extra.cell(row=3, column=3, value="1.205")
+    wb.save(first)
+    make_workbook(tmp_path / "b.xlsx", [("E", "this = sqrt(-1)", "")])
+    (tmp_path / "~$a.xlsx").write_bytes(b"lock")
+    summary_path = tmp_path / "summary.json"
+
+    argv = [str(tmp_path), "--all-sheets", "--jobs", "2"]
+    assert main([*argv, "--summary-json", str(summary_path)]) == 0
+    assert "[集計] ブック 2 件・シート 3 件・行 3 件" in capsys.readouterr().out
+    assert read_outputs(first) == [("10", None, None, "OK")]
+    assert load_workbook(first)["追加"].cell(row=3, column=5).value == "1.21"
+    summary = json.loads(summary_path.read_text(encoding="utf-8"))
+    assert [(entry["rows"], entry["errors"]) for entry in summary["workbooks"]] == [
+        (2, 0),
+        (1, 1),
+    ]
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "a.xlsx",
+        "b.xlsx",
+        "summary.json",
+        "~$a.xlsx",
+    ]
+
+
+def test_main_reports_unreadable_workbooks(tmp_path: Path) -> None:
+    make_workbook(tmp_path / "ok.xlsx", [("E", "this = 1", "")])
+    (tmp_path / "broken.xlsx").write_bytes(b"not a zip")
+    assert main([str(tmp_path / "*.xlsx"), "--jobs", "1"]) == 1
+    assert read_outputs(tmp_path / "ok.xlsx") == [("1", None, None, "OK")]
+
+
+def test_watcher_reevaluates_only_changed_rows(tmp_path: Path) -> None:
+    path = make_workbook(
+        tmp_path / "book.xlsx",
+        [("E", "this = #A * 2", "A=5"), ("E", "this = #A * 3", "A=5")],
+    )
+    args = argparse.Namespace(all_sheets=False, error_column=True, strict_inputs=False)
+    watcher = WorkbookWatcher(path, args)
+    assert watcher.refresh() == 2
+    assert not watcher.changed()
+    assert watcher.refresh() == 0
+
+    wb = load_workbook(path)
+    wb.active.cell(row=4, column=3, value="A=7")
+    wb.active.cell(row=5, column=1, value="R")
+    wb.active.cell(row=5, column=2, value="this = roundjisb(this, 2, 1)")
+    wb.active.cell(row=5, column=3, value="1.205")
+    wb.save(path)
+    assert watcher.changed()
+    assert watcher.refresh() == 2
+    assert read_outputs(path) == [
+        ("10", None, None, "OK"),
+        ("21", None, None, "OK"),
+        (None, "1.21", "1.21", "OK"),
+    ]
+    assert load_workbook(path).active.cell(row=2, column=8).value == "エラー詳細"
+
+    wb = load_workbook(path)
+    wb.active.cell(row=3, column=4, value=None)
+    wb.save(path)
+    assert watch_workbooks([path], args, interval=0.0, max_cycles=2) == 0
+    assert read_outputs(path)[0] == ("10", None, None, "OK")
+
+
+def test_watcher_reads_formula_cells_like_a_normal_run(tmp_path: Path) -> None:
+    path = make_workbook(
+        tmp_path / "book.xlsx",
+        [("E", "this = #A * 2", '="A=" & 5'), ("E", "this = #A * 3", "A=5")],
+    )
+    assert main([str(path), "--error-column"]) == 0
+    detail = load_workbook(path).active.cell(row=3, column=8).value
+    expected = read_outputs(path)
+    wb = load_workbook(path)
+    for row in (3, 4):
+        for column in range(4, 9):
+            wb.active.cell(row=row, column=column, value=None)
+    wb.save(path)
+
+    args = argparse.Namespace(all_sheets=False, error_column=True, strict_inputs=True)
+    watcher = WorkbookWatcher(path, args)
+    assert watcher.refresh() == 2
+    assert read_outputs(path) == expected
+    assert load_workbook(path).active.cell(row=3, column=8).value == detail
+
+
+def test_main_evaluates_rows_referencing_formula_ids(tmp_path: Path) -> None:
+    formulas = tmp_path / "formulas.json"
+    formulas.write_text(
+        json.dumps({"formulas": {"DOUBLE": {"type": "E", "script": "this = #A * 2"}}}),
+        "utf-8",
+    )
+    path = make_workbook(
+        tmp_path / "book.xlsx",
+        [("", "@DOUBLE", "A=5"), ("R", "@DOUBLE", "1"), ("E", "this = 3", "")],
+    )
+    summary = tmp_path / "summary.json"
+    args = [str(path), "--formulas", str(formulas), "--summary-json", str(summary)]
+    assert main(args) == 0
+    outputs = read_outputs(path)
+    assert outputs[0] == ("10", None, None, "OK")
+    assert str(outputs[1][3]).startswith("ERROR: 計算式タイプ 'R'")
+    assert outputs[2] == ("3", None, None, "OK")
+    payload = json.loads(summary.read_text("utf-8"))
+    assert payload["workbooks"][0]["formulas"]["formulas"] == 1
+
+    assert main([str(path), "--formulas", str(tmp_path / "none.json")]) == 1
+
+
+def test_watcher_reevaluates_rows_when_master_sheet_changes(tmp_path: Path) -> None:
+    path = make_workbook(
+        tmp_path / "book.xlsx",
+        [("", "@F1", "A=5"), ("E", "this = #A", "A=5")],
+    )
+    wb = load_workbook(path)
+    master = wb.create_sheet(FORMULA_SHEET)
+    master.append(FORMULA_SHEET_HEADERS)
+    master.append(["F1", "E", "this = #A * 2"])
+    wb.save(path)
+
+    args = argparse.Namespace(all_sheets=True, error_column=False, strict_inputs=False)
+    watcher = WorkbookWatcher(path, args)
+    assert watcher.refresh() == 2
+    assert read_outputs(path) == [("10", None, None, "OK"), ("5", None, None, "OK")]
+    assert watcher.library is not None
+    version = watcher.library.version
+
+    wb = load_workbook(path)
+    wb[FORMULA_SHEET].cell(row=2, column=3, value="this = #A * 3")
+    wb.save(path)
+    assert watcher.changed()
+    # 計算式マスタだけが変わった場合も、`@F1` を参照する行だけを再評価する。
+    assert watcher.refresh() == 1
+    assert watcher.library.version != version
+    assert read_outputs(path)[0] == ("15", None, None, "OK")
+
+
+def test_main_evaluates_cross_row_references_in_dependency_order(
+    tmp_path: Path,
+) -> None:
+    path = make_workbook(
+        tmp_path / "book.xlsx",
+        [
+            ("E", "this = #A + #B", "A={4}\nB={5.edited}"),
+            ("E", "this = #A * 2", "A=5"),
+            ("R", "this = roundjisb(this, 1, 1)", "{4}"),
+            ("E", "this = #A", "A={7}"),
+            ("E", "this = #A", "A={6}"),
+        ],
+    )
+    assert main([str(path)]) == 0
+    outputs = read_outputs(path)
+    assert outputs[0] == ("20.0", None, None, "OK")
+    assert outputs[1] == ("10", None, None, "OK")
+    assert outputs[2] == (None, "10.0", "10.0", "OK")
+    assert outputs[3][3] == "ERROR: 循環参照（LabAid!6, LabAid!7）"
+    assert outputs[4][3] == outputs[3][3]
+
+
+def test_worker_processes_split_jobs_between_processes_and_wave_threads(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = make_workbook(
+        tmp_path / "book.xlsx",
+        [
+            ("E", "this = #A", "A={5}"),
+            ("E", "this = #A", "A={5}"),
+            ("E", "this = 1", ""),
+        ],
+    )
+    pools: list[int | None] = []
+
+    class RecordingPool(ThreadPoolExecutor):
+        def __init__(self, max_workers: int | None = None) -> None:
+            pools.append(max_workers)
+            super().__init__(max_workers=max_workers)
+
+    monkeypatch.setattr(excel_cli, "ThreadPoolExecutor", RecordingPool)
+    args = excel_cli._build_parser().parse_args([str(path), "--jobs", "8"])
+    for processes, threads in ((4, 2), (8, 1), (3, 2)):
+        worker_args = excel_cli._worker_args(args, processes)
+        summary = excel_cli._process_workbook_in_worker(path, worker_args, None, False)
+        assert summary.status == "OK"
+        assert pools[-1] == threads
+    assert read_outputs(path)[0] == ("1", None, None, "OK")
+
+
+def test_watcher_reevaluates_downstream_rows_of_changed_references(
+    tmp_path: Path,
+) -> None:
+    path = make_workbook(
+        tmp_path / "book.xlsx",
+        [
+            ("E", "this = #A * 2", "A=5"),
+            ("E", "this = #A + 1", "A={3}"),
+            ("E", "this = #A + 1", "A={4}"),
+            ("E", "this = #A", "A=1"),
+        ],
+    )
+    args = argparse.Namespace(all_sheets=False, error_column=False, strict_inputs=False)
+    watcher = WorkbookWatcher(path, args)
+    assert watcher.refresh() == 4
+    assert [row[0] for row in read_outputs(path)] == ["10", "11", "12", "1"]
+
+    wb = load_workbook(path)
+    wb.active.cell(row=3, column=3, value="A=7")
+    wb.save(path)
+    # 変更行と、それを参照する 2 行だけを再評価する。
+    assert watcher.refresh() == 3
+    assert [row[0] for row in read_outputs(path)] == ["14", "15", "16", "1"]
+
+
+def test_main_job_mode_resumes_after_interruption(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    rows = [
+        ("E", "this = #A * 2", "A=5"),
+        ("E", "this = #A + 1", "A={3}"),
+        ("E", "this = #A + 1", "A=1"),
+        ("E", "this = #A + 1", "A=2"),
+    ]
+    expected_path = make_workbook(tmp_path / "expected.xlsx", rows)
+    assert main([str(expected_path)]) == 0
+    path = make_workbook(tmp_path / "book.xlsx", rows)
+    database = tmp_path / "jobs.sqlite"
+
+    evaluate = job_queue._evaluate_queued
+    calls: list[int] = []
+
+    def interrupted(*args: object) -> object:
+        calls.append(1)
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        return evaluate(*args)  # type: ignore[arg-type]
+
+    monkeypatch.setattr(job_queue, "JOB_BATCH_ROWS", 1)
+    monkeypatch.setattr(job_queue, "_evaluate_queued", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        main([str(path), "--job", str(database)])
+    monkeypatch.setattr(job_queue, "_evaluate_queued", evaluate)
+    capsys.readouterr()
+
+    assert main([str(path), "--job", str(database)]) == 0
+    assert "2/4 行は評価済み" in capsys.readouterr().out
+    assert read_outputs(path) == read_outputs(expected_path)
+
+
+def test_main_job_mode_gives_up_on_rows_that_keep_crashing(tmp_path: Path) -> None:
+    path = make_workbook(
+        tmp_path / "book.xlsx",
+        [("E", "this = #A * 2", "A=5"), ("E", "this = #A", "A={3}")],
+    )
+    database = tmp_path / "jobs.sqlite"
+    queue = JobQueue(database)
+    rows = [
+        ("LabAid", 3, 0, "E", "this = #A * 2", "A=5", None),
+        ("LabAid", 4, 1, "E", "this = #A", "A={3}", None),
+    ]
+    signature = f"{path.stat().st_mtime_ns}:{path.stat().st_size}"
+    settings = json.dumps(
+        {
+            "all_sheets": False,
+            "formulas": None,
+            "limits": None,
+            "measurement_dir": None,
+            "strict_inputs": True,
+        },
+        sort_keys=True,
+    )
+    job = queue.create_job(path.resolve(), signature, settings, rows)
+    with queue.transaction() as db:
+        db.execute(
+            "UPDATE rows SET attempts = ? WHERE job = ? AND seq = 0",
+            (JOB_MAX_ATTEMPTS, job),
+        )
+    queue.close()
+
+    assert main([str(path), "--job", str(database)]) == 0
+    outputs = read_outputs(path)
+    assert (
+        outputs[0][3]
+        == f"ERROR: 評価中にプロセスが終了しました（{JOB_MAX_ATTEMPTS} 回）"
+    )
+    assert outputs[1][3] == "ERROR: 参照先 LabAid!3 の評価に失敗しました。"
+    with sqlite3.connect(database) as db:
+        assert db.execute("SELECT state FROM jobs").fetchall() == [("done",)]
+
+
+def test_main_captures_evaluations_from_worker_processes(tmp_path: Path) -> None:
+    for name in ("a", "b"):
+        make_workbook(
+            tmp_path / f"{name}.xlsx",
+            [("E", "this = #A * 2", "A=5"), ("E", "this = strlen(#S)", "S='x'")],
+        )
+    log = tmp_path / "capture.jsonl.gz"
+    argv = [str(tmp_path), "--jobs", "2", "--capture", str(log)]
+    assert main([*argv, "--capture-anonymize"]) == 0
+    entries = list(read_capture(log))
+    assert len(entries) == 4
+    assert {entry.outputs[0] for entry in entries} == {"10", "1"}
+    assert sum(entry.anonymized for entry in entries) == 2
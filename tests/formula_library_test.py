@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+
+from lab_aid.formula_library import FormulaLibrary, FormulaLibraryError, load_library
+
+
+def test_library_loads_json_and_toml_with_versions(tmp_path: Path) -> None:
+    json_path = tmp_path / "formulas.json"
+    json_path.write_text(
+        json.dumps(
+            {
+                "version": "2026-10",
+                "formulas": {
+                    "DOUBLE": {"type": "e", "script": "THIS = #A * 2"},
+                    "ROUND2": {"type": "R", "script": "this = roundjisb(this, 2, 1)"},
+                },
+            }
+        ),
+        "utf-8",
+    )
+    toml_path = tmp_path / "formulas.toml"
+    toml_path.write_text(
+        '[formulas.DOUBLE]\ntype = "E"\nscript = "this=#A * 2"\n'
+        '[formulas.ROUND2]\ntype = "R"\nscript = """\nthis = roundjisb(this, 2, 1)\n"""\n',
+        "utf-8",
+    )
+    library = load_library(json_path)
+    assert load_library(json_path) is library
+    assert library.version == "2026-10"
+    assert library.resolve("", "@DOUBLE") == ("E", "this = #A * 2")
+    assert library.resolve("E", "this = 1") == ("E", "this = 1")
+
+    toml_library = FormulaLibrary.load(toml_path)
+    # 版の記載がなければ内容のダイジェストを版とし、表記揺れは同じ内容とみなす。
+    assert toml_library.version == toml_library.digest[:12]
+    assert toml_library.digest == library.digest
+
+    with pytest.raises(FormulaLibraryError, match="登録されていません"):
+        library.resolve("E", "@MISSING")
+    with pytest.raises(FormulaLibraryError, match="一致しません"):
+        library.resolve("E", "@ROUND2")
+    with pytest.raises(FormulaLibraryError, match="BROKEN"):
+        FormulaLibrary.from_entries([("BROKEN", "E", "this = (1")])
+    with pytest.raises(FormulaLibraryError, match="重複"):
+        FormulaLibrary.from_rows([("A", "E", "this = 1"), ("A", "E", "this = 2")])
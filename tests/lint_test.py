@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from textwrap import dedent
+
+import pytest
+from openpyxl import Workbook
+
+from lab_aid import lint_cli
+from lab_aid.engine import evaluate_detailed, lint_script
+from lab_aid.lint_cli import main
+
+
+def lint(calc_type: str, script: str) -> list[tuple[int | None, str]]:
+    return [
+        (diagnostic.line, diagnostic.code)
+        for diagnostic in lint_script(calc_type, dedent(script).strip())
+    ]
+
+
+def test_lint_reports_every_error_with_line_numbers() -> None:
+    script = """
+        a = #A * 2
+        if a gt 3
+          b = foo(a)
+        else
+          b = a ** 2
+        end
+        for i = 1 to 3 step 0
+        next j
+        print(this, #A)
+        c = (
+        this = a
+    """
+    assert lint("E", script) == [
+        (3, "TYPE"),
+        (5, "TYPE"),
+        (7, "VALUE"),
+        (7, "SYNTAX"),
+        (8, "SYNTAX"),
+        (9, "SYNTAX"),
+        (10, "SYNTAX"),
+    ]
+
+
+def test_lint_checks_inactive_branches_that_runtime_skips() -> None:
+    script = """
+        this = 1
+        if this gt 5
+          this = str_comp(this)
+        end
+    """
+    assert evaluate_detailed("E", dedent(script).strip(), "").ok
+    assert lint("E", script) == [(3, "TYPE")]
+
+
+def test_lint_script_level_rules() -> None:
+    assert lint("E", "a = 1") == [(None, "VALUE")]
+    assert lint("R", "this = roundjisb(this, 2, 1)\nx = #A") == [(2, "VALUE")]
+    assert lint("R", "this = roundjisb(this, 2, 1)") == []
+    assert lint("X", "this = 1") == [(None, "VALUE")]
+
+
+def test_lint_cli_checks_workbooks_and_script_files(
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(lint_cli, "LINT_CHUNK_SCRIPTS", 1)
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "マスタ"
+    rows = [("E", "this = #A"), ("E", "this = #A"), ("R", "this = bad(this)"), ("", "")]
+    for offset, (calc_type, script) in enumerate(rows):
+        ws.cell(row=3 + offset, column=1, value=calc_type)
+        ws.cell(row=3 + offset, column=2, value=script)
+    wb.save(tmp_path / "master.xlsx")
+    (tmp_path / "ok.txt").write_text("this = 1\n", "utf-8")
+
+    assert main([str(tmp_path / "ok.txt")]) == 0
+    assert main([str(tmp_path), "--jobs", "2"]) == 1
+    out = capsys.readouterr().out
+    assert f"{tmp_path / 'master.xlsx'}:マスタ!5: 行1: TYPE 未対応の関数: bad" in out
+    assert "計算式 3 件（重複除外後 2 件）・指摘 1 件" in out
+
+    assert main([str(tmp_path / "master.xlsx"), "--format", "json"]) == 1
+    payload = json.loads(capsys.readouterr().out)
+    assert [(item["location"].rsplit(":", 1)[1], item["line"]) for item in payload] == [
+        ("マスタ!5", 1)
+    ]
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import gc
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+
+from openpyxl import load_workbook
+
+from lab_aid.engine import evaluate
+from lab_aid.engine.runtime.inputs import parse_inputs_E
+from lab_aid.excel_cli import ensure_template, main
+
+# 上限は計測値（Python 3.11 で `this = #A * 2` は約 2.7 KB）に十分な余裕を持たせる。
+SIMPLE_PEAK_BUDGET = 16 * 1024
+BYTES_PER_VALUE_BUDGET = 128
+
+
+def peak_and_retained(func: Callable[[], object], calls: int) -> tuple[int, int]:
+    """1 回あたりのピークの最大値と、`calls` 回の呼び出し後に残ったメモリを返す。
+
+    LRU キャッシュの辞書の再確保などの一時的な増加を除くため、残ったメモリは
+    2 回計測した小さい方とする。
+    """
+    for _ in range(3):
+        func()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        peak = 0
+        retained = []
+        for _ in range(2):
+            start = tracemalloc.get_traced_memory()[0]
+            for _ in range(calls):
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                func()
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+            gc.collect()
+            retained.append(tracemalloc.get_traced_memory()[0] - start)
+    finally:
+        tracemalloc.stop()
+    return peak, min(retained)
+
+
+def test_simple_evaluation_stays_within_memory_budget() -> None:
+    peak, retained = peak_and_retained(
+        lambda: evaluate("E", "this = #A * 2", "A=5"), 200
+    )
+    assert peak < SIMPLE_PEAK_BUDGET
+    assert retained < 1024
+
+
+def test_large_multi_measurement_inputs_scale_per_value() -> None:
+    values = 1000
+    inputs = "\n".join(
+        f"M{item}=" + ", ".join(str(value * 0.5) for value in range(values))
+        for item in range(10)
+    )
+    parsed, retained = peak_and_retained(lambda: parse_inputs_E(inputs), 3)
+    assert parsed < BYTES_PER_VALUE_BUDGET * 10 * values
+    assert retained < 1024
+    # 参照しない試験項目は解析しないため、全項目を解析するより十分小さい。
+    peak, _ = peak_and_retained(
+        lambda: evaluate("E", "this = ave(#M3)", inputs, strict_inputs=False), 3
+    )
+    assert peak < parsed / 2
+
+
+def test_excel_cli_does_not_retain_memory_across_runs(tmp_path: Path) -> None:
+    path = tmp_path / "book.xlsx"
+    ensure_template(path)
+    wb = load_workbook(path)
+    ws = wb.active
+    for offset in range(200):
+        ws.cell(row=3 + offset, column=1, value="E")
+        ws.cell(row=3 + offset, column=2, value="this = #A * 2")
+        ws.cell(row=3 + offset, column=3, value=f"A={offset}")
+    wb.save(path)
+
+    _, retained = peak_and_retained(lambda: main([str(path)]), 1)
+    assert retained < 200 * 64
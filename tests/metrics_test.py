@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from lab_aid.engine import evaluate
+from lab_aid.engine.runtime.metrics import (
+    EVALUATION_ERRORS,
+    EVALUATION_SECONDS,
+    MetricsRegistry,
+    PeriodicExporter,
+)
+
+
+def test_registry_renders_prometheus_text() -> None:
+    registry = MetricsRegistry()
+    counter = registry.counter("demo_total", "Demo counter.", ("kind",))
+    counter.inc('a"b')
+    histogram = registry.histogram("demo_seconds", "Demo.", (), buckets=(0.1, 1.0))
+    histogram.observe(0.5)
+    histogram.observe(2.0)
+
+    text = registry.render()
+    assert "# TYPE demo_total counter" in text
+    assert 'demo_total{kind="a\\"b"} 1' in text
+    assert 'demo_seconds_bucket{le="0.1"} 0' in text
+    assert 'demo_seconds_bucket{le="1"} 1' in text
+    assert 'demo_seconds_bucket{le="+Inf"} 2' in text
+    assert "demo_seconds_sum 2.5" in text
+    assert "demo_seconds_count 2" in text
+
+
+def test_evaluate_counts_rows_and_errors_by_exception_class() -> None:
+    rows_before = EVALUATION_SECONDS.count("E")
+    errors_before = EVALUATION_ERRORS.value("E", "KeyError")
+    assert evaluate("E", "this = #A", "A=1") == ("1", None, None)
+    assert evaluate("E", "this = #MISSING", "") == ("エラー", None, None)
+    assert EVALUATION_SECONDS.count("E") == rows_before + 2
+    assert EVALUATION_ERRORS.value("E", "KeyError") == errors_before + 1
+
+
+def test_periodic_exporter_writes_on_stop(tmp_path: Path) -> None:
+    registry = MetricsRegistry()
+    registry.counter("demo_total", "Demo counter.").inc()
+    path = tmp_path / "metrics" / "lab_aid.prom"
+    exporter = PeriodicExporter(registry, path, interval=60).start()
+    exporter.stop()
+    assert "demo_total 1" in path.read_text(encoding="utf-8")
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import pytest
+
+from lab_aid.row_graph import (
+    RowGraph,
+    RowReference,
+    RowReferenceError,
+    find_references,
+    substitute_references,
+)
+
+
+def test_find_and_substitute_references() -> None:
+    inputs = "A={5}\nB={計算!3.edited}\nC='{9}'"
+    assert find_references(inputs, "LabAid") == [
+        RowReference("LabAid", 5, None),
+        RowReference("計算", 3, 1),
+    ]
+    outputs = {
+        ("LabAid", 5): ("10", None, None),
+        ("計算", 3): (None, "it's", "1.2"),
+    }
+    assert substitute_references(inputs, "LabAid", outputs.get) == (
+        "A=10\nB='it''s'\nC='{9}'"
+    )
+    with pytest.raises(RowReferenceError, match="LabAid!7"):
+        substitute_references("A={7}", "LabAid", outputs.get)
+    with pytest.raises(RowReferenceError, match="reported"):
+        find_references("A={5.total}", "LabAid")
+
+
+def test_row_graph_orders_waves_and_reports_cycles() -> None:
+    graph = RowGraph(
+        {
+            ("S", 3): "A=1",
+            ("S", 4): "A={3}",
+            ("S", 5): "A={3}\nB={4}",
+            ("S", 6): "A={7}",
+            ("S", 7): "A={6}",
+            ("S", 8): "A={6}",
+            ("S", 9): "A={99}",
+        }
+    )
+    waves, failures = graph.waves([("S", row) for row in range(3, 10)])
+    assert waves == [[("S", 3), ("S", 8)], [("S", 4)], [("S", 5)]]
+    assert failures[("S", 6)] == "循環参照（S!6, S!7）"
+    assert "S!99" in failures[("S", 9)]
+    assert graph.downstream([("S", 4)]) == {("S", 4), ("S", 5)}
+    assert not RowGraph({("S", 3): "A=1"})
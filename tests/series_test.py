@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from array import array
+from pathlib import Path
+
+import pytest
+
+from lab_aid.engine import (
+    EvaluationLimits,
+    MeasurementSeries,
+    evaluate,
+    evaluate_detailed,
+    evaluate_structured,
+    open_measurements,
+)
+from lab_aid.engine.runtime.inputs import close_measurements, parse_inputs_E
+
+VALUES = [12.5, 3.25, 7.0, 41.125, 0.5, 19.75, 3.25, 8.0]
+# `strlen`・`isempty` は `select_value` で 1 件の測定値を取り出す。
+SCRIPT = """a = ave(#M)
+b = sum(#M, #N)
+c = stdev(#M, #N)
+d = max(#M) - min(#M)
+e = max(#M, #N)
+this = a + b + c + d + e + strlen(#M, 4) + isempty(#M, 99)"""
+
+
+def write_f64(path: Path, values: list[float]) -> Path:
+    with path.open("wb") as fh:
+        array("d", values).tofile(fh)
+    return path
+
+
+def test_float64_file_matches_inline_measurements(tmp_path: Path) -> None:
+    path = write_f64(tmp_path / "m.f64", VALUES)
+    inline = "M=" + ", ".join(map(str, VALUES)) + "\nN=1.5, 2.5"
+    referenced = "M=file('m.f64')\nN=1.5, 2.5"
+
+    items = parse_inputs_E(referenced, measurement_dir=tmp_path)
+    assert isinstance(items["M"], MeasurementSeries)
+    assert isinstance(items["M"].numbers(), memoryview)
+    assert len(items["M"]) == len(VALUES) and items["M"][3] == 41.125
+    close_measurements(items.values())
+    with pytest.raises(ValueError):
+        items["M"][3]
+    expected = evaluate("E", SCRIPT, inline)
+    assert expected[0] != "エラー"
+    for strict in (False, True):
+        assert (
+            evaluate(
+                "E",
+                SCRIPT,
+                referenced,
+                strict_inputs=strict,
+                measurement_dir=tmp_path,
+            )
+            == expected
+        )
+    with open_measurements(path) as series:
+        structured = {"M": series, "N": [1.5, 2.5]}
+        assert evaluate_structured("E", SCRIPT, structured).as_tuple() == expected
+
+    limited = evaluate_detailed(
+        "E",
+        "this = ave(#M)",
+        "M=file('m.f64')",
+        limits=EvaluationLimits(max_list_length=4),
+        measurement_dir=tmp_path,
+    )
+    assert limited.error_code == "BUDGET_EXCEEDED"
+
+
+def test_text_file_is_streamed_with_inline_number_semantics(tmp_path: Path) -> None:
+    path = tmp_path / "m.txt"
+    path.write_text("12.5, 3.25 7\n\n41.125\n0.5,19.75\n3.25 8\n", encoding="utf-8")
+    inline = "M=12.5, 3.25, 7, 41.125, 0.5, 19.75, 3.25, 8\nN=1.5, 2.5"
+
+    series = open_measurements(path)
+    assert isinstance(series, MeasurementSeries) and series.kind == "text"
+    assert (len(series), series[2], series[-1]) == (8, 7, 8)
+    assert evaluate(
+        "E", SCRIPT, "M=file('m.txt')\nN=1.5, 2.5", measurement_dir=tmp_path
+    ) == evaluate("E", SCRIPT, inline)
+    write_f64(tmp_path / "m.dat", VALUES)
+    assert evaluate(
+        "E", "this = sum(#M)", "M=file('m.dat', 'f64')", measurement_dir=tmp_path
+    ) == (str(sum(VALUES)), None, None)
+
+    path.write_text("1, 2, secret-token\n", encoding="utf-8")
+    result = evaluate_detailed(
+        "E", "this = ave(#M)", "M=file('m.txt')", measurement_dir=tmp_path
+    )
+    assert result.error_code == "VALUE"
+    assert "m.txt 1行目" in (result.message or "")
+    assert "secret" not in (result.message or "")
+
+
+def test_file_reference_errors_and_single_values(tmp_path: Path) -> None:
+    write_f64(tmp_path / "one.bin", [2.5])
+    assert open_measurements("one.bin", base_dir=tmp_path) == 2.5
+    assert evaluate(
+        "E", "this = #M * 2", "M=file('one.bin')", measurement_dir=tmp_path
+    ) == evaluate("E", "this = #M * 2", "M=2.5")
+
+    missing = evaluate_detailed(
+        "E", "this = #M", "M=file('none.f64')", measurement_dir=tmp_path
+    )
+    assert missing.error_code == "VALUE"
+    assert "測定値ファイルを開けません（1行目）" in (missing.message or "")
+    (tmp_path / "bad.f64").write_bytes(b"\0" * 12)
+    (tmp_path / "empty.txt").write_text("\n", encoding="utf-8")
+    for name, message in (("bad.f64", "8 バイトの倍数"), ("empty.txt", "空です")):
+        result = evaluate_detailed(
+            "E", "this = #M", f"M=file('{name}')", measurement_dir=tmp_path
+        )
+        assert result.error_code == "VALUE" and message in (result.message or "")
+
+
+def test_file_references_are_confined_to_measurement_dir(tmp_path: Path) -> None:
+    base = tmp_path / "data"
+    base.mkdir()
+    outside = write_f64(tmp_path / "outside.f64", VALUES)
+    (base / "link.f64").symlink_to(outside)
+    write_f64(base / "m.f64", VALUES)
+
+    denied = evaluate_detailed("E", "this = ave(#M)", "M=file('m.f64')")
+    assert denied.error_code == "VALUE"
+    assert "許可されていません" in (denied.message or "")
+    for reference, message in (
+        (str(outside), "相対パス"),
+        ("../outside.f64", "相対パス"),
+        ("sub/../../outside.f64", "相対パス"),
+        ("link.f64", "基準ディレクトリの外"),
+    ):
+        result = evaluate_detailed(
+            "E", "this = ave(#M)", f"M=file('{reference}')", measurement_dir=base
+        )
+        assert result.error_code == "VALUE", reference
+        assert message in (result.message or ""), reference
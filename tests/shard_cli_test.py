@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import csv
+import shutil
+from pathlib import Path
+
+import pytest
+from openpyxl import load_workbook
+
+from lab_aid import excel_cli
+from lab_aid.shard_cli import (
+    ShardError,
+    ShardInfo,
+    main,
+    merge_shards,
+    partition_rows,
+    shard_input,
+)
+
+
+def make_workbook(path: Path, rows: list[tuple[str, str, str]]) -> Path:
+    excel_cli.ensure_template(path)
+    wb = load_workbook(path)
+    ws = wb.active
+    for offset, (calc_type, script, inputs) in enumerate(rows):
+        ws.cell(row=3 + offset, column=1, value=calc_type)
+        ws.cell(row=3 + offset, column=2, value=script)
+        ws.cell(row=3 + offset, column=3, value=inputs)
+    wb.save(path)
+    return path
+
+
+def read_outputs(path: Path) -> list[tuple[object, ...]]:
+    ws = load_workbook(path).active
+    return [
+        tuple(ws.cell(row=row, column=col).value for col in range(4, 8))
+        for row in range(3, ws.max_row + 1)
+    ]
+
+
+def test_partition_rows_balances_cost_and_keeps_references_together() -> None:
+    cells = {("S", row): ("E", "this = #A", f"A={row}") for row in range(3, 23)}
+    cells[("S", 4)] = ("E", "this = #A", "A={21}")
+    groups = partition_rows(cells, 4)
+    assert [len(group) for group in groups] == [5, 5, 5, 5]
+    assert groups[0] == [("S", row) for row in range(3, 7)] + [("S", 21)]
+    assert sorted(key for group in groups for key in group) == sorted(cells)
+    with pytest.raises(ShardError, match="分割数"):
+        partition_rows(cells, 20)
+
+
+def test_shard_and_merge_reproduce_a_single_run(tmp_path: Path) -> None:
+    rows = [("E", "this = #A * 2", f"A={i}") for i in range(12)]
+    rows[2] = ("E", "this = #A + 1", "A={14}")
+    rows.append(("R", "this = roundjisb(this, 2, 1)", "1.205"))
+    expected = make_workbook(tmp_path / "expected.xlsx", rows)
+    assert excel_cli.main([str(expected)]) == 0
+    source = make_workbook(tmp_path / "book.xlsx", rows)
+
+    assert main(["shard", str(source), "-n", "3"]) == 0
+    shards = sorted((tmp_path / "book.shards").glob("*.xlsx"))
+    assert [path.name for path in shards] == [
+        f"book.shard-0{n}-of-03.xlsx" for n in (1, 2, 3)
+    ]
+    assert ShardInfo.read(shards[0]).rows == {"LabAid": "3-5,14"}
+    with pytest.raises(ShardError, match="評価されていません"):
+        merge_shards(source, shards)
+    for path in shards:
+        assert excel_cli.main([str(path)]) == 0
+
+    with pytest.raises(ShardError, match=r"分割 2（全 3 件中）が見つかりません"):
+        merge_shards(source, [shards[0], shards[2]])
+    with pytest.raises(ShardError, match="重複"):
+        merge_shards(source, [*shards, shards[1]])
+    changed = tmp_path / "changed.xlsx"
+    shutil.copy(source, changed)
+    wb = load_workbook(changed)
+    wb.active.cell(row=5, column=3, value="A=99")
+    wb.save(changed)
+    with pytest.raises(ShardError, match="分割後に変更"):
+        merge_shards(changed, shards)
+
+    assert main(["merge", str(source), str(tmp_path / "book.shards")]) == 0
+    assert read_outputs(source) == read_outputs(expected)
+
+
+def test_csv_input_is_sharded_into_workbooks_and_merged_back(tmp_path: Path) -> None:
+    source = tmp_path / "input.csv"
+    with source.open("w", encoding="utf-8-sig", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["ID", "計算式タイプ", "計算式", "変数"])
+        for i in range(6):
+            writer.writerow([f"S{i}", "E", "this = #A + 1\nthis = this * 2", f"A={i}"])
+        writer.writerow(["memo", "", "", ""])
+
+    shards = shard_input(source, 2)
+    for path in shards:
+        assert excel_cli.main([str(path)]) == 0
+    output, rows = merge_shards(source, shards)
+
+    assert (output.name, rows) == ("input.results.csv", 6)
+    with output.open(encoding="utf-8-sig", newline="") as fh:
+        merged = list(csv.reader(fh))
+    assert merged[0][4:] == ["生データ", "編集後", "報告値", "status"]
+    assert [record[0] for record in merged[1:]] == [f"S{i}" for i in range(6)] + [
+        "memo"
+    ]
+    assert [record[4] for record in merged[1:7]] == [str((i + 1) * 2) for i in range(6)]
+    assert merged[7][4:] == ["", "", "", ""]
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from lab_aid.xlsx_patch import UnsupportedWorkbookError, XlsxPackage, parse_row
+
+MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+RELS = "http://schemas.openxmlformats.org/package/2006/relationships"
+DOC_RELS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+
+def write_package(
+    path: Path, sheet_data: str, shared: list[str], dimension: str = ""
+) -> Path:
+    """Excel が保存する形（共有文字列・spans 付きの行）の最小構成を作る。"""
+    items = "".join(f"<si><t>{text}</t></si>" for text in shared)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(
+            "xl/workbook.xml",
+            f'<workbook xmlns="{MAIN}" xmlns:r="{DOC_RELS}">'
+            '<bookViews><workbookView activeTab="1"/></bookViews><sheets>'
+            '<sheet name="空" sheetId="1" r:id="rId1"/>'
+            '<sheet name="LabAid" sheetId="2" r:id="rId2"/></sheets></workbook>',
+        )
+        archive.writestr(
+            "xl/_rels/workbook.xml.rels",
+            f'<Relationships xmlns="{RELS}">'
+            f'<Relationship Id="rId1" Type="{DOC_RELS}/worksheet" '
+            'Target="worksheets/sheet1.xml"/>'
+            f'<Relationship Id="rId2" Type="{DOC_RELS}/worksheet" '
+            'Target="/xl/worksheets/sheet2.xml"/></Relationships>',
+        )
+        archive.writestr(
+            "xl/worksheets/sheet1.xml",
+            f'<worksheet xmlns="{MAIN}"><sheetData/></worksheet>',
+        )
+        archive.writestr(
+            "xl/worksheets/sheet2.xml",
+            f'<worksheet xmlns="{MAIN}">{dimension}'
+            f"<sheetData>{sheet_data}</sheetData></worksheet>",
+        )
+        archive.writestr(
+            "xl/sharedStrings.xml",
+            f'<sst xmlns="{MAIN}" count="{len(shared)}">{items}</sst>',
+        )
+    return path
+
+
+def test_package_reads_shared_strings_and_patches_rows(tmp_path: Path) -> None:
+    path = write_package(
+        tmp_path / "book.xlsx",
+        '<row r="3" spans="1:4"><c r="A3" t="s"><v>0</v></c>'
+        '<c r="B3" t="s"><v>1</v></c><c r="C3" s="2"><v>1.5</v></c>'
+        '<c r="D3" s="3" t="s"><v>2</v></c></row>'
+        '<row r="4"><c r="A4" t="inlineStr"><is><t>R</t></is></c><c r="C4"><v>7</v></c></row>',
+        ["E", "this = a &amp; b_x000A_", "古い値"],
+    )
+    package = XlsxPackage(path)
+    assert package.sheets[package.active_index] == (
+        "LabAid",
+        "xl/worksheets/sheet2.xml",
+    )
+    sheet = package.sheet(*package.sheets[package.active_index])
+    values, refs = parse_row(sheet.row_xml(3), package.shared_strings, 5)
+    assert values == ("E", "this = a & b\n", "1.5", "古い値", "")
+    assert refs == (0, 1, 2)
+    assert parse_row(sheet.row_xml(4), package.shared_strings, 3)[0] == ("R", "", "7")
+
+    patched = sheet.patch({3: {4: "3 < 4", 5: ""}})
+    assert "spans" not in patched[3]
+    assert '<c r="D3" s="3" t="inlineStr">' in patched[3]
+    assert sheet.row_xml(4).startswith('<row r="4">')
+    package.save([sheet])
+
+    reopened = XlsxPackage(path)
+    sheet = reopened.sheet(*reopened.sheets[1])
+    values, _refs = parse_row(sheet.row_xml(3), reopened.shared_strings, 5)
+    assert values == ("E", "this = a & b\n", "1.5", "3 < 4", "")
+    assert reopened.shared_digest == package.shared_digest
+
+
+@pytest.mark.parametrize(
+    "cell",
+    [
+        '<c r="C3"><f>1+1</f><v>2</v></c>',
+        '<c r="C3" t="str"><f>"A="&amp;5</f><v>A=5</v></c>',
+        '<c r="C3" t="d"><v>2026-10-19T00:00:00</v></c>',
+    ],
+)
+def test_formula_and_date_cells_are_left_to_openpyxl(cell: str) -> None:
+    with pytest.raises(UnsupportedWorkbookError):
+        parse_row(f'<row r="3">{cell}</row>', [], 3)
+
+
+def test_patch_extends_dimension_to_written_cells(tmp_path: Path) -> None:
+    path = write_package(
+        tmp_path / "book.xlsx",
+        '<row r="3"><c r="A3" t="inlineStr"><is><t>E</t></is></c></row>'
+        '<row r="4"><c r="A4" t="inlineStr"><is><t>R</t></is></c></row>',
+        [],
+        dimension='<dimension ref="A1:G4"/>',
+    )
+    package = XlsxPackage(path)
+    sheet = package.sheet(*package.sheets[1])
+    sheet.patch({3: {4: "1", 8: ""}})
+    assert '<dimension ref="A1:G4"/>' in sheet.text
+    sheet.patch({4: {8: "VALUE"}})
+    assert '<dimension ref="A1:H4"/>' in sheet.text
+    assert sheet.row_xml(3).startswith('<row r="3">')
+    assert parse_row(sheet.row_xml(4), [], 8)[0][7] == "VALUE"